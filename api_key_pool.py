@@ -0,0 +1,316 @@
+# ============================================================================
+# Test Scenario Generator 2 - API 키 풀 (여러 키로 요청 분산)
+# ============================================================================
+# genai.configure(api_key=...)는 프로세스 전체 설정이라 키 1개의 RPM/TPM 할당량이 배치 전체의 상한이 되고,
+# 동시에 실행 중인 세션/워커가 서로의 키를 덮어쓸 수 있습니다.
+#
+# - 키마다 별도 GenerativeServiceClient를 만들어 모델에 연결 (요청 단위 설정, 전역 configure 없음)
+# - 속도 제한(rate_limit)은 (모델, 키)별로 따로 적용 → 키마다 자기 할당량만큼 호출
+# - 분배: 키별 예상 완료 시간 = 할당량 대기 시간(토큰/429 대기) + 평균 지연 × (진행 중 호출 + 1)이 가장 짧은 키 선택
+# - 인증 실패(잘못된/차단된 키)나 연속 오류가 난 키는 일정 시간 제외했다가 다시 사용
+# 키 상태(지연/오류/클라이언트)는 같은 키를 쓰는 모든 세션과 배치가 공유합니다. API 키 원문은 화면/로그에 표시하지 않습니다.
+# ============================================================================
+
+import hashlib  # 키 식별자 (원문 대신)
+import os  # 환경 변수
+import re  # 키 목록 구분자
+import threading  # 키 상태 동기화
+import time  # 지연 측정/제외 시간
+from typing import Callable, Dict, List, Optional, Sequence, Tuple, TypeVar
+
+from rate_limit import THROTTLE_MAX_RETRIES, get_rate_limiter, is_rate_limit_error
+
+UNHEALTHY_COOLDOWN = 60.0  # 연속 오류 키 제외 시간(초)
+INVALID_KEY_COOLDOWN = 3600.0  # 인증 실패 키 제외 시간(초)
+MAX_CONSECUTIVE_FAILURES = 3  # 이만큼 연속 실패하면 제외
+LATENCY_SMOOTHING = 0.3  # 지연 시간 지수 이동 평균 가중치
+DEFAULT_LATENCY = 1.0  # 아직 측정하지 않은 키의 지연 추정(초, 측정한 키가 있으면 그 평균)
+
+API_KEYS_ENV = "GOOGLE_API_KEYS"  # 여러 키 (쉼표/공백/줄바꿈 구분)
+API_KEY_ENV = "GOOGLE_API_KEY"
+
+_KEY_SEPARATOR = re.compile(r"[\s,;]+")
+
+T = TypeVar("T")
+
+
+def parse_api_keys(text: Optional[str]) -> List[str]:
+    """쉼표/공백/줄바꿈으로 구분한 키 목록 (중복 제거, 입력 순서 유지)"""
+    keys = []
+    for key in _KEY_SEPARATOR.split(text or ""):
+        if key and key not in keys:
+            keys.append(key)
+    return keys
+
+
+def default_api_keys() -> str:
+    """환경 변수의 키 목록 (GOOGLE_API_KEYS 우선, 없으면 GOOGLE_API_KEY)"""
+    return os.environ.get(API_KEYS_ENV) or os.environ.get(API_KEY_ENV, "")
+
+
+def mask_api_key(key: Optional[str]) -> str:
+    """화면 표시용 키 이름 (앞 4자…뒤 4자)"""
+    if not key:
+        return "기본 설정"
+    if len(key) <= 10:
+        return "…" + key[-2:]
+    return f"{key[:4]}…{key[-4:]}"
+
+
+def is_auth_error(error: BaseException) -> bool:
+    """잘못된/차단된 키 오류 여부 (401/403, API_KEY_INVALID)"""
+    code = getattr(error, "code", None)
+    try:
+        if code is not None and int(code) in (401, 403):
+            return True
+    except (TypeError, ValueError):
+        pass
+    if type(error).__name__ in ("Unauthenticated", "PermissionDenied", "Unauthorized", "Forbidden"):
+        return True
+    text = str(error)
+    return "API_KEY_INVALID" in text or "API key not valid" in text or "API key expired" in text
+
+
+def _is_request_error(error: BaseException) -> bool:
+    """요청 자체의 문제(400, 키와 무관)인지 여부 - 키 상태에 반영하지 않음"""
+    code = getattr(error, "code", None)
+    try:
+        return code is not None and int(code) == 400 and not is_auth_error(error)
+    except (TypeError, ValueError):
+        return False
+
+
+# ---------- 키별 상태 ----------
+
+class ApiKeyState:
+    """
+    API 키 1개의 클라이언트와 상태 (지연 시간, 연속 오류, 제외 시각)
+
+    key가 None이면 환경 변수/기본 인증을 쓰는 genai 기본 클라이언트입니다.
+    """
+
+    def __init__(self, key: Optional[str], clock: Callable[[], float] = time.monotonic):
+        self.key = key
+        self.label = mask_api_key(key)
+        self.key_id = hashlib.sha256(key.encode("utf-8")).hexdigest()[:8] if key else ""
+        self.latency: Optional[float] = None  # 성공 호출 지연 시간 이동 평균(초)
+        self.successes = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.unhealthy_until = 0.0
+        self.last_error = ""
+        self._client = None
+        self._clock = clock
+        self._lock = threading.Lock()
+
+    def limiter_name(self, model_name: str) -> str:
+        """속도 제한 단위 ((모델, 키)별 할당량)"""
+        return f"{model_name} · {self.label}#{self.key_id}" if self.key else model_name
+
+    def client(self):
+        """이 키 전용 GenerativeServiceClient (처음 사용할 때 생성, 기본 키는 None → genai 기본 클라이언트)"""
+        if not self.key:
+            return None
+        with self._lock:
+            if self._client is None:
+                import google.ai.generativelanguage as glm  # genai.GenerativeModel이 쓰는 것과 같은 클라이언트
+                self._client = glm.GenerativeServiceClient(client_options={"api_key": self.key})
+            return self._client
+
+    def is_healthy(self, now: Optional[float] = None) -> bool:
+        return (self._clock() if now is None else now) >= self.unhealthy_until
+
+    def record_success(self, latency: float):
+        with self._lock:
+            self.successes += 1
+            self.consecutive_failures = 0
+            if self.latency is None:
+                self.latency = latency
+            else:
+                self.latency += LATENCY_SMOOTHING * (latency - self.latency)
+
+    def record_failure(self, error: BaseException):
+        """429가 아닌 오류 기록 (인증 실패는 바로, 그 외는 연속 MAX_CONSECUTIVE_FAILURES회면 일시 제외)"""
+        if _is_request_error(error):
+            return
+        with self._lock:
+            self.failures += 1
+            self.consecutive_failures += 1
+            self.last_error = str(error)[:200]
+            now = self._clock()
+            if is_auth_error(error):
+                self.unhealthy_until = now + INVALID_KEY_COOLDOWN
+            elif self.consecutive_failures >= MAX_CONSECUTIVE_FAILURES:
+                self.unhealthy_until = now + UNHEALTHY_COOLDOWN
+                self.consecutive_failures = 0
+
+
+_key_states: Dict[Optional[str], ApiKeyState] = {}
+_key_states_lock = threading.Lock()
+
+
+def _key_state(key: Optional[str]) -> ApiKeyState:
+    """키별 상태 (같은 키를 쓰는 모든 풀이 공유)"""
+    with _key_states_lock:
+        state = _key_states.get(key)
+        if state is None:
+            state = ApiKeyState(key)
+            _key_states[key] = state
+        return state
+
+
+# ---------- 키 풀 ----------
+
+class ApiKeyPool:
+    """
+    여러 API 키 중 요청마다 가장 빨리 끝날 키를 고르는 풀
+
+    사용 예:
+        pool = get_api_key_pool("key1, key2, key3")
+        text = pool.call(model_name, lambda state: build_model(state.key).generate_content(contents).text)
+    """
+
+    def __init__(self, keys: Sequence[str], clock: Callable[[], float] = time.monotonic):
+        self.states = [_key_state(key) for key in keys] or [_key_state(None)]
+        self._clock = clock
+
+    def __len__(self) -> int:
+        return len(self.states)
+
+    def _expected_time(self, state: ApiKeyState, model_name: str, default_latency: float) -> float:
+        limiter = get_rate_limiter(state.limiter_name(model_name))
+        latency = state.latency if state.latency is not None else default_latency
+        return limiter.expected_time(latency)
+
+    def choose(self, model_name: str) -> ApiKeyState:
+        """
+        이번 요청에 쓸 키 선택
+
+        제외 중이 아닌 키 중 예상 완료 시간이 가장 짧은 키를 고릅니다.
+        모든 키가 제외 중이면 가장 먼저 복귀하는 키를 씁니다. (오류를 그대로 보여주기 위해)
+        """
+        if len(self.states) == 1:
+            return self.states[0]
+        now = self._clock()
+        healthy = [state for state in self.states if state.is_healthy(now)]
+        if not healthy:
+            return min(self.states, key=lambda state: state.unhealthy_until)
+        measured = [state.latency for state in healthy if state.latency is not None]
+        default_latency = sum(measured) / len(measured) if measured else DEFAULT_LATENCY
+        return min(healthy, key=lambda state: self._expected_time(state, model_name, default_latency))
+
+    def call(self, model_name: str, call: Callable[[ApiKeyState], T],
+             max_throttle_retries: int = THROTTLE_MAX_RETRIES,
+             on_throttle: Optional[Callable[[BaseException], None]] = None) -> T:
+        """
+        키를 골라 (모델, 키)별 속도 제한 안에서 호출하고, 429면 키를 다시 골라 호출
+
+        429가 아닌 오류는 키 상태에 기록한 뒤 그대로 올려 호출 지점의 재시도 정책을 따릅니다.
+        (재시도 때는 오류가 난 키의 상태를 반영해 다시 고름)
+
+        Args:
+            model_name: 모델명
+            call: call(키 상태) -> 결과 (키 상태의 client()로 모델을 연결해 호출)
+            max_throttle_retries: 429 재시도 횟수
+            on_throttle: 429를 받을 때마다 호출 (통계 집계용)
+
+        Raises:
+            Exception: 429가 아닌 오류, 또는 max_throttle_retries회 재시도 후에도 429
+        """
+        attempt = 0
+        while True:
+            state = self.choose(model_name)
+            with get_rate_limiter(state.limiter_name(model_name)).slot() as slot:
+                started = time.monotonic()
+                try:
+                    result = call(state)
+                except Exception as e:
+                    if not is_rate_limit_error(e):
+                        state.record_failure(e)
+                        raise
+                    slot.throttled(e)  # 이 키는 대기 시간 동안 예상 완료 시간이 늘어나 다른 키가 선택됨
+                    if on_throttle is not None:
+                        on_throttle(e)
+                    if attempt >= max_throttle_retries:
+                        raise
+                else:
+                    state.record_success(time.monotonic() - started)
+                    return result
+            attempt += 1
+
+    def snapshot(self, model_name: Optional[str] = None) -> List[dict]:
+        """키별 상태 (사이드바 표시용, 키 원문 제외)"""
+        now = self._clock()
+        rows = []
+        for state in self.states:
+            row = {
+                "key": state.label,
+                "healthy": state.is_healthy(now),
+                "latency_ms": None if state.latency is None else round(state.latency * 1000),
+                "successes": state.successes,
+                "failures": state.failures,
+                "excluded_for": max(0.0, state.unhealthy_until - now),
+                "last_error": state.last_error,
+            }
+            if model_name:
+                limiter = get_rate_limiter(state.limiter_name(model_name)).snapshot()
+                row["throttled"] = limiter["throttled"]
+                row["concurrency_limit"] = limiter["concurrency_limit"]
+            rows.append(row)
+        return rows
+
+
+_pools: Dict[Tuple[str, ...], ApiKeyPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_api_key_pool(api_keys: Optional[str] = None) -> ApiKeyPool:
+    """
+    키 목록 문자열에 해당하는 풀 (같은 키 목록이면 재실행/세션/배치 간 같은 풀)
+
+    Args:
+        api_keys: 키 1개 또는 쉼표/공백/줄바꿈으로 구분한 여러 키 (비어 있으면 genai 기본 설정)
+    """
+    keys = tuple(parse_api_keys(api_keys))
+    with _pools_lock:
+        pool = _pools.get(keys)
+        if pool is None:
+            pool = ApiKeyPool(keys)
+            _pools[keys] = pool
+        return pool
+
+
+# ---------- 벤치마크 (python api_key_pool.py) ----------
+
+if __name__ == "__main__":
+    # 키마다 1초에 20건 할당량인 가짜 모델로, 키 1개와 키 3개(+ 잘못된 키 1개) 풀을 비교
+    from concurrent.futures import ThreadPoolExecutor
+
+    from fake_gemini import RecordedModelFactory
+    from rate_limit import configure_rate_limits
+
+    def run(label: str, api_keys: str, total: int = 300, workers: int = 32):
+        factory = RecordedModelFactory([["ok"]], chunk_delay=0.05, throttle_limit=20, throttle_window=1.0,
+                                       invalid_keys=["AIzaBAD-KEY-0000"])
+        pool = get_api_key_pool(api_keys)
+        failed = []
+
+        def one(_):
+            for retry in range(3):  # 호출 지점 재시도 (잘못된 키 오류)
+                try:
+                    return pool.call("fake-model", lambda state: factory("fake-model", api_key=state.key)
+                                     .generate_content("hi").text, max_throttle_retries=50)
+                except Exception as e:
+                    if retry == 2:
+                        failed.append(e)
+
+        start = time.time()
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            list(executor.map(one, range(total)))
+        print(f"{label}: {total}건 {time.time() - start:.1f}초, 실패 {len(failed)}건, 429 {factory.throttled}회")
+        for row in pool.snapshot("fake-model"):
+            print("   ", row)
+
+    configure_rate_limits(rpm=1100, burst=2)  # 키별 할당량(초당 20건)보다 약간 낮게
+    run("키 1개", "AIzaKEY-ONE-1111")
+    run("키 3개 + 잘못된 키 1개", "AIzaKEY-ONE-1111, AIzaKEY-TWO-2222, AIzaKEY-THREE-3333, AIzaBAD-KEY-0000")
@@ -8,442 +8,34 @@
 
 # ---------- 라이브러리 Import ----------
 import streamlit as st  # Streamlit 웹 애플리케이션 프레임워크
-import google.generativeai as genai  # Google Gemini API 연동
 import pandas as pd  # 데이터프레임 처리 및 Excel 변환
-import base64  # 이미지 파일을 Base64로 인코딩하기 위해 사용
 import json  # JSON 파싱 및 변환
-import re  # 정규식 패턴 매칭 (JSON 파싱용)
-from io import BytesIO  # 메모리 상에서 파일 객체 생성 (Excel 다운로드용)
 from PIL import Image  # 이미지 파일 로딩 및 검증
-from pydantic import BaseModel, Field  # 구조화된 데이터 모델 정의
-from typing import List, Optional  # 타입 힌팅
+from typing import List  # 타입 힌팅
+from functools import partial  # 함수 인자 고정 (배치 워커, Excel 지연 생성)
 import time  # 재시도 간 대기 시간 처리
 import os  # 파일 경로 및 디렉토리 작업
-from datetime import datetime  # 날짜/시간 처리
 
-# ---------- Pydantic 데이터 모델 정의 ----------
-class TestCase(BaseModel):
-    """단일 테스트 케이스 구조를 정의하는 Pydantic 모델"""
-    파일명: str = Field(default="", description="소스 이미지 파일명")
-    구분: str = Field(description="단위 또는 통합")
-    화면경로: str = Field(description="화면 경로")
-    화면명: str = Field(description="화면 이름")
-    화면ID: str = Field(description="화면 식별자")
-    시나리오ID: str = Field(description="시나리오 ID")
-    시나리오명: str = Field(description="시나리오 이름 (상위 묶음)")
-    테스트케이스ID: str = Field(description="테스트 케이스 ID")
-    테스트케이스명: str = Field(description="테스트 케이스 이름 (하위 묶음)")
-    테스트항목_및_절차: str = Field(description="테스트 항목 및 절차")
-    입력데이터: str = Field(description="입력할 데이터")
-    기대결과: str = Field(description="예상되는 결과")
-    비교검증로직: str = Field(description="검증 방법 및 로직")
-    주의태그: Optional[str] = Field(default="", description="[주의] 태그")
-
-class TestCaseList(BaseModel):
-    """여러 테스트 케이스를 담는 컨테이너 모델"""
-    test_cases: List[TestCase]
-
-# ---------- LLM System Prompt 정의 ----------
-
-# ========== 1. 개발자/QA용 단위테스트 프롬프트 ==========
-DEVELOPER_UNIT_PROMPT = """당신은 대규모 엔터프라이즈 시스템(보험, 금융 등) 구축 프로젝트의 수석 QA 매니저입니다.
-제공된 UI/UX 기획안을 분석하여 **개발자 및 QA 담당자**가 검증해야 할 **기술적 단위 테스트**를 생성합니다.
-
-### 테스트 관점: 개발자/QA (기술 검증)
-
-이 테스트는 개발자가 구현을 올바르게 했는지, QA가 기술적 품질을 검증하는 데 사용됩니다.
-
-### 테스트 범위 (기술적 단위 테스트)
-
-* **필드 유효성 검사**: 입력 형식, 길이 제한, 필수값, 정규식 패턴
-* **경계값 분석**: 최소값, 최대값, 경계값, 초과값
-* **UI 요소 동작**: 버튼 활성화/비활성화, 체크박스, 라디오버튼, 드롭다운
-* **에러 처리**: 에러 메시지 표시, 유효성 검사 실패 시 동작
-* **화면 상태 변화**: 조건부 표시/숨김, 동적 UI 변경
-* **데이터 바인딩**: 입력값 반영, 계산 로직, 자동완성
-
-### 출력 형식
-```json
-{
-  "test_cases": [
-    {
-      "구분": "개발단위",
-      "화면경로": "청약 > 계약자 정보",
-      "화면명": "계약자 정보 입력",
-      "화면ID": "SCR_CONTRACT_INFO",
-      "시나리오ID": "TS-DEV-001",
-      "시나리오명": "계약자 정보 유효성 검증",
-      "테스트케이스ID": "TC-DEV-001-001",
-      "테스트케이스명": "주민등록번호 길이 검증",
-      "테스트항목_및_절차": "주민등록번호 필드에 123456 (6자리) 입력 후 이동",
-      "입력데이터": "주민등록번호: '123456'",
-      "기대결과": "'주민등록번호는 13자리여야 합니다' 에러 메시지 표시",
-      "비교검증로직": "[원칙] 13자리 형식 검증 / [예외] 빈 값은 필수값 에러",
-      "주의태그": ""
-    }
-  ]
-}
-```
-
-### 규칙
-* `구분` 필드: "개발단위"로 설정
-* 최소 15개 이상 생성
-* Positive/Negative 케이스 균형
-* 논리 오류, 허점 발견 시 [주의] 태그 필수
-"""
-
-# ========== 2. 현업용 단위테스트 프롬프트 ==========
-BUSINESS_UNIT_PROMPT = """당신은 보험 업무 전문가이자 UAT(User Acceptance Test) 설계자입니다.
-제공된 UI/UX 기획안을 분석하여 **현업 담당자**가 실제 업무 관점에서 검증할 **업무 단위 테스트**를 생성합니다.
-
-### 테스트 관점: 현업 담당자 (업무 검증)
-
-이 테스트는 현업 담당자가 실제 업무를 수행할 때 시스템이 올바르게 동작하는지 검증하는 데 사용됩니다.
-**기술적 테스트(필드 유효성, 경계값 등)는 개발팀에서 이미 완료했다고 가정합니다.**
-
-### 테스트 범위 (업무 단위 테스트)
-
-* **업무 흐름 검증**: 정상적인 업무 처리 흐름 확인
-* **업무 규칙 준수**: 보험 업무 규정, 내부 지침 준수 여부
-* **데이터 정합성**: 입력 데이터가 올바르게 저장/조회되는지
-* **권한별 기능**: 사용자 권한에 따른 기능 접근 확인
-* **조회/등록/수정/삭제**: 기본 CRUD 업무의 정상 동작
-* **출력물 확인**: 청약서, 증권, 영수증 등 출력물 정확성
-
-### 제외 항목 (개발팀에서 검증 완료)
-- 필드별 유효성 검사 (길이, 형식)
-- 경계값 분석
-- 에러 메시지 표시 조건
-- UI 요소 상태 변화
-
-### 출력 형식
-```json
-{
-  "test_cases": [
-    {
-      "구분": "현업단위",
-      "화면경로": "청약 > 계약자 정보",
-      "화면명": "계약자 정보 입력",
-      "화면ID": "SCR_CONTRACT_INFO",
-      "시나리오ID": "TS-BIZ-001",
-      "시나리오명": "신규 계약자 등록 프로세스",
-      "테스트케이스ID": "TC-BIZ-001-001",
-      "테스트케이스명": "정상 신규 등록",
-      "테스트항목_및_절차": "신규 계약자 정보를 모두 입력하고 저장 버튼 클릭",
-      "입력데이터": "계약자명: 홍길동 / 주민번호: 850101-1234567",
-      "기대결과": "저장 완료 메시지 표시 및 피보험자 입력 화면으로 이동",
-      "비교검증로직": "[원칙] 필수 정보 입력 시 정상 저장",
-      "주의태그": ""
-    }
-  ]
-}
-```
-
-### 규칙
-* `구분` 필드: "현업단위"로 설정
-* 최소 10개 이상 생성
-* 실제 업무 시나리오 기반
-* 업무 규칙 위반 가능성 있으면 [주의] 태그 필수
-"""
-
-# ========== 3. 현업용 통합테스트 프롬프트 ==========
-BUSINESS_INTEGRATION_PROMPT = """당신은 보험 업무 전문가이자 통합 테스트 설계자입니다.
-제공된 UI/UX 기획안을 분석하여 **현업 담당자**가 검증할 **화면 내 통합 테스트**를 생성합니다.
-
-### 테스트 관점: 화면 내 통합 테스트
-
-**중요**: 이 테스트는 **현재 화면 내에서 수행 가능한 범위**의 통합 테스트입니다.
-전체 청약 프로세스(청약→심사→승인)가 아니라, 해당 화면에서 비즈니스 조건에 따라 달라지는 동작을 검증합니다.
-
-단위 테스트보다 약간 상위 레벨로, 화면 내 여러 요소의 **상호작용**과 **조건 조합**을 테스트합니다.
-
-### 테스트 범위 (화면 내 통합)
-
-* **조건별 동작 변화**: 계약자 유형(성인/미성년자)에 따른 화면 내 필드 변화
-* **필드 간 연동**: 특정 값 입력 시 다른 필드 자동 변경/표시
-* **비즈니스 규칙 조합**: 상품+계약자+피보험자 조합에 따른 화면 동작
-* **권한별 기능 차이**: 사용자 권한에 따른 버튼/메뉴 활성화
-* **외부 연동 결과 반영**: 본인인증, 계좌인증 결과에 따른 화면 변화
-* **에러 복구 흐름**: 오류 발생 후 재입력 시 화면 상태
-
-### 제외 항목 (별도 테스트 범위)
-- 다른 화면으로의 이동 테스트
-- 전체 청약 프로세스 End-to-End 테스트
-- 시스템 간 연동 테스트
-
-### 출력 형식
-```json
-{
-  "test_cases": [
-    {
-      "구분": "현업통합",
-      "화면경로": "청약 > 계약자 정보",
-      "화면명": "계약자 정보 입력",
-      "화면ID": "SCR_CONTRACT_INFO",
-      "시나리오ID": "TS-INT-001",
-      "시나리오명": "계약자 유형별 화면 동적 변화",
-      "테스트케이스ID": "TC-INT-001-001",
-      "테스트케이스명": "미성년자 선택 시 법정대리인 노출",
-      "테스트항목_및_절차": "생년월일에 2010-01-15 (만 15세) 입력 후 포커스 이동",
-      "입력데이터": "생년월일: 2010-01-15",
-      "기대결과": "법정대리인 정보 입력 영역이 화면에 나타나고 필수값으로 지정됨",
-      "비교검증로직": "[원칙] 미성년자는 법정대리인 필수",
-      "주의태그": "",
-      "생성조건": "계약자: 미성년자"
-    }
-  ]
-}
-```
-
-### 규칙
-* `구분` 필드: "현업통합"으로 설정
-* `생성조건` 필드: 적용된 비즈니스 조건 명시
-* 최소 10개 이상 생성
-* **반드시 현재 화면 내에서 수행 가능한 테스트만 작성**
-* 화면 내 조건 조합에 따른 동작 변화 중심
-* 법규/규정 위반 가능성 있으면 [주의] 태그 필수
-"""
-
-# 기존 호환성을 위한 alias (기본값: 개발자용)
-SYSTEM_PROMPT = DEVELOPER_UNIT_PROMPT
-INTEGRATION_TEST_PROMPT = BUSINESS_INTEGRATION_PROMPT
-
-
-# ---------- 유틸리티 함수들 ----------
-
-def encode_image_to_base64(uploaded_file) -> str:
-    """
-    업로드된 이미지 파일을 Base64 문자열로 인코딩
-    
-    Args:
-        uploaded_file: Streamlit의 UploadedFile 객체
-    
-    Returns:
-        str: Base64로 인코딩된 이미지 문자열
-    """
-    # 업로드된 파일의 바이트 데이터를 읽음
-    bytes_data = uploaded_file.getvalue()
-    # Base64로 인코딩하고 UTF-8 문자열로 디코딩하여 반환
-    return base64.b64encode(bytes_data).decode('utf-8')
-
-def call_gemini_api(api_key: str, image_base64: str, model_name: str = "models/gemini-2.5-flash", test_type: str = "개발자/QA용 단위테스트") -> str:
-    """
-    Google Gemini API를 호출하여 이미지 분석 및 테스트 시나리오 생성
-    
-    Args:
-        api_key: Google AI Studio에서 발급받은 API 키
-        image_base64: Base64로 인코딩된 이미지 데이터
-        model_name: 사용할 Gemini 모델명 (기본값: models/gemini-2.5-flash)
-        test_type: 테스트 유형 (개발자/QA용 단위테스트, 현업용 단위테스트, 현업용 통합테스트)
-    
-    Returns:
-        str: LLM이 생성한 JSON 형식의 테스트 시나리오
-    """
-    # Gemini API 설정 (API 키 등록)
-    genai.configure(api_key=api_key)
-    
-    # 테스트 유형에 따른 프롬프트 선택
-    if test_type == "개발자/QA용 단위테스트":
-        selected_prompt = DEVELOPER_UNIT_PROMPT
-    elif test_type == "현업용 단위테스트":
-        selected_prompt = BUSINESS_UNIT_PROMPT
-    else:  # 현업용 통합테스트
-        selected_prompt = BUSINESS_INTEGRATION_PROMPT
-        
-    # [New] 엑셀 샘플 가이드가 있으면 프롬프트에 추가 (톤앤매너 반영)
-    if 'sample_guide_text' in st.session_state and st.session_state['sample_guide_text']:
-        selected_prompt += "\n" + st.session_state['sample_guide_text']
-    
-    # 모델 인스턴스 생성
-    # system_instruction으로 프롬프트를 설정하여 일관성 강화 (2.0 모델 권장)
-    model = genai.GenerativeModel(
-        model_name=model_name,
-        system_instruction=selected_prompt
-    )
-    
-    # 이미지 데이터를 Gemini가 이해할 수 있는 형식으로 변환
-    # MIME 타입 동적 생성 (확장자 기반)
-    image_part = {
-        "mime_type": "image/jpeg",  # 기본값 (Base64라 확장자 모름)
-        "data": image_base64  # Base64 인코딩된 이미지 데이터
-    }
-    
-    # 프롬프트와 이미지를 함께 전송하여 콘텐츠 생성 요청
-    # system_instruction을 사용했으므로 메시지 본문에는 지시어만 전달
-    user_prompt = """
-위 시스템 프롬프트(및 스타일 가이드)에 정의된 규칙에 따라, 이 화면 설계서(이미지)를 분석하여 완벽한 테스트 시나리오를 생성해주세요.
-
-**[중요 요청사항]**
-결과물(JSON)을 생성하기 전에, 먼저 **[사고 과정]**이라는 섹션을 만들어서 다음 내용을 한글로 상세히 서술해주세요:
-1. **화면 분석**: 이미지가 어떤 화면인지(메뉴명, 기능 등) 파악한 내용
-2. **테스트 전략**: 어떤 관점에서 테스트 케이스를 도출할 것인지
-3. **스타일 적용**: (스타일 가이드가 있다면) 가이드의 어떤 특징(문체, 상세도)을 반영했는지
-
-**출력 순서:**
-1. [사고 과정] ... 텍스트 ...
-2. ```json ... 코드 블록 ...```
-"""
-    response = model.generate_content([
-        user_prompt,
-        image_part
-    ])
-    # 생성된 텍스트 응답 반환
-    return response.text
-
-def parse_json_response(response_text: str) -> List[dict]:
-    """
-    LLM 응답 텍스트를 파싱하여 테스트 시나리오 리스트로 변환
-    
-    Args:
-        response_text: LLM이 반환한 JSON 문자열
-    
-    Returns:
-        List[dict]: 파싱된 테스트 시나리오 딕셔너리 리스트
-    """
-    try:
-        # Markdown 코드 블록 제거 (LLM이 ```json ... ``` 형식으로 응답할 경우 대비)
-        cleaned_text = response_text.strip()
-        
-        # 여러 ```json 블록이 있을 수 있으므로 모두 제거
-        # 모든 ```json ... ``` 블록에서 JSON만 추출
-        json_blocks = re.findall(r'```json\s*(.*?)\s*```', cleaned_text, re.DOTALL)
-        
-        if json_blocks:
-            # 코드 블록이 있으면 그 안의 JSON 사용
-            cleaned_text = '\n'.join(json_blocks)
-        else:
-            # 코드 블록 없이 직접 JSON인 경우
-            if cleaned_text.startswith("```"):
-                cleaned_text = cleaned_text[3:]
-            if cleaned_text.endswith("```"):
-                cleaned_text = cleaned_text[:-3]
-        
-        cleaned_text = cleaned_text.strip()
-        
-        # 여러 JSON 객체가 연속으로 있는 경우 처리
-        # { ... } { ... } 형태를 찾아서 분리
-        all_test_cases = []
-        
-        # JSON 객체들을 찾기 위한 패턴 (중첩 괄호 처리)
-        depth = 0
-        start_idx = None
-        json_objects = []
-        
-        for i, char in enumerate(cleaned_text):
-            if char == '{':
-                if depth == 0:
-                    start_idx = i
-                depth += 1
-            elif char == '}':
-                depth -= 1
-                if depth == 0 and start_idx is not None:
-                    json_objects.append(cleaned_text[start_idx:i+1])
-                    start_idx = None
-        
-        # 추출된 각 JSON 객체 파싱
-        for json_str in json_objects:
-            try:
-                parsed_data = json.loads(json_str)
-                
-                # test_cases 키가 있으면 Pydantic 검증
-                if 'test_cases' in parsed_data:
-                    test_case_list = TestCaseList(**parsed_data)
-                    all_test_cases.extend([tc.model_dump() for tc in test_case_list.test_cases])
-                elif isinstance(parsed_data, list):
-                    # 직접 리스트인 경우
-                    for item in parsed_data:
-                        all_test_cases.append(item)
-            except json.JSONDecodeError:
-                continue  # 개별 파싱 실패 시 건너뛰기
-            except Exception:
-                continue  # Pydantic 검증 실패 시도 건너뛰기
-        
-        if all_test_cases:
-            return all_test_cases
-        
-        # JSON이 불완전한 경우: 개별 test_case 객체들 추출 시도
-        # test_cases 배열 내의 완전한 객체들만 추출
-        tc_pattern = r'\{\s*"시나리오ID"[^}]+?"주의태그"\s*:\s*"[^"]*"\s*\}'
-        tc_matches = re.findall(tc_pattern, cleaned_text, re.DOTALL)
-        
-        for tc_str in tc_matches:
-            try:
-                tc_data = json.loads(tc_str)
-                # 필수 필드 확인
-                if '시나리오ID' in tc_data and '테스트케이스ID' in tc_data:
-                    all_test_cases.append(tc_data)
-            except:
-                continue
-        
-        if all_test_cases:
-            return all_test_cases
-        
-        # 기존 방식으로 단일 JSON 파싱 시도
-        parsed_data = json.loads(cleaned_text)
-        test_case_list = TestCaseList(**parsed_data)
-        return [test_case.model_dump() for test_case in test_case_list.test_cases]
-        
-    except json.JSONDecodeError as e:
-        # JSON 파싱 실패 시 예외 발생
-        raise Exception(f"JSON 파싱 오류: {str(e)}\n원본 텍스트:\n{response_text[:500]}...")
-    except Exception as e:
-        # 기타 예외 발생 시
-        raise Exception(f"데이터 변환 오류: {str(e)}")
-
-def create_excel_file(df: pd.DataFrame) -> BytesIO:
-    """
-    DataFrame을 포맷팅된 Excel 파일로 변환
-    
-    Args:
-        df: 테스트 시나리오가 담긴 DataFrame
-    
-    Returns:
-        BytesIO: 메모리 상의 Excel 파일 객체
-    """
-    # 메모리 상에 바이너리 파일 객체 생성
-    output = BytesIO()
-    
-    # openpyxl 엔진을 사용하여 Excel 파일 작성
-    with pd.ExcelWriter(output, engine='openpyxl') as writer:
-        # DataFrame을 Excel 시트로 작성 (인덱스 제외)
-        df.to_excel(writer, index=False, sheet_name='테스트 시나리오')
-        
-        # 워크북과 워크시트 객체 가져오기
-        workbook = writer.book
-        worksheet = writer.sheets['테스트 시나리오']
-        
-        # 컴럼 너비 자동 조정 (26개 초과 컴럼도 지원)
-        from openpyxl.utils import get_column_letter
-        for idx, col in enumerate(df.columns):
-            # 각 컴럼의 최대 길이 계산 (헤더와 데이터 중 긴 것)
-            max_length = max(
-                df[col].astype(str).apply(len).max(),  # 데이터 최대 길이
-                len(col)  # 헤더 길이
-            )
-            # 최대 길이에 여유분 추가하여 컴럼 너비 설정 (최대 50)
-            worksheet.column_dimensions[get_column_letter(idx + 1)].width = min(max_length + 5, 50)
-        
-        # 헤더 행 스타일 적용 (Bold, 배경색)
-        from openpyxl.styles import Font, PatternFill, Alignment
-        
-        header_font = Font(bold=True, color="FFFFFF")  # 굵은 흰색 글씨
-        header_fill = PatternFill(start_color="4472C4", end_color="4472C4", fill_type="solid")  # 파란색 배경
-        header_alignment = Alignment(horizontal="center", vertical="center")  # 중앙 정렬
-        
-        # 첫 번째 행(헤더)에 스타일 적용
-        for cell in worksheet[1]:
-            cell.font = header_font  # 폰트 적용
-            cell.fill = header_fill  # 배경색 적용
-            cell.alignment = header_alignment  # 정렬 적용
-        
-        # 모든 셀에 텍스트 줄바꿈 적용
-        for row in worksheet.iter_rows(min_row=2, max_row=worksheet.max_row):
-            for cell in row:
-                cell.alignment = Alignment(wrap_text=True, vertical="top")  # 자동 줄바꿈 및 상단 정렬
-    
-    # 파일 포인터를 시작 위치로 이동
-    output.seek(0)
-    return output
+# ---------- 코어 모듈 Import (프롬프트 / API 호출 / 파싱 / Excel / 배치 파이프라인) ----------
+from scenario_core import (
+    SYSTEM_PROMPT, INTEGRATION_TEST_PROMPT,
+    generate_text, encode_prepared_image, call_gemini_api_parallel,
+    stream_gemini_api_parallel, call_gemini_api_tiled, ScenarioStreamParser, STREAM_CHUNK,
+    parse_scenario_response, structured_generation_config, STRUCTURED_OUTPUT_INSTRUCTION,
+    get_parse_stats, PARSE_MODE_TEXT, PARSE_MODE_STRUCTURED, get_excel_bytes,
+    DEFAULT_BATCH_WORKERS, MAX_BATCH_WORKERS, DEDUP_COLUMNS,
+    build_batch_condition_text, list_batch_images, load_condition_presets, CONDITION_PRESETS_FILE, dedup_test_cases, batch_run_directory, new_batch_run_id, BATCH_SPOOL_DIRNAME,
+    get_model_pool_stats,
+)
+from near_dedup import DEFAULT_SIMILARITY_THRESHOLD  # 유사 중복 기본 임계값
+from dedup_index import MODE_FLAG, MODE_DROP, DEFAULT_INDEX_FILENAME  # 배치 전체 화면 간 중복 인덱스
+from image_preprocess import DEFAULT_MAX_EDGE, MIN_MAX_EDGE, MAX_MAX_EDGE, prepare_image_tiles, summarize_tiles  # 업로드 전 이미지 축소/분할
+from response_cache import get_response_cache  # Gemini 응답 디스크 캐시
+from rate_limit import DEFAULT_RPM, DEFAULT_MAX_CONCURRENCY, configure_rate_limits  # 키·모델별 호출 속도 제한
+from api_key_pool import default_api_keys, get_api_key_pool, parse_api_keys  # 여러 API 키 분산
+from batch_checkpoint import BatchCheckpoint, find_resumable_checkpoints  # 배치 체크포인트 (이어하기)
+from batch_jobs import BatchJob, JOB_QUEUED, JOB_RUNNING, JOB_DONE, JOB_CANCELLED, JOB_FAILED, MSG_INFO, get_batch_job_manager  # 백그라운드 배치 작업
+import history_store  # 히스토리 저장소 (SQLite)
 
 # ---------- CSS 로딩 함수 ----------
 
@@ -466,54 +58,50 @@ def load_custom_css():
         st.warning("⚠️ style.css 파일을 찾을 수 없습니다. 기본 스타일이 적용됩니다.")
 
 # ---------- 히스토리 관리 함수들 ----------
+# 실제 저장은 history_store(SQLite)가 담당하고, 여기서는 UI 오류 표시만 처리
 
-def get_history_file_path() -> str:
+def load_history() -> pd.DataFrame:
     """
-    히스토리 CSV 파일의 경로를 반환
+    히스토리 DB를 로드하여 DataFrame으로 반환
     
     Returns:
-        str: history.csv 파일의 절대 경로
+        pd.DataFrame: 히스토리 데이터 (최신순, 없거나 실패하면 빈 DataFrame)
     """
-    # 현재 스크립트 파일이 있는 디렉토리 경로 가져오기
-    current_dir = os.path.dirname(os.path.abspath(__file__))
-    # history.csv 파일 경로 생성
-    return os.path.join(current_dir, "history.csv")
+    try:
+        return history_store.load_entries()
+    except Exception as e:
+        # 로드 실패 시 빈 DataFrame 반환
+        st.warning(f"히스토리 로드 중 오류: {str(e)}")
+        return pd.DataFrame(columns=history_store.HISTORY_COLUMNS)
 
-def load_history() -> pd.DataFrame:
+def load_history_metadata() -> pd.DataFrame:
     """
-    히스토리 파일을 로드하여 DataFrame으로 반환
+    시나리오 JSON을 제외한 히스토리 메타데이터 로드 (쓰기 전까지 캐시 재사용)
     
     Returns:
-        pd.DataFrame: 히스토리 데이터 (파일이 없으면 빈 DataFrame)
+        pd.DataFrame: ID, Timestamp, Model, ImageName, ScenarioCount, Version, ParentID (최신순)
+    """
+    try:
+        return history_store.load_metadata()
+    except Exception as e:
+        st.warning(f"히스토리 로드 중 오류: {str(e)}")
+        return pd.DataFrame(columns=history_store.HISTORY_META_COLUMNS)
+
+def load_history_scenarios(entry_id: int) -> List[dict]:
     """
-    # 히스토리 파일 경로 가져오기
-    history_path = get_history_file_path()
+    히스토리 항목 1건의 시나리오를 지연 로딩
     
-    # 기본 컬럼 정의 (버전 관리 추가)
-    default_columns = ['Timestamp', 'Model', 'ImageName', 'ScenarioCount', 'Scenarios', 'Version', 'ParentID']
+    Args:
+        entry_id: 히스토리 ID (메타데이터의 ID 컬럼)
     
-    # 파일이 존재하는지 확인
-    if os.path.exists(history_path):
-        try:
-            # CSV 파일을 DataFrame으로 로드
-            df = pd.read_csv(history_path, encoding='utf-8-sig')
-            # Version 컬럼이 없으면 추가 (기존 데이터 호환)
-            if 'Version' not in df.columns:
-                df['Version'] = 'v1'
-            if 'ParentID' not in df.columns:
-                df['ParentID'] = ''
-            return df
-        except Exception as e:
-            # 파일 로드 실패 시 빈 DataFrame 반환
-            st.warning(f"히스토리 파일 로드 중 오류: {str(e)}")
-            return pd.DataFrame(columns=default_columns)
-    else:
-        # 파일이 없으면 빈 DataFrame 반환
-        return pd.DataFrame(columns=default_columns)
+    Returns:
+        List[dict]: 시나리오 목록
+    """
+    return history_store.load_scenarios(entry_id)
 
 def save_to_history(model_name: str, image_name: str, scenarios: List[dict], version: str = "v1", parent_id: str = ""):
     """
-    생성된 시나리오를 히스토리 파일에 저장
+    생성된 시나리오를 히스토리 DB에 저장 (1건 INSERT)
     
     Args:
         model_name: 사용한 모델명
@@ -523,33 +111,7 @@ def save_to_history(model_name: str, image_name: str, scenarios: List[dict], ver
         parent_id: 부모 히스토리 ID (2차 검수 시 원본 참조)
     """
     try:
-        # 현재 시간 가져오기 (한국 시간 기준)
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        
-        # 시나리오를 JSON 문자열로 변환 (저장용)
-        scenarios_json = json.dumps(scenarios, ensure_ascii=False)
-        
-        # 새로운 히스토리 엔트리 생성
-        new_entry = pd.DataFrame([{
-            'Timestamp': timestamp,
-            'Model': model_name,
-            'ImageName': image_name,
-            'ScenarioCount': len(scenarios),
-            'Scenarios': scenarios_json,
-            'Version': version,
-            'ParentID': parent_id
-        }])
-        
-        # 기존 히스토리 로드
-        history_df = load_history()
-        
-        # 새 엔트리를 기존 히스토리에 추가 (최신 것이 위로)
-        updated_history = pd.concat([new_entry, history_df], ignore_index=True)
-        
-        # 히스토리 파일에 저장
-        history_path = get_history_file_path()
-        updated_history.to_csv(history_path, index=False, encoding='utf-8-sig')
-        
+        history_store.append_entry(model_name, image_name, scenarios, version, parent_id)
         return True
     except Exception as e:
         # 저장 실패 시 에러 메시지 표시
@@ -561,26 +123,163 @@ def delete_history_entry(index: int):
     특정 히스토리 엔트리 삭제
     
     Args:
-        index: 삭제할 엔트리의 인덱스
+        index: 삭제할 엔트리의 인덱스 (최신순 목록 기준 위치)
     """
     try:
-        # 히스토리 로드
-        history_df = load_history()
-        
-        # 해당 인덱스 행 삭제
-        if 0 <= index < len(history_df):
-            history_df = history_df.drop(index).reset_index(drop=True)
-            
-            # 파일에 저장
-            history_path = get_history_file_path()
-            history_df.to_csv(history_path, index=False, encoding='utf-8-sig')
-            
-            return True
-        return False
+        entry_id = history_store.get_entry_id_at(index)
+        if entry_id is None:
+            return False
+        return history_store.delete_entry(entry_id)
     except Exception as e:
         st.error(f"히스토리 삭제 중 오류: {str(e)}")
         return False
 
+# ---------- Excel 다운로드 데이터 ----------
+
+def excel_download_data(df: pd.DataFrame):
+    """
+    st.download_button에 전달할 Excel 데이터 (지연 생성)
+    
+    워크북은 rerun마다 만들지 않고 다운로드 버튼을 클릭했을 때 생성되며,
+    같은 내용의 DataFrame이면 이전에 만든 바이트를 재사용합니다.
+    
+    Args:
+        df: 테스트 시나리오가 담긴 DataFrame
+    
+    Returns:
+        Callable[[], bytes]: 호출 시 Excel 파일 바이트를 반환하는 함수
+    """
+    return partial(get_excel_bytes, df)
+
+
+# ---------- 배치 작업 진행 상황 ----------
+
+BATCH_POLL_INTERVAL = 1.0  # 실행 중인 배치 작업 진행 상황 갱신 주기 (초)
+BATCH_LOG_LINES = 30  # 화면에 표시할 최근 메시지 수
+
+BATCH_JOB_STATUS_LABELS = {
+    JOB_QUEUED: "⏳ 대기 중",
+    JOB_RUNNING: "🔄 실행 중",
+    JOB_DONE: "✅ 완료",
+    JOB_CANCELLED: "⏹️ 중단됨",
+    JOB_FAILED: "❌ 오류",
+}
+
+
+def format_duration(seconds: float) -> str:
+    """경과/남은 시간 표시 (예: 1시간 2분, 3분 5초, 42초)"""
+    seconds = int(round(seconds))
+    if seconds >= 3600:
+        return f"{seconds // 3600}시간 {seconds % 3600 // 60}분"
+    if seconds >= 60:
+        return f"{seconds // 60}분 {seconds % 60}초"
+    return f"{seconds}초"
+
+
+def render_batch_job(job_id: str, polling: bool = False):
+    """
+    배치 작업 진행 상황/결과 표시 (작업 상태를 읽기만 함)
+    
+    실행 중에는 st.fragment(run_every=...)로 이 영역만 주기적으로 다시 그리고,
+    작업이 끝나면 전체 화면을 한 번 다시 실행해 갱신을 멈추고 최종 요약을 표시합니다.
+    
+    Args:
+        job_id: 배치 작업 ID
+        polling: 주기적 갱신 중 여부
+    """
+    job = get_batch_job_manager().get(job_id)
+    if job is None:
+        st.caption("작업 정보가 없습니다 (앱이 다시 시작되었을 수 있습니다. '이어하기'로 계속 처리하세요)")
+        return
+    if polling and job.is_finished:
+        st.rerun()
+    snapshot = job.snapshot()
+    
+    # 진행률 / 상태 줄
+    status_text = f"**{BATCH_JOB_STATUS_LABELS[snapshot['status']]}:** {snapshot['done']}/{snapshot['total']} (동시 {job.max_workers}개)"
+    if snapshot['elapsed']:
+        status_text += f" · 경과 {format_duration(snapshot['elapsed'])}"
+    if snapshot['eta'] is not None:
+        status_text += f" · 남은 시간 약 {format_duration(snapshot['eta'])}"
+    st.progress(snapshot['done'] / snapshot['total'] if snapshot['total'] else 1.0)
+    st.markdown(status_text)
+    if snapshot['in_progress']:
+        st.caption("🔄 처리 중: " + ", ".join(snapshot['in_progress']))
+    metric_col1, metric_col2, metric_col3 = st.columns(3)
+    metric_col1.metric("✅ 완료", snapshot['succeeded'])
+    metric_col2.metric("❌ 실패", snapshot['failed'])
+    metric_col3.metric("⏹️ 취소", snapshot['cancelled'])
+    if snapshot['cancel_requested'] and not job.is_finished:
+        st.warning("⚠️ 중단 요청됨. 진행 중인 API 호출까지만 마치고 중단합니다.")
+    
+    # 이미지별 메시지 (최근 BATCH_LOG_LINES개)
+    messages = snapshot['messages'][-BATCH_LOG_LINES:]
+    if messages:
+        with st.container(height=300 if len(messages) > 8 else "content"):
+            hidden_count = snapshot['message_count'] - len(messages)
+            if hidden_count:
+                st.caption(f"… 이전 메시지 {hidden_count}개")
+            for kind, text in messages:
+                getattr(st, kind)(text)
+    
+    if job.is_finished:
+        render_batch_job_summary(job)
+
+
+def render_batch_job_summary(job: BatchJob):
+    """끝난 배치 작업의 최종 요약 (중복 처리, 호출 통계, 통합 파일, 미완료 안내)"""
+    summary = job.summary
+    if job.status == JOB_FAILED:
+        st.error(f"❌ 배치 작업 오류: {job.error}")
+    if not summary:
+        return
+    
+    # 중단 요청으로 처리하지 못한 이미지 안내
+    if summary["stopped"]:
+        st.warning(f"⚠️ 중단 완료. {job.succeeded + len(job.failed_files)}개 처리 완료, {summary['unprocessed']}개 미처리")
+    
+    if summary["cross_duplicate_total"]:
+        action = "중복_원본화면 컬럼에 표시" if summary["cross_dedup_mode"] == MODE_FLAG else "통합 파일에서 제외"
+        st.info(f"🔁 화면 간 중복 케이스 {summary['cross_duplicate_total']}개 {action} (인덱스 {summary['index_entries']}개 지문, {summary['index_kb']:.0f} KB)")
+    
+    # 이미지별 유사 중복 병합 내역
+    dedup_report = summary["dedup_report"]
+    if dedup_report is not None:
+        with st.expander(f"🧹 중복 병합 내역 ({len(dedup_report)}건)", expanded=False):
+            st.dataframe(dedup_report, use_container_width=True, height=300)
+    
+    # API 호출 요약 (단계 단위 재시도이므로 재시도 1회 = 실패한 단계 호출 1회)
+    call_stats = job.call_stats
+    call_summary = (
+        f"API 호출 {call_stats.api_calls}회 (캐시 적중 {call_stats.cache_hits}회) · "
+        f"단계 재시도 {call_stats.retries}회 · 낭비된 호출 {call_stats.wasted_calls}회 · "
+        f"속도 제한(429) {call_stats.throttled}회"
+    )
+    
+    if summary["saved_files"]:
+        file_labels = {"dev": "🔧 개발자용", "biz": "📋 현업용", "all": "📦 전체"}
+        st.success(f"""
+        🎉 **배치 처리 완료!**
+        
+        - 처리된 이미지: **{summary['written']}개** / {summary['total_images']}개
+        - 총 테스트 케이스: **{summary['row_count']}개**
+          - 🔧 개발자용: **{summary['count_dev']}개**
+          - 📋 현업 단위: **{summary['count_biz_unit']}개**
+          - 🔄 현업 통합: **{summary['count_biz_int']}개**
+        - {call_summary}
+        - 저장 위치: `{job.input_folder}`
+        """)
+        
+        st.markdown("**📁 생성된 파일:**")
+        for split_name, output_path, row_count in summary["saved_files"]:
+            st.write(f"  - {file_labels[split_name]}: {row_count}개 → {os.path.basename(output_path)}")
+    else:
+        st.info(f"📞 {call_summary}")
+    
+    if summary["remaining"]:
+        st.info(f"⏯️ 미완료 {summary['remaining']}개 이미지는 체크포인트에 저장되어 있습니다. '이어하기'로 남은 이미지만 처리할 수 있습니다.")
+
+
 # ---------- Streamlit UI 구성 ----------
 
 def main():
@@ -628,23 +327,25 @@ def main():
         """, unsafe_allow_html=True)
         
         # API 키 입력 필드 (비밀번호 타입으로 숨김 처리)
-        # 환경 변수에서 자동 로드 지원
+        # 환경 변수에서 자동 로드 지원, 여러 키는 쉼표로 구분 (요청마다 키 풀에서 분산)
         st.markdown("### 🔑 API 인증")
-        default_api_key = os.environ.get("GOOGLE_API_KEY", "")
+        default_api_key = default_api_keys()
         api_key = st.text_input(
             "Google Gemini API Key",
             type="password",  # 입력값 숨김 처리
             value=default_api_key,
-            help="Google AI Studio에서 발급받은 API 키를 입력하세요. 환경변수 GOOGLE_API_KEY 설정 시 자동 입력됩니다.",
-            placeholder="AIza..."
+            help="Google AI Studio에서 발급받은 API 키를 입력하세요. 여러 키를 쉼표로 구분해 입력하면 남은 할당량과 응답 속도에 따라 요청을 나눠 보냅니다. 환경변수 GOOGLE_API_KEYS 또는 GOOGLE_API_KEY 설정 시 자동 입력됩니다.",
+            placeholder="AIza..., AIza..."
         )
+        api_key_count = len(parse_api_keys(api_key))
         
         # API 키 상태 표시
         if api_key:
+            key_count_text = f" ({api_key_count}개 키 분산)" if api_key_count > 1 else ""
             if default_api_key and api_key == default_api_key:
-                st.success("✅ API 키가 환경변수에서 자동 로드되었습니다")
+                st.success(f"✅ API 키가 환경변수에서 자동 로드되었습니다{key_count_text}")
             else:
-                st.success("✅ API 키가 설정되었습니다")
+                st.success(f"✅ API 키가 설정되었습니다{key_count_text}")
         else:
             st.info("💡 API 키를 입력하거나 환경변수 GOOGLE_API_KEY를 설정하세요")
         
@@ -756,8 +457,155 @@ def main():
         else:
             st.session_state['sample_guide_text'] = ""
         
-        # 선택된 모델 정보 표시
-
+        st.markdown("---")  # 구분선
+        
+        # ⚡ 응답 캐시 설정
+        st.markdown("### ⚡ 응답 캐시")
+        use_response_cache = st.checkbox(
+            "캐시된 응답 사용",
+            value=True,
+            key="use_response_cache",
+            help="같은 이미지·프롬프트·모델·스타일 가이드로 요청하면 저장된 응답을 재사용합니다. 해제하면 항상 새로 호출하고 캐시를 갱신합니다."
+        )
+        response_cache = get_response_cache()
+        cache_stats = response_cache.stats()
+        cache_col1, cache_col2 = st.columns(2)
+        with cache_col1:
+            st.metric("✅ 적중", f"{cache_stats['hits']}")
+        with cache_col2:
+            st.metric("📡 미적중", f"{cache_stats['misses']}")
+        st.caption(f"💾 저장 {cache_stats['entries']}건 · {cache_stats['bytes'] / (1024 * 1024):.1f} MB")
+        if st.button("🗑️ 캐시 비우기", use_container_width=True, key="clear_response_cache"):
+            response_cache.clear()
+            st.rerun()
+        
+        st.markdown("---")  # 구분선
+        
+        # 🚦 호출 속도 제한 설정 (모델별, 재실행/배치 간 공유)
+        st.markdown("### 🚦 호출 속도 제한")
+        rate_col1, rate_col2 = st.columns(2)
+        with rate_col1:
+            rate_limit_rpm = st.number_input(
+                "분당 요청 수",
+                min_value=1,
+                max_value=10000,
+                value=DEFAULT_RPM,
+                step=10,
+                key="rate_limit_rpm",
+                help="API 키·모델별 분당 최대 요청 수(RPM)입니다. 키 1개의 할당량에 맞추세요. 429를 받으면 자동으로 속도를 줄이고 Retry-After만큼 기다립니다."
+            )
+        with rate_col2:
+            rate_limit_concurrency = st.number_input(
+                "최대 동시 호출",
+                min_value=1,
+                max_value=128,
+                value=DEFAULT_MAX_CONCURRENCY,
+                key="rate_limit_concurrency",
+                help="API 키·모델별 동시 호출 상한입니다. 429를 받으면 절반으로 줄였다가 성공할 때마다 조금씩 늘립니다."
+            )
+        configure_rate_limits(rpm=rate_limit_rpm, max_concurrency=rate_limit_concurrency)
+        key_rows = get_api_key_pool(api_key).snapshot(model_name)
+        if any(row['successes'] or row['failures'] or row['throttled'] for row in key_rows):
+            rate_caption = (
+                f"🚦 429 {sum(row['throttled'] for row in key_rows)}회 · "
+                f"현재 동시 호출 상한 {sum(row['concurrency_limit'] for row in key_rows if row['healthy'])}"
+            )
+            excluded_count = sum(not row['healthy'] for row in key_rows)
+            if excluded_count:
+                rate_caption += f" · 제외된 키 {excluded_count}개"
+            st.caption(rate_caption)
+            if len(key_rows) > 1:
+                with st.expander("🔑 키별 상태", expanded=False):
+                    st.dataframe(pd.DataFrame([{
+                        "키": row['key'],
+                        "상태": "정상" if row['healthy'] else f"제외 ({row['excluded_for']:.0f}초)",
+                        "평균 지연(ms)": row['latency_ms'],
+                        "성공": row['successes'],
+                        "실패": row['failures'],
+                        "429": row['throttled'],
+                    } for row in key_rows]), hide_index=True, use_container_width=True)
+        model_pool_stats = get_model_pool_stats()
+        if model_pool_stats['hits']:
+            st.caption(f"🧩 모델 객체 재사용 {model_pool_stats['hits']}회 (보관 {model_pool_stats['entries']}개, 새로 생성 {model_pool_stats['misses']}회)")
+        
+        st.markdown("---")  # 구분선
+        
+        # 🧩 출력 모드 설정
+        st.markdown("### 🧩 출력 모드")
+        use_structured_output = st.checkbox(
+            "구조화 출력 (JSON 스키마)",
+            value=False,
+            key="use_structured_output",
+            help="응답 스키마(TestCase 모델)와 JSON MIME 타입으로 요청합니다. 사고 과정은 요약 필드로 받고, 응답에서 JSON을 찾아내는 파싱 단계가 필요 없습니다."
+        )
+        parse_stats = get_parse_stats()
+        mode_col1, mode_col2 = st.columns(2)
+        for mode_col, mode, mode_label in ((mode_col1, PARSE_MODE_TEXT, "📝 텍스트"), (mode_col2, PARSE_MODE_STRUCTURED, "🧩 구조화")):
+            with mode_col:
+                mode_stats = parse_stats.get(mode, {"attempts": 0, "failures": 0})
+                st.metric(f"{mode_label} 파싱 실패", f"{mode_stats['failures']}", help=f"전체 {mode_stats['attempts']}회 중 실패 횟수")
+        
+        st.markdown("---")  # 구분선
+        
+        # 🖼️ 이미지 전처리 설정
+        st.markdown("### 🖼️ 이미지 전처리")
+        use_image_preprocess = st.checkbox(
+            "업로드 전 이미지 축소",
+            value=True,
+            key="use_image_preprocess",
+            help="긴 변이 기준보다 큰 이미지를 비율 유지로 줄여 업로드 시간과 입력 토큰을 줄입니다. 파일 형식은 내용으로 감지합니다."
+        )
+        image_max_edge = st.slider(
+            "긴 변 최대 픽셀",
+            min_value=MIN_MAX_EDGE,
+            max_value=MAX_MAX_EDGE,
+            value=DEFAULT_MAX_EDGE,
+            step=256,
+            key="image_max_edge",
+            disabled=not use_image_preprocess
+        )
+        image_format_label = st.selectbox(
+            "전송 형식",
+            ["원본 유지", "JPEG", "WEBP", "PNG"],
+            key="image_output_format",
+            disabled=not use_image_preprocess,
+            help="JPEG/WEBP는 용량이 작지만 작은 글자가 번질 수 있습니다. 화면 캡처는 '원본 유지'(PNG)를 권장합니다."
+        )
+        if use_image_preprocess:
+            image_options = {
+                "max_edge": image_max_edge,
+                "output_format": None if image_format_label == "원본 유지" else image_format_label,
+            }
+        else:
+            image_options = {"max_edge": None, "output_format": None}
+        use_image_tiling = st.checkbox(
+            "긴 이미지 분할 분석",
+            value=False,
+            key="use_image_tiling",
+            help="화면 목업 아래로 긴 Description 표가 이어지는 합성 이미지(종횡비 2:1 초과)를 겹치는 조각으로 나눠 동시에 분석하고 결과를 합칩니다. 작은 글자 인식률이 높아지고 호출당 응답 시간이 줄어듭니다."
+        )
+        
+        st.markdown("---")  # 구분선
+        
+        # 🧹 중복 제거 설정 (2차 병합 / 배치 병합)
+        st.markdown("### 🧹 중복 제거")
+        use_near_dedup = st.checkbox(
+            "유사 중복 제거",
+            value=True,
+            key="use_near_dedup",
+            help="절차·입력데이터·기대결과가 띄어쓰기, 문장부호, 조사 정도만 다른 케이스도 중복으로 봅니다. 숫자(경계값 등)가 다르면 별개 케이스로 유지합니다. 해제하면 완전히 같은 문자열만 제거합니다."
+        )
+        dedup_threshold = st.slider(
+            "유사도 임계값",
+            min_value=0.70,
+            max_value=1.00,
+            value=DEFAULT_SIMILARITY_THRESHOLD,
+            step=0.01,
+            key="dedup_threshold",
+            disabled=not use_near_dedup,
+            help="높을수록 보수적으로 병합합니다. 1.00이면 정규화(공백/문장부호 제거) 후 완전히 같은 경우만 병합합니다."
+        )
+        similarity_threshold = dedup_threshold if use_near_dedup else None
         
         st.markdown("---")  # 구분선
         
@@ -790,8 +638,8 @@ def main():
         
         st.markdown("---")
         
-        # 📊 향상된 통계 대시보드
-        history_df = load_history()
+        # 📊 향상된 통계 대시보드 (메타데이터만 사용)
+        history_df = load_history_metadata()
         if len(history_df) > 0:
             st.markdown("### 📊 통계 대시보드")
             
@@ -916,7 +764,11 @@ def main():
         if not selected_test_types:
             st.warning("⚠️ 최소 1개 이상의 테스트 유형을 선택하세요")
         elif len(selected_test_types) > 1:
-            st.info(f"📌 **{len(selected_test_types)}개 유형** 선택됨 → 각 유형별로 순차 생성됩니다")
+            st.info(f"📌 **{len(selected_test_types)}개 유형** 선택됨 → 이미지마다 유형별로 동시에 생성됩니다")
+        
+        # 스트리밍 모드: 응답 전체를 기다리지 않고 사고 과정/테스트 케이스를 도착하는 대로 표시
+        use_streaming = st.checkbox("⚡ 실시간 표시 (스트리밍)", value=True, key="use_streaming",
+                                    help="AI 사고 과정과 완성된 테스트 케이스를 생성되는 즉시 화면에 표시합니다")
         
         # 컨텍스트 입력 (선택사항)
         with st.expander("📋 화면 컨텍스트 입력 (선택사항)", expanded=False):
@@ -968,65 +820,148 @@ def main():
         
         task_idx = 0
         for idx, uploaded_file in enumerate(uploaded_files):
-            # 이미지 Base64 인코딩 (한 번만)
+            # 이미지 전처리 + Base64 인코딩 (한 번만, 분할 분석 시 조각 단위)
             try:
-                image_base64 = encode_image_to_base64(uploaded_file)
+                tiles = prepare_image_tiles(uploaded_file.getvalue(), **image_options) if use_image_tiling else []
+                if len(tiles) > 1:
+                    st.caption(f"🧩 {uploaded_file.name}: {summarize_tiles(tiles)}")
+                else:
+                    image_base64, prepared_image = encode_prepared_image(uploaded_file, image_options)
+                    st.caption(f"🖼️ {uploaded_file.name}: {prepared_image.summary()}")
             except Exception as e:
                 st.error(f"❌ {uploaded_file.name} 인코딩 실패: {str(e)}")
                 continue
             
-            # 각 테스트 유형별로 생성
-            for test_type in selected_test_types:
+            type_short_map = {"개발자/QA용 단위테스트": "개발", "현업용 단위테스트": "현업단위", "현업용 통합테스트": "현업통합"}
+            
+            def collect_scenarios(scenarios: List[dict], type_short: str):
+                """파싱된 시나리오에 파일명을 붙여 누적하고 히스토리에 저장"""
+                # [New] 파일명 필드 추가
+                for scenario in scenarios:
+                    scenario['파일명'] = uploaded_file.name
+                    
+                all_scenarios.extend(scenarios)  # 결과 누적
+                
+                # 개별 파일 히스토리 저장
+                save_to_history(model_name, f"{uploaded_file.name} [{type_short}]", scenarios)
+            
+            if len(tiles) > 1:
+                # 분할 분석: (조각 × 유형)을 동시에 호출하고, 유형별로 조각 결과를 합쳐 중복 제거
+                status_text.info(f"🔍 처리 중: {task_idx + 1}~{task_idx + total_types}/{total_tasks} - **{uploaded_file.name}** ({len(tiles)}개 조각 × {total_types}개 유형 동시 분석)")
+                for test_type, thinking_process, scenarios, api_error in call_gemini_api_tiled(
+                    api_key, tiles, model_name, selected_test_types,
+                    st.session_state.get('sample_guide_text', ''), max_retries=1,
+                    use_cache=use_response_cache, structured=use_structured_output
+                ):
+                    task_idx += 1
+                    progress_bar.progress(task_idx / total_tasks)
+                    type_short = type_short_map.get(test_type, test_type)
+                    
+                    if api_error is not None:
+                        if not scenarios:
+                            st.error(f"❌ {uploaded_file.name} [{type_short}] 처리 실패: {str(api_error)}")
+                            continue
+                        st.warning(f"⚠️ {uploaded_file.name} [{type_short}] 일부 조각 실패 (성공한 조각 결과만 사용): {str(api_error)}")
+                    
+                    if thinking_process:
+                        with st.expander(f"🧠 AI 사고 과정 - {uploaded_file.name} [{type_short}]", expanded=False):
+                            st.markdown(thinking_process)
+                    
+                    collect_scenarios(scenarios, type_short)
+                continue
+            
+            if use_streaming:
+                # 각 테스트 유형을 동시에 스트리밍 호출하고, 도착하는 대로 화면 갱신 (메인 스레드)
+                status_text.info(f"🔍 처리 중: {task_idx + 1}~{task_idx + total_types}/{total_tasks} - **{uploaded_file.name}** ({total_types}개 유형 실시간 생성)")
+                parsers = {test_type: ScenarioStreamParser(structured=use_structured_output) for test_type in selected_test_types}
+                thinking_placeholders = {}
+                for test_type in selected_test_types:
+                    with st.expander(f"🧠 AI 사고 과정 - {uploaded_file.name} [{type_short_map.get(test_type, test_type)}]", expanded=True):
+                        thinking_placeholders[test_type] = st.empty()
+                live_caption = st.empty()
+                live_table = st.empty()
+                live_cases = []
+                last_thinking_update = 0.0
+                
+                for event, test_type, chunk_text, api_error in stream_gemini_api_parallel(
+                    api_key, image_base64, model_name, selected_test_types,
+                    st.session_state.get('sample_guide_text', ''), max_retries=1,
+                    use_cache=use_response_cache, structured=use_structured_output,
+                    mime_type=prepared_image.mime_type
+                ):
+                    parser = parsers[test_type]
+                    type_short = type_short_map.get(test_type, test_type)
+                    
+                    if event == STREAM_CHUNK:
+                        new_cases = parser.feed(chunk_text)
+                        if new_cases:
+                            live_cases.extend(dict(case, 파일명=uploaded_file.name) for case in new_cases)
+                            live_caption.caption(f"⏳ **{uploaded_file.name}** 생성 중... {len(live_cases)}개 테스트 케이스 도착")
+                            live_table.dataframe(pd.DataFrame(live_cases), use_container_width=True, height=300)
+                        # 사고 과정은 너무 자주 다시 그리지 않도록 0.3초 간격으로 갱신
+                        if not parser.test_cases and time.time() - last_thinking_update > 0.3:
+                            thinking_placeholders[test_type].markdown(parser.thinking_text or "⏳ 분석 중...")
+                            last_thinking_update = time.time()
+                        continue
+                    
+                    # 유형 하나 완료 (성공 또는 실패)
+                    task_idx += 1
+                    progress_bar.progress(task_idx / total_tasks)
+                    
+                    if api_error is not None:
+                        st.error(f"❌ {uploaded_file.name} [{type_short}] 처리 실패: {str(api_error)}")
+                        continue
+                    
+                    # 전체 응답으로 최종 확정
+                    try:
+                        collect_scenarios(parser.finish(), type_short)
+                    except Exception as parse_error:
+                        st.error(f"❌ {uploaded_file.name} [{type_short}] 파싱 오류: {str(parse_error)}")
+                    
+                    thinking_process = parser.thinking_text
+                    if thinking_process:
+                        thinking_placeholders[test_type].markdown(thinking_process)
+                    else:
+                        thinking_placeholders[test_type].empty()
+                
+                live_caption.empty()
+                live_table.empty()
+                continue
+            
+            # 각 테스트 유형별로 생성 (유형별 호출은 동시에 실행, 결과는 선택 순서대로 처리)
+            status_text.info(f"🔍 처리 중: {task_idx + 1}~{task_idx + total_types}/{total_tasks} - **{uploaded_file.name}** ({total_types}개 유형 동시 생성)")
+            for test_type, response_text, api_error in call_gemini_api_parallel(
+                api_key, image_base64, model_name, selected_test_types,
+                st.session_state.get('sample_guide_text', ''), max_retries=1,
+                use_cache=use_response_cache, structured=use_structured_output,
+                mime_type=prepared_image.mime_type
+            ):
                 task_idx += 1
                 current_progress = task_idx / total_tasks
                 progress_bar.progress(current_progress)
                 
                 # 유형 약어
-                type_short = {"개발자/QA용 단위테스트": "개발", "현업용 단위테스트": "현업단위", "현업용 통합테스트": "현업통합"}.get(test_type, test_type)
-                status_text.info(f"🔍 처리 중: {task_idx}/{total_tasks} - **{uploaded_file.name}** [{type_short}]")
+                type_short = type_short_map.get(test_type, test_type)
                 
                 try:
-                    # LLM API 호출 (재시도 로직 포함)
-                    response_text = None
-                    retry_count = 0
-                    max_retries = 1
-                    
-                    while retry_count <= max_retries:
-                        try:
-                            response_text = call_gemini_api(api_key, image_base64, model_name, test_type)
-                            break
-                        except Exception as api_error:
-                            retry_count += 1
-                            if retry_count > max_retries:
-                                raise api_error
-                            time.sleep(1)
-                    
+                    # LLM API 호출 실패 (재시도 후에도 실패)
+                    if api_error is not None:
+                        raise api_error
                     
-                    # [New] 사고 과정(Thinking Process) 추출 및 표시
-                    # JSON 블록 앞에 있는 텍스트를 사고 과정으로 간주
-                    thinking_match = re.search(r'(.*?)```json', response_text, re.DOTALL)
-                    if thinking_match:
-                        thinking_process = thinking_match.group(1).strip()
-                        if thinking_process:
-                            with st.expander(f"🧠 AI 사고 과정 - {uploaded_file.name} [{type_short}]", expanded=False):
-                                st.markdown(thinking_process)
-                    
-                    # JSON 파싱
+                    # JSON 파싱 + [New] 사고 과정(Thinking Process) 추출
+                    # (텍스트 모드: JSON 블록 앞의 텍스트 / 구조화 모드: 사고_과정 필드)
                     try:
-                        scenarios = parse_json_response(response_text)
-                        
-                        # [New] 파일명 필드 추가
-                        for scenario in scenarios:
-                            scenario['파일명'] = uploaded_file.name
-                            
-                        all_scenarios.extend(scenarios)  # 결과 누적
-                        
-                        # 개별 파일 히스토리 저장
-                        save_to_history(model_name, f"{uploaded_file.name} [{type_short}]", scenarios)
-                        
+                        thinking_process, scenarios = parse_scenario_response(response_text, use_structured_output)
                     except Exception as parse_error:
                         st.error(f"❌ {uploaded_file.name} [{type_short}] 파싱 오류: {str(parse_error)}")
                         continue
+                    
+                    # 사고 과정 표시
+                    if thinking_process:
+                        with st.expander(f"🧠 AI 사고 과정 - {uploaded_file.name} [{type_short}]", expanded=False):
+                            st.markdown(thinking_process)
+                    
+                    collect_scenarios(scenarios, type_short)
                         
                 except Exception as e:
                     st.error(f"❌ {uploaded_file.name} [{type_short}] 처리 실패: {str(e)}")
@@ -1127,10 +1062,9 @@ def main():
             col_dev, col_biz, col_all = st.columns(3)
             
             with col_dev:
-                excel_dev = create_excel_file(df_dev)
                 st.download_button(
                     label="🔧 개발자용 다운로드",
-                    data=excel_dev,
+                    data=excel_download_data(df_dev),
                     file_name=f"테스트_시나리오_개발자용_{time.strftime('%Y%m%d_%H%M%S')}.xlsx",
                     mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
                     use_container_width=True
@@ -1138,10 +1072,9 @@ def main():
                 st.caption(f"📊 개발단위 테스트 {len(df_dev)}개")
             
             with col_biz:
-                excel_biz = create_excel_file(df_biz)
                 st.download_button(
                     label="📋 현업용 다운로드",
-                    data=excel_biz,
+                    data=excel_download_data(df_biz),
                     file_name=f"테스트_시나리오_현업용_{time.strftime('%Y%m%d_%H%M%S')}.xlsx",
                     mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
                     use_container_width=True
@@ -1149,10 +1082,9 @@ def main():
                 st.caption(f"📊 현업단위+통합 테스트 {len(df_biz)}개")
             
             with col_all:
-                excel_all = create_excel_file(st.session_state['df_result'])
                 st.download_button(
                     label="📦 전체 다운로드",
-                    data=excel_all,
+                    data=excel_download_data(st.session_state['df_result']),
                     file_name=f"테스트_시나리오_전체_{time.strftime('%Y%m%d_%H%M%S')}.xlsx",
                     mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
                     use_container_width=True,
@@ -1163,10 +1095,9 @@ def main():
             # 하나만 있는 경우 기존 방식
             col1, col2, col3 = st.columns([1, 2, 1])
             with col2:
-                excel_file = create_excel_file(st.session_state['df_result'])
                 st.download_button(
                     label="📥 Excel 파일 다운로드",
-                    data=excel_file,
+                    data=excel_download_data(st.session_state['df_result']),
                     file_name=f"테스트_시나리오_{time.strftime('%Y%m%d_%H%M%S')}.xlsx",
                     mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
                     use_container_width=True,
@@ -1234,8 +1165,8 @@ def main():
             </div>
         """, unsafe_allow_html=True)
         
-        # 히스토리 데이터 로드
-        history_df = load_history()
+        # 히스토리 메타데이터 로드 (시나리오 JSON은 필요할 때만 로딩)
+        history_df = load_history_metadata()
         
         # 히스토리가 있는지 확인
         if len(history_df) > 0:
@@ -1294,10 +1225,11 @@ def main():
                     "ImageName": st.column_config.TextColumn("이미지/설명", width="medium"),
                     "ScenarioCount": st.column_config.NumberColumn("시나리오 수", width="small"),
                     "Version": st.column_config.TextColumn("버전", width="small"),
+                    "ID": None,  # 내부 식별자는 숨김
                 },
                 hide_index=True,
                 use_container_width=True,
-                disabled=["Timestamp", "Model", "ImageName", "ScenarioCount", "Scenarios", "Version", "ParentID"],
+                disabled=["ID", "Timestamp", "Model", "ImageName", "ScenarioCount", "Version", "ParentID"],
                 key="history_table"
             )
             
@@ -1316,7 +1248,7 @@ def main():
                 for idx in selected_indices:
                     row = history_df.iloc[idx]
                     try:
-                        scenarios = json.loads(row['Scenarios'])
+                        scenarios = load_history_scenarios(row['ID'])
                         consolidated_scenarios.extend(scenarios)
                     except Exception:
                         pass  # JSON 파싱 실패 시 건너뛰
@@ -1325,15 +1257,12 @@ def main():
                     # DataFrame 생성
                     consolidated_df = pd.DataFrame(consolidated_scenarios)
                     
-                    # Excel 파일 생성
-                    excel_file = create_excel_file(consolidated_df)
-                    
                     # 다운로드 버튼
                     col_dl1, col_dl2, col_dl3 = st.columns([1, 2, 1])
                     with col_dl2:
                         st.download_button(
                             label=f"📥 선택한 {len(selected_indices)}개 항목 통합 다운로드 ({len(consolidated_scenarios)}개 케이스)",
-                            data=excel_file,
+                            data=excel_download_data(consolidated_df),
                             file_name=f"통합_테스트케이스_{time.strftime('%Y%m%d_%H%M%S')}.xlsx",
                             mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
                             use_container_width=True,
@@ -1376,7 +1305,7 @@ def main():
                             # 불러오기 버튼
                             if st.button(f"📥 불러오기", key=f"load_{idx}", use_container_width=True):
                                 try:
-                                    scenarios = json.loads(row['Scenarios'])
+                                    scenarios = load_history_scenarios(row['ID'])
                                     df = pd.DataFrame(scenarios)
                                     st.session_state['df_result'] = df
                                     st.session_state['uploaded_image'] = None
@@ -1396,16 +1325,16 @@ def main():
                         # 구분선
                         st.markdown("---")
                         
-                        # 시나리오 미리보기
-                        st.markdown("**📋 시나리오 미리보기** (처음 3개)")
-                        try:
-                            scenarios = json.loads(row['Scenarios'])
-                            preview_df = pd.DataFrame(scenarios[:3])
-                            st.dataframe(preview_df, use_container_width=True, height=200)
-                            if len(scenarios) > 3:
-                                st.caption(f"💡 {len(scenarios) - 3}개의 시나리오가 더 있습니다. 불러오기를 클릭하여 전체 보기")
-                        except Exception:
-                            st.warning("⚠️ 미리보기를 표시할 수 없습니다.")
+                        # 시나리오 미리보기 (켰을 때만 시나리오 JSON 로딩)
+                        if st.toggle("📋 시나리오 미리보기 (처음 3개)", key=f"preview_{idx}"):
+                            try:
+                                scenarios = load_history_scenarios(row['ID'])
+                                preview_df = pd.DataFrame(scenarios[:3])
+                                st.dataframe(preview_df, use_container_width=True, height=200)
+                                if len(scenarios) > 3:
+                                    st.caption(f"💡 {len(scenarios) - 3}개의 시나리오가 더 있습니다. 불러오기를 클릭하여 전체 보기")
+                            except Exception:
+                                st.warning("⚠️ 미리보기를 표시할 수 없습니다.")
         else:
             # 히스토리가 없을 때
             st.markdown("""
@@ -1616,8 +1545,8 @@ def main():
             # 기준 테스트 케이스 선택 (히스토리 우선)
             st.markdown("**📋 기준 테스트 케이스 선택**")
             
-            # 히스토리 로드
-            history_df = load_history()
+            # 히스토리 메타데이터 로드
+            history_df = load_history_metadata()
             
             if len(history_df) > 0:
                 # 히스토리에서 선택 (기본)
@@ -1626,7 +1555,7 @@ def main():
                     range(len(history_df)),
                     format_func=lambda x: f"{history_df.iloc[x]['Timestamp']} | {history_df.iloc[x]['ImageName']} ({history_df.iloc[x]['ScenarioCount']}개)"
                 )
-                base_scenarios = json.loads(history_df.iloc[selected_history]['Scenarios'])
+                base_scenarios = load_history_scenarios(history_df.iloc[selected_history]['ID'])
                 base_df = pd.DataFrame(base_scenarios)
                 st.info(f"📋 선택된 히스토리: **{len(base_df)}개** 테스트 케이스")
             elif 'df_result' in st.session_state and st.session_state['df_result'] is not None:
@@ -1713,21 +1642,25 @@ def main():
                                     st.error("❌ 사이드바에서 API 키를 먼저 입력해주세요!")
                                     st.stop()
                                 
-                                # API 설정
-                                genai.configure(api_key=api_key)
+                                # 구조화 출력 모드면 응답 스키마 적용
+                                expansion_system_prompt = SYSTEM_PROMPT + "\n\n" + expansion_prompt
+                                expansion_config = {"temperature": 0.7}
+                                if use_structured_output:
+                                    expansion_system_prompt += "\n" + STRUCTURED_OUTPUT_INSTRUCTION
+                                    expansion_config = structured_generation_config(expansion_config)
                                 
-                                # API 호출
-                                model = genai.GenerativeModel(
-                                    model_name=model_name,
-                                    generation_config={"temperature": 0.7},
-                                    system_instruction=SYSTEM_PROMPT + "\n\n" + expansion_prompt
+                                # API 호출 (동일 요청은 캐시에서 반환)
+                                response_text = generate_text(
+                                    model_name,
+                                    expansion_system_prompt,
+                                    "위 지침에 따라 테스트 케이스를 생성하세요.",
+                                    generation_config=expansion_config,
+                                    use_cache=use_response_cache,
+                                    api_key=api_key
                                 )
                                 
-                                response = model.generate_content("위 지침에 따라 테스트 케이스를 생성하세요.")
-                                response_text = response.text
-                                
                                 # JSON 파싱
-                                expanded_scenarios = parse_json_response(response_text)
+                                _, expanded_scenarios = parse_scenario_response(response_text, use_structured_output)
                                 expanded_df = pd.DataFrame(expanded_scenarios)
                                 
                                 # 결과 저장
@@ -1752,10 +1685,9 @@ def main():
                 
                 with col_action1:
                     # 다운로드 버튼
-                    excel_file = create_excel_file(expanded_df)
                     st.download_button(
                         label=f"📥 다운로드 ({len(expanded_df)}개)",
-                        data=excel_file,
+                        data=excel_download_data(expanded_df),
                         file_name=f"확장_테스트케이스_{time.strftime('%Y%m%d_%H%M%S')}.xlsx",
                         mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
                         use_container_width=True
@@ -1788,20 +1720,23 @@ def main():
                             # 원본(base_df)과 확장(expanded_df) 병합
                             merged_df = pd.concat([base_df, expanded_df], ignore_index=True)
                             
-                            # 중복 제거 (절차+입력+기대결과 기준으로 정교한 중복 제거)
-                            dedup_cols = [col for col in ['테스트항목_및_절차', '입력데이터', '기대결과'] if col in merged_df.columns]
+                            # 중복 제거 (절차+입력+기대결과 기준, 유사 중복 포함 시 띄어쓰기/문장부호/조사 차이 무시)
+                            dedup_cols = [col for col in DEDUP_COLUMNS if col in merged_df.columns]
+                            merge_report = None
                             if dedup_cols:
                                 before_count = len(merged_df)
-                                merged_df = merged_df.drop_duplicates(subset=dedup_cols, keep='first')
+                                merged_df, merge_report = dedup_test_cases(merged_df, similarity_threshold)
                                 after_count = len(merged_df)
                                 if before_count > after_count:
                                     st.info(f"📌 중복 제거: {before_count} → {after_count}개 ({before_count - after_count}개 제거)")
-                                    st.caption(f"   비교 기준: {', '.join(dedup_cols)}")
+                                    criteria = f"유사도 {similarity_threshold:.2f} 이상" if similarity_threshold is not None else "완전 일치"
+                                    st.caption(f"   비교 기준: {', '.join(dedup_cols)} ({criteria})")
                             else:
                                 st.warning("⚠️ 중복 비교에 필요한 컬럼이 없어 중복 제거를 건너뜁니다.")
                             
                             # 세션에 저장
                             st.session_state['merged_df'] = merged_df
+                            st.session_state['merge_report'] = merge_report
                             
                             # 히스토리에 저장
                             parent_id = ""
@@ -1838,13 +1773,19 @@ def main():
                     
                     st.dataframe(merged_df, use_container_width=True, height=300)
                     
+                    # 유사 중복 병합 내역
+                    merge_report = st.session_state.get('merge_report')
+                    if merge_report is not None and len(merge_report) > 0:
+                        with st.expander(f"🧹 중복 병합 내역 ({len(merge_report)}건)", expanded=False):
+                            st.caption("제거된 케이스와 남긴 케이스를 비교합니다. (행 번호는 병합 전 1차+2차 결합 순서 기준)")
+                            st.dataframe(merge_report, use_container_width=True, height=300)
+                    
                     # 최종본 다운로드
-                    final_excel = create_excel_file(merged_df)
                     col_final1, col_final2, col_final3 = st.columns([1, 2, 1])
                     with col_final2:
                         st.download_button(
                             label=f"📥 최종본 다운로드 ({len(merged_df)}개)",
-                            data=final_excel,
+                            data=excel_download_data(merged_df),
                             file_name=f"최종_테스트케이스_{time.strftime('%Y%m%d_%H%M%S')}.xlsx",
                             mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
                             use_container_width=True,
@@ -1962,21 +1903,8 @@ def main():
             
             # 폴더 내 파일 미리보기 및 선택
             if input_folder and os.path.exists(input_folder):
-                image_extensions = ('.png', '.jpg', '.jpeg', '.gif', '.bmp', '.webp')
-                
-                if include_subfolders:
-                    # 재귀적으로 하위 폴더 탐색
-                    all_image_files = []
-                    for root, dirs, files in os.walk(input_folder):
-                        for f in files:
-                            if f.lower().endswith(image_extensions):
-                                # 상대 경로로 저장 (폴더 구조 유지)
-                                rel_path = os.path.relpath(os.path.join(root, f), input_folder)
-                                all_image_files.append(rel_path)
-                else:
-                    # 현재 폴더만 탐색
-                    all_image_files = [f for f in os.listdir(input_folder) 
-                                  if f.lower().endswith(image_extensions)]
+                # 하위 폴더 포함 시 상대 경로로 저장 (폴더 구조 유지)
+                all_image_files = list_batch_images(input_folder, include_subfolders)
                 
                 if all_image_files:
                     subfolder_text = " (하위 폴더 포함)" if include_subfolders else ""
@@ -2023,7 +1951,6 @@ def main():
                                         img_path = os.path.join(input_folder, img_file)
                                         with col:
                                             try:
-                                                from PIL import Image
                                                 img = Image.open(img_path)
                                                 st.image(img, caption=img_file[:20], use_container_width=True)
                                             except Exception:
@@ -2045,6 +1972,31 @@ def main():
             st.markdown("**📊 출력 옵션**")
             save_individual = st.checkbox("각 이미지별 개별 파일 저장", value=True, help="각 이미지 옆에 개별 Excel 파일 저장")
             save_consolidated = st.checkbox("통합 파일 저장 (입력 폴더에)", value=True, help="모든 결과를 하나의 통합 Excel로 저장")
+            cross_dedup_label = st.selectbox(
+                "🔁 화면 간 중복 케이스 (통합 파일)",
+                ["표시만 (중복_원본화면 컬럼)", "통합 파일에서 제거", "사용 안 함"],
+                key="cross_dedup_mode",
+                help="로그인, 필수값 확인, 공통 버튼처럼 여러 화면에서 반복되는 케이스를 처리 중에 찾아냅니다. 이미지별 개별 파일과 히스토리는 그대로 유지됩니다."
+            )
+            cross_dedup_mode = {"표시만 (중복_원본화면 컬럼)": MODE_FLAG, "통합 파일에서 제거": MODE_DROP}.get(cross_dedup_label)
+            persist_dedup_index = st.checkbox(
+                "배치 간 중복 인덱스 유지",
+                value=False,
+                key="persist_dedup_index",
+                disabled=cross_dedup_mode is None,
+                help=f"입력 폴더의 {DEFAULT_INDEX_FILENAME}에 케이스 지문을 저장해 다음 배치에서도 이전 화면과 비교합니다."
+            )
+
+            # 동시 처리 옵션
+            st.markdown("**🚀 동시 처리**")
+            batch_workers = st.slider(
+                "동시 처리 이미지 수",
+                min_value=1,
+                max_value=MAX_BATCH_WORKERS,
+                value=DEFAULT_BATCH_WORKERS,
+                key="batch_workers",
+                help="여러 이미지를 동시에 처리합니다. API 할당량(RPM)이 낮으면 값을 줄이세요. 이미지별 1차 → 2차 → 병합 순서는 유지됩니다."
+            )
         
         st.markdown("---")
         
@@ -2070,16 +2022,10 @@ def main():
             st.markdown("**💾 조건 프리셋**")
             
             # 프리셋 파일 경로
-            preset_file = os.path.join(os.path.dirname(os.path.abspath(__file__)), "condition_presets.json")
+            preset_file = CONDITION_PRESETS_FILE
             
             # 저장된 프리셋 로드
-            presets = {}
-            if os.path.exists(preset_file):
-                try:
-                    with open(preset_file, 'r', encoding='utf-8') as f:
-                        presets = json.load(f)
-                except Exception:
-                    pass  # 프리셋 파일 로드 실패 시 기본값 사용
+            presets = load_condition_presets(preset_file)
             
             # 1행: 불러오기
             if presets:
@@ -2140,8 +2086,45 @@ def main():
         
         st.markdown("---")
         
+        # 중단된 배치 (입력 폴더의 체크포인트) - 끝난 이미지는 건너뛰고 나머지만 처리
+        resumable_checkpoints = []
+        if input_folder and os.path.exists(input_folder):
+            # 실행/대기 중인 작업이 사용하는 체크포인트는 제외
+            running_dirs = get_batch_job_manager().active_directories()
+            resumable_checkpoints = [
+                checkpoint for checkpoint in find_resumable_checkpoints(os.path.join(input_folder, BATCH_SPOOL_DIRNAME))
+                if checkpoint.directory not in running_dirs
+            ]
+        resume_checkpoint = None
+        if resumable_checkpoints:
+            st.markdown("### ⏯️ 중단된 배치")
+            checkpoint_labels = {f"{checkpoint.run_id} · {checkpoint.summary()}": checkpoint for checkpoint in resumable_checkpoints}
+            resume_col1, resume_col2 = st.columns([3, 1])
+            with resume_col1:
+                resume_label = st.selectbox(
+                    "이어서 처리할 배치",
+                    list(checkpoint_labels),
+                    key="resume_run",
+                    help="세션 종료나 중단으로 끝나지 않은 배치입니다. 이어하기는 당시 설정 그대로 남은 이미지만 처리하고, 1차 생성까지 끝난 이미지는 2차부터 진행합니다."
+                )
+                resume_checkpoint = checkpoint_labels[resume_label]
+            with resume_col2:
+                st.write("")  # 선택 상자와 높이 맞춤
+                if st.button("🗑️ 기록 삭제", use_container_width=True, key="discard_run"):
+                    resume_checkpoint.discard()
+                    st.rerun()
+        
         # 실행/중단 버튼
-        col_btn1, col_btn2, col_btn3 = st.columns([1, 1, 1])
+        job_manager = get_batch_job_manager()
+        session_job = job_manager.get(st.session_state.get('batch_job_id'))
+        # 이 세션이 제출한 작업이 끝나면 실패 목록을 재시도용으로 보관 (한 번만)
+        job_just_finished = False
+        if session_job is not None and session_job.is_finished and st.session_state.get('batch_job_reported') != session_job.job_id:
+            st.session_state['batch_job_reported'] = session_job.job_id
+            st.session_state['failed_files'] = list(session_job.failed_files)
+            st.session_state['failed_batch_dir'] = session_job.checkpoint.directory
+            job_just_finished = True
+        col_btn1, col_btn2, col_btn3, col_btn4 = st.columns([1, 1, 1, 1])
         with col_btn1:
             start_batch = st.button(
                 "🚀 배치 시작",
@@ -2153,11 +2136,12 @@ def main():
             stop_batch = st.button(
                 "⏹️ 중단",
                 use_container_width=True,
-                type="secondary"
+                type="secondary",
+                disabled=session_job is None or session_job.is_finished
             )
-            if stop_batch:
-                st.session_state['batch_stop'] = True
-                st.warning("⚠️ 중단 요청됨. 현재 처리 중인 파일까지 완료 후 중단됩니다.")
+            if stop_batch and session_job is not None:
+                session_job.cancel()
+                st.warning("⚠️ 중단 요청됨. 진행 중인 API 호출까지만 마치고 중단합니다.")
         with col_btn3:
             # 실패한 파일 재시도 버튼
             failed_files = st.session_state.get('failed_files', [])
@@ -2167,321 +2151,120 @@ def main():
                 type="secondary",
                 disabled=len(failed_files) == 0
             )
+        with col_btn4:
+            resume_batch = st.button(
+                "⏯️ 이어하기",
+                use_container_width=True,
+                type="secondary",
+                disabled=resume_checkpoint is None
+            )
         
-        # 배치 처리 실행
-        if start_batch or retry_failed:
-            # 중단 플래그 초기화
-            st.session_state['batch_stop'] = False
-            
+        # 배치 작업 제출 (처리는 백그라운드 작업 스레드에서, 화면은 진행 상황만 주기적으로 표시)
+        if start_batch or retry_failed or resume_batch:
             # API 키 검증
             if not api_key:
                 st.error("❌ 사이드바에서 API 키를 먼저 입력해주세요!")
                 st.stop()
             
-            # 처리할 이미지 결정 (재시도 vs 새로운 처리)
-            if retry_failed and failed_files:
-                image_files = failed_files.copy()
-                st.info(f"🔄 {len(image_files)}개 실패 파일 재시도 중...")
+            # 처리할 이미지와 설정 결정 (이어하기 / 실패 재시도 / 새로운 처리)
+            # 실패 재시도는 직전 배치의 체크포인트가 남아 있으면 같은 배치 안에서 실패 이미지만 다시 처리
+            checkpoint = None
+            start_message = None
+            if retry_failed and failed_files and not resume_batch:
+                retry_dir = st.session_state.get('failed_batch_dir')
+                try:
+                    checkpoint = BatchCheckpoint.load(retry_dir) if retry_dir else None
+                except ValueError:
+                    checkpoint = None
+            elif resume_batch:
+                checkpoint = resume_checkpoint
+            
+            if checkpoint is not None:
+                batch_settings = checkpoint.settings
+                if resume_batch:
+                    image_files = checkpoint.remaining_files()
+                    start_message = f"⏯️ {checkpoint.run_id} 배치 이어하기: {len(image_files)}개 남음 ({checkpoint.summary()})"
+                else:
+                    image_files = [image_file for image_file in checkpoint.remaining_files() if image_file in failed_files]
+                    start_message = f"🔄 {len(image_files)}개 실패 파일 재시도 중..."
             else:
-                image_files = st.session_state.get('selected_images', [])
-                st.session_state['failed_files'] = []  # 실패 목록 초기화
+                if retry_failed and failed_files:
+                    image_files = failed_files.copy()
+                    start_message = f"🔄 {len(image_files)}개 실패 파일 재시도 중..."
+                else:
+                    image_files = st.session_state.get('selected_images', [])
+                
+                # 이어하기 때 그대로 다시 사용할 설정 (체크포인트에 저장, API 키 제외)
+                batch_settings = {
+                    "worker": {
+                        "model_name": model_name,
+                        "phase1_types": batch_phase1_types,
+                        "run_integration": batch_run_integration,
+                        # 2차 검수 조건 텍스트 (메인 스레드에서 미리 구성하여 워커에 전달)
+                        "condition_text": build_batch_condition_text(
+                            batch_contractor_age, batch_contractor_nat, batch_app_type,
+                            batch_product_main, batch_product_riders
+                        ),
+                        "sample_guide_text": st.session_state.get('sample_guide_text', ''),
+                        "save_individual": save_individual,
+                        "use_cache": use_response_cache,
+                        "structured": use_structured_output,
+                        "image_options": image_options,
+                        "tile_images": use_image_tiling,
+                        "similarity_threshold": similarity_threshold,
+                    },
+                    "save_consolidated": save_consolidated,
+                    "cross_dedup_mode": cross_dedup_mode,
+                    "persist_dedup_index": persist_dedup_index,
+                }
+            st.session_state['failed_files'] = []  # 실패 목록 초기화
             
             if not image_files:
                 st.error("❌ 처리할 이미지가 선택되지 않았습니다. 이미지를 선택해주세요.")
                 st.stop()
             
-            # API 설정
-            genai.configure(api_key=api_key)
-            
-            # 전체 결과 저장
-            all_final_results = []
-            failed_files_new = []
-            
-            # 진행률 표시
-            progress_bar = st.progress(0)
-            status_text = st.empty()
-            result_container = st.container()
-            
-            total_files = len(image_files)
-            
-            total_files = len(image_files)
-            
-            for idx, image_file in enumerate(image_files):
-                # 중단 체크
-                if st.session_state.get('batch_stop', False):
-                    status_text.markdown("**⏹️ 사용자 요청으로 중단됨**")
-                    st.warning(f"⚠️ 중단 완료. {idx}개 처리 완료, {total_files - idx}개 미처리")
-                    break
-                
-                # 재시도 로직 (최대 3회)
-                max_retries = 3
-                success = False
-                last_error = None
-                
-                for attempt in range(max_retries):
-                    try:
-                        # 진행률 업데이트
-                        progress = (idx + 1) / total_files
-                        progress_bar.progress(progress)
-                        retry_text = f" (재시도 {attempt + 1}/{max_retries})" if attempt > 0 else ""
-                        status_text.markdown(f"**🔄 처리 중:** {image_file} ({idx + 1}/{total_files}){retry_text}")
-                        
-                        # 이미지 로드
-                        image_path = os.path.join(input_folder, image_file)
-                        with open(image_path, 'rb') as f:
-                            image_data = f.read()
-                        
-                        # ===================
-                        # 1️⃣ 1차 생성: 단위 테스트 (개발자/현업)
-                        # ===================
-                        all_scenarios_for_image = []
-                        
-                        for test_type in batch_phase1_types:
-                            # 테스트 유형에 따른 프롬프트 선택
-                            if test_type == "개발자/QA용 단위테스트":
-                                selected_prompt = DEVELOPER_UNIT_PROMPT
-                            else:  # 현업용 단위테스트
-                                selected_prompt = BUSINESS_UNIT_PROMPT
-                            
-                            # [New] 엑셀 샘플 가이드가 있으면 프롬프트에 추가
-                            if 'sample_guide_text' in st.session_state and st.session_state['sample_guide_text']:
-                                selected_prompt += "\n" + st.session_state['sample_guide_text']
-                            
-                            model = genai.GenerativeModel(
-                                model_name=model_name,
-                                generation_config={"temperature": 0.7},
-                                system_instruction=selected_prompt
-                            )
-                            
-                            response = model.generate_content([
-                                "위 시스템 프롬프트(및 스타일 가이드)에 정의된 규칙에 따라, 이 화면 설계서를 분석하여 테스트 시나리오를 생성해주세요.",
-                                {"mime_type": f"image/{image_file.split('.')[-1].lower()}", "data": image_data}
-                            ])
-                            
-                            type_gen = parse_json_response(response.text)
-                            # [New] 파일명 필드 추가
-                            for scenario in type_gen:
-                                scenario['파일명'] = os.path.basename(image_file)
-                                
-                            all_scenarios_for_image.extend(type_gen)
-                        
-                        first_df = pd.DataFrame(all_scenarios_for_image)
-                        
-                        # ===================
-                        # 2️⃣ 2차 생성: 현업용 통합 (선택 시)
-                        # ===================
-                        second_df = pd.DataFrame()  # 빈 DataFrame 초기화
-                        
-                        if batch_run_integration:
-                            # 조건 텍스트 생성 (사용자가 선택한 경우)
-                            condition_text = ""
-                            if batch_contractor_age:
-                                condition_text += f"\n계약자 연령: {', '.join(batch_contractor_age)}"
-                            if batch_contractor_nat:
-                                condition_text += f"\n계약자 국적: {', '.join(batch_contractor_nat)}"
-                            if batch_app_type:
-                                condition_text += f"\n청약방식: {', '.join(batch_app_type)}"
-                            if batch_product_main:
-                                condition_text += f"\n주계약: {', '.join(batch_product_main)}"
-                            if batch_product_riders:
-                                condition_text += f"\n특약: {', '.join(batch_product_riders)}"
-                            
-                            # 통합 테스트 프롬프트 구성
-                            # 사용자가 조건을 선택했으면 조건 기반 생성, 아니면 자동 추론+검토 모드
-                            if condition_text:
-                                expansion_prompt = f"""
-{INTEGRATION_TEST_PROMPT}
-
-**[지시사항]**
-1차 단위 테스트 결과를 검토하고, 아래 **[적용할 비즈니스 조건]**을 반영하여 **통합 테스트 케이스를 추가**하세요.
-또한 단위 테스트에서 누락된 케이스가 있다면 추가하세요.
-
-**적용할 비즈니스 조건:**
-{condition_text}
-
-**기존 1차 단위 테스트 (참고용):**
-{first_df.to_dict('records')[:10] if not first_df.empty else "없음"}
-
-**생성 규칙:**
-1. `구분` 필드는 "현업통합"으로 설정
-2. `생성조건` 필드에 적용된 조건 명시
-3. 화면에 조건이 적용 불가능하면 해당 조건 케이스는 생성하지 않음
-4. 최소 10개 이상의 통합 테스트 케이스 생성
-"""
-                            else:
-                                # 조건이 없을 때: 1차 결과 검토 및 보완 모드
-                                expansion_prompt = f"""
-{INTEGRATION_TEST_PROMPT}
-
-**[지시사항]**
-1차 단위 테스트 결과를 검토하고, **다른 시각(통합 관점)**에서 누락된 케이스나 시나리오 기반의 흐름 테스트를 추가 생성하세요.
-
-**기존 1차 단위 테스트 (참고용):**
-{first_df.to_dict('records')[:10] if not first_df.empty else "없음"}
-
-**생성 규칙:**
-1. `구분` 필드는 "현업통합"으로 설정
-2. `생성조건` 필드: "자동추론" 또는 적용된 시나리오 조건 명시
-3. 단위 테스트에서 커버하지 못한 필드 간 연동, 예외 처리, 비즈니스 로직 위주로 생성
-4. 최소 10개 이상의 추가 케이스 생성
-"""
-
-                            # [New] 엑셀 샘플 가이드가 있으면 프롬프트에 추가
-                            if 'sample_guide_text' in st.session_state and st.session_state['sample_guide_text']:
-                                expansion_prompt += "\n" + st.session_state['sample_guide_text']
-
-                            model2 = genai.GenerativeModel(
-                                model_name=model_name,
-                                generation_config={"temperature": 0.7},
-                                system_instruction=expansion_prompt
-                            )
-                            
-                            response2 = model2.generate_content([
-                                "위 지침(및 스타일 가이드)에 따라 테스트 케이스를 생성하세요.",
-                                {"mime_type": f"image/{image_file.split('.')[-1].lower()}", "data": image_data}
-                            ])
-                            second_gen = parse_json_response(response2.text)
-                            # [New] 파일명 필드 추가
-                            for scenario in second_gen:
-                                scenario['파일명'] = os.path.basename(image_file)
-                                
-                            second_df = pd.DataFrame(second_gen)
-                        
-                        # ===================
-                        # 3️⃣ 병합 (Final) + 중복 제거
-                        # ===================
-                        if len(second_df) > 0:
-                            merged_df = pd.concat([first_df, second_df], ignore_index=True)
-                        else:
-                            merged_df = first_df
-                        
-                        # 중복 제거 (절차+입력+기대결과 기준으로 정교한 중복 제거)
-                        dedup_cols = [col for col in ['테스트항목_및_절차', '입력데이터', '기대결과'] if col in merged_df.columns]
-                        if dedup_cols:
-                            before_count = len(merged_df)
-                            merged_df = merged_df.drop_duplicates(subset=dedup_cols, keep='first')
-                            after_count = len(merged_df)
-                            if before_count > after_count:
-                                st.info(f"📌 중복 제거: {before_count} → {after_count}개 ({before_count - after_count}개 제거)")
-                        
-                        # 시나리오ID, TC_ID 기준 정렬
-                        if '시나리오ID' in merged_df.columns:
-                            merged_df = merged_df.sort_values(by=['시나리오ID'])
-                        if '테스트케이스ID' in merged_df.columns:
-                            merged_df = merged_df.sort_values(by=['시나리오ID', '테스트케이스ID'] if '시나리오ID' in merged_df.columns else ['테스트케이스ID'])
-                        
-                        merged_df = merged_df.reset_index(drop=True)
-                        
-                        # 개별 파일 저장 (이미지가 있는 폴더에 저장)
-                        if save_individual:
-                            # 이미지가 있는 경로에 저장 (하위 폴더 포함 시 상대 경로 유지)
-                            image_dir = os.path.dirname(os.path.join(input_folder, image_file))
-                            output_file = os.path.join(image_dir, f"{os.path.splitext(os.path.basename(image_file))[0]}_최종.xlsx")
-                            excel_data = create_excel_file(merged_df)
-                            with open(output_file, 'wb') as f:
-                                f.write(excel_data.getvalue())
-                        
-                        # 전체 결과에 추가
-                        all_final_results.extend(merged_df.to_dict('records'))
-                        
-                        # 히스토리 저장
-                        save_to_history(
-                            model_name=model_name,
-                            image_name=f"[배치] {image_file}",
-                            scenarios=merged_df.to_dict('records'),
-                            version="Final",
-                            parent_id=""
-                        )
-                        
-                        # 상세 건수 계산
-                        cnt_dev = len(merged_df[merged_df['구분'] == '개발단위']) if '구분' in merged_df.columns else 0
-                        cnt_biz_unit = len(merged_df[merged_df['구분'] == '현업단위']) if '구분' in merged_df.columns else 0
-                        cnt_biz_int = len(merged_df[merged_df['구분'] == '현업통합']) if '구분' in merged_df.columns else 0
-                        
-                        with result_container:
-                            st.success(f"✅ {image_file}: 최종 {len(merged_df)}개 (🔧개발:{cnt_dev}, 📋현업단위:{cnt_biz_unit}, 🔄현업통합:{cnt_biz_int})")
-                        
-                        success = True
-                        break  # 성공 시 재시도 루프 종료
-                        
-                    except Exception as e:
-                        last_error = str(e)
-                        if attempt < max_retries - 1:
-                            time.sleep(2)  # 2초 대기 후 재시도
-                        continue
-                
-                # 재시도 후에도 실패한 경우
-                if not success:
-                    failed_files_new.append(image_file)
-                    with result_container:
-                        st.error(f"❌ {image_file}: {max_retries}회 시도 후 실패 - {last_error}")
-            
-            # 실패한 파일 목록 저장 (재시도용)
-            st.session_state['failed_files'] = failed_files_new
-            
-            # 통합 파일 저장
-            if save_consolidated and all_final_results:
-                all_df = pd.DataFrame(all_final_results)
-                
-                # 정렬
-                if '시나리오ID' in all_df.columns:
-                    all_df = all_df.sort_values(by=['시나리오ID'])
-                if '테스트케이스ID' in all_df.columns:
-                    sort_cols = ['시나리오ID', '테스트케이스ID'] if '시나리오ID' in all_df.columns else ['테스트케이스ID']
-                    all_df = all_df.sort_values(by=sort_cols)
-                
-                all_df = all_df.reset_index(drop=True)
-                
-                # 개발자용/현업용 분리 저장
-                timestamp = time.strftime('%Y%m%d_%H%M%S')
-                saved_files = []
-                
-                # 개발자용 분리
-                if '구분' in all_df.columns:
-                    df_dev = all_df[all_df['구분'] == '개발단위']
-                    df_biz = all_df[all_df['구분'].isin(['현업단위', '현업통합'])]
-                    
-                    if len(df_dev) > 0:
-                        dev_file = os.path.join(input_folder, f"개발자용_테스트_{timestamp}.xlsx")
-                        excel_data = create_excel_file(df_dev)
-                        with open(dev_file, 'wb') as f:
-                            f.write(excel_data.getvalue())
-                        saved_files.append(f"🔧 개발자용: {len(df_dev)}개 → {os.path.basename(dev_file)}")
-                    
-                    if len(df_biz) > 0:
-                        biz_file = os.path.join(input_folder, f"현업용_테스트_{timestamp}.xlsx")
-                        excel_data = create_excel_file(df_biz)
-                        with open(biz_file, 'wb') as f:
-                            f.write(excel_data.getvalue())
-                        saved_files.append(f"📋 현업용: {len(df_biz)}개 → {os.path.basename(biz_file)}")
-                
-                # 전체 통합본도 저장
-                output_file = os.path.join(input_folder, f"통합_최종본_{timestamp}.xlsx")
-                excel_data = create_excel_file(all_df)
-                with open(output_file, 'wb') as f:
-                    f.write(excel_data.getvalue())
-                saved_files.append(f"📦 전체: {len(all_df)}개 → {os.path.basename(output_file)}")
-                
-                # 전체 상세 건수 계산
-                total_dev = len(all_df[all_df['구분'] == '개발단위']) if '구분' in all_df.columns else 0
-                total_biz_unit = len(all_df[all_df['구분'] == '현업단위']) if '구분' in all_df.columns else 0
-                total_biz_int = len(all_df[all_df['구분'] == '현업통합']) if '구분' in all_df.columns else 0
-
-                st.balloons()
-                st.success(f"""
-                🎉 **배치 처리 완료!**
-                
-                - 처리된 이미지: **{total_files}개**
-                - 총 테스트 케이스: **{len(all_final_results)}개**
-                  - 🔧 개발자용: **{total_dev}개**
-                  - 📋 현업 단위: **{total_biz_unit}개**
-                  - 🔄 현업 통합: **{total_biz_int}개**
-                - 저장 위치: `{input_folder}`
-                """)
-                
-                st.markdown("**📁 생성된 파일:**")
-                for file_info in saved_files:
-                    st.write(f"  - {file_info}")
+            # 같은 폴더에 이미지별 진행 상태(체크포인트)를 함께 기록해 세션이 끊겨도 이어서 처리
+            if checkpoint is None:
+                run_id = new_batch_run_id()
+                checkpoint = BatchCheckpoint.create(
+                    batch_run_directory(input_folder, run_id), run_id, image_files, batch_settings
+                )
+            batch_job = BatchJob(input_folder, checkpoint, image_files, batch_workers)
+            if start_message:
+                batch_job.log(MSG_INFO, start_message)
+            job_manager.submit(batch_job, api_key)
+            st.session_state['batch_job_id'] = batch_job.job_id
+            st.rerun()  # 중단 버튼/이어하기 목록을 새 작업 기준으로 다시 그림
+        
+        # 배치 작업 진행 상황 (다른 탭을 사용하거나 새로고침해도 작업은 계속 실행)
+        batch_jobs = job_manager.jobs()
+        if batch_jobs:
+            st.markdown("### 🏃 배치 작업")
+            shown_job = session_job
+            if len(batch_jobs) > 1 or shown_job is None:
+                job_labels = {
+                    f"{job.label} · {BATCH_JOB_STATUS_LABELS[job.status]} · {job.done}/{job.total}": job
+                    for job in batch_jobs
+                }
+                default_label = next((label for label, job in job_labels.items() if job is session_job), None)
+                shown_label = st.selectbox(
+                    "표시할 배치 작업",
+                    list(job_labels),
+                    index=list(job_labels).index(default_label) if default_label else 0,
+                    help="이 프로세스에서 실행 중이거나 최근에 끝난 배치입니다. 새로고침 후에도 여기서 다시 확인할 수 있습니다."
+                )
+                shown_job = job_labels[shown_label]
+                if not shown_job.is_finished and shown_job is not session_job:
+                    if st.button("⏹️ 이 작업 중단", key=f"cancel_job_{shown_job.job_id}"):
+                        shown_job.cancel()
+            
+            if shown_job.is_finished:
+                render_batch_job(shown_job.job_id)
+                if job_just_finished and shown_job is session_job and shown_job.summary.get("saved_files"):
+                    st.balloons()
+            else:
+                # 실행 중에는 진행 상황 영역만 주기적으로 다시 그림 (스크립트 전체 재실행 없음)
+                st.fragment(render_batch_job, run_every=BATCH_POLL_INTERVAL)(shown_job.job_id, polling=True)
 
 # ---------- 애플리케이션 진입점 ----------
 if __name__ == "__main__":
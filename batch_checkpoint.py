@@ -0,0 +1,301 @@
+# ============================================================================
+# Test Scenario Generator 2 - 배치 체크포인트 (중단된 배치 이어하기)
+# ============================================================================
+# 세션 종료/브라우저 닫힘/절전으로 배치가 중간에 끊기면 그동안의 결과와 실패 목록(session_state)이
+# 모두 사라집니다. 이 모듈은 배치 1회분의 진행 상황을 입력 폴더의 스풀 폴더에 기록해
+# 다음 실행에서 끝난 작업은 건너뛰고 나머지만 처리할 수 있게 합니다.
+#
+# - manifest.jsonl: 첫 줄은 실행 정보(이미지 목록, 설정), 이후 이미지별 상태 변경을 한 줄씩 추가
+#   (매번 전체를 다시 쓰지 않으므로 이미지가 많아도 기록 비용이 일정, 마지막 줄이 깨져도 무시)
+# - 상태: pending → phase1_done(1차 결과 저장) → integration_done(병합 결과 저장) → written(통합 조각/히스토리 기록)
+# - 단계별 중간 결과는 partials/ 폴더에 JSONL로 저장하고, 통합 결과는 배치 스풀 조각(batch_spool)을 그대로 재사용
+# - 1차 생성은 (테스트 유형, 조각) 호출마다 결과를 따로 저장하므로, 한 유형이 실패해도 성공한 호출은 이어받음
+# API 키는 저장하지 않습니다.
+# ============================================================================
+
+import hashlib  # 1차 단계 이름 -> 중간 결과 파일명
+import json  # 매니페스트/중간 결과 직렬화
+import os  # 체크포인트 파일 경로
+import shutil  # 완료/삭제된 체크포인트 정리
+import threading  # 워커/메인 스레드 간 동기화
+import time  # 기록 시각
+from typing import Dict, List, Optional, Set
+
+import pandas as pd
+
+from batch_spool import json_records  # NaN -> None 변환 (스풀 조각과 같은 형식)
+
+MANIFEST_FILENAME = "manifest.jsonl"
+PARTIAL_DIRNAME = "partials"
+
+# 이미지별 처리 상태 (진행 순서)
+STATE_PENDING = "pending"
+STATE_PHASE1_DONE = "phase1_done"
+STATE_INTEGRATION_DONE = "integration_done"
+STATE_WRITTEN = "written"
+STATE_ORDER = [STATE_PENDING, STATE_PHASE1_DONE, STATE_INTEGRATION_DONE, STATE_WRITTEN]
+
+# 중간 결과를 저장하는 상태
+PARTIAL_STATES = (STATE_PHASE1_DONE, STATE_INTEGRATION_DONE)
+
+
+def _write_rows(path: str, df: pd.DataFrame):
+    """DataFrame을 JSONL로 저장 (임시 파일에 쓴 뒤 교체)"""
+    temp_path = path + ".tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        for record in json_records(df):
+            f.write(json.dumps(record, ensure_ascii=False))
+            f.write("\n")
+    os.replace(temp_path, path)
+
+
+def _read_rows(path: str) -> pd.DataFrame:
+    with open(path, "r", encoding="utf-8") as f:
+        return pd.DataFrame([json.loads(line) for line in f if line.strip()])
+
+
+class BatchCheckpoint:
+    """
+    배치 1회분의 이미지별 진행 상태와 단계별 중간 결과
+
+    사용 예:
+        checkpoint = BatchCheckpoint.create(run_dir, run_id, image_files, settings)
+        checkpoint.mark(image_file, STATE_PHASE1_DONE, first_df)  # 워커 스레드에서 호출 가능
+        ...
+        checkpoint = BatchCheckpoint.load(run_dir)  # 이어하기
+        for image_file in checkpoint.remaining_files():
+            ...
+    """
+
+    def __init__(self, directory: str, run_id: str, image_files: List[str], settings: dict, created: float):
+        self.directory = directory
+        self.run_id = run_id
+        self.image_files = list(image_files)
+        self.settings = settings
+        self.created = created
+        self.states: Dict[str, str] = {image_file: STATE_PENDING for image_file in self.image_files}
+        self.errors: Dict[str, str] = {}  # 마지막 실패 메시지 (성공하면 지움)
+        self.steps: Dict[str, Set[str]] = {}  # 결과를 저장한 1차 단계 (이미지별)
+        self._orders = {image_file: order for order, image_file in enumerate(self.image_files)}
+        self._lock = threading.Lock()
+
+    @property
+    def manifest_path(self) -> str:
+        return os.path.join(self.directory, MANIFEST_FILENAME)
+
+    def order_of(self, image_file: str) -> int:
+        """이미지의 원래 순서 (스풀 조각 번호)"""
+        return self._orders[image_file]
+
+    def _partial_path(self, image_file: str, state: str) -> str:
+        return os.path.join(self.directory, PARTIAL_DIRNAME, f"{self.order_of(image_file):06d}.{state}.jsonl")
+
+    def _step_path(self, image_file: str, step: str) -> str:
+        digest = hashlib.sha1(step.encode("utf-8")).hexdigest()[:12]
+        return os.path.join(self.directory, PARTIAL_DIRNAME, f"{self.order_of(image_file):06d}.step.{digest}.jsonl")
+
+    def _append(self, event: dict):
+        """매니페스트에 한 줄 추가 (디스크까지 기록)"""
+        with open(self.manifest_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(event, ensure_ascii=False))
+            f.write("\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    # ---------- 생성 / 로드 ----------
+
+    @classmethod
+    def create(cls, directory: str, run_id: str, image_files: List[str], settings: dict) -> "BatchCheckpoint":
+        """
+        새 배치의 체크포인트 생성
+
+        Args:
+            directory: 체크포인트 폴더 (배치 스풀 폴더와 같은 곳)
+            run_id: 배치 실행 ID (시작 시각 + 임의 접미사, 통합 파일명에는 시작 시각만 사용)
+            image_files: 처리할 이미지 목록 (순서 = 스풀 조각 번호)
+            settings: 이어하기 때 그대로 다시 사용할 처리 설정 (JSON 직렬화 가능해야 함)
+        """
+        checkpoint = cls(directory, run_id, image_files, settings, time.time())
+        os.makedirs(os.path.join(directory, PARTIAL_DIRNAME), exist_ok=True)
+        header = {
+            "type": "header",
+            "run_id": run_id,
+            "created": checkpoint.created,
+            "images": checkpoint.image_files,
+            "settings": settings,
+        }
+        temp_path = checkpoint.manifest_path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            f.write(json.dumps(header, ensure_ascii=False))
+            f.write("\n")
+        os.replace(temp_path, checkpoint.manifest_path)
+        return checkpoint
+
+    @classmethod
+    def load(cls, directory: str) -> "BatchCheckpoint":
+        """
+        매니페스트를 다시 읽어 마지막 상태 복원 (기록 중 끊긴 마지막 줄은 무시)
+
+        Raises:
+            ValueError: 매니페스트가 없거나 첫 줄(실행 정보)이 손상된 경우
+        """
+        manifest_path = os.path.join(directory, MANIFEST_FILENAME)
+        if not os.path.exists(manifest_path):
+            raise ValueError(f"체크포인트가 없습니다: {directory}")
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            lines = f.readlines()
+        try:
+            header = json.loads(lines[0])
+            checkpoint = cls(directory, header["run_id"], header["images"], header["settings"], header["created"])
+        except (IndexError, KeyError, json.JSONDecodeError) as e:
+            raise ValueError(f"체크포인트가 손상되었습니다: {manifest_path}") from e
+
+        for line in lines[1:]:
+            try:
+                event = json.loads(line)
+                image_file = checkpoint.image_files[event["order"]]
+            except (json.JSONDecodeError, KeyError, IndexError):
+                continue  # 기록 중 끊긴 줄
+            if event.get("type") == "state":
+                checkpoint.states[image_file] = event["state"]
+                checkpoint.errors.pop(image_file, None)
+            elif event.get("type") == "error":
+                checkpoint.errors[image_file] = event.get("error", "")
+            elif event.get("type") == "step" and "step" in event:
+                checkpoint.steps.setdefault(image_file, set()).add(event["step"])
+        os.makedirs(os.path.join(directory, PARTIAL_DIRNAME), exist_ok=True)
+        return checkpoint
+
+    # ---------- 상태 기록 ----------
+
+    def mark(self, image_file: str, state: str, df: Optional[pd.DataFrame] = None):
+        """
+        이미지 상태 변경 (워커 스레드에서 호출 가능)
+
+        중간 결과(df)는 상태를 기록하기 전에 먼저 저장하므로, 매니페스트에 기록된 상태의 결과는 항상 남아 있습니다.
+
+        Args:
+            image_file: 이미지 상대 경로
+            state: 새 상태 (STATE_*)
+            df: 단계 결과 (phase1_done: 1차 결과, integration_done: 병합 결과)
+        """
+        if df is not None and state in PARTIAL_STATES:
+            _write_rows(self._partial_path(image_file, state), df)
+        with self._lock:
+            self._append({"type": "state", "order": self.order_of(image_file), "state": state, "time": time.time()})
+            self.states[image_file] = state
+            self.errors.pop(image_file, None)
+
+    def mark_step(self, image_file: str, step: str, df: pd.DataFrame):
+        """
+        1차 생성 단계 1개((테스트 유형, 조각) 호출)의 결과 저장 (워커 스레드에서 호출 가능)
+
+        이미지 상태는 바꾸지 않습니다. 모든 단계가 끝나면 mark(image_file, STATE_PHASE1_DONE, ...)로 기록합니다.
+
+        Args:
+            image_file: 이미지 상대 경로
+            step: 단계 이름 (같은 설정으로 다시 실행하면 같은 이름이어야 함)
+            df: 단계 결과
+        """
+        _write_rows(self._step_path(image_file, step), df)
+        with self._lock:
+            self._append({"type": "step", "order": self.order_of(image_file), "step": step, "time": time.time()})
+            self.steps.setdefault(image_file, set()).add(step)
+
+    def load_step(self, image_file: str, step: str) -> Optional[pd.DataFrame]:
+        """
+        저장된 1차 단계 결과 로드
+
+        Returns:
+            Optional[pd.DataFrame]: 단계가 끝났으면 결과 (0건일 수 있음), 아니면 None
+        """
+        with self._lock:
+            if step not in self.steps.get(image_file, ()):
+                return None
+        path = self._step_path(image_file, step)
+        if not os.path.exists(path):
+            return None
+        return _read_rows(path)
+
+    def record_error(self, image_file: str, error: Exception):
+        """재시도 후에도 실패한 이미지 기록 (상태는 마지막 완료 단계로 유지)"""
+        with self._lock:
+            self._append({"type": "error", "order": self.order_of(image_file), "error": str(error), "time": time.time()})
+            self.errors[image_file] = str(error)
+
+    def load_partial(self, image_file: str, state: str) -> Optional[pd.DataFrame]:
+        """
+        저장된 단계 결과 로드
+
+        Returns:
+            Optional[pd.DataFrame]: 해당 단계까지 끝났으면 결과 (0건일 수 있음), 아니면 None
+        """
+        if image_file not in self.states:
+            return None
+        if STATE_ORDER.index(self.states[image_file]) < STATE_ORDER.index(state):
+            return None
+        path = self._partial_path(image_file, state)
+        if not os.path.exists(path):
+            return None
+        return _read_rows(path)
+
+    # ---------- 진행 현황 ----------
+
+    def remaining_files(self) -> List[str]:
+        """아직 통합 결과에 기록되지 않은 이미지 (원래 순서)"""
+        return [image_file for image_file in self.image_files if self.states[image_file] != STATE_WRITTEN]
+
+    def written_orders(self) -> List[int]:
+        return [self._orders[image_file] for image_file in self.image_files if self.states[image_file] == STATE_WRITTEN]
+
+    def state_counts(self) -> Dict[str, int]:
+        counts = {state: 0 for state in STATE_ORDER}
+        for state in self.states.values():
+            counts[state] = counts.get(state, 0) + 1
+        return counts
+
+    @property
+    def is_complete(self) -> bool:
+        return all(state == STATE_WRITTEN for state in self.states.values())
+
+    def summary(self) -> str:
+        """진행 현황 요약 문자열 (이어하기 목록 표시용)"""
+        counts = self.state_counts()
+        created = time.strftime('%Y-%m-%d %H:%M', time.localtime(self.created))
+        text = f"{created} · {counts[STATE_WRITTEN]}/{len(self.image_files)}개 완료"
+        in_progress = counts[STATE_PHASE1_DONE] + counts[STATE_INTEGRATION_DONE]
+        if in_progress:
+            text += f", 진행 중 {in_progress}개"
+        if self.errors:
+            text += f", 실패 {len(self.errors)}개"
+        return text
+
+    def discard(self):
+        """체크포인트 폴더 삭제"""
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+
+def find_resumable_checkpoints(spool_root: str) -> List[BatchCheckpoint]:
+    """
+    이어서 처리할 수 있는 (미완료) 배치 체크포인트 목록
+
+    Args:
+        spool_root: 배치 스풀 상위 폴더 (입력 폴더/.scenario_batch)
+
+    Returns:
+        List[BatchCheckpoint]: 최근 실행 순
+    """
+    if not os.path.isdir(spool_root):
+        return []
+    checkpoints = []
+    for run_id in os.listdir(spool_root):
+        directory = os.path.join(spool_root, run_id)
+        if not os.path.exists(os.path.join(directory, MANIFEST_FILENAME)):
+            continue
+        try:
+            checkpoint = BatchCheckpoint.load(directory)
+        except (OSError, ValueError):
+            continue
+        if not checkpoint.is_complete:
+            checkpoints.append(checkpoint)
+    return sorted(checkpoints, key=lambda checkpoint: checkpoint.created, reverse=True)
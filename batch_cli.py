@@ -0,0 +1,369 @@
+# ============================================================================
+# Test Scenario Generator 2 - 명령행 배치 실행 (Streamlit 없이 폴더 단위 생성)
+# ============================================================================
+# 배치 탭(tab4)과 같은 처리(이미지별 1차 생성 → 2차 통합 → 병합/중복 제거 → 개별/통합 Excel)를
+# 브라우저 없이 실행합니다. cron/CI에서 무인 실행할 수 있도록 Streamlit을 import하지 않고,
+# 진행 상황은 한 줄에 JSON 하나(JSON Lines)로 표준 출력에 기록하며 결과를 종료 코드로 알립니다.
+#
+#   python batch_cli.py ./screens --types dev,biz --preset 일반청약_성인 --workers 4
+#   python batch_cli.py ./screens --resume                       # 중단된 마지막 배치 이어하기
+#   python batch_cli.py ./screens --replay recorded.json          # 기록된 응답으로 오프라인 실행
+#
+# 종료 코드: 0 전체 성공 / 1 일부 이미지 실패 / 2 인자·설정 오류 / 3 작업 오류 / 130 중단(Ctrl+C, SIGTERM)
+# ============================================================================
+
+import argparse  # 명령행 인자
+import json  # 진행 상황 출력 (JSON Lines)
+import os  # 입력 폴더 확인
+import signal  # SIGTERM → 취소
+import sys  # 표준 출력/종료 코드
+import threading  # 작업 스레드 / 출력 동기화
+import time  # 진행 이벤트 시각 및 경과 시간
+from typing import List, Optional
+
+from api_key_pool import default_api_keys  # 환경 변수 API 키
+from batch_checkpoint import BatchCheckpoint, find_resumable_checkpoints  # 배치 체크포인트 (이어하기)
+from batch_jobs import BatchJob, JOB_CANCELLED, JOB_FAILED, run_batch_job  # 배치 처리 본체 (화면과 공용)
+from dedup_index import MODE_DROP, MODE_FLAG  # 화면 간 중복 처리 방식
+from image_preprocess import DEFAULT_MAX_EDGE  # 업로드 전 이미지 축소 기준
+from near_dedup import DEFAULT_SIMILARITY_THRESHOLD  # 유사 중복 기본 임계값
+from rate_limit import configure_rate_limits  # 키·모델별 호출 속도 제한
+from scenario_core import (
+    DEFAULT_BATCH_WORKERS, MAX_BATCH_WORKERS, PHASE1_TEST_TYPES, BATCH_SPOOL_DIRNAME, CONDITION_PRESETS_FILE,
+    batch_run_directory, build_batch_condition_text, list_batch_images, load_condition_presets, new_batch_run_id,
+    set_model_factory,
+)
+
+# 종료 코드
+EXIT_OK = 0
+EXIT_IMAGES_FAILED = 1  # 배치는 끝났지만 재시도 후에도 실패한 이미지가 있음
+EXIT_USAGE = 2  # 인자/설정 오류 (argparse와 같은 값)
+EXIT_JOB_FAILED = 3  # 배치 작업 자체의 오류 (통합 파일 기록 실패 등)
+EXIT_CANCELLED = 130  # Ctrl+C / SIGTERM으로 중단 (끝난 단계는 체크포인트에 남음)
+
+DEFAULT_MODEL = "models/gemini-2.5-flash"
+
+# --types 이름 → 1차 생성 테스트 유형 ("int"는 2차 현업용 통합테스트)
+TEST_TYPE_NAMES = {"dev": PHASE1_TEST_TYPES[0], "biz": PHASE1_TEST_TYPES[1]}
+INTEGRATION_TYPE_NAME = "int"
+
+CROSS_DEDUP_MODES = {"flag": MODE_FLAG, "drop": MODE_DROP, "off": None}
+
+
+class UsageError(Exception):
+    """명령행 인자/설정 오류 (종료 코드 2)"""
+
+
+# ---------- 진행 상황 출력 ----------
+
+class ProgressPrinter:
+    """
+    작업 이벤트를 표준 출력에 기록 (작업 스레드/메인 스레드에서 호출, 줄 단위로 동기화)
+
+    jsonl: 한 줄에 JSON 하나 (event 필드로 구분: start / message / image / cancel / done, 폴더 감시는 scan / consolidated 추가)
+    text: 사람이 읽는 메시지만 출력
+    """
+
+    def __init__(self, output_format: str = "jsonl", stream=None):
+        self.output_format = output_format
+        self.stream = stream or sys.stdout
+        self._lock = threading.Lock()
+
+    def __call__(self, event: dict):
+        if self.output_format == "jsonl":
+            line = json.dumps(dict(event, time=round(time.time(), 3)), ensure_ascii=False, default=str)
+        elif event["event"] == "message":
+            line = event["text"]
+        elif event["event"] == "image":
+            line = f"[{event['done']}/{event['total']}] {event['image']}: {event['outcome']}"
+        elif event["event"] in ("start", "cancel", "done", "scan", "consolidated"):
+            line = " ".join(f"{key}={value}" for key, value in event.items() if not isinstance(value, (list, dict)))
+        else:
+            return
+        with self._lock:
+            self.stream.write(line + "\n")
+            self.stream.flush()
+
+
+# ---------- 인자 → 배치 설정 ----------
+
+def parse_test_types(value: str):
+    """
+    --types 값 (쉼표로 구분한 dev/biz/int) → (1차 생성 테스트 유형 목록, 2차 통합 실행 여부)
+
+    Raises:
+        UsageError: 알 수 없는 이름이거나 선택된 유형이 없는 경우
+    """
+    names = [name.strip() for name in value.split(",") if name.strip()]
+    unknown = [name for name in names if name not in TEST_TYPE_NAMES and name != INTEGRATION_TYPE_NAME]
+    if unknown:
+        raise UsageError(f"알 수 없는 테스트 유형: {', '.join(unknown)} (dev, biz, int 중에서 선택)")
+    if not names:
+        raise UsageError("테스트 유형을 하나 이상 지정하세요 (dev, biz, int)")
+    phase1_types = [TEST_TYPE_NAMES[name] for name in TEST_TYPE_NAMES if name in names]
+    return phase1_types, INTEGRATION_TYPE_NAME in names
+
+
+def preset_condition_text(preset_name: Optional[str], presets_file: str) -> str:
+    """
+    조건 프리셋 이름 → 2차 생성 조건 텍스트 (이름이 없으면 빈 문자열 = 기본 2차 검수)
+
+    Raises:
+        UsageError: 프리셋 파일에 없는 이름인 경우
+    """
+    if not preset_name:
+        return ""
+    presets = load_condition_presets(presets_file)
+    if preset_name not in presets:
+        available = ", ".join(presets) or "없음"
+        raise UsageError(f"조건 프리셋 '{preset_name}'을(를) 찾을 수 없습니다: {presets_file} (저장된 프리셋: {available})")
+    preset = presets[preset_name]
+    return build_batch_condition_text(
+        preset.get('contractor_age', []), preset.get('contractor_nat', []), preset.get('app_type', []),
+        preset.get('product_main', []), preset.get('product_riders', [])
+    )
+
+
+def build_batch_settings(args: argparse.Namespace) -> dict:
+    """
+    명령행 인자 → 체크포인트에 저장하는 배치 설정 (배치 탭과 같은 구조, API 키 제외)
+
+    Raises:
+        UsageError: 테스트 유형/프리셋 오류
+    """
+    phase1_types, run_integration = parse_test_types(args.types)
+    run_integration = run_integration and not args.no_integration
+    if not phase1_types and not run_integration:
+        raise UsageError("생성할 테스트 유형이 없습니다 (--types가 int뿐인데 --no-integration을 지정함)")
+    image_options = {"max_edge": args.max_edge or None, "output_format": None}
+    return {
+        "worker": {
+            "model_name": args.model,
+            "phase1_types": phase1_types,
+            "run_integration": run_integration,
+            "condition_text": preset_condition_text(args.preset, args.presets_file),
+            "sample_guide_text": "",
+            "save_individual": not args.no_individual,
+            "use_cache": not args.no_cache,
+            "structured": args.structured,
+            "image_options": image_options,
+            "tile_images": args.tile,
+            "similarity_threshold": None if args.exact_dedup else args.similarity,
+        },
+        "save_consolidated": not args.no_consolidated,
+        "cross_dedup_mode": CROSS_DEDUP_MODES[args.cross_dedup],
+        "persist_dedup_index": args.persist_dedup_index,
+    }
+
+
+def prepare_checkpoint(args: argparse.Namespace, batch_settings: Optional[dict]):
+    """
+    처리할 체크포인트와 이미지 목록 결정 (새 배치 또는 --resume)
+
+    Args:
+        args: 명령행 인자
+        batch_settings: 새 배치의 설정 (--resume이면 체크포인트에 저장된 설정을 사용하므로 None)
+
+    Returns:
+        Tuple[BatchCheckpoint, List[str]]: 체크포인트, 이번에 처리할 이미지 (원래 순서)
+
+    Raises:
+        UsageError: 이어할 배치가 없거나 처리할 이미지가 없는 경우
+    """
+    if args.resume:
+        checkpoints = find_resumable_checkpoints(os.path.join(args.input_folder, BATCH_SPOOL_DIRNAME))
+        if not checkpoints:
+            raise UsageError(f"이어서 처리할 배치가 없습니다: {args.input_folder}")
+        checkpoint = checkpoints[0]  # 가장 최근 배치
+        return checkpoint, checkpoint.remaining_files()
+
+    image_files = sorted(list_batch_images(args.input_folder, args.recursive))
+    if not image_files:
+        raise UsageError(f"폴더에 이미지 파일이 없습니다: {args.input_folder}")
+    run_id = new_batch_run_id()
+    checkpoint = BatchCheckpoint.create(
+        batch_run_directory(args.input_folder, run_id), run_id, image_files, batch_settings
+    )
+    return checkpoint, image_files
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        description="폴더의 화면 이미지로 테스트 시나리오를 일괄 생성합니다 (Streamlit 없이 실행).",
+        epilog="종료 코드: 0 전체 성공, 1 일부 이미지 실패, 2 인자/설정 오류, 3 작업 오류, 130 중단",
+    )
+    parser.add_argument("input_folder", help="이미지 폴더 (결과 Excel도 이 폴더에 저장)")
+    add_batch_options(parser)
+    parser.add_argument("--workers", type=int, default=DEFAULT_BATCH_WORKERS,
+                        help=f"동시 처리 이미지 수 (1~{MAX_BATCH_WORKERS}, 기본: {DEFAULT_BATCH_WORKERS})")
+    parser.add_argument("--resume", action="store_true", help="중단된 가장 최근 배치의 남은 이미지만 처리 (저장된 설정 사용)")
+    add_runtime_options(parser)
+    parser.add_argument("--progress", choices=["jsonl", "text"], default="jsonl", help="진행 상황 출력 형식 (기본: jsonl)")
+    return parser
+
+
+def add_batch_options(parser: argparse.ArgumentParser):
+    """배치 설정 인자 (build_batch_settings()가 읽는 값, 작업 큐 제출에서도 사용)"""
+    parser.add_argument("--types", default="dev,biz,int",
+                        help="생성할 테스트 유형 (쉼표 구분: dev=개발자/QA용, biz=현업용 단위, int=현업용 통합, 기본: 전체)")
+    parser.add_argument("--no-integration", action="store_true", help="2차 현업용 통합테스트 생략 (--types에서 int 제외와 같음)")
+    parser.add_argument("--preset", help="2차 생성에 적용할 비즈니스 조건 프리셋 이름")
+    parser.add_argument("--presets-file", default=CONDITION_PRESETS_FILE, help="조건 프리셋 파일 (기본: 앱의 condition_presets.json)")
+    parser.add_argument("--model", default=DEFAULT_MODEL, help=f"Gemini 모델명 (기본: {DEFAULT_MODEL})")
+    parser.add_argument("--recursive", action="store_true", help="하위 폴더의 이미지도 처리")
+    parser.add_argument("--no-individual", action="store_true", help="이미지별 개별 Excel 파일 저장 안 함")
+    parser.add_argument("--no-consolidated", action="store_true", help="통합 Excel 파일 저장 안 함")
+    parser.add_argument("--cross-dedup", choices=list(CROSS_DEDUP_MODES), default="flag",
+                        help="화면 간 중복 케이스 (flag: 중복_원본화면 컬럼에 표시, drop: 통합 파일에서 제거, off: 사용 안 함)")
+    parser.add_argument("--persist-dedup-index", action="store_true", help="화면 간 중복 인덱스를 입력 폴더에 저장해 다음 배치에서도 사용")
+    parser.add_argument("--similarity", type=float, default=DEFAULT_SIMILARITY_THRESHOLD,
+                        help=f"유사 중복 임계값 (기본: {DEFAULT_SIMILARITY_THRESHOLD})")
+    parser.add_argument("--exact-dedup", action="store_true", help="유사 중복 대신 완전히 같은 케이스만 제거")
+    parser.add_argument("--max-edge", type=int, default=DEFAULT_MAX_EDGE, help=f"업로드 전 긴 변 최대 픽셀 (0이면 축소 안 함, 기본: {DEFAULT_MAX_EDGE})")
+    parser.add_argument("--tile", action="store_true", help="긴 이미지를 조각으로 나눠 1차 생성")
+    parser.add_argument("--structured", action="store_true", help="구조화 출력 (JSON 스키마) 모드")
+    parser.add_argument("--no-cache", action="store_true", help="응답 캐시를 사용하지 않고 항상 새로 호출")
+
+
+def add_runtime_options(parser: argparse.ArgumentParser):
+    """실행 환경 인자 (API 키, 속도 제한, 가짜 모델, 체크포인트에 저장하지 않음)"""
+    parser.add_argument("--api-key", help="API 키 (쉼표로 구분하면 여러 키에 분산, 기본: GOOGLE_API_KEYS/GOOGLE_API_KEY 환경 변수)")
+    parser.add_argument("--rpm", type=float, help="API 키·모델별 분당 최대 요청 수")
+    parser.add_argument("--max-concurrency", type=int, help="API 키·모델별 동시 호출 상한")
+    parser.add_argument("--replay", metavar="CHUNKS_JSON", help="기록된 응답 조각 파일을 재생하는 가짜 모델로 실행 (API 호출 없음)")
+
+
+def configure_runtime(args: argparse.Namespace) -> Optional[str]:
+    """
+    API 키 / 가짜 모델 / 속도 제한 설정
+
+    Returns:
+        Optional[str]: API 키 (--replay면 없어도 됨)
+
+    Raises:
+        UsageError: API 키가 없는 경우
+    """
+    api_key = args.api_key or default_api_keys() or None
+    if args.replay:
+        from fake_gemini import RecordedModelFactory, load_chunks  # 오프라인 실행에서만 사용
+        set_model_factory(RecordedModelFactory([load_chunks(args.replay)]))
+    elif not api_key:
+        raise UsageError("API 키가 없습니다. --api-key 또는 환경 변수 GOOGLE_API_KEY를 설정하세요")
+    configure_rate_limits(rpm=args.rpm, max_concurrency=args.max_concurrency)
+    return api_key
+
+
+# ---------- 실행 ----------
+
+def summary_event(job: BatchJob) -> dict:
+    """끝난 작업의 요약 이벤트 (JSON 직렬화 가능한 값만)"""
+    summary = job.summary
+    event = {
+        "event": "done",
+        "status": job.status,
+        "run_id": job.checkpoint.run_id,
+        "succeeded": job.succeeded,
+        "failed_files": list(job.failed_files),
+        "cancelled_files": list(job.cancelled_files),
+        "api_calls": job.call_stats.api_calls,
+        "cache_hits": job.call_stats.cache_hits,
+        "retries": job.call_stats.retries,
+        "throttled": job.call_stats.throttled,
+        "elapsed": round((job.finished_at or time.time()) - (job.started_at or job.submitted_at), 3),
+    }
+    if job.error:
+        event["error"] = job.error
+    if summary:
+        event.update({
+            "rows": summary["row_count"],
+            "written": summary["written"],
+            "total_images": summary["total_images"],
+            "remaining": summary["remaining"],
+            "cross_duplicates": summary["cross_duplicate_total"],
+            "files": [{"split": split_name, "path": path, "rows": row_count}
+                      for split_name, path, row_count in summary["saved_files"]],
+        })
+    return event
+
+
+def exit_code_for(job: BatchJob) -> int:
+    if job.status == JOB_CANCELLED:
+        return EXIT_CANCELLED
+    if job.status == JOB_FAILED:
+        return EXIT_JOB_FAILED
+    return EXIT_IMAGES_FAILED if job.failed_files else EXIT_OK
+
+
+def run(args: argparse.Namespace, printer: ProgressPrinter) -> int:
+    """
+    배치 1회 실행 (작업 스레드에서 처리하고 메인 스레드는 중단 신호만 받음)
+
+    Returns:
+        int: 종료 코드 (EXIT_*)
+
+    Raises:
+        UsageError: 인자/설정 오류
+    """
+    if not os.path.isdir(args.input_folder):
+        raise UsageError(f"폴더를 찾을 수 없습니다: {args.input_folder}")
+    if not 1 <= args.workers <= MAX_BATCH_WORKERS:
+        raise UsageError(f"--workers는 1~{MAX_BATCH_WORKERS} 사이여야 합니다")
+    batch_settings = None if args.resume else build_batch_settings(args)
+    api_key = configure_runtime(args)
+
+    checkpoint, image_files = prepare_checkpoint(args, batch_settings)
+    job = BatchJob(args.input_folder, checkpoint, image_files, args.workers, listener=printer)
+    worker_settings = checkpoint.settings["worker"]
+    printer({
+        "event": "start",
+        "job_id": job.job_id,
+        "run_id": checkpoint.run_id,
+        "checkpoint": checkpoint.directory,
+        "resumed": bool(args.resume),
+        "total": job.total,
+        "model": worker_settings["model_name"],
+        "types": worker_settings["phase1_types"] + (["현업용 통합테스트"] if worker_settings["run_integration"] else []),
+        "workers": job.max_workers,
+    })
+
+    # Ctrl+C / SIGTERM → 취소 요청 (진행 중인 API 호출까지만 마치고 중단, 끝난 단계는 체크포인트에 남음)
+    def request_cancel(*_):
+        if not job.cancel_requested:
+            job.cancel()
+            printer({"event": "cancel", "job_id": job.job_id})
+
+    signal.signal(signal.SIGTERM, request_cancel)
+    # join()이 KeyboardInterrupt로 끊기면 스레드 상태가 잘못 보고될 수 있어 종료 신호는 Event로 받음
+    finished = threading.Event()
+
+    def run_job():
+        try:
+            run_batch_job(job, api_key)
+        finally:
+            finished.set()
+
+    worker = threading.Thread(target=run_job, name=f"batch-{job.job_id}")
+    worker.start()
+    while not finished.is_set():
+        try:
+            finished.wait(timeout=0.5)
+        except KeyboardInterrupt:
+            request_cancel()
+    worker.join()
+
+    printer(summary_event(job))
+    return exit_code_for(job)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    printer = ProgressPrinter(args.progress)
+    try:
+        return run(args, printer)
+    except UsageError as e:
+        print(f"오류: {e}", file=sys.stderr)
+        return EXIT_USAGE
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,415 @@
+# ============================================================================
+# Test Scenario Generator 2 - 백그라운드 배치 작업 (Streamlit 스크립트 실행과 분리)
+# ============================================================================
+# 배치 반복문이 Streamlit 스크립트 안에서 돌면 스크립트가 끝날 때까지 '중단' 버튼을 읽을 수 없고,
+# 탭 이동/위젯 조작으로 스크립트가 다시 실행되면 배치가 끊깁니다.
+#
+# - 배치 1회 = BatchJob 1개. 프로세스 전체에서 공유하는 작업 관리자(BatchJobManager)의 스레드에서 실행
+#   (모듈 변수이므로 rerun/세션과 무관하게 계속 실행, 새로고침한 화면에서도 다시 연결 가능)
+# - 진행 상황(현재 처리 중 이미지, 완료/실패 수, 예상 남은 시간, 이미지별 메시지)은 BatchJob에 기록하고
+#   화면은 주기적으로 snapshot()만 읽어 표시 (작업 스레드는 Streamlit API를 사용하지 않음)
+# - 취소: 새 이미지 제출을 멈추고, 처리 중인 이미지도 다음 API 호출(재시도 대기 포함) 전에 멈춤
+#   → 끝난 단계는 체크포인트에 남아 '이어하기'로 계속 처리
+# ============================================================================
+
+import collections  # 메시지 보관 (최근 N개)
+import os  # 입력 폴더 경로
+import threading  # 작업 상태 동기화 / 취소 신호
+import time  # 경과/예상 시간
+import uuid  # 작업 ID
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Callable, Dict, List, Optional
+
+import pandas as pd
+
+import history_store  # 히스토리 저장소 (SQLite, 연결은 호출마다)
+from batch_checkpoint import BatchCheckpoint, STATE_PHASE1_DONE, STATE_WRITTEN
+from dedup_index import DedupIndex, MODE_FLAG, DEFAULT_INDEX_FILENAME
+from scenario_core import (
+    DEDUP_COLUMNS, BatchCancelled, BatchStepError, CallStats,
+    create_batch_spool, iter_batch_results, process_batch_image, write_consolidated_workbooks,
+)
+
+# 작업 상태
+JOB_QUEUED = "queued"  # 다른 작업이 끝나기를 기다리는 중
+JOB_RUNNING = "running"
+JOB_DONE = "done"
+JOB_CANCELLED = "cancelled"
+JOB_FAILED = "failed"  # 작업 자체의 오류 (이미지별 실패는 JOB_DONE에 포함)
+FINISHED_STATES = (JOB_DONE, JOB_CANCELLED, JOB_FAILED)
+
+MAX_CONCURRENT_JOBS = 2  # 동시에 실행하는 배치 수 (나머지는 대기)
+MAX_FINISHED_JOBS = 20  # 목록에 남겨 둘 끝난 작업 수
+MAX_JOB_MESSAGES = 500  # 작업별로 보관하는 최근 메시지 수
+BATCH_MAX_RETRIES = 3  # 단계별 최대 시도 횟수
+
+# 메시지 종류 (화면에서 같은 이름의 st 함수로 표시)
+MSG_SUCCESS = "success"
+MSG_INFO = "info"
+MSG_WARNING = "warning"
+MSG_ERROR = "error"
+MSG_CAPTION = "caption"
+
+
+class BatchJob:
+    """
+    백그라운드 배치 작업 1개의 진행 상태 (작업 스레드가 기록하고 화면이 읽음)
+
+    summary는 작업이 끝난 뒤 채워지는 최종 요약입니다. (통합 파일, 호출 통계, 실패 목록 등)
+    listener를 주면 메시지/이미지 결과가 생길 때마다 작업 스레드에서 이벤트 dict로 호출합니다.
+    (명령행 실행의 진행 상황 출력용, 화면은 snapshot()을 주기적으로 읽음)
+    """
+
+    def __init__(self, input_folder: str, checkpoint: BatchCheckpoint, image_files: List[str],
+                 max_workers: int, label: str = "", listener: Optional[Callable[[dict], None]] = None):
+        self.job_id = uuid.uuid4().hex[:12]
+        self.input_folder = input_folder
+        self.checkpoint = checkpoint
+        self.image_files = list(image_files)
+        self.max_workers = max_workers
+        self.label = label or checkpoint.run_id
+        self.status = JOB_QUEUED
+        self.submitted_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.done = 0  # 결과를 받은 이미지 수 (성공 + 실패 + 취소)
+        self.succeeded = 0
+        self.failed_files: List[str] = []
+        self.cancelled_files: List[str] = []
+        self.in_progress: List[str] = []  # 처리 중인 이미지 (시작 순서)
+        self.messages = collections.deque(maxlen=MAX_JOB_MESSAGES)  # (종류, 텍스트)
+        self.message_count = 0
+        self.call_stats = CallStats()
+        self.summary: dict = {}
+        self.error = ""
+        self.cancel_event = threading.Event()
+        self.listener = listener
+        self._lock = threading.Lock()
+
+    @property
+    def total(self) -> int:
+        return len(self.image_files)
+
+    @property
+    def is_finished(self) -> bool:
+        return self.status in FINISHED_STATES
+
+    def cancel(self):
+        """취소 요청 (대기 중이면 시작하지 않고, 실행 중이면 다음 API 호출 전에 멈춤)"""
+        self.cancel_event.set()
+
+    @property
+    def cancel_requested(self) -> bool:
+        return self.cancel_event.is_set()
+
+    def log(self, kind: str, text: str):
+        with self._lock:
+            self.messages.append((kind, text))
+            self.message_count += 1
+        self._notify({"event": "message", "kind": kind, "text": text})
+
+    def _notify(self, event: dict):
+        if self.listener is not None:
+            self.listener(dict(event, job_id=self.job_id))
+
+    def _image_result(self, image_file: str, outcome: str, **details):
+        """이미지 1장의 최종 결과 이벤트 (outcome: ok / failed / cancelled)"""
+        self._notify(dict({"event": "image", "image": image_file, "outcome": outcome,
+                           "done": self.done, "total": self.total}, **details))
+
+    def _image_started(self, image_file: str):
+        with self._lock:
+            self.in_progress.append(image_file)
+
+    def _image_finished(self, image_file: str):
+        with self._lock:
+            if image_file in self.in_progress:
+                self.in_progress.remove(image_file)
+            self.done += 1
+
+    def _record_outcome(self, image_file: str, outcome: str, call_stats: Optional[CallStats] = None):
+        """이미지 1장의 결과 집계 (outcome: ok / failed / cancelled, 화면의 snapshot()과 같은 잠금 사용)"""
+        with self._lock:
+            if outcome == "ok":
+                self.succeeded += 1
+            elif outcome == "failed":
+                self.failed_files.append(image_file)
+            else:
+                self.cancelled_files.append(image_file)
+            if call_stats is not None:
+                self.call_stats.merge(call_stats)
+
+    def eta(self) -> Optional[float]:
+        """예상 남은 시간(초, 완료 이미지의 평균 처리 속도 기준, 아직 완료가 없으면 None)"""
+        if self.started_at is None or self.done == 0 or self.is_finished:
+            return None
+        elapsed = time.time() - self.started_at
+        return elapsed / self.done * (self.total - self.done)
+
+    def snapshot(self) -> dict:
+        """화면 표시용 현재 상태 (복사본)"""
+        with self._lock:
+            return {
+                "job_id": self.job_id,
+                "label": self.label,
+                "status": self.status,
+                "total": self.total,
+                "done": self.done,
+                "succeeded": self.succeeded,
+                "failed": len(self.failed_files),
+                "cancelled": len(self.cancelled_files),
+                "in_progress": list(self.in_progress),
+                "eta": self.eta(),
+                "elapsed": (self.finished_at or time.time()) - self.started_at if self.started_at else 0.0,
+                "cancel_requested": self.cancel_requested,
+                "messages": list(self.messages),
+                "message_count": self.message_count,
+                "summary": dict(self.summary),
+                "error": self.error,
+            }
+
+
+class BatchJobManager:
+    """
+    배치 작업 실행기 (프로세스 전체에서 1개, Streamlit 재실행과 무관하게 유지)
+
+    사용 예:
+        job = get_batch_job_manager().submit(BatchJob(input_folder, checkpoint, image_files, max_workers), api_key)
+        ...
+        snapshot = get_batch_job_manager().get(job.job_id).snapshot()
+    """
+
+    def __init__(self, max_concurrent_jobs: int = MAX_CONCURRENT_JOBS):
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrent_jobs, thread_name_prefix="batch-job")
+        self._jobs: Dict[str, BatchJob] = {}
+        self._lock = threading.Lock()
+
+    def submit(self, job: BatchJob, api_key: Optional[str] = None) -> BatchJob:
+        """작업 등록 후 실행 (API 키는 작업 객체에 보관하지 않고 실행 함수에만 전달)"""
+        with self._lock:
+            self._jobs[job.job_id] = job
+            self._prune()
+        self._executor.submit(run_batch_job, job, api_key)
+        return job
+
+    def get(self, job_id: Optional[str]) -> Optional[BatchJob]:
+        with self._lock:
+            return self._jobs.get(job_id) if job_id else None
+
+    def jobs(self) -> List[BatchJob]:
+        """등록된 작업 (최근 순)"""
+        with self._lock:
+            return sorted(self._jobs.values(), key=lambda job: job.submitted_at, reverse=True)
+
+    def active_directories(self) -> set:
+        """실행/대기 중인 작업의 체크포인트 폴더 (이어하기 목록에서 제외용)"""
+        return {job.checkpoint.directory for job in self.jobs() if not job.is_finished}
+
+    def _prune(self):
+        """끝난 작업은 최근 MAX_FINISHED_JOBS개만 유지"""
+        finished = sorted((job for job in self._jobs.values() if job.is_finished), key=lambda job: job.submitted_at)
+        for job in finished[:max(0, len(finished) - MAX_FINISHED_JOBS)]:
+            del self._jobs[job.job_id]
+
+
+_manager: Optional[BatchJobManager] = None
+_manager_lock = threading.Lock()
+
+
+def get_batch_job_manager() -> BatchJobManager:
+    """프로세스 전체에서 공유하는 배치 작업 관리자"""
+    global _manager
+    with _manager_lock:
+        if _manager is None:
+            _manager = BatchJobManager()
+        return _manager
+
+
+# ---------- 작업 실행 (작업 스레드) ----------
+
+def run_batch_job(job: BatchJob, api_key: Optional[str] = None):
+    """작업 스레드 진입점 (예외는 작업 상태로 기록)"""
+    if job.cancel_requested:
+        job.status = JOB_CANCELLED
+        job.finished_at = time.time()
+        job.log(MSG_WARNING, "⏹️ 시작 전에 취소됨")
+        return
+    job.status = JOB_RUNNING
+    job.started_at = time.time()
+    try:
+        _run_batch(job, api_key)
+        job.status = JOB_CANCELLED if job.cancel_requested else JOB_DONE
+    except Exception as e:
+        job.error = str(e)
+        job.log(MSG_ERROR, f"❌ 배치 작업 오류: {e}")
+        job.status = JOB_FAILED
+    finally:
+        job.finished_at = time.time()
+
+
+def _run_batch(job: BatchJob, api_key: Optional[str]):
+    """
+    이미지별 처리 → 화면 간 중복 → 스풀 기록 → 히스토리/체크포인트 → 통합 파일 (Streamlit 비의존)
+
+    설정은 체크포인트에 저장된 것을 그대로 사용합니다. (새 배치/이어하기/실패 재시도 공통)
+    """
+    checkpoint = job.checkpoint
+    input_folder = job.input_folder
+    batch_settings = checkpoint.settings
+    worker_settings = batch_settings["worker"]
+    batch_model_name = worker_settings["model_name"]
+    batch_cross_dedup_mode = batch_settings["cross_dedup_mode"]
+    batch_persist_index = batch_settings["persist_dedup_index"]
+
+    # 전체 결과는 메모리에 모으지 않고 이미지별 조각 파일로 기록 (통합 파일은 마지막에 병합하며 작성)
+    batch_spool = create_batch_spool(input_folder, checkpoint.run_id)
+    written_orders = sorted(checkpoint.written_orders())  # 이전 실행에서 기록 완료된 이미지
+    batch_spool.reload(written_orders)  # 건수/너비만 다시 누적 (결과는 메모리에 올리지 않음)
+    dedup_reports = []  # 이미지별 유사 중복 병합 내역
+
+    # 화면 간 중복 인덱스 (결과 도착 순서대로 누적, 케이스 지문만 보관)
+    cross_dedup_index = None
+    cross_duplicate_total = 0
+    dedup_index_path = os.path.join(input_folder, DEFAULT_INDEX_FILENAME)
+    if batch_cross_dedup_mode is not None:
+        if batch_persist_index:
+            cross_dedup_index = DedupIndex.load(dedup_index_path, DEDUP_COLUMNS)
+        else:
+            cross_dedup_index = DedupIndex(DEDUP_COLUMNS)
+        # 이어하기: 이미 기록된 이미지의 케이스를 먼저 인덱스에 넣어 이후 이미지와 비교 (조각 1개씩 읽음)
+        for order in written_orders:
+            restored_df = batch_spool.read(order)
+            if restored_df is not None:
+                cross_dedup_index.lookup_and_add(restored_df, checkpoint.image_files[order])
+
+    # 이미지 1장 처리 함수 (워커 스레드에서 실행)
+    image_worker = partial(
+        process_batch_image,
+        input_folder,
+        max_retries=BATCH_MAX_RETRIES,
+        checkpoint=checkpoint,
+        api_key=api_key,  # 키는 체크포인트 설정에 저장하지 않고 실행할 때마다 전달
+        cancel_event=job.cancel_event,
+        **worker_settings
+    )
+
+    def batch_worker(image_file: str) -> dict:
+        job._image_started(image_file)
+        return image_worker(image_file)
+
+    # 완료되는 순서대로 결과 수신 (항상 max_workers개 이미지가 처리 중, 취소되면 새 이미지 제출 중단)
+    for _, image_file, result, error in iter_batch_results(
+        job.image_files,
+        batch_worker,
+        max_workers=job.max_workers,
+        should_stop=job.cancel_event.is_set
+    ):
+        job._image_finished(image_file)
+
+        # 취소로 중간에 멈춘 경우 (끝난 단계는 체크포인트에 남음)
+        if isinstance(error, BatchCancelled):
+            job._record_outcome(image_file, "cancelled", error.call_stats)
+            job.log(MSG_CAPTION, f"⏹️ {image_file}: 취소됨 (끝난 단계는 이어하기에서 재사용)")
+            job._image_result(image_file, "cancelled")
+            continue
+
+        # 재시도 후에도 실패한 경우
+        if error is not None:
+            job._record_outcome(image_file, "failed", error.call_stats if isinstance(error, BatchStepError) else None)
+            checkpoint.record_error(image_file, error)
+            job.log(MSG_ERROR, f"❌ {image_file}: 단계별 {BATCH_MAX_RETRIES}회 시도 후 실패 - {error}")
+            job._image_result(image_file, "failed", error=str(error))
+            continue
+
+        merged_df = result['merged_df']
+        image_call_stats = result['call_stats']
+
+        # 화면 간 중복 처리 (통합 파일용, 개별 파일/히스토리는 원본 유지)
+        # 조각 번호는 배치 전체 기준 원래 순서 (이어하기/재시도 때도 정렬 순서 유지)
+        order = checkpoint.order_of(image_file)
+        cross_duplicate_count = 0
+        if cross_dedup_index is not None:
+            consolidated_df, cross_duplicate_count = cross_dedup_index.apply(merged_df, image_file, batch_cross_dedup_mode)
+            cross_duplicate_total += cross_duplicate_count
+            batch_spool.add(order, consolidated_df)
+        else:
+            batch_spool.add(order, merged_df)
+
+        # 히스토리 저장 (작업 스레드에서만 기록)
+        try:
+            history_store.append_entry(batch_model_name, f"[배치] {image_file}", merged_df.to_dict('records'), "Final", "")
+        except Exception as e:
+            job.log(MSG_WARNING, f"⚠️ {image_file}: 히스토리 저장 실패 - {e}")
+        checkpoint.mark(image_file, STATE_WRITTEN)
+        job._record_outcome(image_file, "ok", image_call_stats)
+
+        # 상세 건수 계산
+        cnt_dev = len(merged_df[merged_df['구분'] == '개발단위']) if '구분' in merged_df.columns else 0
+        cnt_biz_unit = len(merged_df[merged_df['구분'] == '현업단위']) if '구분' in merged_df.columns else 0
+        cnt_biz_int = len(merged_df[merged_df['구분'] == '현업통합']) if '구분' in merged_df.columns else 0
+
+        if result['dedup_report'] is not None and len(result['dedup_report']) > 0:
+            dedup_reports.append(result['dedup_report'].assign(파일명=image_file))
+        if result['dedup_before'] > result['dedup_after']:
+            job.log(MSG_INFO, f"📌 {image_file} 중복 제거: {result['dedup_before']} → {result['dedup_after']}개 ({result['dedup_before'] - result['dedup_after']}개 제거)")
+        job.log(MSG_SUCCESS, f"✅ {image_file}: 최종 {len(merged_df)}개 (🔧개발:{cnt_dev}, 📋현업단위:{cnt_biz_unit}, 🔄현업통합:{cnt_biz_int})")
+        if cross_duplicate_count:
+            action = "표시" if batch_cross_dedup_mode == MODE_FLAG else "통합 파일에서 제외"
+            job.log(MSG_CAPTION, f"🔁 다른 화면과 중복 {cross_duplicate_count}개 ({action})")
+        if result['image'] is None:
+            job.log(MSG_CAPTION, "⏯️ 체크포인트에 저장된 병합 결과 사용 (API 호출 없음)")
+        elif result['tile_count'] > 1:
+            job.log(MSG_CAPTION, f"🖼️ {result['image'].summary()} · 🧩 1차 생성 {result['tile_count']}개 조각 분할 분석")
+        else:
+            job.log(MSG_CAPTION, f"🖼️ {result['image'].summary()}")
+        if result['resumed_from'] == STATE_PHASE1_DONE:
+            job.log(MSG_CAPTION, "⏯️ 체크포인트의 1차 결과 사용 (2차부터 진행)")
+        elif result['resumed_steps']:
+            job.log(MSG_CAPTION, f"⏯️ 체크포인트의 1차 단계 결과 {result['resumed_steps']}개 사용 (나머지 단계만 호출)")
+        if image_call_stats.retries:
+            job.log(MSG_CAPTION, f"🔁 실패한 단계만 재시도 {image_call_stats.retries}회 (결과를 쓰지 못한 호출 {image_call_stats.wasted_calls}회)")
+        job._image_result(image_file, "ok", rows=len(merged_df), api_calls=image_call_stats.api_calls,
+                          cache_hits=image_call_stats.cache_hits, retries=image_call_stats.retries,
+                          output_file=result['output_file'])
+
+    summary = {
+        "stopped": job.done < job.total or bool(job.cancelled_files),
+        "unprocessed": job.total - job.done + len(job.cancelled_files),
+        "cross_dedup_mode": batch_cross_dedup_mode,
+        "cross_duplicate_total": cross_duplicate_total,
+        "failed_files": list(job.failed_files),
+        "checkpoint_dir": checkpoint.directory,
+        "dedup_report": pd.concat(dedup_reports, ignore_index=True) if dedup_reports else None,
+    }
+
+    # 화면 간 중복 인덱스 저장 (다음 배치에서 이어서 사용)
+    if cross_dedup_index is not None:
+        if batch_persist_index:
+            try:
+                cross_dedup_index.save(dedup_index_path)
+            except OSError as e:
+                job.log(MSG_WARNING, f"⚠️ 중복 인덱스 저장 실패: {e}")
+        summary["index_entries"] = len(cross_dedup_index)
+        summary["index_kb"] = cross_dedup_index.nbytes / 1024
+
+    # 통합 파일 저장 (조각 병합 → 개발자용/현업용/전체 워크북을 한 번에 스트리밍 기록)
+    # 이어하기로 나머지를 처리하면 같은 파일명으로 전체 결과를 다시 기록
+    saved_files = []
+    if batch_settings["save_consolidated"] and batch_spool.row_count:
+        saved_files = list(write_consolidated_workbooks(batch_spool, input_folder, checkpoint.run_id))
+    summary.update({
+        "saved_files": saved_files,  # (분리 이름, 파일 경로, 행 수)
+        "written": len(checkpoint.written_orders()),
+        "total_images": len(checkpoint.image_files),
+        "row_count": batch_spool.row_count,
+        "count_dev": batch_spool.counts['dev'],
+        "count_biz_unit": batch_spool.counts['biz_unit'],
+        "count_biz_int": batch_spool.counts['biz_int'],
+    })
+
+    # 모든 이미지가 끝났으면 조각/체크포인트 정리, 남은 이미지가 있으면 이어하기용으로 유지
+    summary["remaining"] = len(checkpoint.remaining_files())
+    if checkpoint.is_complete:
+        batch_spool.cleanup()
+    job.summary = summary
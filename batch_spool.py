@@ -0,0 +1,263 @@
+# ============================================================================
+# Test Scenario Generator 2 - 배치 결과 디스크 스풀 (메모리 사용량 일정)
+# ============================================================================
+# 배치 결과를 메모리에 모두 모았다가 마지막에 한 번에 정렬/저장하면 이미지 수에 비례해
+# 메모리가 늘고 마지막 단계가 수 분씩 걸립니다.
+#
+# - 이미지별 결과를 (시나리오ID, 테스트케이스ID) 순으로 정렬해 JSONL 조각(shard) 파일로 즉시 기록
+# - 통합/분리 워크북은 조각들을 k-way 병합(heapq.merge)하면서 ExcelStreamWriter로 한 행씩 기록
+# - 조각이 너무 많으면 중간 병합 파일을 만들어 동시에 여는 파일 수를 제한 (외부 병합 정렬)
+# - 컬럼 목록/너비/분리별 건수는 조각을 쓸 때 누적하므로 병합 전에 이미 알고 있음
+# 정렬 순서는 기존 sort_values(['시나리오ID', '테스트케이스ID'])와 같고 (빈 값은 뒤로),
+# 같은 키끼리는 이미지 순서 → 이미지 내 순서를 유지합니다.
+# ============================================================================
+
+import heapq  # k-way 병합
+import json  # 조각 직렬화
+import os  # 조각 파일 경로
+import re  # 조각 파일명
+import shutil  # 스풀 폴더 정리
+from typing import Callable, Dict, Iterable, Iterator, List, Optional
+
+import numpy as np  # 분리별 컬럼 너비
+import pandas as pd
+
+from excel_export import ExcelStreamWriter, column_width
+
+SORT_COLUMNS = ['시나리오ID', '테스트케이스ID']
+SHARD_SUFFIX = ".jsonl"
+SHARD_NAME_RE = re.compile(r"^(\d{6})\.jsonl$")  # 이미지별 조각 (중간 병합 파일 제외)
+MAX_OPEN_SHARDS = 128  # 한 번에 병합하는 조각 수 (넘으면 중간 병합)
+
+# 분리 이름 -> 행(dict) 포함 여부
+SplitRules = Dict[str, Callable[[dict], bool]]
+
+
+def json_records(df: pd.DataFrame) -> List[dict]:
+    """DataFrame -> JSON으로 저장 가능한 행 목록 (NaN은 None)"""
+    records = df.to_dict('records')
+    for record in records:
+        for col, value in record.items():
+            if isinstance(value, float) and value != value:
+                record[col] = None  # NaN -> 빈 셀
+    return records
+
+
+def _sort_key(record: dict) -> tuple:
+    """정렬 키 (빈 값은 뒤로, 나머지는 문자열 비교)"""
+    key = []
+    for col in SORT_COLUMNS:
+        value = record.get(col)
+        missing = value is None or (isinstance(value, float) and value != value)
+        key.append((missing, "" if missing else str(value)))
+    return tuple(key)
+
+
+def _read_shard(path: str) -> Iterator[tuple]:
+    """조각 파일에서 (정렬 키, 순번, 행) 순서대로 읽기"""
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            entry = json.loads(line)
+            yield _sort_key(entry["row"]), tuple(entry["seq"]), entry["row"]
+
+
+def _write_entries(path: str, entries: Iterator[tuple]):
+    with open(path, "w", encoding="utf-8") as f:
+        for _, seq, row in entries:
+            f.write(json.dumps({"seq": list(seq), "row": row}, ensure_ascii=False))
+            f.write("\n")
+
+
+class ShardSpool:
+    """
+    이미지별 결과를 정렬된 JSONL 조각으로 쌓고, 병합하며 워크북으로 내보내는 스풀
+
+    사용 예:
+        spool = ShardSpool(spool_dir, {"dev": lambda row: row.get('구분') == '개발단위'})
+        for idx, df in results:
+            spool.add(idx, df)
+        spool.write_workbooks({"all": "통합.xlsx", "dev": "개발자용.xlsx"})
+        spool.cleanup()
+
+    분리 이름 "all"은 항상 존재하며 모든 행을 포함합니다.
+    """
+
+    def __init__(self, directory: str, splits: Optional[SplitRules] = None):
+        self.directory = directory
+        self.splits: SplitRules = {"all": lambda row: True}
+        self.splits.update(splits or {})
+        self.columns: List[str] = []  # 등장 순서대로 합친 컬럼 (pd.concat과 동일)
+        self.counts = {name: 0 for name in self.splits}
+        self.widths = {name: {} for name in self.splits}
+        self._shards: Dict[int, str] = {}
+        os.makedirs(directory, exist_ok=True)
+
+    @property
+    def row_count(self) -> int:
+        return self.counts["all"]
+
+    def _shard_path(self, order: int) -> str:
+        return os.path.join(self.directory, f"{order:06d}{SHARD_SUFFIX}")
+
+    def add(self, order: int, df: pd.DataFrame) -> str:
+        """
+        이미지 1장의 결과를 정렬해 조각 파일로 기록
+
+        Args:
+            order: 이미지 순서 (같은 정렬 키끼리의 순서 결정, 같은 값으로 다시 호출하면 덮어씀)
+            df: 이미지 1장의 결과
+
+        Returns:
+            str: 조각 파일 경로
+        """
+        records = json_records(df)
+        self._account(df, records)
+
+        entries = sorted(
+            ((_sort_key(record), (order, position), record) for position, record in enumerate(records)),
+            key=lambda entry: (entry[0], entry[1])
+        )
+        path = self._shard_path(order)
+        temp_path = path + ".tmp"
+        _write_entries(temp_path, iter(entries))
+        os.replace(temp_path, path)
+        self._shards[order] = path
+        return path
+
+    def remove(self, order: int):
+        """
+        이미지 1장의 조각 삭제 (이미지가 삭제된 경우)
+
+        이미 누적된 건수/너비는 줄이지 않으므로, 내보내기 전에 새 스풀로 reload()해서 다시 누적하세요.
+        """
+        self._shards.pop(order, None)
+        path = self._shard_path(order)
+        if os.path.exists(path):
+            os.remove(path)
+
+    def _account(self, df: pd.DataFrame, records: List[dict]):
+        """컬럼 목록/분리별 건수/컬럼 너비 누적"""
+        for col in df.columns:
+            if col not in self.columns:
+                self.columns.append(col)
+
+        # 분리별 건수/컬럼 너비 누적 (너비는 분리별로 따로 계산, estimate_column_widths와 같은 기준)
+        # 셀 문자열 길이는 한 번만 계산하고 분리별로는 마스크 최대값만 구함
+        lengths = np.array(
+            [[len(str(value)) for value in df[col].tolist()] for col in df.columns],
+            dtype=np.int64
+        ).reshape(len(df.columns), len(df)).T
+        for name, rule in self.splits.items():
+            mask = np.fromiter((rule(record) for record in records), dtype=bool, count=len(records))
+            count = int(mask.sum())
+            if count == 0:
+                continue
+            self.counts[name] += count
+            widths = self.widths[name]
+            for col, data_max in zip(df.columns, lengths[mask].max(axis=0).tolist()):
+                width = column_width(max(data_max, len(str(col))))
+                widths[col] = max(width, widths.get(col, 0))
+
+    def _register_existing(self, orders: Optional[Iterable[int]]) -> Iterator[tuple]:
+        """스풀 폴더의 조각을 하나씩 등록하고 건수/너비를 다시 누적하며 (이미지 순서, 결과) 반환"""
+        wanted = None if orders is None else set(orders)
+        for file_name in sorted(os.listdir(self.directory)):
+            match = SHARD_NAME_RE.match(file_name)
+            if not match:
+                continue
+            order = int(match.group(1))
+            if order in self._shards or (wanted is not None and order not in wanted):
+                continue
+            path = os.path.join(self.directory, file_name)
+            records = [row for _, _, row in _read_shard(path)]
+            df = pd.DataFrame(records)
+            self._account(df, records)
+            self._shards[order] = path
+            yield order, df
+
+    def restore(self, orders: Optional[Iterable[int]] = None) -> Dict[int, pd.DataFrame]:
+        """
+        스풀 폴더에 이미 있는 조각을 다시 등록 (중단된 배치 이어하기)
+
+        컬럼 목록/건수/너비를 조각 내용으로 다시 누적합니다.
+
+        Args:
+            orders: 다시 등록할 이미지 순서 (None이면 전부, 나머지 조각은 나중에 add()로 덮어씀)
+
+        Returns:
+            Dict[int, pd.DataFrame]: 이미지 순서 -> 조각에 기록된 결과 (정렬된 순서)
+        """
+        return dict(self._register_existing(orders))
+
+    def reload(self, orders: Optional[Iterable[int]] = None) -> int:
+        """
+        restore()와 같지만 결과를 돌려주지 않음 (조각을 하나씩 읽으므로 메모리에는 조각 1개만 올라감)
+
+        Returns:
+            int: 다시 등록한 조각 수
+        """
+        return sum(1 for _ in self._register_existing(orders))
+
+    def read(self, order: int) -> Optional[pd.DataFrame]:
+        """이미지 1장의 조각을 정렬된 순서로 읽기 (조각이 없으면 None, 건수/너비는 누적하지 않음)"""
+        path = self._shard_path(order)
+        if not os.path.exists(path):
+            return None
+        return pd.DataFrame([row for _, _, row in _read_shard(path)])
+
+    def iter_rows(self) -> Iterator[dict]:
+        """모든 조각을 정렬 순서대로 병합해 한 행씩 반환 (중간 병합 파일은 끝나면 삭제)"""
+        paths = [self._shards[order] for order in sorted(self._shards)]
+        temp_paths = []
+        level = 0
+        while len(paths) > MAX_OPEN_SHARDS:
+            # 조각이 많으면 MAX_OPEN_SHARDS개씩 묶어 중간 병합 (동시에 여는 파일 수 제한)
+            merged_paths = []
+            for start in range(0, len(paths), MAX_OPEN_SHARDS):
+                group = paths[start:start + MAX_OPEN_SHARDS]
+                merged_path = os.path.join(self.directory, f"merge_{level}_{start:06d}{SHARD_SUFFIX}")
+                _write_entries(merged_path, heapq.merge(*(_read_shard(p) for p in group), key=lambda e: (e[0], e[1])))
+                merged_paths.append(merged_path)
+            temp_paths.extend(merged_paths)
+            paths = merged_paths
+            level += 1
+        try:
+            for _, _, row in heapq.merge(*(_read_shard(p) for p in paths), key=lambda e: (e[0], e[1])):
+                yield row
+        finally:
+            for path in temp_paths:
+                if os.path.exists(path):
+                    os.remove(path)
+
+    def write_workbooks(self, outputs: Dict[str, str]) -> Dict[str, int]:
+        """
+        조각을 한 번 병합하면서 분리별 워크북을 동시에 기록
+
+        Args:
+            outputs: 분리 이름 -> 출력 파일 경로 (행이 없는 분리는 만들지 않음)
+
+        Returns:
+            Dict[str, int]: 분리 이름 -> 기록한 행 수
+        """
+        writers = {
+            name: ExcelStreamWriter(self.columns, self.widths[name], path)
+            for name, path in outputs.items() if self.counts.get(name)
+        }
+        if not writers:
+            return {}
+        rules = [(writer, self.splits[name]) for name, writer in writers.items()]
+        for row in self.iter_rows():
+            for writer, rule in rules:
+                if rule(row):
+                    writer.append_record(row)
+        for writer in writers.values():
+            writer.close()
+        return {name: writer.row_count for name, writer in writers.items()}
+
+    def cleanup(self):
+        """스풀 폴더 삭제 (상위 폴더가 비면 함께 삭제)"""
+        shutil.rmtree(self.directory, ignore_errors=True)
+        try:
+            os.rmdir(os.path.dirname(self.directory))
+        except OSError:
+            pass  # 다른 배치의 스풀이 남아 있음
@@ -0,0 +1,239 @@
+# ============================================================================
+# Test Scenario Generator 2 - 배치 전체 중복 인덱스 (화면 간 공통 케이스)
+# ============================================================================
+# 배치의 이미지별 병합은 이미지 안에서만 중복을 제거하므로, 로그인/필수값 확인/공통 버튼 같은
+# 케이스가 통합 최종본에 화면 수만큼 반복됩니다.
+# 이 인덱스는 결과가 도착할 때마다 케이스 지문을 누적해 다른 화면에서 이미 나온 케이스를
+# 표시(flag)하거나 제거(drop)합니다.
+#
+# - 지문: 절차/입력/기대결과를 정규화(near_dedup과 동일)한 문자열의 64비트 BLAKE2b 해시
+#   → 띄어쓰기/문장부호 차이는 같은 케이스로 보되, 숫자의 부호/소수점/자릿수 구분은 유지
+#     ("1.5", "15", "-15" 입력은 서로 다른 케이스라 제거 모드에서도 남음)
+# - 저장: 정렬된 numpy 배열(지문 8바이트 + 원본 화면 번호 4바이트)로 행 복사본 없이 케이스당 약 12바이트
+# - 선택적으로 .npz 파일에 저장해 다음 배치에서 이어서 사용 (같은 화면을 다시 처리하면 자기 자신과는 비교하지 않음)
+#
+# 회귀 확인: python dedup_index.py (경계값 케이스가 제거 모드에서 남는지, 실패하면 종료 코드 1)
+# ============================================================================
+
+import hashlib  # 케이스 지문
+import os  # 인덱스 파일 경로
+import sys  # 회귀 확인 종료 코드
+import tempfile  # 회귀 확인용 인덱스 파일
+import threading  # 워커/메인 스레드 간 동기화
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np  # 지문 배열
+import pandas as pd
+
+from near_dedup import build_dedup_texts  # 비교 문자열 정규화
+
+# 중복 처리 방식
+MODE_FLAG = "flag"  # 원본 화면 컬럼만 채움
+MODE_DROP = "drop"  # 통합 결과에서 제거
+
+CROSS_DUPLICATE_COLUMN = "중복_원본화면"  # 표시 모드에서 추가되는 컬럼
+DEFAULT_INDEX_FILENAME = ".scenario_dedup_index.npz"  # 배치 간 인덱스 파일 (입력 폴더)
+
+PENDING_FLUSH_SIZE = 65536  # 대기 지문이 이만큼 쌓이면 정렬 배열에 합침
+FINGERPRINT_VERSION = 2  # 정규화 규칙이 바뀌면 올림 (저장된 인덱스의 지문과 섞이지 않도록, 2: 숫자 부호/소수점 유지)
+
+
+def case_fingerprints(df: pd.DataFrame, columns: Sequence[str]) -> np.ndarray:
+    """
+    행별 케이스 지문 (정규화한 비교 컬럼의 64비트 해시)
+
+    Returns:
+        np.ndarray: uint64 지문 배열 (행 순서)
+    """
+    columns = [col for col in columns if col in df.columns]
+    if not columns or len(df) == 0:
+        return np.empty(0, dtype=np.uint64)
+    texts = build_dedup_texts(df, columns)
+    digests = b"".join(hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest() for text in texts)
+    return np.frombuffer(digests, dtype=np.uint64).copy()
+
+
+class DedupIndex:
+    """
+    배치 전체(선택 시 여러 배치)에 걸친 케이스 지문 인덱스
+
+    사용 예:
+        index = DedupIndex(DEDUP_COLUMNS)
+        for image_file, merged_df in results:
+            consolidated_df, duplicate_count = index.apply(merged_df, image_file, MODE_FLAG)
+    """
+
+    def __init__(self, columns: Sequence[str]):
+        self.columns = list(columns)
+        self._keys = np.empty(0, dtype=np.uint64)  # 정렬된 지문
+        self._origins = np.empty(0, dtype=np.uint32)  # 지문별 원본 화면 번호 (_keys와 같은 순서)
+        self._pending = {}  # 아직 정렬 배열에 합치지 않은 지문 -> 원본 화면 번호
+        self._sources: List[str] = []  # 원본 화면 번호 -> 이미지 파일명
+        self._source_ids = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._keys) + len(self._pending)
+
+    @property
+    def nbytes(self) -> int:
+        """지문 저장에 쓰는 대략적인 메모리 (바이트, 대기 지문 포함)"""
+        return self._keys.nbytes + self._origins.nbytes + len(self._pending) * 12
+
+    def _source_id(self, source: str) -> int:
+        source_id = self._source_ids.get(source)
+        if source_id is None:
+            source_id = len(self._sources)
+            self._sources.append(source)
+            self._source_ids[source] = source_id
+        return source_id
+
+    def _flush(self):
+        """대기 지문을 정렬 배열에 합침"""
+        if not self._pending:
+            return
+        keys = np.concatenate((self._keys, np.fromiter(self._pending.keys(), dtype=np.uint64, count=len(self._pending))))
+        origins = np.concatenate((self._origins, np.fromiter(self._pending.values(), dtype=np.uint32, count=len(self._pending))))
+        order = np.argsort(keys, kind="stable")
+        self._keys, self._origins = keys[order], origins[order]
+        self._pending = {}
+
+    def _lookup(self, fingerprints: np.ndarray) -> np.ndarray:
+        """지문별 원본 화면 번호 (없으면 -1)"""
+        result = np.full(len(fingerprints), -1, dtype=np.int64)
+        if len(self._keys):
+            positions = np.searchsorted(self._keys, fingerprints)
+            positions[positions == len(self._keys)] = 0
+            found = self._keys[positions] == fingerprints
+            result[found] = self._origins[positions[found]]
+        if self._pending:
+            for i in np.flatnonzero(result < 0).tolist():
+                origin = self._pending.get(int(fingerprints[i]))
+                if origin is not None:
+                    result[i] = origin
+        return result
+
+    def lookup_and_add(self, df: pd.DataFrame, source: str) -> List[Optional[str]]:
+        """
+        행별로 다른 화면에서 이미 나온 케이스인지 확인하고, 처음 나온 케이스는 인덱스에 추가
+
+        같은 화면(source)에서 나온 지문은 중복으로 보지 않습니다. (재처리/이미지 내 중복은 이미지별 병합에서 처리)
+
+        Returns:
+            List[Optional[str]]: 행별 원본 화면 파일명 (다른 화면과 중복이 아니면 None)
+        """
+        fingerprints = case_fingerprints(df, self.columns)
+        with self._lock:
+            source_id = self._source_id(source)
+            origins = self._lookup(fingerprints)
+            result = []
+            for fingerprint, origin in zip(fingerprints.tolist(), origins.tolist()):
+                if origin < 0:
+                    self._pending[fingerprint] = source_id
+                    origins_seen = None
+                elif origin == source_id:
+                    origins_seen = None
+                else:
+                    origins_seen = self._sources[origin]
+                result.append(origins_seen)
+            if len(self._pending) >= PENDING_FLUSH_SIZE:
+                self._flush()
+        return result
+
+    def apply(self, df: pd.DataFrame, source: str, mode: str = MODE_FLAG) -> Tuple[pd.DataFrame, int]:
+        """
+        화면 간 중복 처리 (표시 또는 제거)
+
+        Args:
+            df: 이미지 1장의 병합 결과
+            source: 이미지 파일명 (원본 화면 표시용)
+            mode: MODE_FLAG(중복_원본화면 컬럼 추가) 또는 MODE_DROP(중복 행 제거)
+
+        Returns:
+            Tuple[pd.DataFrame, int]: (처리 결과, 화면 간 중복 건수)
+        """
+        origins = self.lookup_and_add(df, source)
+        duplicate_mask = np.array([origin is not None for origin in origins], dtype=bool)
+        duplicate_count = int(duplicate_mask.sum())
+        if mode == MODE_DROP:
+            return (df[~duplicate_mask] if duplicate_count else df), duplicate_count
+        return df.assign(**{CROSS_DUPLICATE_COLUMN: [origin or "" for origin in origins]}), duplicate_count
+
+    # ---------- 배치 간 유지 ----------
+
+    def save(self, path: str):
+        """인덱스를 .npz 파일로 저장 (임시 파일에 쓴 뒤 교체)"""
+        with self._lock:
+            self._flush()
+            temp_path = path + ".tmp"
+            with open(temp_path, "wb") as f:
+                np.savez(f, keys=self._keys, origins=self._origins,
+                         sources=np.array(self._sources, dtype=object).astype(str),
+                         columns=np.array(self.columns, dtype=str), version=np.array(FINGERPRINT_VERSION))
+            os.replace(temp_path, path)
+
+    @classmethod
+    def load(cls, path: str, columns: Sequence[str]) -> "DedupIndex":
+        """
+        저장된 인덱스 로드 (파일이 없거나 비교 컬럼/지문 버전이 다르면 빈 인덱스)
+        """
+        index = cls(columns)
+        if not os.path.exists(path):
+            return index
+        try:
+            with np.load(path, allow_pickle=False) as data:
+                if data["columns"].tolist() != index.columns:
+                    return index
+                if "version" not in data.files or int(data["version"]) != FINGERPRINT_VERSION:
+                    return index  # 이전 정규화 규칙의 지문 ("-15"와 "15"가 같은 지문)
+                index._keys = data["keys"].astype(np.uint64)
+                index._origins = data["origins"].astype(np.uint32)
+                index._sources = data["sources"].tolist()
+        except (OSError, ValueError, KeyError):
+            return cls(columns)  # 손상된 파일은 무시하고 새로 시작
+        index._source_ids = {source: i for i, source in enumerate(index._sources)}
+        return index
+
+
+# ---------- 회귀 확인 ----------
+
+def check_boundary_values() -> bool:
+    """
+    경계값 회귀 확인: 다른 화면에 "1.5"/"-15" 입력 케이스가 있어도 제거 모드에서 "15"/"1,500" 케이스가 남는지,
+    띄어쓰기/문장부호만 다른 케이스는 제거되는지, 이전 버전 지문으로 저장된 인덱스는 무시하는지
+
+    Returns:
+        bool: 모든 확인이 기대와 같으면 True
+    """
+    columns = ["테스트항목_및_절차", "입력데이터", "기대결과"]
+
+    def cases(inputs: List[str]) -> pd.DataFrame:
+        return pd.DataFrame({"테스트항목_및_절차": "1. 가입금액 필드에 값을 입력한다 2. 저장 버튼을 클릭한다",
+                             "입력데이터": inputs, "기대결과": "입력값 검증 후 오류 메시지가 표시된다"})
+
+    index = DedupIndex(columns)
+    index.apply(cases(["가입금액: 1.5", "가입금액: -15"]), "a.png", MODE_DROP)
+    kept_df, duplicate_count = index.apply(cases(["가입금액: 15", "가입금액: 1,500", "가입금액 : 1.5."]), "b.png", MODE_DROP)
+    checks = [("제거 모드 경계값 보존", kept_df["입력데이터"].tolist(), ["가입금액: 15", "가입금액: 1,500"]),
+              ("제거 모드 중복 건수", duplicate_count, 1)]
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        path = os.path.join(temp_dir, DEFAULT_INDEX_FILENAME)
+        index.save(path)
+        checks.append(("저장 후 로드", len(DedupIndex.load(path, columns)), len(index)))
+        with np.load(path, allow_pickle=False) as data:
+            legacy = {name: data[name] for name in data.files if name != "version"}
+        with open(path, "wb") as f:
+            np.savez(f, **legacy)
+        checks.append(("버전 없는 인덱스 무시", len(DedupIndex.load(path, columns)), 0))
+
+    all_passed = True
+    for description, actual, expected in checks:
+        passed = actual == expected
+        all_passed = all_passed and passed
+        print(f"{'OK  ' if passed else 'FAIL'} {description}: {actual} (기대 {expected})")
+    return all_passed
+
+
+if __name__ == "__main__":
+    sys.exit(0 if check_boundary_values() else 1)
@@ -0,0 +1,176 @@
+# ============================================================================
+# Test Scenario Generator 2 - 대용량 Excel 내보내기 (스트리밍)
+# ============================================================================
+# openpyxl write-only 모드로 행을 순서대로 흘려 쓰는 Excel 작성기입니다.
+# - 셀마다 Alignment 객체를 새로 만들지 않고, 서식을 한 번 적용한 템플릿 셀의 스타일 배열을 복사
+# - 컬럼 너비는 pandas 문자열 연산(벡터화)으로 한 번에 계산
+# - 워크시트 전체를 메모리에 올리지 않으므로 수만 행에서도 메모리 사용량이 일정
+# 결과 서식(헤더 색상/정렬, 본문 줄바꿈/상단 정렬, 컬럼 너비)은 기존 create_excel_file과 동일합니다.
+# ============================================================================
+
+import hashlib  # DataFrame 내용 해시
+from copy import copy  # 템플릿 셀 스타일 복사
+from io import BytesIO  # 메모리 상에서 파일 객체 생성
+from typing import Dict, Iterable, List, Optional, Union
+
+import pandas as pd  # 컬럼 너비 계산
+from openpyxl import Workbook  # Excel 작성
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Alignment, Font, PatternFill
+from openpyxl.utils import get_column_letter
+
+SHEET_NAME = '테스트 시나리오'
+MAX_COLUMN_WIDTH = 50  # 컬럼 너비 상한
+COLUMN_WIDTH_PADDING = 5  # 최대 글자 수에 더하는 여유분
+
+
+def _style_header_cell(cell):
+    """헤더 셀 서식 적용 (굵은 흰색 글씨 + 파란색 배경 + 중앙 정렬)"""
+    cell.font = Font(bold=True, color="FFFFFF")
+    cell.fill = PatternFill(start_color="4472C4", end_color="4472C4", fill_type="solid")
+    cell.alignment = Alignment(horizontal="center", vertical="center")
+
+
+def _style_body_cell(cell):
+    """본문 셀 서식 적용 (자동 줄바꿈 + 상단 정렬)"""
+    cell.alignment = Alignment(wrap_text=True, vertical="top")
+
+
+def column_width(max_length: int) -> int:
+    """최대 글자 수로 컬럼 너비 계산 (여유분 추가, 최대 50)"""
+    return min(int(max_length) + COLUMN_WIDTH_PADDING, MAX_COLUMN_WIDTH)
+
+
+def estimate_column_widths(df: pd.DataFrame) -> Dict[str, int]:
+    """
+    컬럼별 너비 계산 (헤더와 데이터 중 긴 것 기준, 벡터화 연산)
+
+    Returns:
+        Dict[str, int]: 컬럼명 -> 너비
+    """
+    widths = {}
+    for col in df.columns:
+        data_max = df[col].astype(str).str.len().max() if len(df) > 0 else 0
+        if pd.isna(data_max):
+            data_max = 0
+        widths[col] = column_width(max(int(data_max), len(str(col))))
+    return widths
+
+
+def _cell_value(value):
+    """pandas 결측값은 빈 셀로 (to_excel과 동일)"""
+    if value is None:
+        return None
+    try:
+        if pd.isna(value):
+            return None
+    except (TypeError, ValueError):
+        pass
+    return value
+
+
+class ExcelStreamWriter:
+    """
+    행 단위로 흘려 쓰는 Excel 작성기 (write-only 워크북 1시트)
+
+    컬럼 너비는 write-only 모드 특성상 첫 행을 쓰기 전에 정해야 하므로 생성 시 전달받습니다.
+
+    사용 예:
+        writer = ExcelStreamWriter(columns, widths)
+        for row in rows:
+            writer.append(row)
+        data = writer.close()
+    """
+
+    def __init__(self, columns: List[str], column_widths: Optional[Dict[str, int]] = None,
+                 output: Union[str, BytesIO, None] = None):
+        self.columns = list(columns)
+        self.output = output if output is not None else BytesIO()
+        self.row_count = 0
+
+        self._workbook = Workbook(write_only=True)
+        self._sheet = self._workbook.create_sheet(SHEET_NAME)
+
+        # 서식은 템플릿 셀에 한 번만 등록하고 이후 셀은 스타일 배열만 복사
+        header_template = WriteOnlyCell(self._sheet)
+        _style_header_cell(header_template)
+        body_template = WriteOnlyCell(self._sheet)
+        _style_body_cell(body_template)
+        self._header_style = header_template._style
+        self._body_style = body_template._style
+
+        # 컬럼 너비 (26개 초과 컬럼도 지원)
+        column_widths = column_widths or {}
+        for idx, col in enumerate(self.columns):
+            width = column_widths.get(col, column_width(len(str(col))))
+            self._sheet.column_dimensions[get_column_letter(idx + 1)].width = width
+
+        # 헤더 행
+        header_cells = []
+        for col in self.columns:
+            cell = WriteOnlyCell(self._sheet, value=col)
+            cell._style = copy(self._header_style)
+            header_cells.append(cell)
+        self._sheet.append(header_cells)
+
+    def append(self, values: Iterable):
+        """데이터 행 1개 추가 (값 순서 = columns 순서)"""
+        cells = []
+        sheet, body_style = self._sheet, self._body_style
+        for value in values:
+            cell = WriteOnlyCell(sheet, value=_cell_value(value))
+            cell._style = copy(body_style)
+            cells.append(cell)
+        self._sheet.append(cells)
+        self.row_count += 1
+
+    def append_record(self, record: dict):
+        """dict 행 1개 추가 (없는 컬럼은 빈 셀)"""
+        self.append(record.get(col) for col in self.columns)
+
+    def close(self) -> Union[str, BytesIO]:
+        """
+        워크북 저장 후 출력 대상 반환
+
+        Returns:
+            Union[str, BytesIO]: 파일 경로 또는 시작 위치로 되감은 BytesIO
+        """
+        self._workbook.save(self.output)
+        if isinstance(self.output, BytesIO):
+            self.output.seek(0)
+        return self.output
+
+
+def create_excel_file_fast(df: pd.DataFrame) -> BytesIO:
+    """
+    DataFrame을 포맷팅된 Excel 파일로 변환 (스트리밍 고속 모드)
+
+    Args:
+        df: 테스트 시나리오가 담긴 DataFrame
+
+    Returns:
+        BytesIO: 메모리 상의 Excel 파일 객체
+    """
+    writer = ExcelStreamWriter([str(col) for col in df.columns], {str(k): v for k, v in estimate_column_widths(df).items()})
+    for row in df.itertuples(index=False, name=None):
+        writer.append(row)
+    return writer.close()
+
+
+def dataframe_fingerprint(df: pd.DataFrame) -> str:
+    """
+    DataFrame 내용 해시 (컬럼명/순서 + dtype + 모든 셀 값)
+
+    Returns:
+        str: SHA-256 16진 문자열
+    """
+    hasher = hashlib.sha256()
+    hasher.update(repr([str(col) for col in df.columns]).encode("utf-8"))
+    hasher.update(repr([str(dtype) for dtype in df.dtypes]).encode("utf-8"))
+    try:
+        row_hashes = pd.util.hash_pandas_object(df, index=False)
+    except TypeError:
+        # 셀에 list/dict 등 해시 불가 값이 있으면 문자열로 변환 후 해시
+        row_hashes = pd.util.hash_pandas_object(df.astype(str), index=False)
+    hasher.update(row_hashes.to_numpy().tobytes())
+    return hasher.hexdigest()
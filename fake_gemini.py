@@ -0,0 +1,177 @@
+# ============================================================================
+# Test Scenario Generator 2 - 가짜 Gemini 모델 (오프라인 실행 / 동작 확인용)
+# ============================================================================
+# 실제 API 대신 기록해 둔 응답 조각(chunk)을 재생하는 모델입니다.
+# scenario_core.set_model_factory()에 넘기면 모든 Gemini 호출이 이 모델을 사용합니다.
+# 할당량 초과(429)/잘못된 키(403)를 주입해 속도 제한/백오프/키 풀 동작도 오프라인에서 확인할 수 있습니다.
+#
+#   from scenario_core import set_model_factory
+#   from fake_gemini import RecordedModelFactory, load_chunks
+#   set_model_factory(RecordedModelFactory([load_chunks("recorded.json")], chunk_delay=0.05))
+#   set_model_factory(RecordedModelFactory(responses, throttle_limit=10, throttle_window=60))  # 분당 10건 초과 시 429
+# ============================================================================
+
+import json  # 기록 파일 읽기/쓰기
+import random  # 429 무작위 주입
+import threading  # 호출 카운터 동기화
+import time  # 조각 간 지연 재현
+from collections import deque  # 429 판정용 최근 호출 시각
+from typing import Callable, Iterator, List, Optional, Sequence, Union
+
+# 응답 지정 방식: 조각 리스트들 (호출마다 순서대로 반복) 또는 (model_name, system_instruction, contents) -> 텍스트/조각 리스트
+Responses = Union[Sequence[Sequence[str]], Callable[[str, str, object], Union[str, List[str]]]]
+
+
+def split_into_chunks(text: str, chunk_size: int = 200) -> List[str]:
+    """응답 텍스트를 일정 길이 조각으로 분할 (스트리밍 재현용)"""
+    return [text[i:i + chunk_size] for i in range(0, len(text), chunk_size)] or [""]
+
+
+def save_chunks(path: str, chunks: Sequence[str]):
+    """응답 조각 리스트를 JSON 파일로 저장"""
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(list(chunks), f, ensure_ascii=False, indent=2)
+
+
+def load_chunks(path: str) -> List[str]:
+    """JSON 파일에서 응답 조각 리스트 로드"""
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+class FakeRateLimitError(Exception):
+    """할당량 초과 오류 (google.api_core.exceptions.ResourceExhausted처럼 code=429, 메시지 형식 동일)"""
+
+    code = 429
+
+    def __init__(self, retry_after: Optional[float] = None):
+        message = "429 Resource has been exhausted (e.g. check quota)."
+        if retry_after is not None:
+            message += f" Please retry in {retry_after:g}s."
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class FakeAuthError(Exception):
+    """잘못된 API 키 오류 (google.api_core.exceptions.PermissionDenied처럼 code=403)"""
+
+    code = 403
+
+    def __init__(self):
+        super().__init__("403 API key not valid. Please pass a valid API key. [reason: \"API_KEY_INVALID\"]")
+
+
+class FakeChunk:
+    """스트리밍 조각 (genai 응답 조각처럼 .text 제공)"""
+
+    def __init__(self, text: str):
+        self.text = text
+
+
+class FakeResponse:
+    """
+    generate_content() 응답
+
+    stream=False이면 .text로 전체 텍스트를, stream=True이면 반복 시 조각을 지연과 함께 반환합니다.
+    """
+
+    def __init__(self, chunks: List[str], chunk_delay: float = 0.0):
+        self._chunks = chunks
+        self._chunk_delay = chunk_delay
+
+    @property
+    def text(self) -> str:
+        return "".join(self._chunks)
+
+    def __iter__(self) -> Iterator[FakeChunk]:
+        for chunk in self._chunks:
+            if self._chunk_delay:
+                time.sleep(self._chunk_delay)
+            yield FakeChunk(chunk)
+
+
+class FakeModel:
+    """genai.GenerativeModel 대역 (generate_content만 지원)"""
+
+    def __init__(self, factory: "RecordedModelFactory", model_name: str, system_instruction: str = "",
+                 generation_config: Optional[dict] = None, api_key: Optional[str] = None):
+        self._factory = factory
+        self.model_name = model_name
+        self.system_instruction = system_instruction or ""
+        self.generation_config = generation_config
+        self.api_key = api_key
+
+    def generate_content(self, contents, stream: bool = False, **kwargs) -> FakeResponse:
+        self._factory.check_quota(self.api_key)
+        chunks = self._factory.next_chunks(self.model_name, self.system_instruction, contents)
+        if not stream and self._factory.chunk_delay:
+            # 비스트리밍 호출도 전체 생성 시간만큼 대기
+            time.sleep(self._factory.chunk_delay * len(chunks))
+        return FakeResponse(chunks, self._factory.chunk_delay if stream else 0.0)
+
+
+class RecordedModelFactory:
+    """
+    기록된 응답을 재생하는 FakeModel 생성기 (scenario_core.set_model_factory()용)
+
+    Args:
+        responses: 호출마다 순서대로(끝나면 처음부터) 사용할 조각 리스트들,
+            또는 (model_name, system_instruction, contents)를 받아 텍스트/조각 리스트를 반환하는 함수
+        chunk_delay: 조각 사이 지연 시간(초)
+        chunk_size: responses 함수가 텍스트를 반환할 때 나눌 조각 길이
+        throttle_limit: throttle_window초 동안 API 키별로 허용할 호출 수 (넘으면 429, None이면 제한 없음)
+        throttle_window: 호출 수를 세는 구간(초)
+        throttle_rate: 무작위로 429를 돌려줄 비율 (0~1)
+        retry_after: 429에 담을 재시도 대기 시간(초, None이면 생략)
+        seed: 무작위 주입 시드
+        invalid_keys: 항상 인증 오류(403)를 돌려줄 API 키 목록
+    """
+
+    def __init__(self, responses: Responses, chunk_delay: float = 0.0, chunk_size: int = 200,
+                 throttle_limit: Optional[int] = None, throttle_window: float = 60.0,
+                 throttle_rate: float = 0.0, retry_after: Optional[float] = None, seed: Optional[int] = None,
+                 invalid_keys: Sequence[str] = ()):
+        self.responses = responses
+        self.chunk_delay = chunk_delay
+        self.chunk_size = chunk_size
+        self.throttle_limit = throttle_limit
+        self.throttle_window = throttle_window
+        self.throttle_rate = throttle_rate
+        self.retry_after = retry_after
+        self.invalid_keys = set(invalid_keys)
+        self.calls = 0
+        self.throttled = 0  # 돌려준 429 수
+        self.calls_by_key = {}  # API 키 -> 허용한 호출 수
+        self._recent = {}  # API 키 -> 허용한 호출 시각 (throttle_window 이내)
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def __call__(self, model_name: str, system_instruction: str = "", generation_config: Optional[dict] = None,
+                 api_key: Optional[str] = None, **kwargs) -> FakeModel:
+        return FakeModel(self, model_name, system_instruction, generation_config, api_key)
+
+    def check_quota(self, api_key: Optional[str] = None):
+        """인증 오류/429 주입 (키별 구간 내 허용 호출 수 초과 또는 무작위)"""
+        if api_key in self.invalid_keys:
+            raise FakeAuthError()
+        with self._lock:
+            now = time.monotonic()
+            recent = self._recent.setdefault(api_key, deque())
+            while recent and now - recent[0] >= self.throttle_window:
+                recent.popleft()
+            over_limit = self.throttle_limit is not None and len(recent) >= self.throttle_limit
+            if over_limit or (self.throttle_rate and self._random.random() < self.throttle_rate):
+                self.throttled += 1
+                raise FakeRateLimitError(self.retry_after)
+            recent.append(now)
+            self.calls_by_key[api_key] = self.calls_by_key.get(api_key, 0) + 1
+
+    def next_chunks(self, model_name: str, system_instruction: str, contents) -> List[str]:
+        """이번 호출에 재생할 조각 리스트"""
+        with self._lock:
+            call_index = self.calls
+            self.calls += 1
+        if callable(self.responses):
+            result = self.responses(model_name, system_instruction, contents)
+            return split_into_chunks(result, self.chunk_size) if isinstance(result, str) else list(result)
+        return list(self.responses[call_index % len(self.responses)])
@@ -0,0 +1,351 @@
+# ============================================================================
+# Test Scenario Generator 2 - 히스토리 저장소 (SQLite)
+# ============================================================================
+# history.csv 전체를 저장할 때마다 다시 쓰던 방식 대신 표준 라이브러리 sqlite3를 사용합니다.
+# - 저장: INSERT 1건 (O(1) 추가)
+# - 조회: id / Timestamp / Version / ParentID 인덱스
+# - 삭제: DELETE 1건
+# 기존 history.csv가 있으면 최초 연결 시 한 번만 자동으로 옮기고
+# 원본은 history.csv.migrated로 이름을 바꿔 보관합니다.
+#
+# 화면 렌더링용 메타데이터(시나리오 JSON 제외)는 메모리에 캐시하며,
+# 쓰기 버전 카운터 또는 DB 파일 변경(다른 프로세스의 쓰기)이 감지될 때만 다시 읽습니다.
+# 시나리오 JSON은 필요한 항목만 ID로 지연 로딩합니다.
+#
+# 수동 마이그레이션: python history_store.py [CSV 경로] [DB 경로]
+# ============================================================================
+
+import json  # 시나리오 직렬화
+import os  # 파일 경로 및 디렉토리 작업
+import sqlite3  # 히스토리 저장소
+import sys  # 수동 마이그레이션 명령행 인자
+import threading  # 스키마 초기화 동기화
+from datetime import datetime  # 날짜/시간 처리
+from functools import lru_cache  # 시나리오 지연 로딩 캐시
+from typing import List, Optional
+
+import pandas as pd  # 조회 결과를 DataFrame으로 반환
+
+# ---------- 기본 설정 ----------
+_BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_DB_PATH = os.path.join(_BASE_DIR, "history.db")
+LEGACY_CSV_PATH = os.path.join(_BASE_DIR, "history.csv")
+
+# UI에서 사용하는 컬럼 (ID는 삭제/지연 로딩용 내부 식별자)
+HISTORY_COLUMNS = ['ID', 'Timestamp', 'Model', 'ImageName', 'ScenarioCount', 'Scenarios', 'Version', 'ParentID']
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS history (
+    id             INTEGER PRIMARY KEY AUTOINCREMENT,
+    timestamp      TEXT NOT NULL,
+    model          TEXT NOT NULL DEFAULT '',
+    image_name     TEXT NOT NULL DEFAULT '',
+    scenario_count INTEGER NOT NULL DEFAULT 0,
+    scenarios      TEXT NOT NULL DEFAULT '[]',
+    version        TEXT NOT NULL DEFAULT 'v1',
+    parent_id      TEXT NOT NULL DEFAULT ''
+);
+CREATE INDEX IF NOT EXISTS idx_history_timestamp ON history(timestamp);
+CREATE INDEX IF NOT EXISTS idx_history_version ON history(version);
+CREATE INDEX IF NOT EXISTS idx_history_parent_id ON history(parent_id);
+"""
+
+# 메타데이터 컬럼 (시나리오 JSON 제외)
+HISTORY_META_COLUMNS = ['ID', 'Timestamp', 'Model', 'ImageName', 'ScenarioCount', 'Version', 'ParentID']
+
+# DataFrame 컬럼 ↔ 테이블 컬럼 매핑 (SELECT 순서 = HISTORY_COLUMNS 순서)
+_SELECT_COLUMNS = (
+    "id AS ID, timestamp AS Timestamp, model AS Model, image_name AS ImageName, "
+    "scenario_count AS ScenarioCount, scenarios AS Scenarios, version AS Version, parent_id AS ParentID"
+)
+
+_META_SELECT_COLUMNS = (
+    "id AS ID, timestamp AS Timestamp, model AS Model, image_name AS ImageName, "
+    "scenario_count AS ScenarioCount, version AS Version, parent_id AS ParentID"
+)
+
+_initialized_paths = set()
+_init_lock = threading.Lock()
+
+# 메타데이터 캐시 (모듈 변수이므로 Streamlit rerun 간에도 유지)
+_write_version = 0  # 이 프로세스에서 쓰기가 일어날 때마다 증가
+_meta_cache = {}  # db_path -> (캐시 키, 메타데이터 DataFrame)
+_meta_lock = threading.Lock()
+
+
+def get_history_db_path() -> str:
+    """
+    히스토리 DB 파일 경로 반환
+
+    Returns:
+        str: history.db 파일의 절대 경로 (환경변수 HISTORY_DB_PATH로 변경 가능)
+    """
+    return os.environ.get("HISTORY_DB_PATH", DEFAULT_DB_PATH)
+
+
+def _mark_written():
+    """쓰기 후 호출하여 메타데이터 캐시 무효화"""
+    global _write_version
+    with _meta_lock:
+        _write_version += 1
+
+
+def _file_signature(db_path: str) -> tuple:
+    """DB 파일(+WAL)의 mtime/크기 (다른 프로세스의 쓰기 감지용)"""
+    signature = []
+    for path in (db_path, db_path + "-wal"):
+        try:
+            stat = os.stat(path)
+            signature.append((stat.st_mtime_ns, stat.st_size))
+        except OSError:
+            signature.append(None)
+    return tuple(signature)
+
+
+def connect(db_path: Optional[str] = None) -> sqlite3.Connection:
+    """
+    히스토리 DB 연결 (최초 연결 시 스키마 생성 및 기존 CSV 마이그레이션)
+
+    호출마다 새 연결을 반환하므로 배치 워커 등 여러 스레드에서 사용해도 안전합니다.
+    """
+    db_path = db_path or get_history_db_path()
+    conn = sqlite3.connect(db_path, timeout=30)
+    with _init_lock:
+        if db_path not in _initialized_paths:
+            conn.execute("PRAGMA journal_mode=WAL")  # 읽기와 쓰기가 서로 막지 않도록
+            conn.executescript(_SCHEMA)
+            if db_path == DEFAULT_DB_PATH and os.path.exists(LEGACY_CSV_PATH):
+                migrate_csv_to_sqlite(LEGACY_CSV_PATH, conn=conn)
+            _initialized_paths.add(db_path)
+    return conn
+
+
+def migrate_csv_to_sqlite(csv_path: str = LEGACY_CSV_PATH, db_path: Optional[str] = None,
+                          conn: Optional[sqlite3.Connection] = None) -> int:
+    """
+    기존 history.csv를 SQLite로 1회 이전
+
+    CSV는 최신 항목이 위에 있으므로 역순으로 넣어 id 순서 = 생성 순서가 되도록 합니다.
+    이전이 끝나면 CSV를 `<csv_path>.migrated`로 이름을 바꿔 다시 이전되지 않게 합니다.
+
+    CSV 확인/INSERT/이름 변경을 한 BEGIN IMMEDIATE 트랜잭션 안에서 하므로, 여러 프로세스(배치 워커,
+    CLI, 폴더 감시)가 처음 연결하면서 동시에 이전을 시도해도 한 프로세스만 옮기고 나머지는 0건을 반환합니다.
+
+    Returns:
+        int: 이전된 항목 수
+    """
+    # 연결을 먼저 열어 둠 (기본 경로라면 여기서 자동 이전이 먼저 끝날 수 있음)
+    own_conn = conn is None
+    if own_conn:
+        conn = connect(db_path)
+    try:
+        if not os.path.exists(csv_path):
+            return 0
+        conn.execute("BEGIN IMMEDIATE")  # 다른 프로세스의 이전과 순서대로 실행
+        try:
+            # 잠금을 얻은 뒤 다시 확인 (먼저 잠금을 얻은 프로세스가 이미 옮겼으면 CSV가 없음)
+            if not os.path.exists(csv_path):
+                conn.rollback()
+                return 0
+
+            df = pd.read_csv(csv_path, encoding='utf-8-sig', dtype=str, keep_default_na=False)
+            rows = []
+            for _, row in df.iloc[::-1].iterrows():
+                try:
+                    scenario_count = int(float(row.get('ScenarioCount', 0) or 0))
+                except ValueError:
+                    scenario_count = 0
+                rows.append((
+                    row.get('Timestamp', ''),
+                    row.get('Model', ''),
+                    row.get('ImageName', ''),
+                    scenario_count,
+                    row.get('Scenarios', '') or '[]',
+                    row.get('Version', '') or 'v1',  # Version 컬럼이 없던 기존 데이터 호환
+                    row.get('ParentID', ''),
+                ))
+            conn.executemany(
+                "INSERT INTO history (timestamp, model, image_name, scenario_count, scenarios, version, parent_id) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                rows
+            )
+
+            # 커밋 전에 이름을 바꿔야 잠금을 기다리던 프로세스가 같은 CSV를 다시 옮기지 않음
+            try:
+                os.replace(csv_path, csv_path + ".migrated")
+            except FileNotFoundError:
+                pass  # 잠금 없이 옮긴 경우 (이전 버전 프로세스 등)
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+    finally:
+        if own_conn:
+            conn.close()
+
+    _mark_written()
+    return len(rows)
+
+
+def append_entry(model_name: str, image_name: str, scenarios: List[dict], version: str = "v1",
+                 parent_id: str = "", db_path: Optional[str] = None) -> int:
+    """
+    히스토리 항목 1건 추가
+
+    Returns:
+        int: 새 항목의 ID
+    """
+    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    scenarios_json = json.dumps(scenarios, ensure_ascii=False, default=str)
+    conn = connect(db_path)
+    try:
+        with conn:
+            cursor = conn.execute(
+                "INSERT INTO history (timestamp, model, image_name, scenario_count, scenarios, version, parent_id) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (timestamp, model_name, image_name, len(scenarios), scenarios_json, version, parent_id or "")
+            )
+        _mark_written()
+        return cursor.lastrowid
+    finally:
+        conn.close()
+
+
+def load_entries(db_path: Optional[str] = None) -> pd.DataFrame:
+    """
+    전체 히스토리를 최신 항목이 위로 오도록 DataFrame으로 반환
+
+    Returns:
+        pd.DataFrame: HISTORY_COLUMNS 컬럼의 히스토리 (0부터 시작하는 위치 인덱스)
+    """
+    conn = connect(db_path)
+    try:
+        return pd.read_sql_query(f"SELECT {_SELECT_COLUMNS} FROM history ORDER BY id DESC", conn)
+    finally:
+        conn.close()
+
+
+def load_metadata(db_path: Optional[str] = None) -> pd.DataFrame:
+    """
+    시나리오 JSON을 제외한 히스토리 메타데이터를 최신순으로 반환 (캐시 사용)
+
+    쓰기가 없으면 DB를 다시 읽지 않으므로 사이드바/탭에서 여러 번 호출해도 비용이 거의 없습니다.
+
+    Returns:
+        pd.DataFrame: HISTORY_META_COLUMNS 컬럼의 메타데이터 (복사본)
+    """
+    db_path = db_path or get_history_db_path()
+    conn = connect(db_path)  # 최초 호출 시 스키마 생성/마이그레이션 보장
+    try:
+        with _meta_lock:
+            cache_key = (_write_version, _file_signature(db_path))
+            cached = _meta_cache.get(db_path)
+            if cached is not None and cached[0] == cache_key:
+                return cached[1].copy()
+        meta_df = pd.read_sql_query(f"SELECT {_META_SELECT_COLUMNS} FROM history ORDER BY id DESC", conn)
+    finally:
+        conn.close()
+    with _meta_lock:
+        _meta_cache[db_path] = (cache_key, meta_df)
+    return meta_df.copy()
+
+
+@lru_cache(maxsize=64)
+def _load_scenarios_cached(db_path: str, entry_id: int) -> str:
+    conn = connect(db_path)
+    try:
+        row = conn.execute("SELECT scenarios FROM history WHERE id = ?", (entry_id,)).fetchone()
+    finally:
+        conn.close()
+    if row is None:
+        raise KeyError(f"히스토리 항목을 찾을 수 없습니다: ID {entry_id}")
+    return row[0]
+
+
+def load_scenarios(entry_id: int, db_path: Optional[str] = None) -> List[dict]:
+    """
+    히스토리 항목 1건의 시나리오 목록을 지연 로딩
+
+    항목 내용은 저장 후 바뀌지 않으므로 최근 조회한 항목의 JSON은 메모리에 캐시합니다.
+
+    Returns:
+        List[dict]: 시나리오 목록
+    """
+    return json.loads(_load_scenarios_cached(db_path or get_history_db_path(), int(entry_id)))
+
+
+def find_entries(timestamp: Optional[str] = None, version: Optional[str] = None,
+                 parent_id: Optional[str] = None, db_path: Optional[str] = None) -> pd.DataFrame:
+    """
+    Timestamp / Version / ParentID 조건으로 인덱스를 사용해 히스토리 조회 (최신순)
+    """
+    conditions, params = [], []
+    if timestamp is not None:
+        conditions.append("timestamp = ?")
+        params.append(timestamp)
+    if version is not None:
+        conditions.append("version = ?")
+        params.append(version)
+    if parent_id is not None:
+        conditions.append("parent_id = ?")
+        params.append(parent_id)
+    where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+    conn = connect(db_path)
+    try:
+        return pd.read_sql_query(f"SELECT {_SELECT_COLUMNS} FROM history{where} ORDER BY id DESC", conn, params=params)
+    finally:
+        conn.close()
+
+
+def get_entry(entry_id: int, db_path: Optional[str] = None) -> Optional[dict]:
+    """
+    ID로 히스토리 항목 1건 조회
+
+    Returns:
+        Optional[dict]: HISTORY_COLUMNS 키를 가진 항목 (없으면 None)
+    """
+    conn = connect(db_path)
+    try:
+        row = conn.execute(f"SELECT {_SELECT_COLUMNS} FROM history WHERE id = ?", (int(entry_id),)).fetchone()
+    finally:
+        conn.close()
+    return dict(zip(HISTORY_COLUMNS, row)) if row else None
+
+
+def get_entry_id_at(position: int, db_path: Optional[str] = None) -> Optional[int]:
+    """
+    최신순 목록에서 position번째 항목의 ID 반환 (기존 위치 인덱스 기반 삭제 호환용)
+    """
+    if position < 0:
+        return None
+    conn = connect(db_path)
+    try:
+        row = conn.execute("SELECT id FROM history ORDER BY id DESC LIMIT 1 OFFSET ?", (int(position),)).fetchone()
+    finally:
+        conn.close()
+    return row[0] if row else None
+
+
+def delete_entry(entry_id: int, db_path: Optional[str] = None) -> bool:
+    """
+    ID로 히스토리 항목 1건 삭제
+
+    Returns:
+        bool: 삭제 여부
+    """
+    conn = connect(db_path)
+    try:
+        with conn:
+            cursor = conn.execute("DELETE FROM history WHERE id = ?", (int(entry_id),))
+        _mark_written()
+        return cursor.rowcount > 0
+    finally:
+        conn.close()
+
+
+# ---------- 수동 마이그레이션 진입점 ----------
+if __name__ == "__main__":
+    source_csv = sys.argv[1] if len(sys.argv) > 1 else LEGACY_CSV_PATH
+    target_db = sys.argv[2] if len(sys.argv) > 2 else None
+    migrated = migrate_csv_to_sqlite(source_csv, db_path=target_db)
+    print(f"{migrated}개 항목을 {target_db or get_history_db_path()}로 이전했습니다.")
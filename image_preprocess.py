@@ -0,0 +1,386 @@
+# ============================================================================
+# Test Scenario Generator 2 - 이미지 전처리 (업로드 전 축소 / 재인코딩)
+# ============================================================================
+# 화면 설계서 내보내기 이미지는 4K 이상 PNG(6~15MB)인 경우가 많아 업로드 시간과
+# 입력 토큰(768px 타일 단위 과금)만 늘리고 글자 판독에는 도움이 되지 않습니다.
+#
+# - 실제 포맷 감지 (확장자가 아닌 파일 내용 기준, image/jpg 같은 잘못된 MIME 방지)
+# - 긴 변이 max_edge를 넘으면 비율 유지 축소 (LANCZOS, 글자 가독성 유지)
+# - 선택 시 JPEG/WEBP로 재인코딩, Gemini 미지원 포맷(GIF/BMP 등)은 PNG로 변환
+# - 처리 결과는 (원본 내용 해시 + 옵션) 기준으로 메모리에 캐시
+# - 세로(가로)로 긴 합성 이미지는 겹치는 조각(tile)으로 분할 (원본 해상도에서 잘라 작은 글자 보존)
+# - 이미지별 절감 바이트 / 예상 업로드 시간 / 예상 입력 토큰 보고
+# ============================================================================
+
+import hashlib  # 캐시 키 (원본 내용 해시)
+import math  # 타일 수 계산
+import sys  # 회귀 확인 종료 코드
+import threading  # 배치 워커 스레드 간 캐시 동기화
+import time  # 전처리 소요 시간 측정
+from collections import OrderedDict  # LRU 순서 관리
+from dataclasses import dataclass
+from io import BytesIO
+from typing import List, Optional
+
+from PIL import Image  # 이미지 처리
+
+# ---------- 기본 설정 ----------
+DEFAULT_MAX_EDGE = 2048  # 긴 변 최대 픽셀 (화면 설계서 글자 판독에 충분한 크기)
+MIN_MAX_EDGE = 768
+MAX_MAX_EDGE = 4096
+DEFAULT_JPEG_QUALITY = 90  # 글자 주변 번짐을 줄이기 위해 높게 유지
+# PNG 압축 수준: optimize/기본(6)은 2K 이미지에서 1~2초 걸려 업로드 절감분을 대부분 잠식하므로
+# 용량이 10% 남짓 크더라도 인코딩이 몇 배 빠른 낮은 수준 사용
+PNG_COMPRESS_LEVEL = 3
+
+# 재인코딩 포맷 선택지 (None = 원본 포맷 유지)
+OUTPUT_FORMATS = (None, "JPEG", "WEBP", "PNG")
+
+# 업로드 시간 추정용 대역폭 (바이트/초, 약 20Mbps)
+ASSUMED_UPLOAD_BYTES_PER_SEC = 2.5 * 1024 * 1024
+
+# Gemini가 받는 이미지 포맷 -> MIME 타입
+SUPPORTED_MIME_TYPES = {
+    "PNG": "image/png",
+    "JPEG": "image/jpeg",
+    "WEBP": "image/webp",
+}
+
+# 분할(tile) 설정
+TILE_MIN_ASPECT = 2.0  # 긴 변 / 짧은 변 비율이 이 값을 넘으면 분할
+TILE_ASPECT = 1.4  # 조각의 긴 변 길이 = 짧은 변 × 이 값
+TILE_OVERLAP = 0.15  # 인접 조각 겹침 비율 (경계에 걸친 항목/표 행이 잘리지 않도록)
+MAX_TILES = 8  # 조각 수 상한 (넘으면 조각을 길게)
+
+# 처리 결과 캐시 한도
+CACHE_MAX_ENTRIES = 64
+CACHE_MAX_BYTES = 200 * 1024 * 1024  # 200MB
+
+
+@dataclass
+class PreparedImage:
+    """전처리된 이미지와 절감 통계"""
+    data: bytes
+    mime_type: str
+    original_bytes: int
+    original_size: tuple  # (너비, 높이)
+    size: tuple  # (너비, 높이)
+    elapsed: float  # 전처리 소요 시간(초, 캐시 적중 시 0)
+    from_cache: bool = False
+    tile_index: int = 0  # 분할 조각 순번 (0부터)
+    tile_count: int = 1  # 전체 조각 수 (1이면 분할하지 않은 전체 이미지)
+    box: Optional[tuple] = None  # 원본 기준 조각 영역 (left, top, right, bottom)
+    vertical: bool = True  # 분할 방향 (True: 위→아래, False: 왼쪽→오른쪽)
+
+    @property
+    def bytes_saved(self) -> int:
+        return self.original_bytes - len(self.data)
+
+    @property
+    def upload_seconds_saved(self) -> float:
+        """예상 업로드 단축 시간(초) - Base64 인코딩(4/3배) 기준, 전처리 시간 차감"""
+        return self.bytes_saved * 4 / 3 / ASSUMED_UPLOAD_BYTES_PER_SEC - self.elapsed
+
+    @property
+    def tokens_saved(self) -> int:
+        """예상 입력 토큰 절감량"""
+        return estimate_image_tokens(*self.original_size) - estimate_image_tokens(*self.size)
+
+    def summary(self) -> str:
+        """한 줄 요약 (예: 8.2MB → 1.1MB (-86%), 3840×2160 → 2048×1152, 업로드 -2.9초, 토큰 -2322)"""
+        if self.bytes_saved == 0 and self.size == self.original_size:
+            return f"{_format_bytes(self.original_bytes)}, {self.size[0]}×{self.size[1]} 원본 그대로 전송"
+        change = (-self.bytes_saved / self.original_bytes * 100) if self.original_bytes else 0
+        parts = [f"{_format_bytes(self.original_bytes)} → {_format_bytes(len(self.data))} ({change:+.0f}%)"]
+        if self.size != self.original_size:
+            parts.append(f"{self.original_size[0]}×{self.original_size[1]} → {self.size[0]}×{self.size[1]}")
+        parts.append(f"업로드 {-self.upload_seconds_saved:+.1f}초")
+        if self.tokens_saved:
+            parts.append(f"토큰 -{self.tokens_saved}")
+        return ", ".join(parts)
+
+
+def _format_bytes(num_bytes: int) -> str:
+    if num_bytes >= 1024 * 1024:
+        return f"{num_bytes / (1024 * 1024):.1f}MB"
+    return f"{num_bytes / 1024:.0f}KB"
+
+
+def estimate_image_tokens(width: int, height: int) -> int:
+    """
+    Gemini 이미지 입력 토큰 추정
+
+    양 변이 384px 이하면 258토큰, 그보다 크면 768×768 타일마다 258토큰입니다.
+    """
+    if width <= 384 and height <= 384:
+        return 258
+    return math.ceil(width / 768) * math.ceil(height / 768) * 258
+
+
+def detect_mime_type(data: bytes) -> Optional[str]:
+    """
+    이미지 내용으로 MIME 타입 감지
+
+    Returns:
+        Optional[str]: Gemini 지원 포맷이면 MIME 타입, 미지원 포맷이면 None
+    """
+    with Image.open(BytesIO(data)) as image:
+        return SUPPORTED_MIME_TYPES.get(image.format)
+
+
+# ---------- 처리 결과 캐시 ----------
+_cache = OrderedDict()  # 키 -> PreparedImage 또는 조각 튜플
+_cache_bytes = 0
+_cache_lock = threading.Lock()
+
+
+def _entry_bytes(entry) -> int:
+    if isinstance(entry, tuple):
+        return sum(len(tile.data) for tile in entry)
+    return len(entry.data)
+
+
+def _cache_get(key: str):
+    with _cache_lock:
+        prepared = _cache.get(key)
+        if prepared is not None:
+            _cache.move_to_end(key)
+        return prepared
+
+
+def _cache_put(key: str, prepared):
+    global _cache_bytes
+    with _cache_lock:
+        if key in _cache:
+            return
+        _cache[key] = prepared
+        _cache_bytes += _entry_bytes(prepared)
+        while len(_cache) > 1 and (len(_cache) > CACHE_MAX_ENTRIES or _cache_bytes > CACHE_MAX_BYTES):
+            _, old = _cache.popitem(last=False)
+            _cache_bytes -= _entry_bytes(old)
+
+
+def _resize(image: Image.Image, max_edge: Optional[int]) -> Image.Image:
+    """긴 변이 max_edge를 넘으면 비율 유지 축소 (넘지 않으면 그대로 반환)"""
+    if max_edge is None or max(image.size) <= max_edge:
+        return image
+    if image.mode in ("P", "1"):
+        # 팔레트/흑백 이미지는 LANCZOS 보간을 위해 변환 후 축소
+        image = image.convert("RGBA" if image.mode == "P" else "L")
+    scale = max_edge / max(image.size)
+    size = (max(1, round(image.size[0] * scale)), max(1, round(image.size[1] * scale)))
+    return image.resize(size, Image.LANCZOS)
+
+
+def _encode(image: Image.Image, image_format: str, quality: int) -> bytes:
+    """지정 포맷으로 인코딩"""
+    output = BytesIO()
+    if image_format == "JPEG":
+        if image.mode in ("RGBA", "LA", "P"):
+            # 투명 배경은 흰색으로 합성 (JPEG는 알파 채널 미지원)
+            rgba = image.convert("RGBA")
+            background = Image.new("RGB", rgba.size, (255, 255, 255))
+            background.paste(rgba, mask=rgba.getchannel("A"))
+            image = background
+        elif image.mode != "RGB":
+            image = image.convert("RGB")
+        image.save(output, format="JPEG", quality=quality, optimize=True)
+    elif image_format == "WEBP":
+        image.save(output, format="WEBP", quality=quality, method=4)
+    else:
+        if image.mode not in ("RGB", "RGBA", "L", "LA", "P"):
+            image = image.convert("RGBA")
+        image.save(output, format="PNG", compress_level=PNG_COMPRESS_LEVEL)
+    return output.getvalue()
+
+
+def prepare_image(data: bytes, max_edge: Optional[int] = DEFAULT_MAX_EDGE, output_format: Optional[str] = None,
+                  quality: int = DEFAULT_JPEG_QUALITY) -> PreparedImage:
+    """
+    업로드 전 이미지 전처리 (포맷 감지 → 축소 → 재인코딩)
+
+    축소도 포맷 변환도 필요 없으면 원본 바이트를 그대로 사용하고,
+    포맷 변환만 한 결과가 원본보다 크면 원본을 유지합니다.
+    축소한 결과가 원본보다 크면 max_edge를 지키기 위해 원본 대신 다른 포맷까지 인코딩해 가장 작은 결과를 씁니다.
+
+    Args:
+        data: 원본 이미지 바이트
+        max_edge: 긴 변 최대 픽셀 (None이면 축소하지 않음)
+        output_format: 재인코딩 포맷 ("JPEG", "WEBP", "PNG", None=원본 포맷 유지)
+        quality: JPEG/WEBP 품질
+
+    Returns:
+        PreparedImage: 전처리된 이미지 바이트, MIME 타입, 절감 통계
+    """
+    key = hashlib.sha256(data).hexdigest() + f":{max_edge}:{output_format}:{quality}"
+    cached = _cache_get(key)
+    if cached is not None:
+        return PreparedImage(cached.data, cached.mime_type, cached.original_bytes, cached.original_size,
+                             cached.size, 0.0, from_cache=True)
+
+    started = time.perf_counter()
+    with Image.open(BytesIO(data)) as image:
+        original_format = image.format
+        original_size = image.size
+        target_format = output_format or (original_format if original_format in SUPPORTED_MIME_TYPES else "PNG")
+
+        needs_resize = max_edge is not None and max(original_size) > max_edge
+        if not needs_resize and target_format == original_format:
+            # 변경 없음: 원본 그대로
+            processed, size = data, original_size
+        else:
+            image.load()
+            if getattr(image, "is_animated", False):
+                image.seek(0)  # 애니메이션은 첫 프레임만 사용
+            resized = _resize(image, max_edge)
+            size = resized.size
+            processed = _encode(resized, target_format, quality)
+            if len(processed) >= len(data) and not needs_resize:
+                if original_format in SUPPORTED_MIME_TYPES:
+                    # 포맷 변환 결과가 더 크면 원본 유지
+                    processed, target_format, size = data, original_format, original_size
+            elif len(processed) >= len(data):
+                # 축소한 결과가 더 크면 (예: 단순한 PNG를 축소하며 보간으로 색이 늘어난 경우) 다른 포맷 중 가장 작은 결과 사용
+                for other_format in SUPPORTED_MIME_TYPES:
+                    if other_format != target_format:
+                        encoded = _encode(resized, other_format, quality)
+                        if len(encoded) < len(processed):
+                            processed, target_format = encoded, other_format
+
+    prepared = PreparedImage(processed, SUPPORTED_MIME_TYPES[target_format], len(data), original_size, size,
+                             time.perf_counter() - started)
+    _cache_put(key, prepared)
+    return prepared
+
+
+def _tile_spans(length: int, tile_length: int, overlap: float, max_tiles: int) -> List[tuple]:
+    """긴 변을 겹치는 구간으로 균등 분할 [(시작, 끝), ...]"""
+    step = tile_length * (1 - overlap)
+    count = math.ceil((length - tile_length) / step) + 1
+    if count <= 1 or max_tiles <= 1:
+        return [(0, length)]
+    if count > max_tiles:
+        # 조각 수 상한: 겹침 비율은 유지하고 조각을 길게
+        count = max_tiles
+        tile_length = math.ceil(length / (count - (count - 1) * overlap))
+    step = (length - tile_length) / (count - 1)
+    return [(round(i * step), min(length, round(i * step) + tile_length)) for i in range(count)]
+
+
+def prepare_image_tiles(data: bytes, max_edge: Optional[int] = DEFAULT_MAX_EDGE, output_format: Optional[str] = None,
+                        quality: int = DEFAULT_JPEG_QUALITY, min_aspect: float = TILE_MIN_ASPECT,
+                        tile_aspect: float = TILE_ASPECT, overlap: float = TILE_OVERLAP,
+                        max_tiles: int = MAX_TILES) -> List[PreparedImage]:
+    """
+    긴 합성 이미지(화면 목업 + 긴 Description 표 등)를 겹치는 조각으로 나눠 전처리
+
+    긴 변 / 짧은 변 비율이 min_aspect 이하면 분할하지 않고 [prepare_image(...)] 를 반환합니다.
+    조각은 원본 해상도에서 잘라낸 뒤 조각마다 max_edge 축소/재인코딩을 적용하므로,
+    전체를 한 번에 축소할 때 뭉개지는 작은 글자가 보존됩니다.
+    조각의 original_bytes / original_size는 전체 원본 이미지 기준입니다. (표시는 summarize_tiles() 사용)
+
+    Args:
+        data: 원본 이미지 바이트
+        max_edge, output_format, quality: prepare_image()와 동일 (조각 단위로 적용)
+        min_aspect: 분할 기준 종횡비
+        tile_aspect: 조각의 긴 변 길이 (짧은 변 대비 배수)
+        overlap: 인접 조각 겹침 비율 (0~0.5)
+        max_tiles: 최대 조각 수
+
+    Returns:
+        List[PreparedImage]: 순서대로 정렬된 조각 (tile_index, tile_count, box 포함)
+    """
+    with Image.open(BytesIO(data)) as image:
+        width, height = image.size
+    if max(width, height) / min(width, height) <= min_aspect:
+        return [prepare_image(data, max_edge, output_format, quality)]
+
+    key = (hashlib.sha256(data).hexdigest()
+           + f":tiles:{max_edge}:{output_format}:{quality}:{min_aspect}:{tile_aspect}:{overlap}:{max_tiles}")
+    cached = _cache_get(key)
+    if cached is not None:
+        return [PreparedImage(tile.data, tile.mime_type, tile.original_bytes, tile.original_size, tile.size, 0.0,
+                              from_cache=True, tile_index=tile.tile_index, tile_count=tile.tile_count,
+                              box=tile.box, vertical=tile.vertical)
+                for tile in cached]
+
+    started = time.perf_counter()
+    vertical = height >= width
+    long_edge, short_edge = (height, width) if vertical else (width, height)
+    spans = _tile_spans(long_edge, round(short_edge * tile_aspect), overlap, max_tiles)
+
+    tiles = []
+    with Image.open(BytesIO(data)) as image:
+        original_format = image.format
+        target_format = output_format or (original_format if original_format in SUPPORTED_MIME_TYPES else "PNG")
+        image.load()
+        if getattr(image, "is_animated", False):
+            image.seek(0)  # 애니메이션은 첫 프레임만 사용
+        for index, (start, end) in enumerate(spans):
+            box = (0, start, width, end) if vertical else (start, 0, end, height)
+            tile_image = _resize(image.crop(box), max_edge)
+            tile_started = time.perf_counter()
+            processed = _encode(tile_image, target_format, quality)
+            tiles.append(PreparedImage(processed, SUPPORTED_MIME_TYPES[target_format], len(data), (width, height),
+                                       tile_image.size, time.perf_counter() - tile_started,
+                                       tile_index=index, tile_count=len(spans), box=box, vertical=vertical))
+
+    # 분할 자체(디코딩/자르기) 시간은 첫 조각에 합산
+    tiles[0].elapsed = time.perf_counter() - started - sum(tile.elapsed for tile in tiles[1:])
+    _cache_put(key, tuple(tiles))
+    return tiles
+
+
+def summarize_tiles(tiles: List[PreparedImage]) -> str:
+    """조각 목록 한 줄 요약 (조각이 1개면 PreparedImage.summary())"""
+    if len(tiles) == 1:
+        return tiles[0].summary()
+    first = tiles[0]
+    total_bytes = sum(len(tile.data) for tile in tiles)
+    direction = "세로" if first.vertical else "가로"
+    return (f"{first.original_size[0]}×{first.original_size[1]} → {direction} {len(tiles)}개 조각 "
+            f"(조각 {first.size[0]}×{first.size[1]}, 겹침 포함 총 {_format_bytes(total_bytes)})")
+
+
+# ---------- 회귀 확인 ----------
+
+def check_resize_fallback() -> bool:
+    """
+    축소 회귀 확인: 축소하며 용량이 늘어나는 단순한 이미지(팔레트/흑백 PNG)도 max_edge 안으로 줄어드는지,
+    축소 없이 포맷만 바꿔 커지는 경우에는 원본을 유지하는지
+
+    Returns:
+        bool: 모든 확인이 기대와 같으면 True
+    """
+    from PIL import ImageDraw
+
+    def striped_png(mode: str, size: tuple) -> bytes:
+        """가는 세로줄만 있는 이미지 (원본은 작지만 축소하면 보간으로 색이 늘어 커짐)"""
+        image = Image.new(mode, size, 0 if mode == "P" else 255)
+        if mode == "P":
+            image.putpalette([255, 255, 255, 0, 0, 0] + [0] * 762)
+        draw = ImageDraw.Draw(image)
+        for x in range(0, size[0], 7):
+            draw.line([(x, 0), (x, size[1])], fill=1 if mode == "P" else 0)
+        output = BytesIO()
+        image.save(output, format="PNG")
+        return output.getvalue()
+
+    checks = []
+    for mode in ("P", "1"):
+        prepared = prepare_image(striped_png(mode, (3000, 1000)), max_edge=1024)
+        checks.append((f"{mode} 모드 PNG 축소 크기", prepared.size, (1024, 341)))
+    small = striped_png("P", (600, 200))
+    prepared = prepare_image(small, max_edge=1024, output_format="JPEG")
+    checks.append(("포맷 변환만 해서 커지면 원본 유지", (prepared.mime_type, len(prepared.data)), ("image/png", len(small))))
+
+    all_passed = True
+    for description, actual, expected in checks:
+        passed = actual == expected
+        all_passed = all_passed and passed
+        print(f"{'OK  ' if passed else 'FAIL'} {description}: {actual} (기대 {expected})")
+    return all_passed
+
+
+if __name__ == "__main__":
+    sys.exit(0 if check_resize_fallback() else 1)
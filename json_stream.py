@@ -0,0 +1,240 @@
+# ============================================================================
+# Test Scenario Generator 2 - LLM 응답 JSON 추출기 (단일 패스, 점진적)
+# ============================================================================
+# LLM 응답에는 [사고 과정] 텍스트, ```json 코드 블록, 여러 개의 JSON 객체가 섞여 있고
+# 출력 토큰 한도로 마지막 JSON이 잘리는 경우도 있습니다.
+# 이 모듈은 응답을 앞에서부터 한 번만 훑으며
+# - 완성된 최상위 JSON 값(객체)과
+# - 최상위 객체의 "test_cases" 배열 안에서 완성된 항목 객체
+# 를 찾는 즉시 돌려줍니다.
+#
+# - 문자열 리터럴 안의 {, }, [, ] 및 이스케이프(\")를 구분 (한글 설명 속 괄호로 깨지지 않음)
+# - JSON 안에서 ``` 코드 블록 표시를 만나면 닫히지 않은 값을 버리고 다시 찾음
+#   ([사고 과정] 속 `{"a": [1 형태` 같은 예시가 뒤따르는 ```json 블록을 삼키지 않도록)
+# - 문자열과 구조 문자 사이를 정규식으로 건너뛰므로 응답 길이에 선형 (역추적 없음)
+# - feed()로 조각을 나눠 넣을 수 있어 스트리밍 응답에도 사용 가능
+# ============================================================================
+
+import json  # 추출한 조각 파싱
+import os  # 회귀 확인용 응답 모음 경로
+import re  # 구조 문자 탐색
+import sys  # 회귀 확인 종료 코드
+import time  # 벤치마크
+from typing import Any, Iterator, List, Tuple
+
+# 이벤트 종류
+EVENT_VALUE = "value"  # 완성된 최상위 JSON 값
+EVENT_ITEM = "item"  # test_cases 배열 안의 완성된 항목 객체
+EVENT_ABANDONED = "abandoned"  # 닫히지 않은 채 코드 블록 표시를 만나 버린 최상위 값 (그때까지의 원본 텍스트)
+
+ITEM_ARRAY_KEY = "test_cases"
+
+# 괄호 안 토큰: 문자열 리터럴 전체(이스케이프 포함, 닫는 따옴표는 그룹 1), 구조 문자 또는 코드 블록 표시
+# 문자열을 정규식 엔진이 한 번에 건너뛰므로 문자 단위 파이썬 루프가 없음
+_TOKEN_RE = re.compile(r'"[^"\\]*(?:\\.[^"\\]*)*("?)|[{}\[\]:]|```', re.DOTALL)
+_NON_SPACE_RE = re.compile(r'\S')
+
+
+class JsonStreamExtractor:
+    """
+    텍스트 조각을 받아 완성된 JSON 값/항목을 순서대로 돌려주는 점진적 추출기
+
+    최상위(괄호 밖)에서는 `{` 다음에 공백 외 첫 문자가 `"` 또는 `}`인 경우만
+    JSON 객체의 시작으로 봅니다. ([사고 과정] 속 `{변수}` 같은 텍스트 무시)
+
+    사용 예:
+        extractor = JsonStreamExtractor()
+        for chunk in chunks:
+            for kind, text, value in extractor.feed(chunk):
+                ...
+    """
+
+    def __init__(self, complete_input: bool = False):
+        """
+        Args:
+            complete_input: 전체 텍스트를 한 번에 넣는 경우 True.
+                최상위 객체를 json 디코더(C 구현)로 먼저 통째로 읽고,
+                실패한(잘렸거나 깨진) 객체만 토큰 단위로 훑습니다.
+                스트리밍에서는 매 조각마다 재시도하게 되므로 False로 둡니다.
+        """
+        self._complete_input = complete_input
+        self._decoder = json.JSONDecoder()
+        self._buf = ""
+        self._pos = 0  # 다음에 검사할 위치
+        self._stack: List[list] = []  # [괄호 종류, 시작 위치, 항목 배열 여부]
+        self._last_string = None  # 마지막으로 닫힌 문자열의 (시작, 끝) 위치 (객체 키 후보)
+        self._current_key = None  # ':' 직후의 키
+
+    @property
+    def depth(self) -> int:
+        """현재 괄호 중첩 깊이 (0이면 JSON 밖)"""
+        return len(self._stack)
+
+    def feed(self, chunk: str) -> List[Tuple[str, str, Any]]:
+        """
+        텍스트 조각을 추가하고 새로 완성된 값/항목 반환
+
+        토큰 단위로 찾은 조각은 괄호 짝만 확인한 상태이므로 값이 None입니다.
+        필요한 조각만 호출 측에서 loads_or_none()으로 파싱합니다.
+
+        Returns:
+            List[Tuple[str, str, Any]]: (이벤트 종류, 원본 JSON 텍스트, 파싱된 값 또는 None)
+        """
+        self._buf += chunk
+        events = []
+        buf = self._buf
+        pos = self._pos
+        length = len(buf)
+
+        while pos < length:
+            if not self._stack:
+                # JSON 밖: 객체 시작만 탐색
+                start = buf.find("{", pos)
+                if start < 0:
+                    pos = length
+                    break
+                match = _NON_SPACE_RE.search(buf, start + 1)
+                if match is None:
+                    # 다음 문자를 아직 모름
+                    pos = start
+                    break
+                if match.group() not in '"}':
+                    pos = start + 1
+                    continue
+                if self._complete_input:
+                    try:
+                        value, end = self._decoder.raw_decode(buf, start)
+                    except ValueError:
+                        pass
+                    else:
+                        events.append((EVENT_VALUE, buf[start:end], value))
+                        pos = end
+                        continue
+                self._stack.append(["{", start, False])
+                self._last_string = None
+                self._current_key = None
+                pos = start + 1
+                continue
+
+            match = _TOKEN_RE.search(buf, pos)
+            if match is None:
+                # 끝의 ` 1~2개는 다음 조각과 이어져 코드 블록 표시가 될 수 있으므로 남겨 둠
+                pos = max(pos, length - (length - len(buf.rstrip("`"))))
+                break
+            char = buf[match.start()]
+
+            if char == "`":
+                # JSON 안에서는 문자열 밖에 나올 수 없는 코드 블록 표시: 닫히지 않은 값은 JSON이 아니었거나 잘린 것
+                events.append((EVENT_ABANDONED, buf[self._stack[0][1]:match.start()], None))
+                self._stack.clear()
+                pos = match.end()
+                continue
+            if char == '"':
+                if not match.group(1):
+                    # 닫히지 않은 문자열: 다음 조각에서 문자열 처음부터 다시 검사
+                    pos = match.start()
+                    break
+                self._last_string = (match.start() + 1, match.end() - 1)
+            elif char == ":":
+                if self._last_string is not None:
+                    self._current_key = buf[self._last_string[0]:self._last_string[1]]
+            elif char == "{":
+                self._stack.append(["{", match.start(), False])
+                self._current_key = None
+            elif char == "[":
+                parent = self._stack[-1]
+                is_item_array = parent[0] == "{" and self._current_key == ITEM_ARRAY_KEY and len(self._stack) == 1
+                self._stack.append(["[", match.start(), is_item_array])
+                self._current_key = None
+            else:
+                # 닫는 괄호
+                opener, start, _ = self._stack.pop()
+                if (opener == "{") != (char == "}"):
+                    # 괄호 짝이 맞지 않는 깨진 JSON: 현재 최상위 값 포기
+                    self._stack.clear()
+                    pos = match.end()
+                    continue
+                if not self._stack:
+                    events.append((EVENT_VALUE, buf[start:match.end()], None))
+                elif opener == "{" and self._stack[-1][2]:
+                    events.append((EVENT_ITEM, buf[start:match.end()], None))
+                self._current_key = None
+            pos = match.end()
+
+        # 처리 완료된 앞부분은 버퍼에서 제거 (JSON 밖일 때만)
+        if not self._stack:
+            self._buf = buf[pos:]
+            self._pos = 0
+        else:
+            self._pos = pos
+        return events
+
+
+def loads_or_none(text: str) -> Any:
+    """JSON 텍스트 파싱 (실패 시 None)"""
+    try:
+        return json.loads(text)
+    except ValueError:
+        return None
+
+
+def iter_json_values(text: str) -> Iterator[Tuple[str, str, Any]]:
+    """
+    전체 텍스트에서 완성된 JSON 값/항목을 순서대로 반환 (단일 패스)
+
+    Returns:
+        Iterator[Tuple[str, str, Any]]: (이벤트 종류, 원본 JSON 텍스트, 파싱된 값 또는 None)
+    """
+    yield from JsonStreamExtractor(complete_input=True).feed(text)
+
+
+# ---------- 회귀 확인 / 벤치마크 ----------
+
+CORPUS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "testdata", "llm_responses")
+
+
+def run_corpus(corpus_dir: str = CORPUS_DIR, repeat: int = 200) -> bool:
+    """
+    응답 모음(manifest.json)의 기대 케이스 수와 파싱 결과를 비교하고 파일별 파싱 시간을 출력
+
+    expected_cases가 null이면 파싱 오류가 나야 정상입니다.
+
+    Returns:
+        bool: 모든 응답이 기대와 같으면 True
+    """
+    from scenario_core import parse_json_response  # 회귀 확인에서만 사용 (scenario_core가 이 모듈을 import)
+
+    with open(os.path.join(corpus_dir, "manifest.json"), "r", encoding="utf-8") as f:
+        manifest = json.load(f)
+    all_passed = True
+    for entry in manifest:
+        with open(os.path.join(corpus_dir, entry["file"]), "r", encoding="utf-8") as f:
+            text = f.read()
+        try:
+            count = len(parse_json_response(text))
+        except Exception:
+            count = None
+        passed = count == entry["expected_cases"]
+        all_passed = all_passed and passed
+
+        started = time.perf_counter()
+        for _ in range(repeat):
+            try:
+                parse_json_response(text)
+            except Exception:
+                pass
+        elapsed_ms = (time.perf_counter() - started) / repeat * 1000
+        print(f"{'OK  ' if passed else 'FAIL'} {entry['file']}: {count} (기대 {entry['expected_cases']}), "
+              f"{len(text) / 1024:.1f}KB {elapsed_ms:.3f}ms - {entry['description']}")
+    # 큰 응답 (여러 코드 블록이 이어진 경우)
+    with open(os.path.join(corpus_dir, manifest[1]["file"]), "r", encoding="utf-8") as f:
+        large_text = f.read() * 100
+    started = time.perf_counter()
+    large_count = len(parse_json_response(large_text))
+    print(f"큰 응답 {len(large_text) / 1024:.0f}KB: {large_count}건, {(time.perf_counter() - started) * 1000:.1f}ms")
+    return all_passed
+
+
+if __name__ == "__main__":
+    corpus_ok = run_corpus(sys.argv[1] if len(sys.argv) > 1 else CORPUS_DIR)
+    sys.exit(0 if corpus_ok else 1)
@@ -0,0 +1,398 @@
+# ============================================================================
+# Test Scenario Generator 2 - 유사 중복 테스트 케이스 제거 (MinHash + LSH)
+# ============================================================================
+# LLM은 띄어쓰기, 문장부호, 조사만 다른 테스트 케이스를 자주 만들어
+# 문자열 완전 일치(drop_duplicates)로는 걸러지지 않습니다.
+#
+# - 정규화: 유니코드 NFKC + 소문자 + 공백/문장부호 제거 (숫자는 부호/소수점/자릿수 구분을 포함해 그대로 유지)
+# - 절차/입력/기대결과를 구분자로 이어 붙인 문자열의 문자 n-gram(shingle) 집합으로 비교
+# - MinHash 서명(numpy 벡터 연산)으로 Jaccard 유사도 근사
+# - LSH 밴딩으로 후보 쌍만 찾고 서명으로 유사도 검증 → 행 수에 거의 선형
+# - 숫자(경계값, 길이, 금액 등)가 다르면 유사해도 다른 케이스로 취급 (경계값 테스트 보존)
+# - 유사한 행끼리 묶어 각 묶음의 첫 행만 유지 (drop_duplicates keep='first'와 동일한 기준)
+#
+# 벤치마크: python near_dedup.py [행 수, 기본 50000] (경계값 회귀 확인을 먼저 실행, 실패하면 종료 코드 1)
+# ============================================================================
+
+import re  # 정규화
+import sys  # 벤치마크 인자
+import time  # 벤치마크 시간 측정
+import unicodedata  # NFKC 정규화
+from typing import List, Sequence, Tuple
+
+import numpy as np  # MinHash / LSH 벡터 연산
+import pandas as pd
+
+# ---------- 기본 설정 ----------
+DEFAULT_SIMILARITY_THRESHOLD = 0.85  # 이 값 이상이면 같은 테스트 케이스로 간주 (Jaccard 유사도)
+SHINGLE_SIZE = 3  # 문자 n-gram 길이 (한글은 음절 단위라 3이면 조사 하나 차이에 둔감)
+NUM_PERM = 128  # MinHash 서명 길이 (클수록 유사도 추정 오차 감소, 128이면 약 ±0.04)
+FIELD_SEPARATOR = "\x1f"  # 컬럼 경계 (서로 다른 컬럼의 글자가 한 shingle로 이어지지 않도록)
+ROW_SEPARATOR = "\x1e"  # 일괄 정규화 시 행 경계
+
+# 정규화에서 지우지 않을 숫자 안/앞의 기호 (사용자 영역 문자로 잠시 바꿔 두었다가 되돌림)
+# "-15", "1.5", "1,500", "15"가 모두 "15"가 되지 않도록 숫자 부호/소수점/자릿수 구분을 유지하고,
+# 숫자 사이의 공백/기호는 공백 하나로 남겨 "1 5"가 "15"가 되지 않게 함
+_KEPT_MARKS = {"-": "\ue000", "+": "\ue001", ".": "\ue002", ",": "\ue003", " ": "\ue004"}
+_RESTORE_MARKS = str.maketrans({mark: char for char, mark in _KEPT_MARKS.items()})
+_BLANK_MARKS = str.maketrans(dict.fromkeys(_KEPT_MARKS.values(), " "))  # 원문에 들어 있던 같은 문자는 다른 기호처럼 제거
+_NUMBER_MARK_RE = re.compile(r"[-+.,](?=\d)")  # 숫자 앞의 부호 후보 / 숫자 사이의 소수점·자릿수 구분 후보
+_REMOVED_CLASS = rf"(?:[^\w{ROW_SEPARATOR}{FIELD_SEPARATOR}\ue000-\ue004]|_)+"  # 공백/문장부호/기호 (구분자/표시 문자 제외)
+_DIGIT_GAP_RE = re.compile(rf"(\d){_REMOVED_CLASS}(?=\d)")
+_NORMALIZE_RE = re.compile(_REMOVED_CLASS, re.UNICODE)
+# 정규화된 문자열의 숫자 토큰 (남은 부호/소수점은 모두 원문 숫자의 것이므로 원문에서 찾은 숫자와 같음)
+_NUMBER_RE = re.compile(r"[-+]?\d+(?:[.,]\d+)*")
+
+_SHINGLE_BASE = np.uint64(0x100000001B3)  # shingle 다항식 해시 배수 (FNV prime)
+
+
+def _number_mark(match: re.Match) -> str:
+    """부호는 앞이 글자/숫자가 아닐 때만("a-5"의 "-"는 제외), 소수점/자릿수 구분은 앞이 숫자일 때만 표시 문자로"""
+    char, start, text = match.group(0), match.start(), match.string
+    previous = text[start - 1] if start > 0 else ""
+    if char in "-+":
+        return char if previous.isalnum() else _KEPT_MARKS[char]
+    return _KEPT_MARKS[char] if previous.isdigit() else char
+
+
+def _mark_numbers(text: str) -> str:
+    """숫자 부호/소수점/자릿수 구분과 숫자 사이 간격을 지우지 않을 표시 문자로 바꿈 (NFKC/소문자 변환 후)"""
+    if any(mark in text for mark in _KEPT_MARKS.values()):
+        text = text.translate(_BLANK_MARKS)
+    text = _NUMBER_MARK_RE.sub(_number_mark, text)
+    return _DIGIT_GAP_RE.sub(r"\1" + _KEPT_MARKS[" "], text)
+
+
+def normalize_text(value) -> str:
+    """비교용 정규화 (NFKC, 소문자, 공백/문장부호 제거, 숫자의 부호/소수점 유지, 결측값은 빈 문자열)"""
+    if value is None or (isinstance(value, float) and np.isnan(value)):
+        return ""
+    text = unicodedata.normalize("NFKC", str(value)).lower()
+    return _NORMALIZE_RE.sub("", _mark_numbers(text)).translate(_RESTORE_MARKS)
+
+
+def _mix64(values: np.ndarray) -> np.ndarray:
+    """64비트 해시 섞기 (splitmix64 마무리 단계)"""
+    with np.errstate(over="ignore"):
+        values = values ^ (values >> np.uint64(30))
+        values = values * np.uint64(0xBF58476D1CE4E5B9)
+        values = values ^ (values >> np.uint64(27))
+        values = values * np.uint64(0x94D049BB133111EB)
+        return values ^ (values >> np.uint64(31))
+
+
+def _shingle_hashes(texts: Sequence[str], shingle_size: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    모든 문자열의 shingle 해시를 한 배열로 계산
+
+    shingle_size보다 짧은 문자열은 뒤를 NUL로 채워 shingle 1개로 취급합니다. (빈 문자열 포함)
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: (shingle 해시 uint64 배열, 문자열별 시작 오프셋)
+    """
+    padded = [text if len(text) >= shingle_size else text.ljust(shingle_size, "\0") for text in texts]
+    lengths = np.fromiter((len(text) for text in padded), dtype=np.int64, count=len(padded))
+    codes = np.frombuffer("".join(padded).encode("utf-32-le"), dtype=np.uint32).astype(np.uint64)
+
+    # 각 위치의 shingle = codes[p:p + n] (문자열 끝을 넘는 위치는 제외)
+    counts = lengths - shingle_size + 1
+    starts = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+    positions = np.repeat(starts - np.concatenate(([0], np.cumsum(counts)[:-1])), counts) + np.arange(counts.sum())
+
+    hashes = np.zeros(len(positions), dtype=np.uint64)
+    with np.errstate(over="ignore"):
+        for offset in range(shingle_size):
+            hashes = hashes * _SHINGLE_BASE + codes[positions + offset]
+    offsets = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    return _mix64(hashes), offsets
+
+
+def minhash_signatures(texts: Sequence[str], num_perm: int = NUM_PERM, shingle_size: int = SHINGLE_SIZE,
+                       seed: int = 1) -> np.ndarray:
+    """
+    문자열별 MinHash 서명 계산
+
+    해시 함수는 곱셈-시프트 방식 ((a × h + b) >> 32, a는 홀수)이며,
+    문자열별 최솟값은 np.minimum.reduceat으로 한 번에 구합니다.
+
+    Returns:
+        np.ndarray: (문자열 수, num_perm) uint32 서명
+    """
+    signatures = np.empty((len(texts), num_perm), dtype=np.uint32)
+    if not len(texts):
+        return signatures
+    hashes, offsets = _shingle_hashes(texts, shingle_size)
+    rng = np.random.default_rng(seed)
+    multipliers = rng.integers(1, 2 ** 63, size=num_perm, dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+    increments = rng.integers(0, 2 ** 63, size=num_perm, dtype=np.uint64)
+    with np.errstate(over="ignore"):
+        for k in range(num_perm):
+            permuted = ((hashes * multipliers[k] + increments[k]) >> np.uint64(32)).astype(np.uint32)
+            signatures[:, k] = np.minimum.reduceat(permuted, offsets)
+    return signatures
+
+
+def choose_bands(num_perm: int, threshold: float) -> Tuple[int, int]:
+    """
+    LSH 밴드 수/밴드당 행 수 선택
+
+    후보 검출 임계값 (1/b)^(1/r)이 유사도 임계값보다 0.1 이상 낮은 조합 중 가장 높은 것을 고릅니다.
+    (놓치는 쌍을 줄이고, 늘어난 후보는 서명 비교로 걸러냄)
+
+    Returns:
+        Tuple[int, int]: (밴드 수, 밴드당 행 수)
+    """
+    best = (num_perm, 1)
+    best_threshold = -1.0
+    for rows in range(1, num_perm + 1):
+        if num_perm % rows:
+            continue
+        bands = num_perm // rows
+        lsh_threshold = (1 / bands) ** (1 / rows)
+        if best_threshold < lsh_threshold <= threshold - 0.1:
+            best, best_threshold = (bands, rows), lsh_threshold
+    return best
+
+
+def _candidate_pairs(signatures: np.ndarray, bands: int, rows: int) -> np.ndarray:
+    """
+    밴드별로 같은 버킷에 들어간 행을 버킷의 첫 행과 짝지어 후보 쌍 생성
+
+    Returns:
+        np.ndarray: (후보 수, 2) [첫 행, 다른 행] (중복 쌍 제거)
+    """
+    count = len(signatures)
+    pairs = []
+    for band in range(bands):
+        band_values = signatures[:, band * rows:(band + 1) * rows].astype(np.uint64)
+        keys = np.zeros(count, dtype=np.uint64)
+        with np.errstate(over="ignore"):
+            for column in range(rows):
+                keys = _mix64(keys * _SHINGLE_BASE + band_values[:, column])
+        order = np.argsort(keys, kind="stable")
+        sorted_keys = keys[order]
+        group_start = np.concatenate(([True], sorted_keys[1:] != sorted_keys[:-1]))
+        # 각 원소가 속한 버킷의 첫 행 (안정 정렬이므로 버킷 내 가장 앞선 행)
+        representative = order[np.maximum.accumulate(np.where(group_start, np.arange(count), 0))]
+        members = order[~group_start]
+        if len(members):
+            pairs.append(np.stack((representative[~group_start], members), axis=1))
+    if not pairs:
+        return np.empty((0, 2), dtype=np.int64)
+    return np.unique(np.concatenate(pairs), axis=0)
+
+
+def _find(parent: List[int], node: int) -> int:
+    while parent[node] != node:
+        parent[node] = parent[parent[node]]
+        node = parent[node]
+    return node
+
+
+def find_near_duplicates(texts: Sequence[str], threshold: float = DEFAULT_SIMILARITY_THRESHOLD,
+                         num_perm: int = NUM_PERM, shingle_size: int = SHINGLE_SIZE,
+                         match_numbers: bool = True) -> List[Tuple[int, int, float]]:
+    """
+    정규화된 문자열 목록에서 유사 중복 찾기
+
+    정규화 결과가 완전히 같은 문자열은 서명 계산 없이 바로 묶고,
+    나머지는 MinHash + LSH 후보를 서명 유사도로 검증해 묶습니다.
+
+    Args:
+        texts: 정규화된 비교 문자열 (행 순서)
+        threshold: 유사도 임계값 (0~1, 1이면 정규화 후 완전 일치만)
+        num_perm: MinHash 서명 길이
+        shingle_size: 문자 n-gram 길이
+        match_numbers: True면 숫자 나열이 같은 행끼리만 묶음 ("9자 입력"과 "10자 입력", "1.5"와 "-15"는 별개)
+
+    Returns:
+        List[Tuple[int, int, float]]: (유지할 행, 제거할 행, 추정 유사도) - 제거할 행 순서
+    """
+    # 정규화 후 완전 일치 묶기
+    codes, uniques = pd.factorize(pd.Series(list(texts), dtype=object))
+    first_row = np.full(len(uniques), -1, dtype=np.int64)
+    np.minimum.at(first_row.view(np.uint64), codes, np.arange(len(codes), dtype=np.uint64))  # -1은 uint64 최댓값
+
+    # 고유 문자열 단위 유사 묶음 (union-find, 루트 = 가장 앞선 행)
+    parent = list(range(len(uniques)))
+    signatures = None
+    if threshold < 1.0 and len(uniques) > 1:
+        signatures = minhash_signatures(list(uniques), num_perm, shingle_size)
+        bands, rows = choose_bands(num_perm, threshold)
+        pairs = _candidate_pairs(signatures, bands, rows)
+        if len(pairs):
+            similarity = (signatures[pairs[:, 0]] == signatures[pairs[:, 1]]).mean(axis=1)
+            accepted = similarity >= threshold
+            if match_numbers:
+                number_codes, _ = pd.factorize(pd.Series([" ".join(_NUMBER_RE.findall(text)) for text in uniques], dtype=object))
+                accepted &= number_codes[pairs[:, 0]] == number_codes[pairs[:, 1]]
+            for left, right in pairs[accepted].tolist():
+                root_left, root_right = _find(parent, left), _find(parent, right)
+                if root_left != root_right:
+                    if first_row[root_right] < first_row[root_left]:
+                        root_left, root_right = root_right, root_left
+                    parent[root_right] = root_left
+
+    # 행 단위 결과: 각 묶음에서 가장 앞선 행 유지
+    roots = np.fromiter((_find(parent, code) for code in range(len(uniques))), dtype=np.int64, count=len(uniques))
+    keep_row = first_row[roots][codes]
+    removed = np.flatnonzero(keep_row != np.arange(len(codes)))
+    results = []
+    for row in removed.tolist():
+        kept = int(keep_row[row])
+        if codes[row] == codes[kept]:
+            similarity = 1.0
+        else:
+            similarity = float((signatures[codes[row]] == signatures[codes[kept]]).mean())
+        results.append((kept, row, similarity))
+    return results
+
+
+def build_dedup_texts(df: pd.DataFrame, columns: Sequence[str]) -> List[str]:
+    """
+    비교 컬럼들을 정규화해 구분자로 이어 붙인 행별 비교 문자열 (normalize_text()와 같은 결과)
+
+    셀마다 정규화하지 않고 전체를 행 구분자로 이어 붙여 NFKC/소문자 변환을 한 번에 한 뒤,
+    제거할 문자(공백/문장부호, 숫자의 부호/소수점 제외)는 코드 포인트 조회표로 한 번에 걸러냅니다.
+    (셀 값에 구분자 문자가 들어 있으면 셀 단위 정규화로 처리)
+    """
+    cells = [["" if pd.isna(value) else str(value) for value in df[col].tolist()] for col in columns]
+    rows = [FIELD_SEPARATOR.join(values) for values in zip(*cells)]
+    if not rows:
+        return []
+    joined = ROW_SEPARATOR.join(rows)
+    if joined.count(ROW_SEPARATOR) != len(rows) - 1 or joined.count(FIELD_SEPARATOR) != len(rows) * (len(columns) - 1):
+        return [FIELD_SEPARATOR.join(normalize_text(value) for value in values) for values in zip(*cells)]
+
+    joined = _mark_numbers(unicodedata.normalize("NFKC", joined).lower())
+    # 정규식 \w와 같은 기준 (isalnum), 구분자/숫자 표시 문자는 유지
+    kept = {ROW_SEPARATOR, FIELD_SEPARATOR, *_KEPT_MARKS.values()}
+    removed = [ord(char) for char in set(joined) if not char.isalnum() and char not in kept]
+    codes = np.frombuffer(joined.encode("utf-32-le"), dtype=np.uint32)
+    keep = np.ones(int(codes.max()) + 1, dtype=bool)
+    keep[removed] = False
+    codes = codes[keep[codes]]
+    for char, mark in _KEPT_MARKS.items():  # 표시 문자 되돌리기 (str.translate보다 빠름)
+        codes[codes == ord(mark)] = ord(char)
+    return codes.tobytes().decode("utf-32-le").split(ROW_SEPARATOR)
+
+
+def near_dedup_dataframe(df: pd.DataFrame, columns: Sequence[str], threshold: float = DEFAULT_SIMILARITY_THRESHOLD,
+                         match_numbers: bool = True) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    DataFrame에서 유사 중복 행 제거 (각 묶음의 첫 행 유지)
+
+    Args:
+        df: 테스트 케이스 DataFrame
+        columns: 비교 컬럼 (없는 컬럼은 무시)
+        threshold: 유사도 임계값 (0~1)
+        match_numbers: 숫자가 다른 행은 묶지 않음 (경계값 테스트 보존)
+
+    Returns:
+        Tuple[pd.DataFrame, pd.DataFrame]: (중복 제거 결과, 병합 보고서)
+            보고서 컬럼: 유지_행, 제거_행(원본 위치), 유사도, 유지_<컬럼>, 제거_<컬럼>
+    """
+    columns = [col for col in columns if col in df.columns]
+    report_columns = ["유지_행", "제거_행", "유사도"] + [f"{prefix}_{col}" for col in columns for prefix in ("유지", "제거")]
+    if not columns or len(df) < 2:
+        return df, pd.DataFrame(columns=report_columns)
+
+    duplicates = find_near_duplicates(build_dedup_texts(df, columns), threshold, match_numbers=match_numbers)
+    if not duplicates:
+        return df, pd.DataFrame(columns=report_columns)
+
+    kept_rows = [kept for kept, _, _ in duplicates]
+    removed_rows = [row for _, row, _ in duplicates]
+    report = {"유지_행": kept_rows, "제거_행": removed_rows, "유사도": [round(sim, 3) for _, _, sim in duplicates]}
+    for col in columns:
+        values = df[col].tolist()
+        report[f"유지_{col}"] = [values[row] for row in kept_rows]
+        report[f"제거_{col}"] = [values[row] for row in removed_rows]
+
+    keep_mask = np.ones(len(df), dtype=bool)
+    keep_mask[removed_rows] = False
+    return df[keep_mask], pd.DataFrame(report, columns=report_columns)
+
+
+# ---------- 벤치마크 ----------
+
+def _synthetic_cases(count: int, duplicate_ratio: float = 0.25, seed: int = 0) -> pd.DataFrame:
+    """LLM 출력과 비슷한 변형(띄어쓰기/문장부호/조사 변경)이 섞인 합성 테스트 케이스"""
+    rng = np.random.default_rng(seed)
+    screens = ["청약서 작성", "계약자 정보", "피보험자 정보", "보험료 계산", "상품 선택", "특약 가입", "본인 인증", "결제 정보"]
+    fields = ["주민등록번호", "휴대폰번호", "이메일", "생년월일", "주소", "직업코드", "보험기간", "납입주기", "가입금액", "계좌번호"]
+    actions = ["입력 후 저장 버튼을 클릭한다", "값을 비우고 다음 버튼을 클릭한다", "최대 길이를 초과하여 입력한다",
+               "특수문자를 포함하여 입력한다", "조회 버튼을 클릭하여 팝업을 확인한다"]
+    results = ["오류 메시지가 표시된다", "다음 화면으로 이동한다", "입력이 제한된다", "저장이 완료된다", "팝업이 닫힌다"]
+
+    base_count = max(1, int(count * (1 - duplicate_ratio)))
+    rows = []
+    for i in range(base_count):
+        screen, field = screens[rng.integers(len(screens))], fields[rng.integers(len(fields))]
+        rows.append({
+            "테스트항목_및_절차": f"1. {screen} 화면 진입 2. {field} 필드에 {actions[rng.integers(len(actions))]} (케이스 {i})",
+            "입력데이터": f"{field}: 값{rng.integers(100000)}",
+            "기대결과": f"{field} 검증 후 {results[rng.integers(len(results))]}",
+        })
+    variants = [
+        lambda s: s.replace(" ", "  ", 1),
+        lambda s: s.replace(" 후 ", ", 후 ") if " 후 " in s else s + ".",
+        lambda s: s.replace("버튼을", "버튼") if "버튼을" in s else s.replace("필드에", "필드"),
+        lambda s: s.rstrip(")") + " )",
+    ]
+    for _ in range(count - base_count):
+        source = dict(rows[rng.integers(base_count)])
+        column = ["테스트항목_및_절차", "입력데이터", "기대결과"][rng.integers(3)]
+        source[column] = variants[rng.integers(len(variants))](source[column])
+        rows.append(source)
+    order = rng.permutation(len(rows))
+    return pd.DataFrame([rows[i] for i in order])
+
+
+
+def check_boundary_values() -> bool:
+    """
+    경계값 회귀 확인: 입력 숫자만 다른 케이스는 모두 남고, 띄어쓰기/문장부호만 다른 케이스는 묶이는지
+
+    Returns:
+        bool: 모든 확인이 기대와 같으면 True
+    """
+    procedure = "1. 가입금액 필드에 값을 입력한다 2. 저장 버튼을 클릭한다"
+    expected = "입력값 검증 후 오류 메시지가 표시된다"
+    checks = [
+        # (설명, 입력데이터 목록, 남아야 하는 행 수)
+        ("부호/소수점/자릿수 구분만 다른 값", ["1.5", "15", "-15", "1,500", "+15"], 5),
+        ("숫자 사이 공백", ["1 5", "15"], 2),
+        ("띄어쓰기/문장부호만 다른 값", ["가입금액: 15", "가입금액 : 15.", "가입금액:15"], 1),
+        ("전각 숫자 (NFKC)", ["-1.5", "－１．５"], 1),
+    ]
+    all_passed = True
+    for description, inputs, expected_rows in checks:
+        check_df = pd.DataFrame({"테스트항목_및_절차": procedure, "입력데이터": inputs, "기대결과": expected})
+        kept_df, _ = near_dedup_dataframe(check_df, list(check_df.columns))
+        passed = len(kept_df) == expected_rows
+        all_passed = all_passed and passed
+        print(f"{'OK  ' if passed else 'FAIL'} {description}: {len(kept_df)}행 남음 (기대 {expected_rows}) - {inputs}")
+    return all_passed
+
+
+if __name__ == "__main__":
+    boundary_ok = check_boundary_values()
+    row_count = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    threshold = float(sys.argv[2]) if len(sys.argv) > 2 else DEFAULT_SIMILARITY_THRESHOLD
+    bench_columns = ["테스트항목_및_절차", "입력데이터", "기대결과"]
+    bench_df = _synthetic_cases(row_count)
+
+    started = time.perf_counter()
+    exact_df = bench_df.drop_duplicates(subset=bench_columns, keep="first")
+    exact_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    near_df, merge_report = near_dedup_dataframe(bench_df, bench_columns, threshold)
+    near_seconds = time.perf_counter() - started
+
+    print(f"행 수: {len(bench_df)} (합성 변형 약 25%)")
+    print(f"완전 일치 drop_duplicates: {len(exact_df)}행 남음, {exact_seconds:.2f}초")
+    print(f"유사 중복 (임계값 {threshold}): {len(near_df)}행 남음, {near_seconds:.2f}초, 최저 유사도 "
+          f"{merge_report['유사도'].min() if len(merge_report) else '-'}")
+    sys.exit(0 if boundary_ok else 1)
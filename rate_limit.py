@@ -0,0 +1,369 @@
+# ============================================================================
+# Test Scenario Generator 2 - 호출 속도 제한 (모델별 토큰 버킷 + AIMD 동시 호출 + 백오프)
+# ============================================================================
+# 재시도가 고정 대기(1초/2초)이고 429(할당량 초과)와 실제 오류를 구분하지 않으면, 동시 호출이 많을 때
+# 모든 워커가 같은 순간에 다시 몰려 429가 반복되고(thundering herd) 할당량이 낭비됩니다.
+#
+# - 토큰 버킷: 모델별 분당 요청 수(RPM)만큼만 호출 시작 (버스트 허용)
+# - AIMD 동시 호출 상한: 성공하면 조금씩 늘리고(+1/상한), 429를 받으면 절반으로 줄임
+# - 429 발생 시 해당 모델 전체가 Retry-After(없으면 지수 백오프) 동안 새 호출을 멈춤 → 한 번에 몰리지 않음
+# - 지수 백오프 + full jitter: 재시도 간격을 0 ~ base·2^n 사이에서 무작위로 골라 재시도 시점을 분산
+# 429는 generate_text()/generate_text_stream() 안에서 처리하므로, 호출 지점의 재시도는 실제 오류에만 쓰입니다.
+# 가짜 모델(fake_gemini.RecordedModelFactory)의 429 주입 옵션으로 오프라인에서 확인할 수 있습니다.
+# ============================================================================
+
+import random  # 백오프 jitter
+import re  # 오류 메시지의 재시도 대기 시간
+import threading  # 모델별 상태 동기화
+import time  # 토큰 충전/대기
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, Optional
+
+DEFAULT_RPM = 60  # 모델별 분당 요청 수 (사이드바에서 변경)
+DEFAULT_BURST = 10  # 한 번에 몰아서 시작할 수 있는 요청 수
+DEFAULT_MAX_CONCURRENCY = 32  # 동시 호출 상한 최대값 (429 전까지는 제한 없음과 같음)
+MIN_CONCURRENCY = 1
+
+BACKOFF_BASE = 1.0  # 첫 재시도 최대 대기(초)
+BACKOFF_CAP = 60.0  # 최대 대기(초)
+THROTTLE_MAX_RETRIES = 6  # 429 재시도 횟수 (실제 오류 재시도와 별도)
+
+_RETRY_AFTER_PATTERNS = [
+    re.compile(r"retry_delay\s*\{\s*seconds:\s*(\d+(?:\.\d+)?)", re.IGNORECASE),  # google.rpc.RetryInfo
+    re.compile(r"retry in\s*(\d+(?:\.\d+)?)\s*s", re.IGNORECASE),  # "Please retry in 27.5s."
+    re.compile(r"retry-after:?\s*(\d+(?:\.\d+)?)", re.IGNORECASE),
+]
+
+
+# ---------- 오류 분류 ----------
+
+def is_rate_limit_error(error: BaseException) -> bool:
+    """429 / 할당량 초과(ResourceExhausted) 오류 여부"""
+    code = getattr(error, "code", None)
+    if code is not None:
+        try:
+            if int(code) == 429:
+                return True
+        except (TypeError, ValueError):
+            pass
+    if type(error).__name__ in ("ResourceExhausted", "TooManyRequests"):
+        return True
+    text = str(error)
+    return text.startswith("429") or "RESOURCE_EXHAUSTED" in text or "Resource has been exhausted" in text
+
+
+def retry_after_seconds(error: BaseException) -> Optional[float]:
+    """오류에 담긴 재시도 대기 시간 (Retry-After 헤더, RetryInfo, 메시지 순서로 확인)"""
+    retry_after = getattr(error, "retry_after", None)
+    if retry_after is not None:
+        return float(retry_after)
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if headers:
+        try:
+            return float(headers.get("Retry-After"))
+        except (TypeError, ValueError):
+            pass
+    text = str(error)
+    for pattern in _RETRY_AFTER_PATTERNS:
+        match = pattern.search(text)
+        if match:
+            return float(match.group(1))
+    return None
+
+
+def backoff_delay(attempt: int, base: float = BACKOFF_BASE, cap: float = BACKOFF_CAP,
+                  retry_after: Optional[float] = None, rng: Optional[random.Random] = None) -> float:
+    """
+    재시도 대기 시간 (지수 백오프 + full jitter)
+
+    Args:
+        attempt: 재시도 번호 (0부터)
+        base: 첫 재시도 최대 대기(초)
+        cap: 최대 대기(초)
+        retry_after: 서버가 알려준 대기 시간 (있으면 그 이상 기다리고 약간의 jitter만 더함)
+
+    Returns:
+        float: 대기 시간(초)
+    """
+    rng = rng or random
+    if retry_after is not None:
+        return retry_after + rng.uniform(0, base)
+    return rng.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+def retry_delay(attempt: int, error: Optional[BaseException] = None, base: float = BACKOFF_BASE) -> float:
+    """호출 지점 재시도용 대기 시간 (오류에 Retry-After가 있으면 따름)"""
+    return backoff_delay(attempt, base, retry_after=retry_after_seconds(error) if error is not None else None)
+
+
+# ---------- 토큰 버킷 / 모델별 제한 ----------
+
+class TokenBucket:
+    """분당 rate개씩 충전되고 최대 burst개까지 쌓이는 토큰 버킷 (잠금은 호출 측에서)"""
+
+    def __init__(self, rate_per_minute: float, burst: int, clock: Callable[[], float] = time.monotonic):
+        self.rate_per_minute = rate_per_minute
+        self.burst = burst
+        self._clock = clock
+        self._tokens = float(burst)
+        self._updated = clock()
+
+    def _refill(self, now: float):
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate_per_minute / 60.0)
+        self._updated = now
+
+    def take(self) -> float:
+        """
+        토큰 1개 사용 시도
+
+        Returns:
+            float: 0이면 사용함, 아니면 토큰이 생길 때까지 기다려야 하는 시간(초)
+        """
+        now = self._clock()
+        self._refill(now)
+        if self._tokens >= 1:
+            self._tokens -= 1
+            return 0.0
+        return (1 - self._tokens) * 60.0 / self.rate_per_minute
+
+    def wait_time(self) -> float:
+        """토큰 1개가 생길 때까지 남은 시간 (사용하지 않고 확인만)"""
+        self._refill(self._clock())
+        return max(0.0, (1 - self._tokens) * 60.0 / self.rate_per_minute)
+
+    def drain(self):
+        """남은 토큰 비우기 (429 직후 버스트 방지)"""
+        self._refill(self._clock())
+        self._tokens = min(self._tokens, 0.0)
+
+
+class ModelRateLimiter:
+    """
+    모델 1개의 호출 속도 제한 (토큰 버킷 + AIMD 동시 호출 상한 + 429 대기)
+
+    사용 예:
+        limiter = get_rate_limiter(model_name)
+        with limiter.slot() as slot:
+            response = model.generate_content(contents)  # 429면 slot.throttled(error) 후 다시 시도
+    """
+
+    def __init__(self, rpm: float = DEFAULT_RPM, burst: int = DEFAULT_BURST,
+                 max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+                 clock: Callable[[], float] = time.monotonic):
+        self.bucket = TokenBucket(rpm, burst, clock)
+        self.max_concurrency = max_concurrency
+        self.concurrency_limit = float(max_concurrency)
+        self.in_flight = 0
+        self.throttle_count = 0  # 받은 429 수
+        self.throttle_streak = 0  # 연속 429 수 (백오프 단계)
+        self.cooldown_until = 0.0
+        self.last_throttle = float("-inf")  # 마지막 AIMD 감소 시각
+        self._clock = clock
+        self._cond = threading.Condition()
+
+    def configure(self, rpm: Optional[float] = None, max_concurrency: Optional[int] = None,
+                  burst: Optional[int] = None):
+        with self._cond:
+            if rpm is not None:
+                self.bucket.rate_per_minute = rpm
+            if burst is not None:
+                self.bucket.burst = burst
+            if max_concurrency is not None:
+                self.max_concurrency = max_concurrency
+                self.concurrency_limit = min(self.concurrency_limit, float(max_concurrency))
+            self._cond.notify_all()
+
+    def acquire(self) -> float:
+        """429 대기 시간, 동시 호출 상한, 토큰을 모두 만족할 때까지 대기 (반환값: 호출 시작 시각)"""
+        with self._cond:
+            while True:
+                now = self._clock()
+                if now < self.cooldown_until:
+                    self._cond.wait(self.cooldown_until - now)
+                    continue
+                if self.in_flight >= max(MIN_CONCURRENCY, int(self.concurrency_limit)):
+                    self._cond.wait()
+                    continue
+                wait_time = self.bucket.take()
+                if wait_time > 0:
+                    self._cond.wait(wait_time)
+                    continue
+                self.in_flight += 1
+                return now
+
+    def expected_time(self, latency: float = 0.0) -> float:
+        """
+        지금 acquire()하면 호출이 끝날 때까지의 대략적인 시간 (API 키 풀의 키 선택용)
+
+        대기 시간(429 대기/토큰, 동시 호출 상한이 찼으면 latency 추가) + latency × (진행 중 호출 + 1)을
+        같은 잠금 안에서 계산합니다.
+
+        Args:
+            latency: 호출 1회 예상 시간
+        """
+        with self._cond:
+            wait_time = max(self.cooldown_until - self._clock(), self.bucket.wait_time())
+            if self.in_flight >= max(MIN_CONCURRENCY, int(self.concurrency_limit)):
+                wait_time += latency
+            return max(0.0, wait_time) + latency * (self.in_flight + 1)
+
+    def release(self, succeeded: bool):
+        """호출 종료 (성공하면 동시 호출 상한을 +1/상한만큼 늘림)"""
+        with self._cond:
+            self.in_flight -= 1
+            if succeeded:
+                self.throttle_streak = 0
+                self.concurrency_limit = min(self.max_concurrency, self.concurrency_limit + 1.0 / self.concurrency_limit)
+            self._cond.notify_all()
+
+    def on_throttle(self, retry_after: Optional[float] = None, started: Optional[float] = None) -> float:
+        """
+        429 수신: 동시 호출 상한 절반, 토큰 비움, 모델 전체 대기 시간 설정
+
+        직전 429 이전에 시작한 호출의 429는 같은 과부하로 보고 상한을 다시 줄이지 않습니다. (AIMD 감소는 과부하 1회당 1번)
+
+        Args:
+            retry_after: 서버가 알려준 대기 시간
+            started: 429를 받은 호출의 시작 시각
+
+        Returns:
+            float: 남은 대기 시간(초)
+        """
+        with self._cond:
+            now = self._clock()
+            self.throttle_count += 1
+            if started is None or started >= self.last_throttle:
+                self.concurrency_limit = max(float(MIN_CONCURRENCY), self.concurrency_limit / 2)
+                self.bucket.drain()
+                delay = backoff_delay(self.throttle_streak, retry_after=retry_after)
+                self.throttle_streak += 1
+                self.last_throttle = now
+            else:
+                delay = retry_after or 0.0
+            # 이미 더 긴 대기 중이면 유지 (동시에 받은 429들이 대기 시간을 줄이지 않도록)
+            self.cooldown_until = max(self.cooldown_until, now + delay)
+            self._cond.notify_all()
+            return self.cooldown_until - now
+
+    @contextmanager
+    def slot(self) -> Iterator["_Slot"]:
+        """호출 1회 구간 (예외 없이 끝나면 성공으로 처리)"""
+        slot = _Slot(self, self.acquire())
+        try:
+            yield slot
+        except BaseException:
+            self.release(False)
+            raise
+        self.release(not slot.was_throttled)
+
+    def snapshot(self) -> dict:
+        """현재 상태 (사이드바 표시용)"""
+        with self._cond:
+            return {
+                "rpm": self.bucket.rate_per_minute,
+                "concurrency_limit": int(self.concurrency_limit),
+                "in_flight": self.in_flight,
+                "throttled": self.throttle_count,
+                "cooldown": max(0.0, self.cooldown_until - self._clock()),
+            }
+
+
+class _Slot:
+    def __init__(self, limiter: ModelRateLimiter, started: float):
+        self._limiter = limiter
+        self.started = started
+        self.was_throttled = False
+
+    def throttled(self, error: BaseException) -> float:
+        self.was_throttled = True
+        return self._limiter.on_throttle(retry_after_seconds(error), self.started)
+
+
+# ---------- 모델별 제한 레지스트리 ----------
+
+_limiters: Dict[str, ModelRateLimiter] = {}
+_limiters_lock = threading.Lock()
+_settings = {"rpm": DEFAULT_RPM, "max_concurrency": DEFAULT_MAX_CONCURRENCY, "burst": DEFAULT_BURST}
+
+
+def get_rate_limiter(model_name: str) -> ModelRateLimiter:
+    """모델별 속도 제한 (프로세스 전체에서 공유, Streamlit 재실행 간 유지)"""
+    with _limiters_lock:
+        limiter = _limiters.get(model_name)
+        if limiter is None:
+            limiter = ModelRateLimiter(_settings["rpm"], _settings["burst"], _settings["max_concurrency"])
+            _limiters[model_name] = limiter
+        return limiter
+
+
+def configure_rate_limits(rpm: Optional[float] = None, max_concurrency: Optional[int] = None,
+                          burst: Optional[int] = None):
+    """모든 모델의 RPM/동시 호출 상한/버스트 변경 (이후 생성되는 모델에도 적용)"""
+    with _limiters_lock:
+        for key, value in (("rpm", rpm), ("max_concurrency", max_concurrency), ("burst", burst)):
+            if value is not None:
+                _settings[key] = value
+        limiters = list(_limiters.values())
+    for limiter in limiters:
+        limiter.configure(rpm, max_concurrency, burst)
+
+
+def rate_limit_snapshot() -> Dict[str, dict]:
+    """모델별 현재 상태"""
+    with _limiters_lock:
+        limiters = dict(_limiters)
+    return {model_name: limiter.snapshot() for model_name, limiter in limiters.items()}
+
+
+# ---------- 벤치마크 (python rate_limit.py) ----------
+
+if __name__ == "__main__":
+    # 가짜 모델이 1초에 20건을 넘으면 429를 돌려줄 때, 고정 1초 재시도와 이 모듈을 비교
+    from concurrent.futures import ThreadPoolExecutor
+
+    from fake_gemini import RecordedModelFactory
+
+    def run(label: str, use_limiter: bool, total: int = 200, workers: int = 32):
+        factory = RecordedModelFactory([["ok"]], chunk_delay=0.05, throttle_limit=20, throttle_window=1.0)
+        calls = {"attempts": 0, "throttled": 0}
+        lock = threading.Lock()
+
+        def one(_):
+            model = factory("fake-model")
+            limiter = get_rate_limiter("fake-model")
+            while True:
+                if use_limiter:
+                    # api_key_pool.ApiKeyPool.call과 같은 방식 (키 선택 없이 제한만 적용)
+                    with limiter.slot() as slot:
+                        try:
+                            return model.generate_content("hi").text
+                        except Exception as e:
+                            if not is_rate_limit_error(e):
+                                raise
+                            slot.throttled(e)  # 다음 acquire()에서 모델 대기 시간이 끝날 때까지 기다림
+                            with lock:
+                                calls["throttled"] += 1
+                    continue
+                try:
+                    return model.generate_content("hi").text
+                except Exception as e:
+                    if not is_rate_limit_error(e):
+                        raise
+                    with lock:
+                        calls["throttled"] += 1
+                    time.sleep(1)
+
+        start = time.time()
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            list(executor.map(one, range(total)))
+        print(f"{label}: {total}건 {time.time() - start:.1f}초, 429 {calls['throttled']}회, 모델 호출 {factory.calls}회")
+
+    # 할당량 구간이 1초로 짧으므로 버스트도 그에 맞게 줄임 (실제 분당 할당량에서는 DEFAULT_BURST)
+    run("고정 1초 재시도", use_limiter=False)
+    configure_rate_limits(rpm=1100, max_concurrency=DEFAULT_MAX_CONCURRENCY, burst=2)
+    run("토큰 버킷 + AIMD + 백오프 (RPM을 할당량보다 약간 낮게)", use_limiter=True)
+    _limiters.clear()
+    configure_rate_limits(rpm=3000, burst=5)
+    run("토큰 버킷 + AIMD + 백오프 (RPM을 할당량보다 높게 설정)", use_limiter=True)
+    print("제한 상태:", rate_limit_snapshot())
@@ -0,0 +1,213 @@
+# ============================================================================
+# Test Scenario Generator 2 - Gemini 응답 캐시
+# ============================================================================
+# 같은 이미지 + 같은 프롬프트 + 같은 모델/설정으로 요청하면 네트워크 호출 없이
+# 디스크에 저장된 응답을 재사용합니다. (실패 후 배치 재실행, 폴더 재로딩 시 효과)
+#
+# - 키: (이미지 바이트, 시스템 프롬프트(스타일 가이드 포함), 사용자 프롬프트,
+#        모델명, 생성 설정)의 SHA-256 해시
+# - 용량 제한 LRU 제거 + TTL 만료
+# - 적중/미적중 카운터 (프로세스 단위, Streamlit rerun 간 유지)
+# ============================================================================
+
+import hashlib  # 캐시 키 해시
+import json  # 캐시 파일 직렬화
+import os  # 파일 경로 및 디렉토리 작업
+import threading  # 배치 워커 스레드 간 동기화
+import time  # TTL 계산
+from collections import OrderedDict  # LRU 순서 관리
+from typing import Any, Optional
+
+# ---------- 기본 설정 ----------
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "gemini_responses")
+DEFAULT_MAX_BYTES = 200 * 1024 * 1024  # 200MB
+DEFAULT_TTL_SECONDS = 7 * 24 * 60 * 60  # 7일
+
+
+def _update_hash_with_part(hasher, part: Any):
+    """generate_content()에 전달되는 contents 항목 하나를 해시에 반영"""
+    if isinstance(part, dict):
+        # 이미지 파트: {"mime_type": ..., "data": bytes 또는 Base64 문자열}
+        hasher.update(b"part:")
+        hasher.update(str(part.get("mime_type", "")).encode("utf-8"))
+        data = part.get("data", b"")
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        hasher.update(hashlib.sha256(data).digest())
+    else:
+        hasher.update(b"text:")
+        hasher.update(str(part).encode("utf-8"))
+    hasher.update(b"\x00")
+
+
+def make_cache_key(model_name: str, system_instruction: Optional[str], contents: Any,
+                   generation_config: Optional[dict] = None) -> str:
+    """
+    요청 내용으로 캐시 키(SHA-256 16진 문자열) 생성
+
+    Args:
+        model_name: Gemini 모델명
+        system_instruction: 시스템 프롬프트 (스타일 가이드 포함)
+        contents: generate_content()에 전달하는 contents (문자열 또는 리스트)
+        generation_config: 생성 설정 (temperature 등)
+
+    Returns:
+        str: 캐시 키
+    """
+    hasher = hashlib.sha256()
+    hasher.update(f"model:{model_name}\x00".encode("utf-8"))
+    hasher.update(f"system:{system_instruction or ''}\x00".encode("utf-8"))
+    hasher.update(("config:" + json.dumps(generation_config or {}, sort_keys=True, ensure_ascii=False, default=str) + "\x00").encode("utf-8"))
+    for part in (contents if isinstance(contents, (list, tuple)) else [contents]):
+        _update_hash_with_part(hasher, part)
+    return hasher.hexdigest()
+
+
+class ResponseCache:
+    """
+    디스크 기반 Gemini 응답 캐시 (용량 제한 LRU + TTL)
+
+    항목 하나는 `<cache_dir>/<키 앞 2자리>/<키>.json` 파일 하나이며,
+    파일 mtime을 마지막 사용 시각으로 사용하여 프로세스 재시작 후에도 LRU 순서를 복원합니다.
+    """
+
+    def __init__(self, cache_dir: str = DEFAULT_CACHE_DIR, max_bytes: int = DEFAULT_MAX_BYTES,
+                 ttl_seconds: int = DEFAULT_TTL_SECONDS):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._index = None  # OrderedDict[키, 파일 크기] (오래 사용 안 한 순서)
+        self._total_bytes = 0
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], f"{key}.json")
+
+    def _load_index(self):
+        """디스크의 캐시 파일을 스캔하여 LRU 인덱스 구성 (최초 1회)"""
+        if self._index is not None:
+            return
+        entries = []
+        if os.path.isdir(self.cache_dir):
+            for root, _, files in os.walk(self.cache_dir):
+                for name in files:
+                    if not name.endswith(".json"):
+                        continue
+                    try:
+                        stat = os.stat(os.path.join(root, name))
+                    except OSError:
+                        continue
+                    entries.append((stat.st_mtime, name[:-5], stat.st_size))
+        entries.sort()
+        self._index = OrderedDict((key, size) for _, key, size in entries)
+        self._total_bytes = sum(self._index.values())
+
+    def _remove(self, key: str):
+        size = self._index.pop(key, 0)
+        self._total_bytes -= size
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+
+    def get(self, key: str) -> Optional[str]:
+        """
+        캐시된 응답 텍스트 조회
+
+        Returns:
+            Optional[str]: 응답 텍스트 (없거나 만료되었으면 None)
+        """
+        with self._lock:
+            self._load_index()
+            path = self._path(key)
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    entry = json.load(f)
+            except (OSError, ValueError):
+                if key in self._index:
+                    self._remove(key)
+                self.misses += 1
+                return None
+
+            # TTL 만료 확인
+            if time.time() - entry.get("created_at", 0) > self.ttl_seconds:
+                self._remove(key)
+                self.misses += 1
+                return None
+
+            # 최근 사용으로 갱신 (mtime + LRU 순서)
+            try:
+                os.utime(path, None)
+            except OSError:
+                pass
+            if key in self._index:
+                self._index.move_to_end(key)
+            else:
+                size = os.path.getsize(path)
+                self._index[key] = size
+                self._total_bytes += size
+            self.hits += 1
+            return entry.get("text")
+
+    def set(self, key: str, text: str):
+        """응답 텍스트를 캐시에 저장하고 용량 초과 시 오래된 항목부터 제거"""
+        payload = json.dumps({"created_at": time.time(), "text": text}, ensure_ascii=False).encode("utf-8")
+        with self._lock:
+            self._load_index()
+            path = self._path(key)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # 임시 파일에 쓴 뒤 교체 (동시 읽기 시 깨진 파일 방지)
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(payload)
+            os.replace(tmp_path, path)
+
+            self._total_bytes -= self._index.pop(key, 0)
+            self._index[key] = len(payload)
+            self._total_bytes += len(payload)
+
+            # LRU 제거
+            while self._total_bytes > self.max_bytes and len(self._index) > 1:
+                oldest_key = next(iter(self._index))
+                self._remove(oldest_key)
+
+    def clear(self):
+        """캐시 전체 삭제 및 카운터 초기화"""
+        with self._lock:
+            self._load_index()
+            for key in list(self._index):
+                self._remove(key)
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> dict:
+        """
+        캐시 통계 반환
+
+        Returns:
+            dict: hits, misses, entries, bytes
+        """
+        with self._lock:
+            self._load_index()
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "entries": len(self._index),
+                "bytes": self._total_bytes,
+            }
+
+
+# ---------- 프로세스 공용 인스턴스 ----------
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def get_response_cache() -> ResponseCache:
+    """프로세스 공용 응답 캐시 반환 (모듈 변수이므로 Streamlit rerun 간에도 유지)"""
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = ResponseCache()
+        return _default_cache
@@ -0,0 +1,1943 @@
+# ============================================================================
+# Test Scenario Generator 2 - 코어 모듈
+# 프롬프트 / Gemini 호출 / JSON 파싱 / Excel 변환 / 배치 파이프라인
+# ============================================================================
+# Streamlit에 의존하지 않는 로직만 모아둔 모듈입니다.
+# 배치 워커 스레드에서도 안전하게 호출할 수 있도록 st.session_state 대신
+# 필요한 값(API 키, 스타일 가이드 등)을 인자로 전달받습니다.
+# ============================================================================
+
+# ---------- 라이브러리 Import ----------
+import google.generativeai as genai  # Google Gemini API 연동
+import pandas as pd  # 데이터프레임 처리 및 Excel 변환
+import base64  # 이미지 파일을 Base64로 인코딩하기 위해 사용
+import json  # JSON 파싱 및 변환
+import hashlib  # 모델 풀 키 (시스템 프롬프트 해시)
+import re  # 정규식 패턴 매칭 (스트리밍 중 사고 과정 추출)
+from io import BytesIO  # 메모리 상에서 파일 객체 생성 (Excel 다운로드용)
+from pydantic import BaseModel, Field  # 구조화된 데이터 모델 정의
+from typing import Callable, Iterator, List, Optional, Tuple  # 타입 힌팅
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait  # 배치 동시 처리
+import time  # 재시도 간 대기 시간 처리
+import uuid  # 배치 실행 ID (같은 초에 시작한 배치 구분)
+import os  # 파일 경로 및 디렉토리 작업
+import threading  # Excel 메모이제이션 동기화
+import queue  # 스트리밍 조각 전달 (워커 스레드 -> 메인 스레드)
+import sys  # 회귀 확인 종료 코드
+from collections import OrderedDict  # LRU 순서 관리
+from dataclasses import dataclass  # 호출 통계
+from functools import partial  # 단계 호출 인자 고정
+from response_cache import get_response_cache, make_cache_key  # Gemini 응답 디스크 캐시
+from json_stream import EVENT_ABANDONED, EVENT_ITEM, EVENT_VALUE, JsonStreamExtractor, iter_json_values, loads_or_none  # LLM 응답 JSON 단일 패스 추출
+from near_dedup import near_dedup_dataframe  # 유사 중복 제거 (MinHash + LSH)
+from image_preprocess import PreparedImage, prepare_image, prepare_image_tiles, detect_mime_type  # 업로드 전 이미지 축소/재인코딩
+from batch_spool import ShardSpool  # 배치 결과 디스크 스풀 (조각 병합 -> 스트리밍 워크북)
+from batch_checkpoint import BatchCheckpoint, STATE_PHASE1_DONE, STATE_INTEGRATION_DONE  # 배치 체크포인트 (이어하기)
+from rate_limit import THROTTLE_MAX_RETRIES, get_rate_limiter, is_rate_limit_error, retry_delay  # 모델별 속도 제한/백오프
+from api_key_pool import ApiKeyState, get_api_key_pool, mask_api_key  # 여러 API 키 분산 (키별 클라이언트)
+from excel_export import create_excel_file_fast, dataframe_fingerprint, estimate_column_widths  # 대용량 Excel 스트리밍 내보내기
+
+# ---------- Pydantic 데이터 모델 정의 ----------
+class TestCase(BaseModel):
+    """단일 테스트 케이스 구조를 정의하는 Pydantic 모델"""
+    파일명: str = Field(default="", description="소스 이미지 파일명")
+    구분: str = Field(description="단위 또는 통합")
+    화면경로: str = Field(description="화면 경로")
+    화면명: str = Field(description="화면 이름")
+    화면ID: str = Field(description="화면 식별자")
+    시나리오ID: str = Field(description="시나리오 ID")
+    시나리오명: str = Field(description="시나리오 이름 (상위 묶음)")
+    테스트케이스ID: str = Field(description="테스트 케이스 ID")
+    테스트케이스명: str = Field(description="테스트 케이스 이름 (하위 묶음)")
+    테스트항목_및_절차: str = Field(description="테스트 항목 및 절차")
+    입력데이터: str = Field(description="입력할 데이터")
+    기대결과: str = Field(description="예상되는 결과")
+    비교검증로직: str = Field(description="검증 방법 및 로직")
+    주의태그: Optional[str] = Field(default="", description="[주의] 태그")
+
+class TestCaseList(BaseModel):
+    """여러 테스트 케이스를 담는 컨테이너 모델"""
+    test_cases: List[TestCase]
+
+class StructuredScenarioResponse(BaseModel):
+    """구조화 출력 모드 응답 (사고 과정 요약 + 테스트 케이스)"""
+    사고_과정: str = Field(description="화면 분석, 테스트 전략, 스타일 적용 내용을 한글로 간결하게 요약")
+    test_cases: List[TestCase]
+
+# ---------- 구조화 출력 (응답 스키마) ----------
+
+# 앱이 채우는 필드는 스키마에서 제외 (출력 토큰 절약)
+STRUCTURED_EXCLUDED_FIELDS = {'파일명'}
+
+def _to_gemini_schema(json_schema: dict, defs: dict) -> dict:
+    """Pydantic JSON 스키마 노드를 Gemini response_schema 형식(OpenAPI 부분집합)으로 변환"""
+    if '$ref' in json_schema:
+        return _to_gemini_schema(defs[json_schema['$ref'].split('/')[-1]], defs)
+    
+    # Optional[X] -> X + nullable
+    if 'anyOf' in json_schema:
+        variants = [v for v in json_schema['anyOf'] if v.get('type') != 'null']
+        schema = _to_gemini_schema(variants[0], defs)
+        if len(variants) < len(json_schema['anyOf']):
+            schema['nullable'] = True
+        if 'description' in json_schema:
+            schema['description'] = json_schema['description']
+        return schema
+    
+    schema = {'type': json_schema['type'].upper()}
+    # 객체의 description은 클래스 docstring이므로 제외 (필드 설명만 전달)
+    if 'description' in json_schema and json_schema['type'] != 'object':
+        schema['description'] = json_schema['description']
+    if json_schema['type'] == 'object':
+        properties = {
+            name: _to_gemini_schema(prop, defs)
+            for name, prop in json_schema.get('properties', {}).items()
+            if name not in STRUCTURED_EXCLUDED_FIELDS
+        }
+        schema['properties'] = properties
+        schema['required'] = [name for name in properties]
+    elif json_schema['type'] == 'array':
+        schema['items'] = _to_gemini_schema(json_schema['items'], defs)
+    return schema
+
+def build_response_schema(model_cls=StructuredScenarioResponse) -> dict:
+    """
+    Pydantic 모델로 Gemini response_schema 생성
+    
+    genai SDK의 Pydantic 변환은 default 값이 있는 필드를 처리하지 못하므로 직접 변환합니다.
+    
+    Returns:
+        dict: generation_config의 response_schema 값
+    """
+    json_schema = model_cls.model_json_schema()
+    return _to_gemini_schema(json_schema, json_schema.get('$defs', {}))
+
+RESPONSE_SCHEMA = build_response_schema()
+
+def structured_generation_config(generation_config: Optional[dict] = None) -> dict:
+    """생성 설정에 JSON MIME 타입 + 응답 스키마 추가"""
+    config = dict(generation_config or {})
+    config["response_mime_type"] = "application/json"
+    config["response_schema"] = RESPONSE_SCHEMA
+    return config
+
+# 구조화 출력 모드에서 [사고 과정] 텍스트 섹션 대신 사용하는 지시문
+STRUCTURED_OUTPUT_INSTRUCTION = """
+**[출력 형식]**
+응답은 지정된 JSON 스키마로만 작성합니다. (코드 블록, 설명 텍스트 없이)
+- `사고_과정`: 화면 분석 / 테스트 전략 / 스타일 적용 내용을 한글로 간결하게 요약
+- `test_cases`: 테스트 케이스 목록
+"""
+
+# ---------- 파싱 실패 통계 (모드별) ----------
+PARSE_MODE_TEXT = "text"  # [사고 과정] + ```json 텍스트 응답
+PARSE_MODE_STRUCTURED = "structured"  # 응답 스키마 + JSON MIME 타입
+
+_parse_stats = {PARSE_MODE_TEXT: {"attempts": 0, "failures": 0}, PARSE_MODE_STRUCTURED: {"attempts": 0, "failures": 0}}
+_parse_stats_lock = threading.Lock()
+
+def record_parse_result(mode: str, success: bool):
+    """응답 파싱 결과 기록 (프로세스 단위, 배치 워커 스레드에서도 호출)"""
+    with _parse_stats_lock:
+        stats = _parse_stats.setdefault(mode, {"attempts": 0, "failures": 0})
+        stats["attempts"] += 1
+        if not success:
+            stats["failures"] += 1
+
+def get_parse_stats() -> dict:
+    """
+    모드별 파싱 통계 반환
+    
+    Returns:
+        dict: {모드: {"attempts": 시도 수, "failures": 실패 수}}
+    """
+    with _parse_stats_lock:
+        return {mode: dict(stats) for mode, stats in _parse_stats.items()}
+
+def reset_parse_stats():
+    """파싱 통계 초기화"""
+    with _parse_stats_lock:
+        for stats in _parse_stats.values():
+            stats["attempts"] = 0
+            stats["failures"] = 0
+
+# ---------- LLM System Prompt 정의 ----------
+
+# ========== 1. 개발자/QA용 단위테스트 프롬프트 ==========
+DEVELOPER_UNIT_PROMPT = """당신은 대규모 엔터프라이즈 시스템(보험, 금융 등) 구축 프로젝트의 수석 QA 매니저입니다.
+제공된 UI/UX 기획안을 분석하여 **개발자 및 QA 담당자**가 검증해야 할 **기술적 단위 테스트**를 생성합니다.
+
+### 테스트 관점: 개발자/QA (기술 검증)
+
+이 테스트는 개발자가 구현을 올바르게 했는지, QA가 기술적 품질을 검증하는 데 사용됩니다.
+
+### 테스트 범위 (기술적 단위 테스트)
+
+* **필드 유효성 검사**: 입력 형식, 길이 제한, 필수값, 정규식 패턴
+* **경계값 분석**: 최소값, 최대값, 경계값, 초과값
+* **UI 요소 동작**: 버튼 활성화/비활성화, 체크박스, 라디오버튼, 드롭다운
+* **에러 처리**: 에러 메시지 표시, 유효성 검사 실패 시 동작
+* **화면 상태 변화**: 조건부 표시/숨김, 동적 UI 변경
+* **데이터 바인딩**: 입력값 반영, 계산 로직, 자동완성
+
+### 출력 형식
+```json
+{
+  "test_cases": [
+    {
+      "구분": "개발단위",
+      "화면경로": "청약 > 계약자 정보",
+      "화면명": "계약자 정보 입력",
+      "화면ID": "SCR_CONTRACT_INFO",
+      "시나리오ID": "TS-DEV-001",
+      "시나리오명": "계약자 정보 유효성 검증",
+      "테스트케이스ID": "TC-DEV-001-001",
+      "테스트케이스명": "주민등록번호 길이 검증",
+      "테스트항목_및_절차": "주민등록번호 필드에 123456 (6자리) 입력 후 이동",
+      "입력데이터": "주민등록번호: '123456'",
+      "기대결과": "'주민등록번호는 13자리여야 합니다' 에러 메시지 표시",
+      "비교검증로직": "[원칙] 13자리 형식 검증 / [예외] 빈 값은 필수값 에러",
+      "주의태그": ""
+    }
+  ]
+}
+```
+
+### 규칙
+* `구분` 필드: "개발단위"로 설정
+* 최소 15개 이상 생성
+* Positive/Negative 케이스 균형
+* 논리 오류, 허점 발견 시 [주의] 태그 필수
+"""
+
+# ========== 2. 현업용 단위테스트 프롬프트 ==========
+BUSINESS_UNIT_PROMPT = """당신은 보험 업무 전문가이자 UAT(User Acceptance Test) 설계자입니다.
+제공된 UI/UX 기획안을 분석하여 **현업 담당자**가 실제 업무 관점에서 검증할 **업무 단위 테스트**를 생성합니다.
+
+### 테스트 관점: 현업 담당자 (업무 검증)
+
+이 테스트는 현업 담당자가 실제 업무를 수행할 때 시스템이 올바르게 동작하는지 검증하는 데 사용됩니다.
+**기술적 테스트(필드 유효성, 경계값 등)는 개발팀에서 이미 완료했다고 가정합니다.**
+
+### 테스트 범위 (업무 단위 테스트)
+
+* **업무 흐름 검증**: 정상적인 업무 처리 흐름 확인
+* **업무 규칙 준수**: 보험 업무 규정, 내부 지침 준수 여부
+* **데이터 정합성**: 입력 데이터가 올바르게 저장/조회되는지
+* **권한별 기능**: 사용자 권한에 따른 기능 접근 확인
+* **조회/등록/수정/삭제**: 기본 CRUD 업무의 정상 동작
+* **출력물 확인**: 청약서, 증권, 영수증 등 출력물 정확성
+
+### 제외 항목 (개발팀에서 검증 완료)
+- 필드별 유효성 검사 (길이, 형식)
+- 경계값 분석
+- 에러 메시지 표시 조건
+- UI 요소 상태 변화
+
+### 출력 형식
+```json
+{
+  "test_cases": [
+    {
+      "구분": "현업단위",
+      "화면경로": "청약 > 계약자 정보",
+      "화면명": "계약자 정보 입력",
+      "화면ID": "SCR_CONTRACT_INFO",
+      "시나리오ID": "TS-BIZ-001",
+      "시나리오명": "신규 계약자 등록 프로세스",
+      "테스트케이스ID": "TC-BIZ-001-001",
+      "테스트케이스명": "정상 신규 등록",
+      "테스트항목_및_절차": "신규 계약자 정보를 모두 입력하고 저장 버튼 클릭",
+      "입력데이터": "계약자명: 홍길동 / 주민번호: 850101-1234567",
+      "기대결과": "저장 완료 메시지 표시 및 피보험자 입력 화면으로 이동",
+      "비교검증로직": "[원칙] 필수 정보 입력 시 정상 저장",
+      "주의태그": ""
+    }
+  ]
+}
+```
+
+### 규칙
+* `구분` 필드: "현업단위"로 설정
+* 최소 10개 이상 생성
+* 실제 업무 시나리오 기반
+* 업무 규칙 위반 가능성 있으면 [주의] 태그 필수
+"""
+
+# ========== 3. 현업용 통합테스트 프롬프트 ==========
+BUSINESS_INTEGRATION_PROMPT = """당신은 보험 업무 전문가이자 통합 테스트 설계자입니다.
+제공된 UI/UX 기획안을 분석하여 **현업 담당자**가 검증할 **화면 내 통합 테스트**를 생성합니다.
+
+### 테스트 관점: 화면 내 통합 테스트
+
+**중요**: 이 테스트는 **현재 화면 내에서 수행 가능한 범위**의 통합 테스트입니다.
+전체 청약 프로세스(청약→심사→승인)가 아니라, 해당 화면에서 비즈니스 조건에 따라 달라지는 동작을 검증합니다.
+
+단위 테스트보다 약간 상위 레벨로, 화면 내 여러 요소의 **상호작용**과 **조건 조합**을 테스트합니다.
+
+### 테스트 범위 (화면 내 통합)
+
+* **조건별 동작 변화**: 계약자 유형(성인/미성년자)에 따른 화면 내 필드 변화
+* **필드 간 연동**: 특정 값 입력 시 다른 필드 자동 변경/표시
+* **비즈니스 규칙 조합**: 상품+계약자+피보험자 조합에 따른 화면 동작
+* **권한별 기능 차이**: 사용자 권한에 따른 버튼/메뉴 활성화
+* **외부 연동 결과 반영**: 본인인증, 계좌인증 결과에 따른 화면 변화
+* **에러 복구 흐름**: 오류 발생 후 재입력 시 화면 상태
+
+### 제외 항목 (별도 테스트 범위)
+- 다른 화면으로의 이동 테스트
+- 전체 청약 프로세스 End-to-End 테스트
+- 시스템 간 연동 테스트
+
+### 출력 형식
+```json
+{
+  "test_cases": [
+    {
+      "구분": "현업통합",
+      "화면경로": "청약 > 계약자 정보",
+      "화면명": "계약자 정보 입력",
+      "화면ID": "SCR_CONTRACT_INFO",
+      "시나리오ID": "TS-INT-001",
+      "시나리오명": "계약자 유형별 화면 동적 변화",
+      "테스트케이스ID": "TC-INT-001-001",
+      "테스트케이스명": "미성년자 선택 시 법정대리인 노출",
+      "테스트항목_및_절차": "생년월일에 2010-01-15 (만 15세) 입력 후 포커스 이동",
+      "입력데이터": "생년월일: 2010-01-15",
+      "기대결과": "법정대리인 정보 입력 영역이 화면에 나타나고 필수값으로 지정됨",
+      "비교검증로직": "[원칙] 미성년자는 법정대리인 필수",
+      "주의태그": "",
+      "생성조건": "계약자: 미성년자"
+    }
+  ]
+}
+```
+
+### 규칙
+* `구분` 필드: "현업통합"으로 설정
+* `생성조건` 필드: 적용된 비즈니스 조건 명시
+* 최소 10개 이상 생성
+* **반드시 현재 화면 내에서 수행 가능한 테스트만 작성**
+* 화면 내 조건 조합에 따른 동작 변화 중심
+* 법규/규정 위반 가능성 있으면 [주의] 태그 필수
+"""
+
+# 기존 호환성을 위한 alias (기본값: 개발자용)
+SYSTEM_PROMPT = DEVELOPER_UNIT_PROMPT
+INTEGRATION_TEST_PROMPT = BUSINESS_INTEGRATION_PROMPT
+
+
+# ---------- 유틸리티 함수들 ----------
+
+def encode_image_to_base64(uploaded_file) -> str:
+    """
+    업로드된 이미지 파일을 Base64 문자열로 인코딩
+    
+    Args:
+        uploaded_file: Streamlit의 UploadedFile 객체
+    
+    Returns:
+        str: Base64로 인코딩된 이미지 문자열
+    """
+    # 업로드된 파일의 바이트 데이터를 읽음
+    bytes_data = uploaded_file.getvalue()
+    # Base64로 인코딩하고 UTF-8 문자열로 디코딩하여 반환
+    return base64.b64encode(bytes_data).decode('utf-8')
+
+
+def encode_prepared_image(uploaded_file, image_options: Optional[dict] = None) -> Tuple[str, PreparedImage]:
+    """
+    업로드된 이미지를 전처리(축소/재인코딩)한 뒤 Base64 문자열로 인코딩
+    
+    Args:
+        uploaded_file: Streamlit의 UploadedFile 객체
+        image_options: prepare_image() 옵션 (max_edge, output_format, quality)
+    
+    Returns:
+        Tuple[str, PreparedImage]: (Base64 문자열, 전처리 결과 - MIME 타입/절감 통계 포함)
+    """
+    prepared = prepare_image(uploaded_file.getvalue(), **(image_options or {}))
+    return base64.b64encode(prepared.data).decode('utf-8'), prepared
+
+# ---------- 호출 통계 (배치 단계별 재시도) ----------
+
+@dataclass
+class CallStats:
+    """
+    Gemini 호출 통계 (배치 이미지 1장 또는 배치 전체 합계)
+    
+    단계(테스트 유형 1개 / 2차 통합 호출)마다 따로 만들어 한 스레드에서만 갱신하고, 끝난 뒤 merge()로 합칩니다.
+    """
+    api_calls: int = 0  # 실제 API 호출 수 (캐시 적중 제외)
+    cache_hits: int = 0  # 캐시에서 바로 반환한 수
+    retries: int = 0  # 단계 재시도 수
+    wasted_calls: int = 0  # 결과를 쓰지 못한 API 호출 수 (호출/파싱 실패)
+    throttled: int = 0  # 받은 429 수 (속도 제한 안에서 대기 후 다시 호출)
+    
+    def merge(self, other: "CallStats") -> "CallStats":
+        self.api_calls += other.api_calls
+        self.cache_hits += other.cache_hits
+        self.retries += other.retries
+        self.wasted_calls += other.wasted_calls
+        self.throttled += other.throttled
+        return self
+
+class BatchStepError(Exception):
+    """배치 단계가 재시도 후에도 실패한 경우 (실패한 단계 이름과 이미지 1장의 호출 통계 포함)"""
+    
+    def __init__(self, step: str, error: Exception, call_stats: CallStats):
+        super().__init__(f"[{step}] {error}")
+        self.step = step
+        self.call_stats = call_stats
+
+class BatchCancelled(Exception):
+    """배치 작업이 취소되어 이미지 처리를 중간에 멈춘 경우 (다음 API 호출 전에 확인, 끝난 단계는 체크포인트에 남음)"""
+    
+    def __init__(self, call_stats: Optional[CallStats] = None):
+        super().__init__("사용자 요청으로 취소됨")
+        self.call_stats = call_stats or CallStats()
+
+# ---------- Gemini 모델 생성 ----------
+
+# 모델 생성 함수 (기본: genai.GenerativeModel). 테스트/오프라인 실행 시 가짜 모델로 교체 가능
+_model_factory = None
+
+
+def set_model_factory(factory: Optional[Callable] = None):
+    """
+    Gemini 모델 생성 함수 교체 (None이면 genai.GenerativeModel로 복원)
+    
+    factory는 genai.GenerativeModel과 같은 키워드 인자(model_name, system_instruction,
+    generation_config)와 api_key(키 풀에서 고른 키, 기본 설정이면 None)를 받아
+    generate_content(contents, stream=...)를 가진 객체를 반환해야 합니다. (예: fake_gemini.RecordedModelFactory)
+    """
+    global _model_factory
+    _model_factory = factory
+    clear_model_pool()  # 이전 생성 함수로 만든 모델은 재사용하지 않음
+
+
+def _create_model(model_name: str, system_instruction: str, generation_config: Optional[dict] = None,
+                  key_state: Optional[ApiKeyState] = None):
+    """
+    모델 객체 생성 (generation_config가 없으면 모델 기본값)
+    
+    key_state가 있으면 그 키 전용 클라이언트를 연결합니다. (genai.configure 전역 설정을 쓰지 않음)
+
+    google-generativeai에는 모델별로 클라이언트를 넘기는 공개 인자가 없습니다.
+    키마다 genai.configure()를 바꾸는 방법은 모델이 첫 generate_content() 때 전역 기본 클라이언트를
+    가져가므로 생성 시점에 키를 고정할 수 없고, 다른 스레드의 기본 클라이언트까지 바꿉니다.
+    그래서 GenerativeModel._client(비어 있을 때만 기본 클라이언트 사용)에 직접 연결하며,
+    이 동작을 확인한 버전(<0.9)으로 requirements.txt에 고정해 두고, SDK를 올릴 때는
+    check_key_client_binding()(python scenario_core.py)으로 _client 동작이 그대로인지 확인합니다.
+
+    Raises:
+        RuntimeError: 설치된 SDK의 GenerativeModel에 _client가 없는 경우 (키별 연결 불가)
+    """
+    model_kwargs = {"model_name": model_name, "system_instruction": system_instruction}
+    if generation_config is not None:
+        model_kwargs["generation_config"] = generation_config
+    if _model_factory is not None:
+        return _model_factory(api_key=key_state.key if key_state else None, **model_kwargs)
+    model = genai.GenerativeModel(**model_kwargs)
+    client = key_state.client() if key_state else None
+    if client is not None:
+        if not hasattr(model, "_client"):
+            # 조용히 전역 키로 호출하면 키별 할당량 분산이 깨지므로 바로 알림
+            raise RuntimeError(
+                f"google-generativeai {getattr(genai, '__version__', '?')}는 키별 클라이언트 연결을 지원하지 않습니다. "
+                "requirements.txt의 버전(<0.9)으로 설치하세요."
+            )
+        model._client = client  # generate_content()는 _client가 없을 때만 전역 기본 클라이언트를 사용
+    return model
+
+# ---------- Gemini 모델 재사용 풀 ----------
+# 같은 (API 키, 모델, 시스템 프롬프트, 생성 설정) 요청은 모델 객체를 한 번만 만들고 재사용합니다.
+# (모듈 변수이므로 rerun/배치 이미지 간 유지, 키별 클라이언트 연결도 함께 유지)
+# 모델 객체는 요청 간 상태가 없으므로 여러 스레드가 동시에 사용해도 됩니다.
+MODEL_POOL_MAX_ENTRIES = 64
+
+_model_pool = OrderedDict()  # 풀 키 -> 모델 객체 (오래 사용 안 한 순서)
+_model_pool_stats = {"hits": 0, "misses": 0}
+_model_pool_lock = threading.Lock()
+
+
+def _model_pool_key(model_name: str, system_instruction: str, generation_config: Optional[dict],
+                    key_state: Optional[ApiKeyState]) -> tuple:
+    """풀 키: (키 식별자, 모델명, 시스템 프롬프트 해시, 생성 설정 JSON)"""
+    config_text = None if generation_config is None else json.dumps(generation_config, sort_keys=True, ensure_ascii=False, default=str)
+    return (
+        key_state.key_id if key_state else "",
+        model_name,
+        hashlib.sha256((system_instruction or "").encode("utf-8")).hexdigest(),
+        config_text,
+    )
+
+
+def get_model(model_name: str, system_instruction: str, generation_config: Optional[dict] = None,
+              key_state: Optional[ApiKeyState] = None):
+    """
+    모델 객체 반환 (같은 키/모델/시스템 프롬프트/생성 설정이면 이전에 만든 객체 재사용)
+    
+    Args:
+        model_name: Gemini 모델명
+        system_instruction: 시스템 프롬프트
+        generation_config: 생성 설정 (없으면 모델 기본값)
+        key_state: 키 풀에서 고른 키 (없으면 genai 기본 설정)
+    """
+    pool_key = _model_pool_key(model_name, system_instruction, generation_config, key_state)
+    with _model_pool_lock:
+        model = _model_pool.get(pool_key)
+        if model is not None:
+            _model_pool.move_to_end(pool_key)
+            _model_pool_stats["hits"] += 1
+            return model
+        _model_pool_stats["misses"] += 1
+    
+    # 모델 생성은 잠금 밖에서 (동시에 만들어지면 먼저 등록된 객체 사용)
+    model = _create_model(model_name, system_instruction, generation_config, key_state)
+    with _model_pool_lock:
+        model = _model_pool.setdefault(pool_key, model)
+        _model_pool.move_to_end(pool_key)
+        while len(_model_pool) > MODEL_POOL_MAX_ENTRIES:
+            _model_pool.popitem(last=False)
+    return model
+
+
+def get_model_pool_stats() -> dict:
+    """모델 풀 현황 (entries: 보관 중인 모델 수, hits: 재사용 횟수, misses: 새로 만든 횟수)"""
+    with _model_pool_lock:
+        return {"entries": len(_model_pool), **_model_pool_stats}
+
+
+def clear_model_pool():
+    with _model_pool_lock:
+        _model_pool.clear()
+        _model_pool_stats["hits"] = 0
+        _model_pool_stats["misses"] = 0
+
+
+def _chunk_text(chunk) -> str:
+    """스트리밍 조각의 텍스트 (텍스트 파트가 없는 조각은 빈 문자열)"""
+    try:
+        return chunk.text or ""
+    except ValueError:
+        return ""
+
+
+def generate_text(model_name: str, system_instruction: str, contents, generation_config: Optional[dict] = None,
+                  use_cache: bool = True, stats: Optional[CallStats] = None, api_key: Optional[str] = None) -> str:
+    """
+    Gemini 모델을 생성하여 콘텐츠 생성 요청 후 응답 텍스트 반환 (모든 호출 지점의 공통 경로)
+    
+    동일한 (이미지, 시스템 프롬프트, 사용자 프롬프트, 모델, 생성 설정) 요청은 디스크 캐시에서 바로 반환합니다.
+    use_cache=False이면 캐시 조회를 건너뛰고 새로 호출한 결과로 캐시를 갱신합니다.
+    API 호출은 키 풀에서 고른 키로 (모델, 키)별 속도 제한 안에서 하며, 429는 키를 다시 골라 여기서 다시 호출합니다.
+    
+    Args:
+        model_name: 사용할 Gemini 모델명
+        system_instruction: 시스템 프롬프트
+        contents: generate_content()에 전달할 내용 (문자열 또는 [프롬프트, 이미지 파트] 리스트)
+        generation_config: 생성 설정 (없으면 모델 기본값)
+        use_cache: 캐시 조회 여부
+        stats: 호출 통계 (캐시 적중/API 호출/429 수 누적, 한 스레드에서만 갱신)
+        api_key: API 키 1개 또는 쉼표로 구분한 여러 키 (없으면 genai 기본 설정/환경 변수)
+    
+    Returns:
+        str: 응답 텍스트
+    
+    Raises:
+        Exception: API 오류 (429는 THROTTLE_MAX_RETRIES회 대기/재호출 후에도 계속될 때만)
+    """
+    cache = get_response_cache()
+    cache_key = make_cache_key(model_name, system_instruction, contents, generation_config)
+    if use_cache:
+        cached_text = cache.get(cache_key)
+        if cached_text is not None:
+            if stats is not None:
+                stats.cache_hits += 1
+            return cached_text
+    
+    if stats is not None:
+        stats.api_calls += 1
+    response_text = get_api_key_pool(api_key).call(
+        model_name,
+        lambda key_state: get_model(model_name, system_instruction, generation_config, key_state).generate_content(contents).text,
+        on_throttle=_throttle_counter(stats)
+    )
+    
+    cache.set(cache_key, response_text)
+    return response_text
+
+def _throttle_counter(stats: Optional[CallStats]) -> Optional[Callable[[BaseException], None]]:
+    """429를 받을 때마다 stats.throttled 증가"""
+    if stats is None:
+        return None
+    def count(_error: BaseException):
+        stats.throttled += 1
+    return count
+
+def generate_text_stream(model_name: str, system_instruction: str, contents, generation_config: Optional[dict] = None,
+                         use_cache: bool = True, api_key: Optional[str] = None) -> Iterator[str]:
+    """
+    generate_text()의 스트리밍 버전 - 응답 텍스트를 도착하는 조각 단위로 반환
+    
+    캐시 적중 시 저장된 전체 텍스트를 한 조각으로 반환하고,
+    끝까지 받은 응답만 캐시에 저장합니다. (중간에 실패한 응답은 저장하지 않음)
+    스트림을 받는 동안 (모델, 키)별 속도 제한의 호출 자리를 차지하며, 첫 조각 전에 받은 429만 키를 다시 골라 호출합니다.
+    
+    Yields:
+        str: 응답 텍스트 조각
+    """
+    cache = get_response_cache()
+    cache_key = make_cache_key(model_name, system_instruction, contents, generation_config)
+    if use_cache:
+        cached_text = cache.get(cache_key)
+        if cached_text is not None:
+            yield cached_text
+            return
+    
+    pool = get_api_key_pool(api_key)
+    chunks = []
+    for attempt in range(THROTTLE_MAX_RETRIES + 1):
+        key_state = pool.choose(model_name)
+        with get_rate_limiter(key_state.limiter_name(model_name)).slot() as slot:
+            started = time.monotonic()
+            try:
+                model = get_model(model_name, system_instruction, generation_config, key_state)
+                for chunk in model.generate_content(contents, stream=True):
+                    text = _chunk_text(chunk)
+                    if text:
+                        chunks.append(text)
+                        yield text
+            except Exception as e:
+                if not is_rate_limit_error(e):
+                    key_state.record_failure(e)
+                if chunks or not is_rate_limit_error(e) or attempt == THROTTLE_MAX_RETRIES:
+                    raise
+                slot.throttled(e)  # 이 키는 대기 시간 동안 다른 키가 선택됨
+            else:
+                key_state.record_success(time.monotonic() - started)
+                break
+    
+    cache.set(cache_key, "".join(chunks))
+
+# 이미지 분석 요청의 사용자 프롬프트 (시스템 프롬프트와 함께 이미지와 전송)
+IMAGE_USER_PROMPT = """
+위 시스템 프롬프트(및 스타일 가이드)에 정의된 규칙에 따라, 이 화면 설계서(이미지)를 분석하여 완벽한 테스트 시나리오를 생성해주세요.
+
+**[중요 요청사항]**
+결과물(JSON)을 생성하기 전에, 먼저 **[사고 과정]**이라는 섹션을 만들어서 다음 내용을 한글로 상세히 서술해주세요:
+1. **화면 분석**: 이미지가 어떤 화면인지(메뉴명, 기능 등) 파악한 내용
+2. **테스트 전략**: 어떤 관점에서 테스트 케이스를 도출할 것인지
+3. **스타일 적용**: (스타일 가이드가 있다면) 가이드의 어떤 특징(문체, 상세도)을 반영했는지
+
+**출력 순서:**
+1. [사고 과정] ... 텍스트 ...
+2. ```json ... 코드 블록 ...```
+"""
+
+# 구조화 출력 모드의 사용자 프롬프트 (사고 과정은 스키마의 사고_과정 필드에 요약)
+IMAGE_USER_PROMPT_STRUCTURED = "위 시스템 프롬프트(및 스타일 가이드)에 정의된 규칙에 따라, 이 화면 설계서(이미지)를 분석하여 완벽한 테스트 시나리오를 생성해주세요."
+
+# 분할 분석 시 조각마다 덧붙이는 안내 (조각 위치와 경계 처리 규칙)
+TILE_USER_PROMPT = """
+**[분할 분석 안내]**
+이 이미지는 {direction}로 긴 화면 설계서 전체를 {count}개로 나눈 조각 중 {index}번째입니다. ({order} 순서, 인접 조각과 일부 겹침)
+- 이 조각에 보이는 화면 요소와 Description 항목만 근거로 테스트 케이스를 작성하세요.
+- 조각 경계에서 잘려 일부만 보이는 항목은 온전히 보이는 다른 조각에서 다루므로, 추측해서 채우지 마세요.
+"""
+
+def build_tile_note(tile: PreparedImage) -> str:
+    """분할 조각용 안내 문구 (분할하지 않은 이미지는 빈 문자열)"""
+    if tile.tile_count <= 1:
+        return ""
+    return TILE_USER_PROMPT.format(
+        direction="세로" if tile.vertical else "가로",
+        count=tile.tile_count,
+        index=tile.tile_index + 1,
+        order="위→아래" if tile.vertical else "왼쪽→오른쪽",
+    )
+
+def _build_image_request(image_base64: str, test_type: str, sample_guide_text: str = "",
+                         structured: bool = False, mime_type: Optional[str] = None,
+                         tile_note: str = "") -> Tuple[str, list, Optional[dict]]:
+    """
+    테스트 유형별 이미지 분석 요청 구성
+    
+    Args:
+        structured: 구조화 출력 모드 (응답 스키마 + JSON MIME 타입, 사고 과정은 스키마 필드로)
+        mime_type: 이미지 MIME 타입 (None이면 이미지 내용으로 감지)
+        tile_note: 분할 조각 안내 문구 (build_tile_note() 결과, 사용자 프롬프트 뒤에 추가)
+    
+    Returns:
+        Tuple[str, list, Optional[dict]]: (시스템 프롬프트, generate_content()에 전달할 contents, 생성 설정)
+    """
+    # 테스트 유형에 따른 프롬프트 선택
+    if test_type == "개발자/QA용 단위테스트":
+        selected_prompt = DEVELOPER_UNIT_PROMPT
+    elif test_type == "현업용 단위테스트":
+        selected_prompt = BUSINESS_UNIT_PROMPT
+    else:  # 현업용 통합테스트
+        selected_prompt = BUSINESS_INTEGRATION_PROMPT
+        
+    # [New] 엑셀 샘플 가이드가 있으면 프롬프트에 추가 (톤앤매너 반영)
+    if sample_guide_text:
+        selected_prompt += "\n" + sample_guide_text
+    
+    # 이미지 데이터를 Gemini가 이해할 수 있는 형식으로 변환
+    # MIME 타입은 실제 이미지 포맷 기준 (확장자/고정값 사용 시 PNG를 JPEG로 보내는 문제 방지)
+    if mime_type is None:
+        mime_type = detect_mime_type(base64.b64decode(image_base64)) or "image/png"
+    image_part = {
+        "mime_type": mime_type,
+        "data": image_base64  # Base64 인코딩된 이미지 데이터
+    }
+    
+    # 프롬프트와 이미지를 함께 전송
+    # system_instruction을 사용하므로 메시지 본문에는 지시어만 전달
+    if structured:
+        return (selected_prompt + "\n" + STRUCTURED_OUTPUT_INSTRUCTION,
+                [IMAGE_USER_PROMPT_STRUCTURED + tile_note, image_part],
+                structured_generation_config())
+    return selected_prompt, [IMAGE_USER_PROMPT + tile_note, image_part], None
+
+def call_gemini_api(api_key: str, image_base64: str, model_name: str = "models/gemini-2.5-flash", test_type: str = "개발자/QA용 단위테스트", sample_guide_text: str = "", use_cache: bool = True,
+                    structured: bool = False, mime_type: Optional[str] = None) -> str:
+    """
+    Google Gemini API를 호출하여 이미지 분석 및 테스트 시나리오 생성
+    
+    Args:
+        api_key: Google AI Studio에서 발급받은 API 키 (쉼표로 구분하면 여러 키에 분산)
+        image_base64: Base64로 인코딩된 이미지 데이터
+        model_name: 사용할 Gemini 모델명 (기본값: models/gemini-2.5-flash)
+        test_type: 테스트 유형 (개발자/QA용 단위테스트, 현업용 단위테스트, 현업용 통합테스트)
+        sample_guide_text: 엑셀 샘플에서 추출한 스타일 가이드 (없으면 빈 문자열)
+        use_cache: 응답 캐시 조회 여부 (False면 새로 호출하여 캐시 갱신)
+        structured: 구조화 출력 모드 (응답은 parse_scenario_response(..., structured=True)로 파싱)
+        mime_type: 이미지 MIME 타입 (prepare_image() 결과, None이면 이미지 내용으로 감지)
+    
+    Returns:
+        str: LLM이 생성한 JSON 형식의 테스트 시나리오
+    """
+    selected_prompt, contents, generation_config = _build_image_request(image_base64, test_type, sample_guide_text, structured, mime_type)
+    
+    # system_instruction으로 프롬프트를 설정하여 일관성 강화 (2.0 모델 권장)
+    # 생성된 텍스트 응답 반환 (동일 요청은 캐시에서 반환, API 키는 요청 단위로 연결)
+    return generate_text(model_name, selected_prompt, contents, generation_config, use_cache=use_cache, api_key=api_key)
+
+def call_gemini_api_stream(api_key: str, image_base64: str, model_name: str = "models/gemini-2.5-flash", test_type: str = "개발자/QA용 단위테스트", sample_guide_text: str = "", use_cache: bool = True,
+                           structured: bool = False, mime_type: Optional[str] = None) -> Iterator[str]:
+    """
+    call_gemini_api()의 스트리밍 버전 - 응답 텍스트를 조각 단위로 반환
+    
+    Yields:
+        str: 응답 텍스트 조각
+    """
+    selected_prompt, contents, generation_config = _build_image_request(image_base64, test_type, sample_guide_text, structured, mime_type)
+    yield from generate_text_stream(model_name, selected_prompt, contents, generation_config, use_cache=use_cache, api_key=api_key)
+
+def call_gemini_api_parallel(api_key: str, image_base64: str, model_name: str, test_types: List[str],
+                             sample_guide_text: str = "", max_retries: int = 1,
+                             use_cache: bool = True, structured: bool = False,
+                             mime_type: Optional[str] = None) -> Iterator[Tuple[str, Optional[str], Optional[Exception]]]:
+    """
+    같은 이미지에 대해 여러 테스트 유형을 동시에 호출
+    
+    유형별 호출은 서로 독립적이므로 한꺼번에 요청하고, 결과는 선택한 유형 순서대로 반환합니다.
+    각 유형은 실패 시 지수 백오프(jitter 포함) 대기 후 max_retries회까지 재시도합니다. (429는 generate_text()에서 처리)
+    
+    Args:
+        api_key: Google AI Studio에서 발급받은 API 키 (쉼표로 구분하면 여러 키에 분산)
+        image_base64: Base64로 인코딩된 이미지 데이터
+        model_name: 사용할 Gemini 모델명
+        test_types: 생성할 테스트 유형 목록
+        sample_guide_text: 엑셀 샘플 스타일 가이드
+        max_retries: 유형별 최대 재시도 횟수
+        use_cache: 응답 캐시 조회 여부
+        structured: 구조화 출력 모드
+        mime_type: 이미지 MIME 타입
+    
+    Yields:
+        Tuple[str, Optional[str], Optional[Exception]]: (테스트 유형, 응답 텍스트, 오류)
+    """
+    def call_with_retry(test_type: str) -> str:
+        retry_count = 0
+        while True:
+            try:
+                return call_gemini_api(api_key, image_base64, model_name, test_type, sample_guide_text, use_cache, structured, mime_type)
+            except Exception as e:
+                retry_count += 1
+                if retry_count > max_retries:
+                    raise
+                time.sleep(retry_delay(retry_count - 1, e))
+    
+    if not test_types:
+        return
+    with ThreadPoolExecutor(max_workers=len(test_types), thread_name_prefix="gemini-type") as executor:
+        futures = [(test_type, executor.submit(call_with_retry, test_type)) for test_type in test_types]
+        for test_type, future in futures:
+            error = future.exception()
+            yield test_type, (None if error else future.result()), error
+
+# 스트리밍 이벤트 종류
+STREAM_CHUNK = "chunk"  # 응답 텍스트 조각 도착
+STREAM_DONE = "done"  # 응답 완료
+STREAM_ERROR = "error"  # 실패 (재시도 후에도)
+
+def stream_gemini_api_parallel(api_key: str, image_base64: str, model_name: str, test_types: List[str],
+                               sample_guide_text: str = "", max_retries: int = 1,
+                               use_cache: bool = True, structured: bool = False,
+                               mime_type: Optional[str] = None) -> Iterator[Tuple[str, str, Optional[str], Optional[Exception]]]:
+    """
+    call_gemini_api_parallel()의 스트리밍 버전 - 여러 테스트 유형을 동시에 스트리밍 호출
+    
+    유형별 스트림은 워커 스레드에서 받고, 도착하는 순서대로 이벤트를 반환합니다.
+    (Streamlit 화면 갱신은 호출한 메인 스레드에서 수행)
+    재시도는 아직 조각을 하나도 받지 못한 경우에만 합니다. (이미 표시한 내용이 중복되지 않도록)
+    
+    Yields:
+        Tuple[str, str, Optional[str], Optional[Exception]]:
+            (이벤트 종류, 테스트 유형, 텍스트 조각, 오류)
+    """
+    events = queue.Queue()
+    
+    def stream_with_retry(test_type: str):
+        retry_count = 0
+        while True:
+            received = False
+            try:
+                for text in call_gemini_api_stream(api_key, image_base64, model_name, test_type, sample_guide_text, use_cache, structured, mime_type):
+                    received = True
+                    events.put((STREAM_CHUNK, test_type, text, None))
+                events.put((STREAM_DONE, test_type, None, None))
+                return
+            except Exception as e:
+                retry_count += 1
+                if received or retry_count > max_retries:
+                    events.put((STREAM_ERROR, test_type, None, e))
+                    return
+                time.sleep(retry_delay(retry_count - 1, e))
+    
+    if not test_types:
+        return
+    with ThreadPoolExecutor(max_workers=len(test_types), thread_name_prefix="gemini-stream") as executor:
+        for test_type in test_types:
+            executor.submit(stream_with_retry, test_type)
+        remaining = len(test_types)
+        while remaining:
+            event = events.get()
+            if event[0] != STREAM_CHUNK:
+                remaining -= 1
+            yield event
+
+# 분할 분석 동시 호출 상한 (조각 수 × 테스트 유형)
+MAX_TILE_WORKERS = 8
+
+def call_gemini_api_tiled(api_key: str, tiles: List[PreparedImage], model_name: str, test_types: List[str],
+                          sample_guide_text: str = "", max_retries: int = 1,
+                          use_cache: bool = True, structured: bool = False
+                          ) -> Iterator[Tuple[str, str, List[dict], Optional[Exception]]]:
+    """
+    긴 이미지를 조각별로 동시에 분석하고 유형별로 결과를 합쳐 반환
+    
+    (조각 × 테스트 유형) 호출을 한꺼번에 요청하고, 유형별로 모든 조각이 끝나면
+    조각 순서대로 테스트 케이스를 합친 뒤 drop_duplicate_cases()로 겹침 영역 중복을 제거합니다.
+    일부 조각만 실패한 경우 성공한 조각의 결과와 함께 첫 오류를 반환합니다.
+    
+    Args:
+        api_key: Google AI Studio에서 발급받은 API 키 (쉼표로 구분하면 여러 키에 분산)
+        tiles: prepare_image_tiles() 결과
+        model_name: 사용할 Gemini 모델명
+        test_types: 생성할 테스트 유형 목록
+        sample_guide_text: 엑셀 샘플 스타일 가이드
+        max_retries: 호출별 최대 재시도 횟수
+        use_cache: 응답 캐시 조회 여부
+        structured: 구조화 출력 모드
+    
+    Yields:
+        Tuple[str, str, List[dict], Optional[Exception]]: (테스트 유형, 조각별 사고 과정, 합친 테스트 케이스, 오류)
+    """
+    def call_tile(test_type: str, tile: PreparedImage) -> Tuple[str, List[dict]]:
+        image_base64 = base64.b64encode(tile.data).decode('utf-8')
+        selected_prompt, contents, generation_config = _build_image_request(
+            image_base64, test_type, sample_guide_text, structured, tile.mime_type, build_tile_note(tile)
+        )
+        retry_count = 0
+        while True:
+            try:
+                response_text = generate_text(model_name, selected_prompt, contents, generation_config,
+                                              use_cache=use_cache, api_key=api_key)
+                return parse_scenario_response(response_text, structured)
+            except Exception as e:
+                retry_count += 1
+                if retry_count > max_retries:
+                    raise
+                time.sleep(retry_delay(retry_count - 1, e))
+    
+    if not test_types or not tiles:
+        return
+    max_workers = min(MAX_TILE_WORKERS, len(tiles) * len(test_types))
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="gemini-tile") as executor:
+        futures = [(test_type, [executor.submit(call_tile, test_type, tile) for tile in tiles]) for test_type in test_types]
+        for test_type, tile_futures in futures:
+            thinking_parts = []
+            scenarios = []
+            first_error = None
+            for tile, future in zip(tiles, tile_futures):
+                error = future.exception()
+                if error is not None:
+                    first_error = first_error or error
+                    continue
+                thinking, tile_scenarios = future.result()
+                if thinking:
+                    thinking_parts.append(f"#### 🧩 조각 {tile.tile_index + 1}/{tile.tile_count}\n{thinking}")
+                scenarios.extend(tile_scenarios)
+            if scenarios:
+                scenarios = drop_duplicate_cases(pd.DataFrame(scenarios)).to_dict('records')
+            yield test_type, "\n\n".join(thinking_parts), scenarios, first_error
+
+def _coerce_test_cases(items: list) -> List[dict]:
+    """
+    test_cases 항목들을 Pydantic으로 검증하여 딕셔너리 리스트로 변환
+    
+    전체 검증이 실패하면 항목별로 검증하고, 검증에 실패한 항목도
+    시나리오ID/테스트케이스ID가 있으면 원본 그대로 살립니다.
+    """
+    try:
+        return [tc.model_dump() for tc in TestCaseList(test_cases=items).test_cases]
+    except Exception:
+        pass
+    
+    test_cases = []
+    for item in items:
+        if not isinstance(item, dict):
+            continue
+        try:
+            test_cases.append(TestCase(**item).model_dump())
+        except Exception:
+            # 필수 필드 확인
+            if '시나리오ID' in item and '테스트케이스ID' in item:
+                test_cases.append(item)
+    return test_cases
+
+
+def parse_json_response(response_text: str) -> List[dict]:
+    """
+    LLM 응답 텍스트를 파싱하여 테스트 시나리오 리스트로 변환 (텍스트 모드, 파싱 통계 기록)
+    
+    Args:
+        response_text: LLM이 반환한 JSON 문자열
+    
+    Returns:
+        List[dict]: 파싱된 테스트 시나리오 딕셔너리 리스트
+    """
+    try:
+        test_cases = _parse_json_text(response_text)
+    except Exception:
+        record_parse_result(PARSE_MODE_TEXT, False)
+        raise
+    record_parse_result(PARSE_MODE_TEXT, True)
+    return test_cases
+
+def parse_structured_response(response_text: str) -> Tuple[str, List[dict]]:
+    """
+    구조화 출력 모드 응답(JSON)을 파싱하여 사고 과정과 테스트 시나리오 리스트로 변환
+    
+    스키마대로 온 응답은 Pydantic으로 바로 검증하고, 출력 한도로 잘린 경우 등
+    스키마 검증에 실패하면 텍스트 모드 추출기로 완성된 항목만 복구합니다. (실패로 집계)
+    
+    Args:
+        response_text: LLM이 반환한 JSON 문자열
+    
+    Returns:
+        Tuple[str, List[dict]]: (사고 과정 요약, 테스트 시나리오 딕셔너리 리스트)
+    """
+    try:
+        parsed = StructuredScenarioResponse.model_validate_json(response_text)
+    except ValueError:
+        record_parse_result(PARSE_MODE_STRUCTURED, False)
+        return "", _parse_json_text(response_text)
+    record_parse_result(PARSE_MODE_STRUCTURED, True)
+    return parsed.사고_과정.strip(), [test_case.model_dump() for test_case in parsed.test_cases]
+
+def extract_thinking_text(response_text: str) -> str:
+    """텍스트 모드 응답에서 JSON 블록 앞의 [사고 과정] 텍스트 추출"""
+    cut_positions = [pos for pos in (response_text.find("```json"), response_text.find('{"')) if pos >= 0]
+    return (response_text[:min(cut_positions)] if cut_positions else response_text).strip()
+
+def parse_scenario_response(response_text: str, structured: bool = False) -> Tuple[str, List[dict]]:
+    """
+    모드에 맞게 응답 파싱
+    
+    Args:
+        response_text: LLM 응답 텍스트
+        structured: 구조화 출력 모드 응답 여부
+    
+    Returns:
+        Tuple[str, List[dict]]: (사고 과정, 테스트 시나리오 딕셔너리 리스트)
+    """
+    if structured:
+        return parse_structured_response(response_text)
+    return extract_thinking_text(response_text), parse_json_response(response_text)
+
+# ```json 코드 블록 (마지막 블록은 출력 한도로 닫는 표시가 없을 수 있음)
+_FENCED_BLOCK_RE = re.compile(r'```(?:json)?\s*(.*?)(?:```|$)', re.DOTALL)
+
+def _parse_json_text(response_text: str) -> List[dict]:
+    """
+    LLM 응답 텍스트에서 테스트 시나리오 추출
+    
+    응답을 한 번만 훑어 완성된 JSON 객체들을 찾습니다. ([사고 과정] 텍스트, ```json 코드 블록,
+    연속된 여러 JSON 객체, 문자열 속 괄호 모두 처리) 마지막 JSON이 잘렸거나 깨진 경우에는
+    test_cases 배열 안에서 완성된 항목만 살립니다.
+    전체에서 아무것도 찾지 못하면 (예: [사고 과정] 속 짝이 맞지 않는 따옴표가 코드 블록까지 이어진 경우)
+    코드 블록을 하나씩 따로 훑습니다.
+    
+    Args:
+        response_text: LLM이 반환한 JSON 문자열
+    
+    Returns:
+        List[dict]: 파싱된 테스트 시나리오 딕셔너리 리스트
+    """
+    all_test_cases, found_test_cases = _extract_test_cases(response_text)
+    if not (all_test_cases or found_test_cases):
+        for block in _FENCED_BLOCK_RE.findall(response_text):
+            block_test_cases, block_found = _extract_test_cases(block)
+            all_test_cases.extend(block_test_cases)
+            found_test_cases = found_test_cases or block_found
+    
+    if all_test_cases or found_test_cases:
+        return all_test_cases
+    
+    # JSON 파싱 실패 시 예외 발생
+    raise Exception(f"JSON 파싱 오류: 응답에서 테스트 케이스 JSON을 찾을 수 없습니다\n원본 텍스트:\n{response_text[:500]}...")
+
+def _extract_test_cases(response_text: str) -> Tuple[List[dict], bool]:
+    """
+    텍스트를 한 번 훑어 테스트 케이스 추출
+    
+    Returns:
+        Tuple[List[dict], bool]: (테스트 케이스, test_cases 키를 가진 JSON을 하나라도 찾았는지)
+    """
+    all_test_cases = []
+    found_test_cases = False
+    pending_items = []  # 현재 최상위 JSON 안에서 완성된 항목 텍스트 (JSON이 깨졌을 때만 파싱)
+    
+    for kind, text, value in iter_json_values(response_text):
+        if kind == EVENT_ITEM:
+            pending_items.append(text)
+            continue
+        
+        items, pending_items = pending_items, []
+        if kind == EVENT_ABANDONED:
+            # 닫히지 않은 채 코드 블록 표시를 만난 값: 완성된 항목만 사용
+            all_test_cases.extend(_coerce_test_cases([loads_or_none(item) for item in items]))
+            continue
+        
+        if value is None:
+            value = loads_or_none(text)
+        if isinstance(value, dict) and isinstance(value.get('test_cases'), list):
+            found_test_cases = True
+            all_test_cases.extend(_coerce_test_cases(value['test_cases']))
+        elif isinstance(value, dict) and '시나리오ID' in value and '테스트케이스ID' in value:
+            # 배열 또는 낱개로 나열된 테스트 케이스 객체
+            all_test_cases.extend(_coerce_test_cases([value]))
+        elif value is None:
+            # 괄호는 닫혔지만 JSON이 깨진 경우: 완성된 항목만 사용
+            all_test_cases.extend(_coerce_test_cases([loads_or_none(item) for item in items]))
+    
+    # 출력이 잘려 닫히지 않은 마지막 JSON의 완성된 항목
+    all_test_cases.extend(_coerce_test_cases([loads_or_none(item) for item in pending_items]))
+    return all_test_cases, found_test_cases
+
+# 구조화 모드 스트리밍 중 사고_과정 문자열 값 (닫는 따옴표 전까지 도착한 부분)
+_STRUCTURED_THINKING_RE = re.compile(r'"사고_과정"\s*:\s*"((?:[^"\\]|\\.)*)', re.DOTALL)
+
+class ScenarioStreamParser:
+    """
+    스트리밍 응답을 조각 단위로 받아 완성된 테스트 케이스를 즉시 반환하는 파서
+    
+    test_cases 배열 안의 항목 객체가 닫히는 즉시 TestCase로 검증하여 돌려주므로
+    응답 전체를 기다리지 않고 화면 표에 추가할 수 있습니다.
+    응답이 끝나면 finish()로 전체 텍스트를 parse_scenario_response()와 같은 규칙으로 다시 확정합니다.
+    
+    사용 예:
+        parser = ScenarioStreamParser()
+        for chunk in call_gemini_api_stream(...):
+            new_cases = parser.feed(chunk)
+            ...
+        scenarios = parser.finish()
+    """
+    
+    def __init__(self, structured: bool = False):
+        """
+        Args:
+            structured: 구조화 출력 모드 응답 여부 (사고 과정이 JSON의 사고_과정 필드에 있음)
+        """
+        self.structured = structured
+        self._extractor = JsonStreamExtractor()
+        self._chunks = []
+        self._final_thinking = None
+        self.test_cases = []  # 지금까지 도착한 테스트 케이스
+    
+    @property
+    def text(self) -> str:
+        """지금까지 받은 응답 전체 텍스트"""
+        return "".join(self._chunks)
+    
+    @property
+    def thinking_text(self) -> str:
+        """[사고 과정] 텍스트 (도착한 만큼, finish() 후에는 확정된 내용)"""
+        if self._final_thinking is not None:
+            return self._final_thinking
+        if not self.structured:
+            return extract_thinking_text(self.text)
+        
+        # 구조화 모드: "사고_과정": "... 문자열 값 중 도착한 부분
+        match = _STRUCTURED_THINKING_RE.search(self.text)
+        if match is None:
+            return ""
+        try:
+            return json.loads('"' + match.group(1) + '"').strip()
+        except ValueError:
+            return match.group(1).strip()
+    
+    def feed(self, chunk: str) -> List[dict]:
+        """
+        응답 조각 추가
+        
+        Returns:
+            List[dict]: 이번 조각으로 새로 완성된 테스트 케이스
+        """
+        self._chunks.append(chunk)
+        new_cases = []
+        for kind, text, _ in self._extractor.feed(chunk):
+            if kind == EVENT_ITEM:
+                new_cases.extend(_coerce_test_cases([loads_or_none(text)]))
+            elif kind == EVENT_VALUE:
+                # 배열 또는 낱개로 나열된 테스트 케이스 객체
+                value = loads_or_none(text)
+                if isinstance(value, dict) and '시나리오ID' in value and '테스트케이스ID' in value:
+                    new_cases.extend(_coerce_test_cases([value]))
+        self.test_cases.extend(new_cases)
+        return new_cases
+    
+    def finish(self) -> List[dict]:
+        """
+        응답 완료 후 전체 텍스트로 최종 테스트 케이스 확정
+        
+        Returns:
+            List[dict]: 파싱된 테스트 시나리오 딕셔너리 리스트 (parse_scenario_response와 동일)
+        """
+        thinking, test_cases = parse_scenario_response(self.text, self.structured)
+        self._final_thinking = thinking
+        return test_cases
+
+# 이 행 수 이상이면 create_excel_file()이 스트리밍 고속 모드 사용
+FAST_EXCEL_MIN_ROWS = 1000
+
+
+def create_excel_file(df: pd.DataFrame, fast: Optional[bool] = None) -> BytesIO:
+    """
+    DataFrame을 포맷팅된 Excel 파일로 변환
+    
+    Args:
+        df: 테스트 시나리오가 담긴 DataFrame
+        fast: True면 스트리밍 고속 모드, False면 기존 방식,
+              None이면 행 수(FAST_EXCEL_MIN_ROWS 이상)로 자동 선택
+    
+    Returns:
+        BytesIO: 메모리 상의 Excel 파일 객체
+    """
+    # 대용량(배치 통합 결과 등)은 write-only 스트리밍 작성기로 처리 (서식 동일)
+    if fast is None:
+        fast = len(df) >= FAST_EXCEL_MIN_ROWS
+    if fast:
+        return create_excel_file_fast(df)
+    
+    # 메모리 상에 바이너리 파일 객체 생성
+    output = BytesIO()
+    
+    # openpyxl 엔진을 사용하여 Excel 파일 작성
+    with pd.ExcelWriter(output, engine='openpyxl') as writer:
+        # DataFrame을 Excel 시트로 작성 (인덱스 제외)
+        df.to_excel(writer, index=False, sheet_name='테스트 시나리오')
+        
+        # 워크북과 워크시트 객체 가져오기
+        workbook = writer.book
+        worksheet = writer.sheets['테스트 시나리오']
+        
+        # 컴럼 너비 자동 조정 (26개 초과 컴럼도 지원)
+        from openpyxl.utils import get_column_letter
+        # 각 컴럼의 최대 길이 계산 (헤더와 데이터 중 긴 것, 여유분 추가, 최대 50)
+        column_widths = estimate_column_widths(df)
+        for idx, col in enumerate(df.columns):
+            worksheet.column_dimensions[get_column_letter(idx + 1)].width = column_widths[col]
+        
+        # 헤더 행 스타일 적용 (Bold, 배경색)
+        from openpyxl.styles import Font, PatternFill, Alignment
+        
+        header_font = Font(bold=True, color="FFFFFF")  # 굵은 흰색 글씨
+        header_fill = PatternFill(start_color="4472C4", end_color="4472C4", fill_type="solid")  # 파란색 배경
+        header_alignment = Alignment(horizontal="center", vertical="center")  # 중앙 정렬
+        
+        # 첫 번째 행(헤더)에 스타일 적용
+        for cell in worksheet[1]:
+            cell.font = header_font  # 폰트 적용
+            cell.fill = header_fill  # 배경색 적용
+            cell.alignment = header_alignment  # 정렬 적용
+        
+        # 모든 셀에 텍스트 줄바꿈 적용 (Alignment 객체 1개 공유)
+        body_alignment = Alignment(wrap_text=True, vertical="top")  # 자동 줄바꿈 및 상단 정렬
+        for row in worksheet.iter_rows(min_row=2, max_row=worksheet.max_row):
+            for cell in row:
+                cell.alignment = body_alignment
+    
+    # 파일 포인터를 시작 위치로 이동
+    output.seek(0)
+    return output
+
+# ---------- 다운로드용 Excel 바이트 메모이제이션 ----------
+# Streamlit은 상호작용마다 스크립트 전체를 다시 실행하므로, 같은 DataFrame의 워크북을
+# 매번 새로 만들지 않도록 내용 해시 기준으로 결과 바이트를 재사용합니다.
+# (모듈 변수이므로 rerun 간 유지, 여러 세션이 공유)
+EXCEL_MEMO_MAX_ENTRIES = 32
+EXCEL_MEMO_MAX_BYTES = 100 * 1024 * 1024  # 100MB
+
+_excel_memo = OrderedDict()  # 내용 해시 -> 워크북 바이트 (오래 사용 안 한 순서)
+_excel_memo_bytes = 0
+_excel_memo_lock = threading.Lock()
+
+
+def get_excel_bytes(df: pd.DataFrame) -> bytes:
+    """
+    DataFrame의 Excel 파일 바이트 반환 (같은 내용이면 이전 결과 재사용)
+
+    Args:
+        df: 테스트 시나리오가 담긴 DataFrame
+
+    Returns:
+        bytes: Excel 파일 내용
+    """
+    global _excel_memo_bytes
+    key = dataframe_fingerprint(df)
+    with _excel_memo_lock:
+        data = _excel_memo.get(key)
+        if data is not None:
+            _excel_memo.move_to_end(key)
+            return data
+
+    # 워크북 생성은 잠금 밖에서 (다른 세션의 조회를 막지 않도록)
+    data = create_excel_file(df).getvalue()
+
+    with _excel_memo_lock:
+        if key not in _excel_memo:
+            _excel_memo[key] = data
+            _excel_memo_bytes += len(data)
+        # 개수/용량 초과 시 오래된 항목부터 제거
+        while len(_excel_memo) > 1 and (len(_excel_memo) > EXCEL_MEMO_MAX_ENTRIES or _excel_memo_bytes > EXCEL_MEMO_MAX_BYTES):
+            _, old = _excel_memo.popitem(last=False)
+            _excel_memo_bytes -= len(old)
+    return data
+
+# ---------- 배치 처리 파이프라인 ----------
+
+# 배치 동시 처리 워커 수 (이미지 단위)
+DEFAULT_BATCH_WORKERS = 4
+MAX_BATCH_WORKERS = 16
+
+# 중복 제거 기준 컬럼 (절차+입력+기대결과)
+DEDUP_COLUMNS = ['테스트항목_및_절차', '입력데이터', '기대결과']
+
+# 배치 입력 이미지 확장자
+BATCH_IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.gif', '.bmp', '.webp')
+
+# 1차 생성 테스트 유형 (2차 현업용 통합테스트는 별도 단계)
+PHASE1_TEST_TYPES = ["개발자/QA용 단위테스트", "현업용 단위테스트"]
+
+# 비즈니스 조건 프리셋 파일 (앱과 같은 폴더)
+CONDITION_PRESETS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "condition_presets.json")
+
+def list_batch_images(input_folder: str, include_subfolders: bool = False) -> List[str]:
+    """
+    입력 폴더의 이미지 파일 목록 (입력 폴더 기준 상대 경로)
+    
+    Args:
+        input_folder: 입력 폴더 경로
+        include_subfolders: 하위 폴더까지 검색 (상대 경로로 폴더 구조 유지)
+    """
+    if not include_subfolders:
+        return [f for f in os.listdir(input_folder) if f.lower().endswith(BATCH_IMAGE_EXTENSIONS)]
+    image_files = []
+    for root, dirs, files in os.walk(input_folder):
+        for f in files:
+            if f.lower().endswith(BATCH_IMAGE_EXTENSIONS):
+                image_files.append(os.path.relpath(os.path.join(root, f), input_folder))
+    return image_files
+
+def individual_output_path(input_folder: str, image_file: str) -> str:
+    """이미지별 개별 Excel 경로 (이미지가 있는 폴더의 <이미지 이름>_최종.xlsx, 하위 폴더 구조 유지)"""
+    image_path = os.path.join(input_folder, image_file)
+    return os.path.join(os.path.dirname(image_path), f"{os.path.splitext(os.path.basename(image_file))[0]}_최종.xlsx")
+
+def load_condition_presets(path: str = CONDITION_PRESETS_FILE) -> dict:
+    """
+    저장된 비즈니스 조건 프리셋 로드
+    
+    Returns:
+        dict: 프리셋 이름 -> 조건 (contractor_age, contractor_nat, app_type, product_main, product_riders),
+            파일이 없거나 읽을 수 없으면 빈 dict
+    """
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except Exception:
+        return {}  # 프리셋 파일 로드 실패 시 기본값 사용
+
+def build_batch_condition_text(contractor_age: List[str], contractor_nat: List[str], app_type: List[str],
+                               product_main: List[str], product_riders: List[str]) -> str:
+    """
+    배치 모드의 비즈니스 조건 선택값을 프롬프트용 텍스트로 변환
+    
+    Returns:
+        str: 조건 텍스트 (선택된 조건이 없으면 빈 문자열)
+    """
+    condition_text = ""
+    if contractor_age:
+        condition_text += f"\n계약자 연령: {', '.join(contractor_age)}"
+    if contractor_nat:
+        condition_text += f"\n계약자 국적: {', '.join(contractor_nat)}"
+    if app_type:
+        condition_text += f"\n청약방식: {', '.join(app_type)}"
+    if product_main:
+        condition_text += f"\n주계약: {', '.join(product_main)}"
+    if product_riders:
+        condition_text += f"\n특약: {', '.join(product_riders)}"
+    return condition_text
+
+def build_batch_integration_prompt(condition_text: str, first_df: pd.DataFrame, sample_guide_text: str = "") -> str:
+    """
+    배치 2차 생성(현업용 통합)에 사용할 시스템 프롬프트 구성
+    
+    사용자가 조건을 선택했으면 조건 기반 생성, 아니면 자동 추론+검토 모드
+    """
+    if condition_text:
+        expansion_prompt = f"""
+{INTEGRATION_TEST_PROMPT}
+
+**[지시사항]**
+1차 단위 테스트 결과를 검토하고, 아래 **[적용할 비즈니스 조건]**을 반영하여 **통합 테스트 케이스를 추가**하세요.
+또한 단위 테스트에서 누락된 케이스가 있다면 추가하세요.
+
+**적용할 비즈니스 조건:**
+{condition_text}
+
+**기존 1차 단위 테스트 (참고용):**
+{first_df.to_dict('records')[:10] if not first_df.empty else "없음"}
+
+**생성 규칙:**
+1. `구분` 필드는 "현업통합"으로 설정
+2. `생성조건` 필드에 적용된 조건 명시
+3. 화면에 조건이 적용 불가능하면 해당 조건 케이스는 생성하지 않음
+4. 최소 10개 이상의 통합 테스트 케이스 생성
+"""
+    else:
+        # 조건이 없을 때: 1차 결과 검토 및 보완 모드
+        expansion_prompt = f"""
+{INTEGRATION_TEST_PROMPT}
+
+**[지시사항]**
+1차 단위 테스트 결과를 검토하고, **다른 시각(통합 관점)**에서 누락된 케이스나 시나리오 기반의 흐름 테스트를 추가 생성하세요.
+
+**기존 1차 단위 테스트 (참고용):**
+{first_df.to_dict('records')[:10] if not first_df.empty else "없음"}
+
+**생성 규칙:**
+1. `구분` 필드는 "현업통합"으로 설정
+2. `생성조건` 필드: "자동추론" 또는 적용된 시나리오 조건 명시
+3. 단위 테스트에서 커버하지 못한 필드 간 연동, 예외 처리, 비즈니스 로직 위주로 생성
+4. 최소 10개 이상의 추가 케이스 생성
+"""
+
+    # [New] 엑셀 샘플 가이드가 있으면 프롬프트에 추가
+    if sample_guide_text:
+        expansion_prompt += "\n" + sample_guide_text
+    return expansion_prompt
+
+def drop_duplicate_cases(df: pd.DataFrame) -> pd.DataFrame:
+    """절차+입력+기대결과(DEDUP_COLUMNS) 기준 중복 테스트 케이스 제거 (먼저 나온 것 유지)"""
+    dedup_cols = [col for col in DEDUP_COLUMNS if col in df.columns]
+    if not dedup_cols:
+        return df
+    return df.drop_duplicates(subset=dedup_cols, keep='first')
+
+def dedup_test_cases(df: pd.DataFrame, similarity_threshold: Optional[float] = None) -> Tuple[pd.DataFrame, Optional[pd.DataFrame]]:
+    """
+    테스트 케이스 중복 제거 (완전 일치 또는 유사 중복)
+    
+    Args:
+        df: 테스트 케이스 DataFrame
+        similarity_threshold: 유사도 임계값 (None이면 DEDUP_COLUMNS 완전 일치만 제거)
+    
+    Returns:
+        Tuple[pd.DataFrame, Optional[pd.DataFrame]]: (중복 제거 결과, 유사 중복 병합 보고서 - 완전 일치 모드는 None)
+    """
+    if similarity_threshold is None:
+        return drop_duplicate_cases(df), None
+    return near_dedup_dataframe(df, DEDUP_COLUMNS, similarity_threshold)
+
+def merge_and_dedup(first_df: pd.DataFrame, second_df: pd.DataFrame,
+                    similarity_threshold: Optional[float] = None) -> Tuple[pd.DataFrame, int, int, Optional[pd.DataFrame]]:
+    """
+    1차/2차 결과를 병합하고 중복 제거 후 시나리오ID, TC_ID 기준으로 정렬
+    
+    Args:
+        similarity_threshold: 유사 중복 임계값 (None이면 완전 일치만 제거)
+    
+    Returns:
+        Tuple[pd.DataFrame, int, int, Optional[pd.DataFrame]]:
+            (병합 결과, 중복 제거 전 건수, 중복 제거 후 건수, 유사 중복 병합 보고서)
+    """
+    if len(second_df) > 0:
+        merged_df = pd.concat([first_df, second_df], ignore_index=True)
+    else:
+        merged_df = first_df
+    
+    # 중복 제거 (절차+입력+기대결과 기준으로 정교한 중복 제거)
+    before_count = len(merged_df)
+    merged_df, dedup_report = dedup_test_cases(merged_df, similarity_threshold)
+    after_count = len(merged_df)
+    
+    # 시나리오ID, TC_ID 기준 정렬
+    if '시나리오ID' in merged_df.columns:
+        merged_df = merged_df.sort_values(by=['시나리오ID'])
+    if '테스트케이스ID' in merged_df.columns:
+        merged_df = merged_df.sort_values(by=['시나리오ID', '테스트케이스ID'] if '시나리오ID' in merged_df.columns else ['테스트케이스ID'])
+    
+    return merged_df.reset_index(drop=True), before_count, after_count, dedup_report
+
+def _generate_batch_phase1(image_part: dict, image_file: str, model_name: str, test_type: str,
+                           sample_guide_text: str, use_cache: bool = True, structured: bool = False,
+                           tile_note: str = "", stats: Optional[CallStats] = None,
+                           api_key: Optional[str] = None) -> List[dict]:
+    """배치 1차 생성: 테스트 유형 1개(분할 시 조각 1개)에 대한 API 호출 + 파싱"""
+    # 테스트 유형에 따른 프롬프트 선택
+    if test_type == "개발자/QA용 단위테스트":
+        selected_prompt = DEVELOPER_UNIT_PROMPT
+    else:  # 현업용 단위테스트
+        selected_prompt = BUSINESS_UNIT_PROMPT
+    
+    # [New] 엑셀 샘플 가이드가 있으면 프롬프트에 추가
+    if sample_guide_text:
+        selected_prompt += "\n" + sample_guide_text
+    
+    generation_config = {"temperature": 0.7}
+    if structured:
+        selected_prompt += "\n" + STRUCTURED_OUTPUT_INSTRUCTION
+        generation_config = structured_generation_config(generation_config)
+    
+    response_text = generate_text(
+        model_name,
+        selected_prompt,
+        [
+            "위 시스템 프롬프트(및 스타일 가이드)에 정의된 규칙에 따라, 이 화면 설계서를 분석하여 테스트 시나리오를 생성해주세요." + tile_note,
+            image_part
+        ],
+        generation_config=generation_config,
+        use_cache=use_cache,
+        stats=stats,
+        api_key=api_key
+    )
+    
+    _, type_gen = parse_scenario_response(response_text, structured)
+    # [New] 파일명 필드 추가
+    for scenario in type_gen:
+        scenario['파일명'] = os.path.basename(image_file)
+    return type_gen
+
+def _generate_batch_integration(image_part: dict, image_file: str, model_name: str, condition_text: str,
+                                first_df: pd.DataFrame, sample_guide_text: str, use_cache: bool = True,
+                                structured: bool = False, stats: Optional[CallStats] = None,
+                                api_key: Optional[str] = None) -> List[dict]:
+    """배치 2차 생성: 1차 결과를 참고한 현업용 통합 테스트 API 호출 + 파싱"""
+    integration_prompt = build_batch_integration_prompt(condition_text, first_df, sample_guide_text)
+    integration_config = {"temperature": 0.7}
+    if structured:
+        integration_prompt += "\n" + STRUCTURED_OUTPUT_INSTRUCTION
+        integration_config = structured_generation_config(integration_config)
+    response2_text = generate_text(
+        model_name,
+        integration_prompt,
+        [
+            "위 지침(및 스타일 가이드)에 따라 테스트 케이스를 생성하세요.",
+            image_part
+        ],
+        generation_config=integration_config,
+        use_cache=use_cache,
+        stats=stats,
+        api_key=api_key
+    )
+    _, second_gen = parse_scenario_response(response2_text, structured)
+    # [New] 파일명 필드 추가
+    for scenario in second_gen:
+        scenario['파일명'] = os.path.basename(image_file)
+    return second_gen
+
+# 배치 단계 재시도 백오프 기준 시간 (초, 재시도마다 최대 2배, jitter 포함)
+BATCH_RETRY_DELAY = 2
+
+def _run_batch_step(call: Callable[..., List[dict]], max_retries: int, use_cache: bool,
+                    stats: CallStats, cancel_event: Optional[threading.Event] = None) -> List[dict]:
+    """
+    배치 단계 1개(테스트 유형 1개 또는 2차 통합 호출)를 단계 단위로 재시도
+    
+    다른 단계의 성공한 결과는 그대로 두고 실패한 단계만 다시 호출합니다.
+    재시도 때는 캐시를 건너뛰고 새로 호출합니다. (파싱에 실패한 응답이 캐시에서 반복되지 않도록)
+    
+    Args:
+        call: call(use_cache=..., stats=...) -> 테스트 케이스 목록
+        max_retries: 단계별 최대 시도 횟수
+        use_cache: 첫 시도의 캐시 조회 여부
+        stats: 이 단계 전용 호출 통계
+        cancel_event: 설정되면 다음 시도 전에 멈춤 (재시도 대기 중에도 바로 멈춤)
+    
+    Raises:
+        BatchCancelled: cancel_event가 설정된 경우
+        Exception: max_retries회 시도 후에도 실패한 경우 마지막 오류
+    """
+    max_retries = max(1, max_retries)
+    for attempt in range(max_retries):
+        if cancel_event is not None and cancel_event.is_set():
+            raise BatchCancelled()
+        calls_before = stats.api_calls
+        try:
+            return call(use_cache=use_cache and attempt == 0, stats=stats)
+        except Exception as e:
+            stats.wasted_calls += stats.api_calls - calls_before  # 호출했지만 쓰지 못한 응답
+            if attempt == max_retries - 1:
+                raise
+            stats.retries += 1
+            delay = retry_delay(attempt, e, base=BATCH_RETRY_DELAY)
+            if cancel_event is not None:
+                cancel_event.wait(delay)
+            else:
+                time.sleep(delay)
+
+def generate_phase1_cases(image_data: bytes, image_file: str, model_name: str, test_type: str,
+                          sample_guide_text: str = "", use_cache: bool = True, structured: bool = False,
+                          image_options: Optional[dict] = None, tile_images: bool = False,
+                          stats: Optional[CallStats] = None, api_key: Optional[str] = None) -> List[dict]:
+    """
+    1차 생성 단계 1개 (이미지 1장 × 테스트 유형 1개, 재시도 없이 1회)
+    
+    작업 큐처럼 단계를 따로 실행하는 곳에서 사용합니다. (재시도/임대는 호출 측에서 관리)
+    분할 분석 시 조각을 차례로 호출하고 겹침 영역에서 나온 중복을 제거합니다.
+    
+    Returns:
+        List[dict]: 테스트 케이스 목록 (파일명 필드 포함)
+    """
+    tiles = prepare_image_tiles(image_data, **(image_options or {})) if tile_images else []
+    if len(tiles) <= 1:
+        prepared_image = prepare_image(image_data, **(image_options or {}))
+        image_part = {"mime_type": prepared_image.mime_type, "data": prepared_image.data}
+        return _generate_batch_phase1(image_part, image_file, model_name, test_type, sample_guide_text,
+                                      use_cache=use_cache, structured=structured, stats=stats, api_key=api_key)
+    cases = []
+    for tile in tiles:
+        cases.extend(_generate_batch_phase1(
+            {"mime_type": tile.mime_type, "data": tile.data}, image_file, model_name, test_type, sample_guide_text,
+            use_cache=use_cache, structured=structured, tile_note=build_tile_note(tile), stats=stats, api_key=api_key
+        ))
+    return drop_duplicate_cases(pd.DataFrame(cases)).to_dict('records')
+
+def generate_integration_cases(image_data: bytes, image_file: str, model_name: str, condition_text: str,
+                               first_df: pd.DataFrame, sample_guide_text: str = "", use_cache: bool = True,
+                               structured: bool = False, image_options: Optional[dict] = None,
+                               stats: Optional[CallStats] = None, api_key: Optional[str] = None) -> List[dict]:
+    """
+    2차 현업용 통합 생성 단계 (재시도 없이 1회, 1차 결과를 참고)
+    
+    Returns:
+        List[dict]: 테스트 케이스 목록 (파일명 필드 포함)
+    """
+    prepared_image = prepare_image(image_data, **(image_options or {}))
+    image_part = {"mime_type": prepared_image.mime_type, "data": prepared_image.data}
+    return _generate_batch_integration(image_part, image_file, model_name, condition_text, first_df, sample_guide_text,
+                                       use_cache=use_cache, structured=structured, stats=stats, api_key=api_key)
+
+def process_batch_image(input_folder: str, image_file: str, model_name: str, phase1_types: List[str],
+                        run_integration: bool, condition_text: str = "", sample_guide_text: str = "",
+                        save_individual: bool = True, max_retries: int = 3, use_cache: bool = True,
+                        structured: bool = False, image_options: Optional[dict] = None,
+                        tile_images: bool = False, similarity_threshold: Optional[float] = None,
+                        checkpoint: Optional[BatchCheckpoint] = None, api_key: Optional[str] = None,
+                        cancel_event: Optional[threading.Event] = None, image_data: Optional[bytes] = None) -> dict:
+    """
+    배치 모드에서 이미지 1장을 처리 (1차 생성 → 2차 통합 → 병합/중복 제거)
+    
+    워커 스레드에서 호출되므로 Streamlit API를 사용하지 않고 결과만 반환합니다.
+    재시도는 단계 단위(1차 테스트 유형/조각 1개, 2차 통합 호출)로 하며, 성공한 단계는 다시 호출하지 않습니다.
+    
+    Args:
+        input_folder: 입력 폴더 경로
+        image_file: 입력 폴더 기준 이미지 상대 경로
+        model_name: 사용할 Gemini 모델명
+        phase1_types: 1차 생성 테스트 유형 목록
+        run_integration: 2차 현업용 통합 테스트 생성 여부
+        condition_text: 2차 생성에 적용할 비즈니스 조건 텍스트
+        sample_guide_text: 엑셀 샘플 스타일 가이드
+        save_individual: 이미지 옆에 개별 Excel 파일 저장 여부
+        max_retries: 단계별 최대 시도 횟수
+        use_cache: 응답 캐시 조회 여부
+        structured: 구조화 출력 모드 (응답 스키마 + JSON MIME 타입)
+        image_options: prepare_image() 옵션 (max_edge, output_format, quality)
+        tile_images: 긴 이미지를 겹치는 조각으로 나눠 1차 생성 (2차 통합은 전체 이미지 사용)
+        similarity_threshold: 병합 시 유사 중복 임계값 (None이면 완전 일치만 제거)
+        checkpoint: 배치 체크포인트 (있으면 단계별 결과를 기록하고, 이미 끝난 단계는 건너뜀. 1차는 유형/조각 단위)
+        api_key: API 키 (쉼표로 구분하면 여러 키에 분산, 체크포인트 설정에는 저장하지 않음)
+        cancel_event: 배치 작업 취소 신호 (API 호출 단계마다 확인)
+        image_data: 이미지 내용 (주면 파일을 읽지 않음, 예: HTTP 요청으로 받은 이미지. image_file은 표시용 이름)
+    
+    Returns:
+        dict: merged_df(병합 결과), dedup_before/dedup_after(중복 제거 전후 건수),
+            dedup_report(유사 중복 병합 보고서 또는 None), output_file(개별 파일 경로),
+            image(전처리 결과 PreparedImage, 병합 결과를 그대로 이어받으면 None), tile_count(1차 생성 조각 수),
+            resumed_from(체크포인트에서 이어받은 단계 또는 None), resumed_steps(체크포인트에서 이어받은 1차 단계 수),
+            call_stats(CallStats, 재시도/낭비된 호출 수 포함)
+    
+    Raises:
+        BatchStepError: 단계가 max_retries회 시도 후에도 실패한 경우 (실패 단계와 호출 통계 포함)
+        BatchCancelled: cancel_event가 설정되어 중간에 멈춘 경우 (호출 통계 포함)
+    """
+    call_stats = CallStats()
+    if cancel_event is not None and cancel_event.is_set():
+        raise BatchCancelled(call_stats)
+    
+    # 체크포인트에 병합 결과까지 남아 있으면 API 호출 없이 그대로 반환 (이어하기)
+    if checkpoint is not None:
+        merged_df = checkpoint.load_partial(image_file, STATE_INTEGRATION_DONE)
+        if merged_df is not None:
+            return {
+                'merged_df': merged_df,
+                'dedup_before': len(merged_df),
+                'dedup_after': len(merged_df),
+                'dedup_report': None,
+                'output_file': None,
+                'image': None,
+                'tile_count': 1,
+                'resumed_from': STATE_INTEGRATION_DONE,
+                'resumed_steps': 0,
+                'call_stats': call_stats,
+            }
+    
+    # 이미지 로드 + 전처리 (실제 포맷 감지, 축소/재인코딩)
+    image_path = os.path.join(input_folder, image_file)
+    if image_data is None:
+        with open(image_path, 'rb') as f:
+            image_data = f.read()
+    prepared_image = prepare_image(image_data, **(image_options or {}))
+    image_part = {"mime_type": prepared_image.mime_type, "data": prepared_image.data}
+    
+    # ===================
+    # 1️⃣ 1차 생성: 단위 테스트 (개발자/현업)
+    # ===================
+    # 유형별 호출은 서로 독립적이므로 동시에 실행하고, 결과는 선택 순서대로 합침
+    # 분할 분석 시 (유형 × 조각)별로 호출하고, 겹침 영역에서 나온 중복은 합친 뒤 제거
+    # 체크포인트에 1차 결과가 있으면 1차 호출은 건너뛰고, 일부 단계만 끝났으면 나머지 단계만 호출
+    first_df = checkpoint.load_partial(image_file, STATE_PHASE1_DONE) if checkpoint is not None else None
+    resumed_from = STATE_PHASE1_DONE if first_df is not None else None
+    resumed_steps = 0
+    tiles = []
+    if first_df is None:
+        all_scenarios_for_image = []
+        tiles = prepare_image_tiles(image_data, **(image_options or {})) if tile_images else []
+        if len(tiles) > 1:
+            phase1_requests = [
+                (f"1차 {test_type} 조각 {tile.tile_index + 1}/{tile.tile_count}",
+                 {"mime_type": tile.mime_type, "data": tile.data}, test_type, build_tile_note(tile))
+                for test_type in phase1_types for tile in tiles
+            ]
+        else:
+            phase1_requests = [(f"1차 {test_type}", image_part, test_type, "") for test_type in phase1_types]
+        
+        # 단계별 결과 (체크포인트에서 이어받은 단계는 호출하지 않음)
+        step_results = {}
+        if checkpoint is not None:
+            for step_name, _, _, _ in phase1_requests:
+                step_df = checkpoint.load_step(image_file, step_name)
+                if step_df is not None:
+                    step_results[step_name] = step_df.to_dict('records')
+        resumed_steps = len(step_results)
+        pending_requests = [request for request in phase1_requests if request[0] not in step_results]
+        
+        if pending_requests:
+            # 단계마다 전용 통계를 두고 모두 끝난 뒤 합침 (스레드 간 공유 없음)
+            step_stats = [CallStats() for _ in pending_requests]
+            max_workers = min(len(pending_requests), MAX_TILE_WORKERS) if len(tiles) > 1 else len(pending_requests)
+            with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="batch-phase1") as type_executor:
+                type_futures = [
+                    (step_name, type_executor.submit(
+                        _run_batch_step,
+                        partial(_generate_batch_phase1, request_part, image_file, model_name, test_type,
+                                sample_guide_text, structured=structured, tile_note=tile_note, api_key=api_key),
+                        max_retries, use_cache, stats, cancel_event
+                    ))
+                    for (step_name, request_part, test_type, tile_note), stats in zip(pending_requests, step_stats)
+                ]
+                failed_step = None
+                for step_name, future in type_futures:
+                    error = future.exception()
+                    if error is not None:
+                        failed_step = failed_step or (step_name, error)
+                        continue
+                    step_results[step_name] = future.result()
+                    # 다른 단계가 실패/취소되어도 성공한 단계 결과는 남겨 다음 실행에서 다시 호출하지 않음
+                    if checkpoint is not None:
+                        checkpoint.mark_step(image_file, step_name, pd.DataFrame(step_results[step_name]))
+            for stats in step_stats:
+                call_stats.merge(stats)
+            cancelled = any(isinstance(future.exception(), BatchCancelled) for _, future in type_futures)
+            if (cancelled or failed_step is not None) and checkpoint is None:
+                call_stats.wasted_calls = call_stats.api_calls  # 체크포인트가 없으면 성공한 단계의 호출도 쓰지 못함
+            if cancelled:
+                raise BatchCancelled(call_stats)
+            if failed_step is not None:
+                raise BatchStepError(failed_step[0], failed_step[1], call_stats) from failed_step[1]
+        
+        for step_name, _, _, _ in phase1_requests:
+            all_scenarios_for_image.extend(step_results[step_name])
+        
+        first_df = pd.DataFrame(all_scenarios_for_image)
+        if len(tiles) > 1:
+            first_df = drop_duplicate_cases(first_df).reset_index(drop=True)
+        if checkpoint is not None:
+            checkpoint.mark(image_file, STATE_PHASE1_DONE, first_df)
+    
+    # ===================
+    # 2️⃣ 2차 생성: 현업용 통합 (선택 시)
+    # ===================
+    # 실패하면 2차 호출만 재시도 (1차 결과는 유지)
+    second_df = pd.DataFrame()  # 빈 DataFrame 초기화
+    
+    if run_integration:
+        integration_stats = CallStats()
+        try:
+            second_gen = _run_batch_step(
+                partial(_generate_batch_integration, image_part, image_file, model_name, condition_text,
+                        first_df, sample_guide_text, structured=structured, api_key=api_key),
+                max_retries, use_cache, integration_stats, cancel_event
+            )
+        except BatchCancelled:
+            call_stats.merge(integration_stats)
+            raise BatchCancelled(call_stats)
+        except Exception as e:
+            call_stats.merge(integration_stats)
+            if checkpoint is None:
+                call_stats.wasted_calls = call_stats.api_calls  # 체크포인트가 없으면 1차 결과도 버려짐
+            raise BatchStepError("2차 통합", e, call_stats) from e
+        call_stats.merge(integration_stats)
+        second_df = pd.DataFrame(second_gen)
+    
+    # ===================
+    # 3️⃣ 병합 (Final) + 중복 제거
+    # ===================
+    merged_df, before_count, after_count, dedup_report = merge_and_dedup(first_df, second_df, similarity_threshold)
+    
+    # 개별 파일 저장 (이미지가 있는 폴더에 저장, 하위 폴더 포함 시 상대 경로 유지)
+    output_file = None
+    if save_individual:
+        output_file = individual_output_path(input_folder, image_file)
+        excel_data = create_excel_file(merged_df)
+        with open(output_file, 'wb') as f:
+            f.write(excel_data.getvalue())
+    
+    if checkpoint is not None:
+        checkpoint.mark(image_file, STATE_INTEGRATION_DONE, merged_df)
+    
+    return {
+        'merged_df': merged_df,
+        'dedup_before': before_count,
+        'dedup_after': after_count,
+        'dedup_report': dedup_report,
+        'output_file': output_file,
+        'image': prepared_image,
+        'tile_count': max(len(tiles), 1),
+        'resumed_from': resumed_from,
+        'resumed_steps': resumed_steps,
+        'call_stats': call_stats,
+    }
+
+def iter_batch_results(image_files: List[str], worker: Callable[[str], dict],
+                       max_workers: int = DEFAULT_BATCH_WORKERS,
+                       should_stop: Optional[Callable[[], bool]] = None) -> Iterator[Tuple[int, str, Optional[dict], Optional[Exception]]]:
+    """
+    이미지 목록을 워커 풀에 분배하여 동시에 처리하고 완료 순서대로 결과를 반환
+    
+    항상 최대 max_workers개의 이미지만 처리 중으로 유지하며, 하나가 끝날 때마다 다음 이미지를 제출합니다.
+    이 제너레이터는 호출한 스레드(배치 작업 스레드)에서 실행되므로 진행 상황 기록은 호출 측에서 처리합니다.
+    
+    Args:
+        image_files: 처리할 이미지 목록
+        worker: 이미지 1장을 처리하는 함수 (image_file -> dict)
+        max_workers: 동시에 처리할 이미지 수
+        should_stop: True를 반환하면 새 작업 제출을 멈추고 진행 중인 작업만 마무리
+    
+    Yields:
+        Tuple[int, str, Optional[dict], Optional[Exception]]: (원래 순서 인덱스, 파일명, 결과, 오류)
+    """
+    max_workers = max(1, min(int(max_workers), MAX_BATCH_WORKERS))
+    pending = iter(enumerate(image_files))
+    in_flight = {}
+    
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="batch-image") as executor:
+        def submit_next() -> bool:
+            if should_stop is not None and should_stop():
+                return False
+            try:
+                idx, image_file = next(pending)
+            except StopIteration:
+                return False
+            in_flight[executor.submit(worker, image_file)] = (idx, image_file)
+            return True
+        
+        # 처음 N개 제출
+        for _ in range(max_workers):
+            if not submit_next():
+                break
+        
+        # 하나 끝날 때마다 결과 반환 후 다음 이미지 제출
+        while in_flight:
+            done, _ = wait(list(in_flight), return_when=FIRST_COMPLETED)
+            for future in done:
+                idx, image_file = in_flight.pop(future)
+                error = future.exception()
+                yield idx, image_file, (None if error else future.result()), error
+                submit_next()
+
+# ---------- 배치 통합 파일 (디스크 스풀) ----------
+
+BATCH_SPOOL_DIRNAME = ".scenario_batch"  # 입력 폴더 안의 스풀 폴더
+
+# 통합 파일 분리 기준 (구분 컬럼, "all"은 ShardSpool 기본 분리)
+BATCH_SPLIT_RULES = {
+    "dev": lambda row: row.get('구분') == '개발단위',
+    "biz": lambda row: row.get('구분') in ('현업단위', '현업통합'),
+    "biz_unit": lambda row: row.get('구분') == '현업단위',
+    "biz_int": lambda row: row.get('구분') == '현업통합',
+}
+
+# 분리 이름 -> 통합 파일명 (기록 순서: 개발자용 → 현업용 → 전체)
+CONSOLIDATED_FILE_NAMES = {
+    "dev": "개발자용_테스트_{timestamp}.xlsx",
+    "biz": "현업용_테스트_{timestamp}.xlsx",
+    "all": "통합_최종본_{timestamp}.xlsx",
+}
+
+def new_batch_run_id() -> str:
+    """
+    새 배치 실행 ID (시작 시각 + 임의 접미사, 같은 초에 제출한 배치끼리 체크포인트/스풀 폴더가 겹치지 않음)
+
+    접미사는 내부 폴더/체크포인트용이며, 통합 파일명에는 시작 시각만 씁니다. (batch_file_timestamp)
+    """
+    return f"{time.strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:8]}"
+
+def batch_file_timestamp(run_id: str) -> str:
+    """통합 파일명에 쓸 시작 시각 (실행 ID의 임의 접미사 제외, 예: 20250101_093000_1a2b3c4d → 20250101_093000)"""
+    return "_".join(run_id.split("_")[:2])
+
+def batch_run_directory(output_folder: str, run_id: str) -> str:
+    """배치 1회분 스풀/체크포인트 폴더 (output_folder/.scenario_batch/<run_id>)"""
+    return os.path.join(output_folder, BATCH_SPOOL_DIRNAME, run_id)
+
+def create_batch_spool(output_folder: str, run_id: str) -> ShardSpool:
+    """배치 1회분 결과 스풀 생성 (output_folder/.scenario_batch/<run_id>)"""
+    return ShardSpool(batch_run_directory(output_folder, run_id), BATCH_SPLIT_RULES)
+
+def write_consolidated_workbooks(spool: ShardSpool, output_folder: str, run_id: str) -> List[Tuple[str, str, int]]:
+    """
+    스풀된 배치 결과로 개발자용/현업용/전체 통합 파일 작성 (조각 1회 병합, 행 단위 스트리밍)
+
+    파일명에는 실행 ID의 시작 시각만 씁니다. (같은 초에 같은 폴더로 시작한 배치는 나중에 끝난 쪽이 덮어씀)
+    
+    Returns:
+        List[Tuple[str, str, int]]: (분리 이름, 파일 경로, 행 수) - 행이 있는 분리만, 기록 순서대로
+    """
+    outputs = {
+        name: os.path.join(output_folder, file_name.format(timestamp=batch_file_timestamp(run_id)))
+        for name, file_name in CONSOLIDATED_FILE_NAMES.items()
+    }
+    written = spool.write_workbooks(outputs)
+    return [(name, outputs[name], written[name]) for name in CONSOLIDATED_FILE_NAMES if name in written]
+
+
+# ---------- 회귀 확인 ----------
+
+def check_key_client_binding() -> bool:
+    """
+    SDK 회귀 확인: _create_model()이 연결한 키별 클라이언트로 generate_content()가 호출되는지 (일반/스트리밍)
+
+    google-generativeai의 GenerativeModel._client는 공개 API가 아니므로, SDK 버전을 바꾸면 이 확인을 먼저 실행합니다.
+    전역 기본 클라이언트를 가져가면 실패하도록 바꿔 두고, 키마다 기록용 클라이언트를 연결해 네트워크 없이 확인합니다.
+
+    Returns:
+        bool: 모든 확인이 기대와 같으면 True
+    """
+    import google.ai.generativelanguage as glm
+    from google.generativeai import client as genai_client
+
+    class RecordingClient:
+        """키 이름을 응답으로 돌려주는 GenerativeServiceClient 대역"""
+
+        def __init__(self, key: str):
+            self.key = key
+            self.calls = []
+
+        def _response(self):
+            return glm.GenerateContentResponse(candidates=[
+                {"content": {"role": "model", "parts": [{"text": self.key}]}, "finish_reason": "STOP"}
+            ])
+
+        def generate_content(self, request, **kwargs):
+            self.calls.append("generate_content")
+            return self._response()
+
+        def stream_generate_content(self, request, **kwargs):
+            self.calls.append("stream_generate_content")
+            return iter([self._response()])
+
+    def default_client_used(*args, **kwargs):
+        raise RuntimeError("전역 기본 클라이언트를 사용함")
+
+    checks = []
+    original_default_client = genai_client.get_default_generative_client
+    genai_client.get_default_generative_client = default_client_used
+    try:
+        for key in ("AIzaCHECK-KEY-1111", "AIzaCHECK-KEY-2222"):
+            key_state = ApiKeyState(key)  # 공유 키 상태(_key_state)는 건드리지 않음
+            key_state._client = RecordingClient(key)
+            model = _create_model("gemini-check", "확인용 시스템 프롬프트", key_state=key_state)
+            try:
+                text = model.generate_content("확인").text
+                stream_text = "".join(chunk.text for chunk in model.generate_content("확인", stream=True))
+            except Exception as e:
+                text = stream_text = f"오류: {e}"
+            label = mask_api_key(key)
+            checks.append((f"{label} 일반 호출", text, key))
+            checks.append((f"{label} 스트리밍 호출", stream_text, key))
+            checks.append((f"{label} 클라이언트 호출", key_state._client.calls, ["generate_content", "stream_generate_content"]))
+    finally:
+        genai_client.get_default_generative_client = original_default_client
+
+    all_passed = True
+    for description, actual, expected in checks:
+        passed = actual == expected
+        all_passed = all_passed and passed
+        print(f"{'OK  ' if passed else 'FAIL'} {description}: {actual} (기대 {expected})")
+    print(f"google-generativeai {getattr(genai, '__version__', '?')}")
+    return all_passed
+
+
+if __name__ == "__main__":
+    sys.exit(0 if check_key_client_binding() else 1)
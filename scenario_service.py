@@ -0,0 +1,401 @@
+# ============================================================================
+# Test Scenario Generator 2 - 로컬 HTTP 생성 서비스 (제출 → 상태 조회 → 결과 받기)
+# ============================================================================
+# CI 등에서 Streamlit 앱을 거치지 않고 화면 이미지 1장을 보내 테스트 케이스를 받습니다.
+# 요청마다 스크립트를 다시 실행하지 않고, 프로세스 안의 작업 큐와 고정된 수의 워커 스레드가
+# 배치와 같은 이미지 처리(process_batch_image: 1차 생성 → 2차 통합 → 병합/중복 제거)를 실행합니다.
+#
+#   POST   /jobs                 이미지 제출 (본문: 이미지 바이트 + 쿼리 옵션, 또는 JSON {"image": base64, ...}) → 202
+#   GET    /jobs/<id>            상태 조회 (queued / running / done / cancelled / failed)
+#   GET    /jobs/<id>/result     결과 (?format=json 기본, ?format=xlsx는 create_excel_file 워크북)
+#   DELETE /jobs/<id>            취소 (대기 중이면 시작하지 않고, 실행 중이면 다음 API 호출 전에 멈춤)
+#   GET    /health               큐/워커 현황
+#
+# 큐가 가득 차면 503 + Retry-After로 거절합니다. (제출 수와 무관하게 메모리/동시 호출 수 상한 유지)
+# 옵션: types(dev,biz,int) · preset · model · structured · tile · similarity · exact_dedup · use_cache · max_edge
+#
+#   python scenario_service.py --port 8765 --workers 4
+#   python scenario_service.py --replay recorded.json    # 기록된 응답으로 오프라인 실행 (API 호출 없음)
+# ============================================================================
+
+import argparse  # 명령행 인자
+import base64  # JSON 본문의 이미지
+import collections  # 끝난 작업 보관 (오래된 순 정리)
+import dataclasses  # 호출 통계 직렬화
+import json  # 요청/응답 본문
+import queue  # 작업 큐 (크기 제한)
+import re  # 경로 매칭
+import sys  # 종료 코드
+import threading  # 워커 스레드 / 작업 상태 동기화
+import time  # 작업 시각
+import uuid  # 작업 ID
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional
+from urllib.parse import parse_qs, urlparse
+
+import pandas as pd
+
+from api_key_pool import default_api_keys  # 환경 변수 API 키
+from batch_cli import DEFAULT_MODEL, UsageError, parse_test_types, preset_condition_text  # 명령행 배치와 같은 옵션 해석
+from batch_jobs import BATCH_MAX_RETRIES, FINISHED_STATES, JOB_CANCELLED, JOB_DONE, JOB_FAILED, JOB_QUEUED, JOB_RUNNING
+from image_preprocess import DEFAULT_MAX_EDGE  # 업로드 전 이미지 축소 기준
+from near_dedup import DEFAULT_SIMILARITY_THRESHOLD  # 유사 중복 기본 임계값
+from scenario_core import (
+    CONDITION_PRESETS_FILE, BatchCancelled, BatchStepError, CallStats,
+    create_excel_file, process_batch_image, set_model_factory,
+)
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+DEFAULT_SERVICE_WORKERS = 4  # 동시에 처리하는 이미지 수 (API 호출 수는 키·모델별 속도 제한이 따로 제한)
+DEFAULT_QUEUE_SIZE = 64  # 대기 중인 작업 상한 (넘으면 503)
+MAX_FINISHED_JOBS = 256  # 결과를 보관하는 끝난 작업 수 (넘으면 오래된 것부터 삭제)
+MAX_IMAGE_BYTES = 20 * 1024 * 1024  # 요청 본문 상한
+QUEUE_FULL_RETRY_AFTER = 5  # 큐가 가득 찼을 때 Retry-After (초)
+
+XLSX_CONTENT_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+
+class ServiceJob:
+    """HTTP로 제출된 이미지 1장의 생성 작업 (워커 스레드가 기록하고 요청 처리 스레드가 읽음)"""
+
+    def __init__(self, image_data: bytes, image_name: str, options: dict):
+        self.job_id = uuid.uuid4().hex[:12]
+        self.image_data: Optional[bytes] = image_data  # 처리가 끝나면 해제
+        self.image_name = image_name
+        self.options = options  # process_batch_image 키워드 인자
+        self.status = JOB_QUEUED
+        self.submitted_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.result_df: Optional[pd.DataFrame] = None
+        self.dedup_before = 0
+        self.dedup_after = 0
+        self.call_stats = CallStats()
+        self.error = ""
+        self.cancel_event = threading.Event()
+
+    @property
+    def is_finished(self) -> bool:
+        return self.status in FINISHED_STATES
+
+    def describe(self) -> dict:
+        """상태 조회 응답"""
+        info = {
+            "job_id": self.job_id,
+            "status": self.status,
+            "image": self.image_name,
+            "model": self.options["model_name"],
+            "submitted_at": self.submitted_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "call_stats": dataclasses.asdict(self.call_stats),
+        }
+        if self.status == JOB_DONE:
+            info.update({"row_count": len(self.result_df), "dedup_before": self.dedup_before, "dedup_after": self.dedup_after})
+        if self.error:
+            info["error"] = self.error
+        return info
+
+
+class GenerationService:
+    """
+    작업 큐 + 고정 워커 스레드 (서버 1개에 1개)
+
+    사용 예:
+        service = GenerationService(max_workers=4, api_key=api_key)
+        job = service.submit(image_bytes, "login.png", {"types": "dev,int"})
+        ...
+        service.get(job.job_id).result_df
+    """
+
+    def __init__(self, max_workers: int = DEFAULT_SERVICE_WORKERS, max_queue: int = DEFAULT_QUEUE_SIZE,
+                 api_key: Optional[str] = None, presets_file: str = CONDITION_PRESETS_FILE):
+        self.api_key = api_key
+        self.presets_file = presets_file
+        self.max_workers = max_workers
+        self._queue: "queue.Queue[ServiceJob]" = queue.Queue(maxsize=max_queue)
+        self._jobs: Dict[str, ServiceJob] = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self._workers = [
+            threading.Thread(target=self._work, name=f"service-worker-{i}", daemon=True)
+            for i in range(max_workers)
+        ]
+        for worker in self._workers:
+            worker.start()
+
+    # ---------- 제출 / 조회 / 취소 ----------
+
+    def build_options(self, params: dict) -> dict:
+        """
+        요청 옵션 → process_batch_image 키워드 인자 (배치/명령행과 같은 기본값)
+
+        Raises:
+            UsageError: 알 수 없는 테스트 유형/프리셋이나 잘못된 숫자 값
+        """
+        def flag(name: str, default: bool) -> bool:
+            value = params.get(name)
+            if value is None:
+                return default
+            return value if isinstance(value, bool) else str(value).lower() in ("1", "true", "yes", "on")
+
+        phase1_types, run_integration = parse_test_types(str(params.get("types", "dev,biz,int")))
+        try:
+            max_edge = int(params.get("max_edge", DEFAULT_MAX_EDGE))
+            similarity = float(params.get("similarity", DEFAULT_SIMILARITY_THRESHOLD))
+        except (TypeError, ValueError) as e:
+            raise UsageError(f"잘못된 숫자 옵션: {e}")
+        return {
+            "model_name": str(params.get("model") or DEFAULT_MODEL),
+            "phase1_types": phase1_types,
+            "run_integration": run_integration,
+            "condition_text": preset_condition_text(params.get("preset"), self.presets_file),
+            "use_cache": flag("use_cache", True),
+            "structured": flag("structured", False),
+            "image_options": {"max_edge": max_edge or None, "output_format": None},
+            "tile_images": flag("tile", False),
+            "similarity_threshold": None if flag("exact_dedup", False) else similarity,
+        }
+
+    def submit(self, image_data: bytes, image_name: str, params: dict) -> ServiceJob:
+        """
+        작업 제출 (바로 반환, 처리는 워커 스레드에서)
+
+        Raises:
+            UsageError: 옵션 오류
+            queue.Full: 대기 중인 작업이 큐 상한에 도달한 경우
+        """
+        job = ServiceJob(image_data, image_name, self.build_options(params))
+        with self._lock:
+            self._queue.put_nowait(job)
+            self._jobs[job.job_id] = job
+            self._prune()
+        return job
+
+    def get(self, job_id: str) -> Optional[ServiceJob]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id: str) -> Optional[ServiceJob]:
+        job = self.get(job_id)
+        if job is not None:
+            job.cancel_event.set()
+        return job
+
+    def stats(self) -> dict:
+        with self._lock:
+            counts = collections.Counter(job.status for job in self._jobs.values())
+        return {
+            "workers": self.max_workers,
+            "queued": self._queue.qsize(),
+            "queue_limit": self._queue.maxsize,
+            "jobs": {status: counts.get(status, 0) for status in (JOB_QUEUED, JOB_RUNNING) + FINISHED_STATES},
+        }
+
+    def _prune(self):
+        """끝난 작업이 MAX_FINISHED_JOBS개를 넘으면 오래된 것부터 삭제 (lock 안에서 호출)"""
+        finished = [job_id for job_id, job in self._jobs.items() if job.is_finished]
+        for job_id in finished[:max(0, len(finished) - MAX_FINISHED_JOBS)]:
+            del self._jobs[job_id]
+
+    # ---------- 워커 스레드 ----------
+
+    def _work(self):
+        while True:
+            job = self._queue.get()
+            try:
+                self._run(job)
+            finally:
+                job.image_data = None
+                job.finished_at = time.time()
+                self._queue.task_done()
+
+    def _run(self, job: ServiceJob):
+        if job.cancel_event.is_set():
+            job.status = JOB_CANCELLED
+            return
+        job.status = JOB_RUNNING
+        job.started_at = time.time()
+        try:
+            result = process_batch_image(
+                "", job.image_name, max_retries=BATCH_MAX_RETRIES, save_individual=False,
+                api_key=self.api_key, cancel_event=job.cancel_event, image_data=job.image_data, **job.options
+            )
+        except BatchCancelled as e:
+            job.call_stats = e.call_stats
+            job.status = JOB_CANCELLED
+            return
+        except Exception as e:
+            if isinstance(e, BatchStepError):
+                job.call_stats = e.call_stats
+            job.error = str(e)
+            job.status = JOB_FAILED
+            return
+        job.result_df = result['merged_df']
+        job.dedup_before = result['dedup_before']
+        job.dedup_after = result['dedup_after']
+        job.call_stats = result['call_stats']
+        job.status = JOB_DONE
+
+
+# ---------- HTTP 요청 처리 ----------
+
+JOB_PATH = re.compile(r"^/jobs/([0-9a-f]+)(/result(?:\.(json|xlsx))?)?/?$")
+
+
+class ServiceRequestHandler(BaseHTTPRequestHandler):
+    """JSON API (요청마다 스레드 1개, 생성 작업은 서비스 워커에서만 실행)"""
+
+    server_version = "ScenarioService/1.0"
+    service: GenerationService = None  # create_server()에서 설정
+
+    def log_message(self, format, *args):
+        pass  # 요청마다 표준 오류에 기록하지 않음
+
+    def _send_json(self, status: int, body: dict, headers: Optional[dict] = None):
+        data = json.dumps(body, ensure_ascii=False, default=str).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_error(self, status: int, message: str, headers: Optional[dict] = None):
+        self._send_json(status, {"error": message}, headers)
+
+    def _read_body(self) -> Optional[bytes]:
+        length = int(self.headers.get("Content-Length") or 0)
+        if length > MAX_IMAGE_BYTES:
+            self._send_error(413, f"이미지는 {MAX_IMAGE_BYTES // (1024 * 1024)}MB 이하여야 합니다")
+            return None
+        return self.rfile.read(length)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path in ("/health", "/health/"):
+            self._send_json(200, self.service.stats())
+            return
+        match = JOB_PATH.match(url.path)
+        job = self.service.get(match.group(1)) if match else None
+        if job is None:
+            self._send_error(404, "작업을 찾을 수 없습니다")
+            return
+        if not match.group(2):
+            self._send_json(200, job.describe())
+            return
+
+        # 결과: 끝나지 않았으면 409 (상태 조회로 다시 확인), 실패/취소면 상태와 함께 409
+        if job.status != JOB_DONE:
+            self._send_json(409, job.describe())
+            return
+        output_format = match.group(3) or parse_qs(url.query).get("format", ["json"])[0]
+        if output_format == "xlsx":
+            data = create_excel_file(job.result_df).getvalue()
+            self.send_response(200)
+            self.send_header("Content-Type", XLSX_CONTENT_TYPE)
+            self.send_header("Content-Disposition", f'attachment; filename="{job.job_id}.xlsx"')
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+        elif output_format == "json":
+            body = job.describe()
+            body["test_cases"] = job.result_df.astype(object).where(job.result_df.notna(), None).to_dict("records")
+            self._send_json(200, body)
+        else:
+            self._send_error(400, f"지원하지 않는 형식: {output_format} (json, xlsx)")
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        if url.path not in ("/jobs", "/jobs/"):
+            self._send_error(404, "경로를 찾을 수 없습니다")
+            return
+        body = self._read_body()
+        if body is None:
+            return
+        params = {name: values[-1] for name, values in parse_qs(url.query).items()}
+
+        # JSON 본문: {"image": base64, "name": ..., 옵션...} / 그 외: 본문 전체가 이미지
+        if self.headers.get("Content-Type", "").startswith("application/json"):
+            try:
+                payload = json.loads(body)
+                image_data = base64.b64decode(payload.pop("image"), validate=True)
+            except (ValueError, KeyError, TypeError, AttributeError):
+                self._send_error(400, "JSON 본문에는 base64 인코딩된 image 필드가 필요합니다")
+                return
+            params.update(payload)
+        else:
+            image_data = body
+        if not image_data:
+            self._send_error(400, "이미지가 비어 있습니다")
+            return
+
+        image_name = str(params.pop("name", "") or "image")
+        try:
+            job = self.service.submit(image_data, image_name, params)
+        except UsageError as e:
+            self._send_error(400, str(e))
+            return
+        except queue.Full:
+            self._send_error(503, "대기 중인 작업이 너무 많습니다. 잠시 후 다시 제출하세요",
+                             {"Retry-After": str(QUEUE_FULL_RETRY_AFTER)})
+            return
+        self._send_json(202, dict(job.describe(), poll=f"/jobs/{job.job_id}", result=f"/jobs/{job.job_id}/result"),
+                        {"Location": f"/jobs/{job.job_id}"})
+
+    def do_DELETE(self):
+        match = JOB_PATH.match(urlparse(self.path).path)
+        job = self.service.cancel(match.group(1)) if match and not match.group(2) else None
+        if job is None:
+            self._send_error(404, "작업을 찾을 수 없습니다")
+            return
+        self._send_json(202, job.describe())
+
+
+class ServiceHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128  # 동시에 몰리는 제출 연결 (기본 5개면 연결이 거부됨)
+
+
+def create_server(service: GenerationService, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT) -> ServiceHTTPServer:
+    """
+    서비스 HTTP 서버 생성 (serve_forever()로 실행, port=0이면 빈 포트 사용)
+    """
+    handler = type("BoundServiceRequestHandler", (ServiceRequestHandler,), {"service": service})
+    return ServiceHTTPServer((host, port), handler)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="테스트 시나리오 생성 로컬 HTTP 서비스")
+    parser.add_argument("--host", default=DEFAULT_HOST, help=f"바인딩 주소 (기본: {DEFAULT_HOST})")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help=f"포트 (기본: {DEFAULT_PORT})")
+    parser.add_argument("--workers", type=int, default=DEFAULT_SERVICE_WORKERS, help=f"동시 처리 이미지 수 (기본: {DEFAULT_SERVICE_WORKERS})")
+    parser.add_argument("--queue-size", type=int, default=DEFAULT_QUEUE_SIZE, help=f"대기 작업 상한 (기본: {DEFAULT_QUEUE_SIZE})")
+    parser.add_argument("--api-key", help="API 키 (쉼표로 구분하면 여러 키에 분산, 기본: GOOGLE_API_KEYS/GOOGLE_API_KEY 환경 변수)")
+    parser.add_argument("--presets-file", default=CONDITION_PRESETS_FILE, help="조건 프리셋 파일")
+    parser.add_argument("--replay", metavar="CHUNKS_JSON", help="기록된 응답 조각 파일을 재생하는 가짜 모델로 실행 (API 호출 없음)")
+    args = parser.parse_args(argv)
+
+    api_key = args.api_key or default_api_keys() or None
+    if args.replay:
+        from fake_gemini import RecordedModelFactory, load_chunks  # 오프라인 실행에서만 사용
+        set_model_factory(RecordedModelFactory([load_chunks(args.replay)]))
+    elif not api_key:
+        print("오류: API 키가 없습니다. --api-key 또는 환경 변수 GOOGLE_API_KEY를 설정하세요", file=sys.stderr)
+        return 2
+
+    service = GenerationService(args.workers, args.queue_size, api_key, args.presets_file)
+    server = create_server(service, args.host, args.port)
+    print(f"http://{server.server_address[0]}:{server.server_address[1]} 에서 대기 중 (워커 {args.workers}개, 큐 {args.queue_size}개)", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
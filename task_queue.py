@@ -0,0 +1,653 @@
+# ============================================================================
+# Test Scenario Generator 2 - 영속 작업 큐 (SQLite, 여러 워커 프로세스)
+# ============================================================================
+# 스레드만으로는 한 프로세스 안에서 파싱/병합/Excel 작성이 동시에 돌 수 있는 양에 한계가 있고,
+# Streamlit 프로세스가 끝나면 배치도 같이 끝납니다. 이 모듈은 배치를 SQLite 파일의 작업 행으로 나눠
+# 같은 머신의 모든 코어에서 워커 프로세스가 나눠 처리하게 합니다.
+#
+# 큐 DB는 로컬 디스크에 두세요. WAL 모드는 같은 머신의 공유 메모리를 쓰고, NFS/SMB 같은 네트워크 파일
+# 시스템에서는 SQLite 파일 잠금을 믿을 수 없어 여러 머신이 같은 DB를 나눠 쓰는 구성은 지원하지 않습니다.
+#
+# - 작업 종류 (배치 1회 = 이미지 N장 × 1차 유형 M개 + 이미지별 마무리 N개 + 통합 1개)
+#   phase1: 이미지 1장 × 1차 테스트 유형 1개 (API 호출 + 파싱)
+#   finalize: 이미지 1장의 2차 통합(선택) + 병합/중복 제거 + 개별 Excel + 히스토리 (1차가 모두 끝나면 시작)
+#   consolidate: 화면 간 중복 처리 + 통합 Excel (모든 이미지의 마무리가 끝나면 시작)
+# - 상태: blocked(선행 작업 대기) → pending → leased(임대 중) → done / failed
+# - 임대: 워커가 작업을 가져가면 lease_expires까지 독점하고, 처리 중에는 주기적으로 연장합니다.
+#   워커가 죽으면 임대가 만료되어 다른 워커가 다시 가져갑니다. (시도 횟수는 max_attempts까지)
+# - 임대를 잃은 워커의 결과(완료/실패 기록)는 무시되므로 같은 작업의 결과가 두 번 기록되지 않습니다.
+#
+#   python task_queue.py submit ./screens --types dev,biz,int --preset 일반청약_성인
+#   python task_queue.py work --processes 8 --exit-when-idle
+#   python task_queue.py status
+#
+# 속도 제한(--rpm/--max-concurrency, 키·모델별 전체 할당량)은 워커 프로세스 수로 나눠 각 프로세스에 적용합니다.
+# ============================================================================
+
+import argparse  # 명령행 인자
+import contextlib  # 쓰기 트랜잭션
+import dataclasses  # 작업 행 / 호출 통계 직렬화
+import json  # 설정/결과 직렬화
+import multiprocessing  # 워커 프로세스
+import os  # 파일 경로
+import signal  # 워커 중지 신호
+import socket  # 워커 ID (호스트 이름)
+import sqlite3  # 작업 큐 저장소
+import sys  # 종료 코드
+import threading  # 프로세스 안의 워커 스레드 / 임대 연장
+import time  # 임대 만료 시각
+import uuid  # 배치 ID
+from typing import Iterator, List, Optional
+
+import pandas as pd
+
+import history_store  # 히스토리 저장소 (SQLite, 연결은 호출마다)
+from batch_cli import UsageError, add_batch_options, add_runtime_options, build_batch_settings, configure_runtime
+from batch_spool import json_records  # NaN -> None 변환
+from dedup_index import DedupIndex, DEFAULT_INDEX_FILENAME
+from rate_limit import (  # 재시도 대기 (Retry-After 존중) / 프로세스별 속도 제한 몫
+    DEFAULT_BURST, DEFAULT_MAX_CONCURRENCY, DEFAULT_RPM, MIN_CONCURRENCY, configure_rate_limits, retry_delay,
+)
+from scenario_core import (
+    DEDUP_COLUMNS, BATCH_RETRY_DELAY, CallStats, create_batch_spool, create_excel_file, generate_integration_cases,
+    generate_phase1_cases, individual_output_path, list_batch_images, merge_and_dedup, write_consolidated_workbooks,
+)
+
+_BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_QUEUE_DB_PATH = os.path.join(_BASE_DIR, "task_queue.db")
+
+DEFAULT_MAX_ATTEMPTS = 3  # 작업별 최대 시도 횟수 (임대 만료 포함)
+DEFAULT_LEASE_SECONDS = 120.0  # 임대 기간 (처리 중에는 1/3마다 연장)
+DEFAULT_POLL_INTERVAL = 1.0  # 가져갈 작업이 없을 때 다시 확인하는 주기 (초)
+DEFAULT_WORKER_THREADS = 2  # 프로세스당 워커 스레드 (API 대기 중에도 다른 작업 진행)
+
+# 작업 종류 (우선순위: 뒤 단계를 먼저 가져가 이미지/배치가 빨리 끝나도록)
+TASK_CONSOLIDATE = "consolidate"
+TASK_FINALIZE = "finalize"
+TASK_PHASE1 = "phase1"
+TASK_PRIORITY = {TASK_CONSOLIDATE: 0, TASK_FINALIZE: 1, TASK_PHASE1: 2}
+
+# 작업 상태
+TASK_BLOCKED = "blocked"
+TASK_PENDING = "pending"
+TASK_LEASED = "leased"
+TASK_DONE = "done"
+TASK_FAILED = "failed"
+TERMINAL_STATES = (TASK_DONE, TASK_FAILED)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS batches (
+    batch_id     TEXT PRIMARY KEY,
+    input_folder TEXT NOT NULL,
+    settings     TEXT NOT NULL,
+    created      REAL NOT NULL,
+    finished     REAL
+);
+CREATE TABLE IF NOT EXISTS tasks (
+    task_id       INTEGER PRIMARY KEY AUTOINCREMENT,
+    batch_id      TEXT NOT NULL,
+    kind          TEXT NOT NULL,
+    priority      INTEGER NOT NULL,
+    image_file    TEXT NOT NULL DEFAULT '',
+    image_order   INTEGER NOT NULL DEFAULT 0,
+    test_type     TEXT NOT NULL DEFAULT '',
+    state         TEXT NOT NULL,
+    attempts      INTEGER NOT NULL DEFAULT 0,
+    max_attempts  INTEGER NOT NULL,
+    not_before    REAL NOT NULL DEFAULT 0,
+    lease_owner   TEXT,
+    lease_expires REAL,
+    result        TEXT,
+    error         TEXT NOT NULL DEFAULT '',
+    updated       REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_tasks_claim ON tasks(state, priority, image_order);
+CREATE INDEX IF NOT EXISTS idx_tasks_image ON tasks(batch_id, image_file, kind);
+"""
+
+
+@dataclasses.dataclass
+class Task:
+    """임대한 작업 1개 (배치 설정 포함)"""
+    task_id: int
+    batch_id: str
+    kind: str
+    image_file: str
+    image_order: int
+    test_type: str
+    attempts: int
+    max_attempts: int
+    input_folder: str
+    settings: dict
+
+
+class LeaseLost(Exception):
+    """임대가 만료되어 다른 워커가 가져간 작업 (결과를 기록하지 않음)"""
+
+
+class TaskQueue:
+    """
+    SQLite 작업 큐 (프로세스/스레드마다 호출할 때 새 연결을 열어 사용)
+
+    사용 예:
+        queue = TaskQueue(db_path)
+        batch_id = queue.submit_batch(input_folder, image_files, settings)
+        task = queue.claim(worker_id)            # 워커
+        queue.complete(task, worker_id, result)  # 또는 queue.fail(task, worker_id, error)
+    """
+
+    def __init__(self, db_path: str = DEFAULT_QUEUE_DB_PATH):
+        self.db_path = db_path
+        conn = self._connect()
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")  # 읽기와 쓰기가 서로 막지 않도록 (로컬 디스크 전용, 네트워크 파일 시스템 불가)
+            conn.executescript(_SCHEMA)
+        finally:
+            conn.close()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    @contextlib.contextmanager
+    def _write(self) -> Iterator[sqlite3.Connection]:
+        """쓰기 트랜잭션 (BEGIN IMMEDIATE: 다른 프로세스의 쓰기와 순서대로 실행)"""
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+        finally:
+            conn.close()
+
+    # ---------- 제출 ----------
+
+    def submit_batch(self, input_folder: str, image_files: List[str], settings: dict,
+                     max_attempts: int = DEFAULT_MAX_ATTEMPTS) -> str:
+        """
+        배치를 작업 행으로 나눠 등록
+
+        Args:
+            input_folder: 입력 폴더 (모든 워커에서 같은 경로로 접근 가능해야 함)
+            image_files: 입력 폴더 기준 이미지 상대 경로
+            settings: 배치 설정 (batch_cli.build_batch_settings()와 같은 구조)
+            max_attempts: 작업별 최대 시도 횟수
+
+        Returns:
+            str: 배치 ID (통합 파일 이름에도 사용)
+        """
+        batch_id = f"{time.strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:6]}"
+        now = time.time()
+        phase1_types = settings["worker"]["phase1_types"]
+        rows = []
+        for order, image_file in enumerate(image_files):
+            for test_type in phase1_types:
+                rows.append((batch_id, TASK_PHASE1, image_file, order, test_type, TASK_PENDING))
+            rows.append((batch_id, TASK_FINALIZE, image_file, order, "", TASK_BLOCKED if phase1_types else TASK_PENDING))
+        rows.append((batch_id, TASK_CONSOLIDATE, "", len(image_files), "", TASK_BLOCKED if image_files else TASK_PENDING))
+        with self._write() as conn:
+            conn.execute(
+                "INSERT INTO batches (batch_id, input_folder, settings, created) VALUES (?, ?, ?, ?)",
+                (batch_id, os.path.abspath(input_folder), json.dumps(settings, ensure_ascii=False), now)
+            )
+            conn.executemany(
+                "INSERT INTO tasks (batch_id, kind, priority, image_file, image_order, test_type, state, max_attempts, updated) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [(batch_id, kind, TASK_PRIORITY[kind], image_file, order, test_type, state, max_attempts, now)
+                 for batch_id, kind, image_file, order, test_type, state in rows]
+            )
+        return batch_id
+
+    # ---------- 임대 / 완료 / 실패 ----------
+
+    def claim(self, worker_id: str, lease_seconds: float = DEFAULT_LEASE_SECONDS) -> Optional[Task]:
+        """
+        가져갈 수 있는 작업 1개를 임대 (대기 중이거나 임대가 만료된 작업, 뒤 단계 우선)
+
+        Returns:
+            Optional[Task]: 임대한 작업 (없으면 None)
+        """
+        now = time.time()
+        with self._write() as conn:
+            # 임대가 만료됐는데 시도 횟수를 다 쓴 작업은 실패 처리 (처리 중 워커가 반복해서 죽은 경우)
+            for row in conn.execute(
+                "SELECT * FROM tasks WHERE state = ? AND lease_expires < ? AND attempts >= max_attempts",
+                (TASK_LEASED, now)
+            ).fetchall():
+                self._finish(conn, row, TASK_FAILED, error=f"임대 만료 {row['attempts']}회 (워커 중단 추정)")
+            row = conn.execute(
+                "SELECT * FROM tasks WHERE (state = ? AND not_before <= ?) OR (state = ? AND lease_expires < ?) "
+                "ORDER BY priority, image_order, task_id LIMIT 1",
+                (TASK_PENDING, now, TASK_LEASED, now)
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute(
+                "UPDATE tasks SET state = ?, lease_owner = ?, lease_expires = ?, attempts = attempts + 1, updated = ? "
+                "WHERE task_id = ?",
+                (TASK_LEASED, worker_id, now + lease_seconds, now, row["task_id"])
+            )
+            batch = conn.execute("SELECT input_folder, settings FROM batches WHERE batch_id = ?", (row["batch_id"],)).fetchone()
+        return Task(
+            task_id=row["task_id"], batch_id=row["batch_id"], kind=row["kind"], image_file=row["image_file"],
+            image_order=row["image_order"], test_type=row["test_type"], attempts=row["attempts"] + 1,
+            max_attempts=row["max_attempts"], input_folder=batch["input_folder"], settings=json.loads(batch["settings"]),
+        )
+
+    def _leased_row(self, conn: sqlite3.Connection, task: Task, worker_id: str) -> sqlite3.Row:
+        row = conn.execute(
+            "SELECT * FROM tasks WHERE task_id = ? AND state = ? AND lease_owner = ?",
+            (task.task_id, TASK_LEASED, worker_id)
+        ).fetchone()
+        if row is None:
+            raise LeaseLost(f"작업 {task.task_id}의 임대가 만료되었습니다")
+        return row
+
+    def heartbeat(self, task: Task, worker_id: str, lease_seconds: float = DEFAULT_LEASE_SECONDS) -> bool:
+        """임대 연장 (False면 임대를 잃음)"""
+        with self._write() as conn:
+            cursor = conn.execute(
+                "UPDATE tasks SET lease_expires = ?, updated = ? WHERE task_id = ? AND state = ? AND lease_owner = ?",
+                (time.time() + lease_seconds, time.time(), task.task_id, TASK_LEASED, worker_id)
+            )
+            return cursor.rowcount == 1
+
+    def complete(self, task: Task, worker_id: str, result: dict):
+        """
+        작업 완료 기록 (뒤 단계 작업의 선행 조건이 모두 끝났으면 대기 상태로 전환)
+
+        Raises:
+            LeaseLost: 임대가 만료되어 다른 워커가 가져간 경우
+        """
+        with self._write() as conn:
+            row = self._leased_row(conn, task, worker_id)
+            self._finish(conn, row, TASK_DONE, result=result)
+
+    def fail(self, task: Task, worker_id: str, error: BaseException):
+        """
+        작업 실패 기록 (시도 횟수가 남았으면 백오프 후 다시 대기, 다 쓰면 실패 확정)
+
+        Raises:
+            LeaseLost: 임대가 만료되어 다른 워커가 가져간 경우
+        """
+        with self._write() as conn:
+            row = self._leased_row(conn, task, worker_id)
+            if row["attempts"] < row["max_attempts"]:
+                conn.execute(
+                    "UPDATE tasks SET state = ?, not_before = ?, lease_owner = NULL, lease_expires = NULL, "
+                    "error = ?, updated = ? WHERE task_id = ?",
+                    (TASK_PENDING, time.time() + retry_delay(row["attempts"] - 1, error, base=BATCH_RETRY_DELAY),
+                     str(error), time.time(), row["task_id"])
+                )
+            else:
+                self._finish(conn, row, TASK_FAILED, error=str(error))
+
+    def _finish(self, conn: sqlite3.Connection, row: sqlite3.Row, state: str,
+                result: Optional[dict] = None, error: str = ""):
+        """작업을 완료/실패로 확정하고 뒤 단계 작업을 풀어줌 (트랜잭션 안에서 호출)"""
+        conn.execute(
+            "UPDATE tasks SET state = ?, result = ?, error = ?, lease_owner = NULL, lease_expires = NULL, updated = ? "
+            "WHERE task_id = ?",
+            (state, json.dumps(result, ensure_ascii=False, default=str) if result is not None else None,
+             error, time.time(), row["task_id"])
+        )
+        batch_id, image_file = row["batch_id"], row["image_file"]
+        if row["kind"] == TASK_PHASE1:
+            counts = dict(conn.execute(
+                "SELECT state, COUNT(*) FROM tasks WHERE batch_id = ? AND image_file = ? AND kind = ? GROUP BY state",
+                (batch_id, image_file, TASK_PHASE1)
+            ).fetchall())
+            if sum(count for task_state, count in counts.items() if task_state not in TERMINAL_STATES):
+                return
+            finalize_row = conn.execute(
+                "SELECT * FROM tasks WHERE batch_id = ? AND image_file = ? AND kind = ? AND state = ?",
+                (batch_id, image_file, TASK_FINALIZE, TASK_BLOCKED)
+            ).fetchone()
+            if finalize_row is None:
+                return
+            if counts.get(TASK_FAILED):
+                # 1차 결과는 유형이 모두 있어야 병합하므로 이미지 전체를 실패 처리
+                self._finish(conn, finalize_row, TASK_FAILED, error="1차 생성 실패")
+            else:
+                conn.execute("UPDATE tasks SET state = ?, updated = ? WHERE task_id = ?",
+                             (TASK_PENDING, time.time(), finalize_row["task_id"]))
+        elif row["kind"] == TASK_FINALIZE:
+            remaining = conn.execute(
+                "SELECT COUNT(*) FROM tasks WHERE batch_id = ? AND kind = ? AND state NOT IN (?, ?)",
+                (batch_id, TASK_FINALIZE) + TERMINAL_STATES
+            ).fetchone()[0]
+            if remaining == 0:
+                conn.execute("UPDATE tasks SET state = ?, updated = ? WHERE batch_id = ? AND kind = ? AND state = ?",
+                             (TASK_PENDING, time.time(), batch_id, TASK_CONSOLIDATE, TASK_BLOCKED))
+        elif row["kind"] == TASK_CONSOLIDATE:
+            conn.execute("UPDATE batches SET finished = ? WHERE batch_id = ?", (time.time(), batch_id))
+
+    # ---------- 조회 ----------
+
+    def stage_results(self, batch_id: str, kind: str, image_file: Optional[str] = None) -> Iterator[sqlite3.Row]:
+        """
+        완료된 작업의 결과를 한 행씩 반환 (이미지 순서 → 등록 순서, result는 JSON 문자열)
+
+        커서로 읽으므로 배치 전체 결과를 한 번에 메모리에 올리지 않습니다. (끝까지 읽거나 닫으면 연결 종료)
+        """
+        query = "SELECT image_file, image_order, test_type, result FROM tasks WHERE batch_id = ? AND kind = ? AND state = ?"
+        params = [batch_id, kind, TASK_DONE]
+        if image_file is not None:
+            query += " AND image_file = ?"
+            params.append(image_file)
+        conn = self._connect()
+        try:
+            yield from conn.execute(query + " ORDER BY image_order, task_id", params)
+        finally:
+            conn.close()
+
+    def is_idle(self) -> bool:
+        """처리할(또는 처리 중인) 작업이 하나도 없는지"""
+        conn = self._connect()
+        try:
+            return conn.execute(
+                "SELECT COUNT(*) FROM tasks WHERE state NOT IN (?, ?)", TERMINAL_STATES
+            ).fetchone()[0] == 0
+        finally:
+            conn.close()
+
+    def status(self, batch_id: Optional[str] = None) -> List[dict]:
+        """배치별 진행 현황 (작업 종류별 상태 수, 실패한 이미지, 통합 결과)"""
+        conn = self._connect()
+        try:
+            batches = conn.execute(
+                "SELECT * FROM batches" + (" WHERE batch_id = ?" if batch_id else "") + " ORDER BY created DESC",
+                (batch_id,) if batch_id else ()
+            ).fetchall()
+            report = []
+            for batch in batches:
+                counts = {}
+                for kind, state, count in conn.execute(
+                    "SELECT kind, state, COUNT(*) FROM tasks WHERE batch_id = ? GROUP BY kind, state", (batch["batch_id"],)
+                ):
+                    counts.setdefault(kind, {})[state] = count
+                failed = conn.execute(
+                    "SELECT image_file, error FROM tasks WHERE batch_id = ? AND kind = ? AND state = ? ORDER BY image_order",
+                    (batch["batch_id"], TASK_FINALIZE, TASK_FAILED)
+                ).fetchall()
+                consolidated = conn.execute(
+                    "SELECT state, result, error FROM tasks WHERE batch_id = ? AND kind = ?", (batch["batch_id"], TASK_CONSOLIDATE)
+                ).fetchone()
+                report.append({
+                    "batch_id": batch["batch_id"],
+                    "input_folder": batch["input_folder"],
+                    "created": batch["created"],
+                    "finished": batch["finished"],
+                    "tasks": counts,
+                    "failed_images": [{"image": row["image_file"], "error": row["error"]} for row in failed],
+                    "consolidated": json.loads(consolidated["result"]) if consolidated and consolidated["result"] else None,
+                })
+            return report
+        finally:
+            conn.close()
+
+
+# ---------- 작업 실행 ----------
+
+def _read_image(task: Task) -> bytes:
+    with open(os.path.join(task.input_folder, task.image_file), "rb") as f:
+        return f.read()
+
+
+def _write_workbook(path: str, df: pd.DataFrame):
+    """개별 Excel 저장 (임시 파일에 쓴 뒤 교체, 도중에 죽어도 깨진 파일이 남지 않음)"""
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, "wb") as f:
+        f.write(create_excel_file(df).getvalue())
+    os.replace(temp_path, path)
+
+
+def run_phase1_task(queue: TaskQueue, task: Task, api_key: Optional[str]) -> dict:
+    """이미지 1장 × 1차 테스트 유형 1개"""
+    worker_settings = task.settings["worker"]
+    stats = CallStats()
+    cases = generate_phase1_cases(
+        _read_image(task), task.image_file, worker_settings["model_name"], task.test_type,
+        worker_settings["sample_guide_text"],
+        use_cache=worker_settings["use_cache"] and task.attempts == 1,  # 재시도는 캐시를 건너뜀
+        structured=worker_settings["structured"], image_options=worker_settings["image_options"],
+        tile_images=worker_settings["tile_images"], stats=stats, api_key=api_key,
+    )
+    return {"cases": cases, "call_stats": dataclasses.asdict(stats)}
+
+
+def run_finalize_task(queue: TaskQueue, task: Task, api_key: Optional[str]) -> dict:
+    """이미지 1장: 2차 통합(선택) → 병합/중복 제거 → 개별 Excel → 히스토리"""
+    worker_settings = task.settings["worker"]
+    stats = CallStats()
+    first_df = pd.DataFrame([
+        case
+        for row in queue.stage_results(task.batch_id, TASK_PHASE1, task.image_file)
+        for case in json.loads(row["result"])["cases"]
+    ])
+    second_df = pd.DataFrame()
+    if worker_settings["run_integration"]:
+        second_df = pd.DataFrame(generate_integration_cases(
+            _read_image(task), task.image_file, worker_settings["model_name"], worker_settings["condition_text"],
+            first_df, worker_settings["sample_guide_text"],
+            use_cache=worker_settings["use_cache"] and task.attempts == 1,
+            structured=worker_settings["structured"], image_options=worker_settings["image_options"],
+            stats=stats, api_key=api_key,
+        ))
+    merged_df, before_count, after_count, _ = merge_and_dedup(first_df, second_df, worker_settings["similarity_threshold"])
+
+    output_file = None
+    if worker_settings["save_individual"]:
+        output_file = individual_output_path(task.input_folder, task.image_file)
+        _write_workbook(output_file, merged_df)
+    records = json_records(merged_df)
+    history_store.append_entry(worker_settings["model_name"], f"[배치] {task.image_file}", records, "Final", "")
+    return {
+        "cases": records,
+        "dedup_before": before_count,
+        "dedup_after": after_count,
+        "output_file": output_file,
+        "call_stats": dataclasses.asdict(stats),
+    }
+
+
+def run_consolidate_task(queue: TaskQueue, task: Task, api_key: Optional[str]) -> dict:
+    """배치 전체: 화면 간 중복 처리(이미지 순서대로) → 통합 Excel"""
+    settings = task.settings
+    cross_dedup_mode = settings["cross_dedup_mode"]
+    dedup_index_path = os.path.join(task.input_folder, DEFAULT_INDEX_FILENAME)
+    cross_dedup_index = None
+    if cross_dedup_mode is not None:
+        if settings["persist_dedup_index"]:
+            cross_dedup_index = DedupIndex.load(dedup_index_path, DEDUP_COLUMNS)
+        else:
+            cross_dedup_index = DedupIndex(DEDUP_COLUMNS)
+
+    batch_spool = create_batch_spool(task.input_folder, task.batch_id)
+    cross_duplicate_total = 0
+    for row in queue.stage_results(task.batch_id, TASK_FINALIZE):
+        merged_df = pd.DataFrame(json.loads(row["result"])["cases"])
+        if cross_dedup_index is not None:
+            merged_df, cross_duplicate_count = cross_dedup_index.apply(merged_df, row["image_file"], cross_dedup_mode)
+            cross_duplicate_total += cross_duplicate_count
+        batch_spool.add(row["image_order"], merged_df)
+    if cross_dedup_index is not None and settings["persist_dedup_index"]:
+        cross_dedup_index.save(dedup_index_path)
+
+    saved_files = []
+    if settings["save_consolidated"] and batch_spool.row_count:
+        saved_files = write_consolidated_workbooks(batch_spool, task.input_folder, task.batch_id)
+    row_count = batch_spool.row_count
+    batch_spool.cleanup()
+    return {
+        "files": [{"split": split_name, "path": path, "rows": count} for split_name, path, count in saved_files],
+        "row_count": row_count,
+        "cross_duplicates": cross_duplicate_total,
+        "cross_dedup_mode": cross_dedup_mode,
+    }
+
+
+TASK_RUNNERS = {
+    TASK_PHASE1: run_phase1_task,
+    TASK_FINALIZE: run_finalize_task,
+    TASK_CONSOLIDATE: run_consolidate_task,
+}
+
+
+def execute_task(queue: TaskQueue, task: Task, worker_id: str, api_key: Optional[str] = None,
+                 lease_seconds: float = DEFAULT_LEASE_SECONDS):
+    """
+    임대한 작업 1개 실행 (처리 중에는 임대를 주기적으로 연장, 결과/실패는 큐에 기록)
+
+    임대를 잃으면 (다른 워커가 이미 가져감) 결과를 버립니다.
+    """
+    stop_heartbeat = threading.Event()
+
+    def keep_lease():
+        while not stop_heartbeat.wait(lease_seconds / 3):
+            if not queue.heartbeat(task, worker_id, lease_seconds):
+                return
+
+    heartbeat = threading.Thread(target=keep_lease, name=f"lease-{task.task_id}", daemon=True)
+    heartbeat.start()
+    try:
+        try:
+            result = TASK_RUNNERS[task.kind](queue, task, api_key)
+        except Exception as e:
+            stop_heartbeat.set()
+            queue.fail(task, worker_id, e)
+            return
+        stop_heartbeat.set()
+        queue.complete(task, worker_id, result)
+    except LeaseLost:
+        pass  # 다른 워커가 다시 처리 중
+    finally:
+        stop_heartbeat.set()
+        heartbeat.join()
+
+
+def run_worker(db_path: str, api_key: Optional[str] = None, threads: int = DEFAULT_WORKER_THREADS,
+               lease_seconds: float = DEFAULT_LEASE_SECONDS, poll_interval: float = DEFAULT_POLL_INTERVAL,
+               exit_when_idle: bool = False, stop_event: Optional[threading.Event] = None):
+    """
+    워커 프로세스 1개의 작업 루프 (스레드 threads개가 각자 작업을 임대해 처리)
+
+    Args:
+        exit_when_idle: 큐에 남은 작업이 없으면 종료 (아니면 stop_event까지 계속 대기)
+        stop_event: 설정되면 처리 중인 작업까지만 마치고 종료
+    """
+    queue = TaskQueue(db_path)
+    stop_event = stop_event or threading.Event()
+    worker_prefix = f"{socket.gethostname()}:{os.getpid()}"
+
+    def loop(worker_id: str):
+        while not stop_event.is_set():
+            task = queue.claim(worker_id, lease_seconds)
+            if task is None:
+                if exit_when_idle and queue.is_idle():
+                    return
+                stop_event.wait(poll_interval)
+                continue
+            execute_task(queue, task, worker_id, api_key, lease_seconds)
+
+    workers = [threading.Thread(target=loop, args=(f"{worker_prefix}:{i}",), name=f"queue-worker-{i}")
+               for i in range(max(1, threads))]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+
+def split_rate_limits(args: argparse.Namespace, process_count: int):
+    """
+    키·모델별 속도 제한을 워커 프로세스 수로 나눔 (args를 직접 수정)
+
+    속도 제한기는 프로세스마다 따로 있으므로, 나누지 않으면 키 하나에 프로세스 수 × --rpm만큼 요청이 갑니다.
+    """
+    process_count = max(1, process_count)
+    args.rpm = (args.rpm if args.rpm is not None else DEFAULT_RPM) / process_count
+    args.max_concurrency = max(MIN_CONCURRENCY, (args.max_concurrency or DEFAULT_MAX_CONCURRENCY) // process_count)
+    args.burst = max(1, DEFAULT_BURST // process_count)
+
+
+def _worker_process(args: argparse.Namespace):
+    """워커 프로세스 진입점 (가짜 모델/속도 제한은 프로세스마다 설정)"""
+    api_key = configure_runtime(args)
+    configure_rate_limits(burst=args.burst)
+    stop_event = threading.Event()
+    for signal_number in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signal_number, lambda *_: stop_event.set())
+    run_worker(args.db, api_key, args.threads, args.lease, args.poll_interval, args.exit_when_idle, stop_event)
+
+
+# ---------- 명령행 ----------
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="테스트 시나리오 생성 영속 작업 큐 (SQLite, 여러 워커 프로세스)")
+    parser.add_argument("--db", default=os.environ.get("TASK_QUEUE_DB_PATH", DEFAULT_QUEUE_DB_PATH),
+                        help="작업 큐 DB 경로 (로컬 디스크, 모든 워커가 같은 파일을 사용, 기본: TASK_QUEUE_DB_PATH 또는 앱 폴더의 task_queue.db)")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    submit = commands.add_parser("submit", help="폴더의 이미지를 작업으로 등록")
+    submit.add_argument("input_folder", help="이미지 폴더 (결과 Excel도 이 폴더에 저장, 모든 워커에서 같은 경로)")
+    add_batch_options(submit)
+    submit.add_argument("--max-attempts", type=int, default=DEFAULT_MAX_ATTEMPTS,
+                        help=f"작업별 최대 시도 횟수 (기본: {DEFAULT_MAX_ATTEMPTS})")
+
+    work = commands.add_parser("work", help="워커 프로세스 실행")
+    work.add_argument("--processes", type=int, default=os.cpu_count() or 1, help="워커 프로세스 수 (기본: CPU 코어 수)")
+    work.add_argument("--threads", type=int, default=DEFAULT_WORKER_THREADS,
+                      help=f"프로세스당 워커 스레드 수 (기본: {DEFAULT_WORKER_THREADS})")
+    work.add_argument("--lease", type=float, default=DEFAULT_LEASE_SECONDS, help=f"작업 임대 기간 초 (기본: {DEFAULT_LEASE_SECONDS:g})")
+    work.add_argument("--poll-interval", type=float, default=DEFAULT_POLL_INTERVAL, help="작업이 없을 때 확인 주기 초")
+    work.add_argument("--exit-when-idle", action="store_true", help="남은 작업이 없으면 종료")
+    add_runtime_options(work)
+
+    status = commands.add_parser("status", help="배치별 진행 현황 (JSON)")
+    status.add_argument("--batch", help="배치 ID (기본: 전체)")
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    try:
+        if args.command == "submit":
+            if not os.path.isdir(args.input_folder):
+                raise UsageError(f"폴더를 찾을 수 없습니다: {args.input_folder}")
+            settings = build_batch_settings(args)
+            image_files = sorted(list_batch_images(args.input_folder, args.recursive))
+            if not image_files:
+                raise UsageError(f"폴더에 이미지 파일이 없습니다: {args.input_folder}")
+            batch_id = TaskQueue(args.db).submit_batch(args.input_folder, image_files, settings, args.max_attempts)
+            print(json.dumps({"batch_id": batch_id, "images": len(image_files), "db": args.db}, ensure_ascii=False))
+        elif args.command == "status":
+            print(json.dumps(TaskQueue(args.db).status(args.batch), ensure_ascii=False, indent=2))
+        else:
+            configure_runtime(args)  # API 키 확인 (프로세스마다 다시 설정)
+            TaskQueue(args.db)  # 스키마 생성
+            process_count = max(1, args.processes)
+            split_rate_limits(args, process_count)
+            processes = [multiprocessing.Process(target=_worker_process, args=(args,), name=f"queue-process-{i}")
+                         for i in range(process_count)]
+            for process in processes:
+                process.start()
+            signal.signal(signal.SIGTERM, lambda *_: [process.terminate() for process in processes if process.is_alive()])
+            for process in processes:
+                while process.is_alive():
+                    try:
+                        process.join()
+                    except KeyboardInterrupt:
+                        pass  # 자식 프로세스도 SIGINT를 받아 처리 중인 작업까지만 마치고 종료
+    except UsageError as e:
+        print(f"오류: {e}", file=sys.stderr)
+        return 2
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
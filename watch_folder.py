@@ -0,0 +1,456 @@
+# ============================================================================
+# Test Scenario Generator 2 - 폴더 감시 (새로 추가/변경된 화면 이미지만 처리)
+# ============================================================================
+# 배치 탭이나 batch_cli.py는 실행할 때마다 선택한 이미지를 모두 다시 생성합니다.
+# 이 모듈은 입력 폴더(기본: 하위 폴더 포함)를 주기적으로 살펴 새 이미지와 내용이 바뀐 이미지만 처리하고,
+# 이미지별 _최종.xlsx와 통합 파일을 갱신합니다.
+#
+# - 변경 감지: 크기/수정 시각이 기록과 다를 때만 내용 해시(SHA-256)를 계산하고, 해시까지 다르면 변경으로 판단
+#   (저장만 다시 한 파일은 API를 호출하지 않음). 방금 수정된 파일은 복사 중일 수 있어 다음 확인으로 미룸
+# - 처음 보는 이미지 옆에 이미지보다 새로운 _최종.xlsx가 있으면 다시 생성하지 않고 그 결과를 가져옴
+# - 이미지별 병합 결과는 입력 폴더의 .scenario_watch/results에 조각(JSONL)으로 보관하고,
+#   통합 파일은 바뀐 것이 있을 때만 보관된 조각을 병합해 다시 기록 (API 호출 없음)
+# - 삭제된 이미지는 통합 파일에서 빠지며, 이미지 옆의 _최종.xlsx는 지우지 않음
+# - 생성 설정(--types, --preset 등)이 지난 실행과 다르면 전체를 다시 생성
+# - 실패한 이미지는 파일이 바뀌거나 감시를 다시 시작하면 재시도
+#
+#   python watch_folder.py ./screens --types dev,biz,int --preset 일반청약_성인 --interval 10
+#   python watch_folder.py ./screens --once                       # 한 번만 확인하고 종료 (cron 등)
+# ============================================================================
+
+import argparse  # 명령행 인자
+import hashlib  # 이미지 내용 해시
+import json  # 감시 상태 파일
+import os  # 파일 상태/경로
+import shutil  # 임시 스풀 정리
+import signal  # SIGTERM → 중지
+import sys  # 종료 코드
+import threading  # 중지 신호
+import time  # 확인 주기
+from concurrent.futures import ThreadPoolExecutor, as_completed  # 이미지 병렬 처리
+from typing import Callable, Dict, List, Optional
+
+import pandas as pd
+
+import history_store  # 히스토리 저장소 (SQLite, 연결은 호출마다)
+from batch_cli import (
+    EXIT_CANCELLED, EXIT_IMAGES_FAILED, EXIT_OK, EXIT_USAGE, ProgressPrinter, UsageError,
+    add_batch_options, add_runtime_options, build_batch_settings, configure_runtime,
+)
+from batch_jobs import BATCH_MAX_RETRIES, MSG_CAPTION, MSG_ERROR, MSG_INFO, MSG_WARNING
+from batch_spool import ShardSpool
+from dedup_index import DedupIndex
+from scenario_core import (
+    BATCH_SPLIT_RULES, CONSOLIDATED_FILE_NAMES, DEDUP_COLUMNS, DEFAULT_BATCH_WORKERS, MAX_BATCH_WORKERS,
+    BatchCancelled, individual_output_path, list_batch_images, process_batch_image,
+)
+
+WATCH_STATE_DIRNAME = ".scenario_watch"  # 입력 폴더 안의 감시 상태 폴더
+WATCH_STATE_FILENAME = "state.json"  # 이미지별 크기/수정 시각/해시/조각 번호
+WATCH_RESULTS_DIRNAME = "results"  # 이미지별 병합 결과 조각 (통합 파일 재작성용)
+WATCH_OUTPUT_LABEL = "감시"  # 통합 파일명의 {timestamp} 자리 (예: 통합_최종본_감시.xlsx)
+
+DEFAULT_WATCH_INTERVAL = 5.0  # 폴더 확인 주기 (초)
+DEFAULT_SETTLE_SECONDS = 2.0  # 수정 후 이 시간이 지나야 처리 (복사 중인 파일 제외)
+HASH_BLOCK_SIZE = 1024 * 1024
+
+
+def file_sha256(path: str) -> str:
+    """파일 내용 SHA-256 (블록 단위로 읽음)"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class FolderWatcher:
+    """
+    입력 폴더의 새/변경 이미지만 처리하고 통합 파일을 갱신하는 감시기 (Streamlit 비의존)
+
+    사용 예:
+        watcher = FolderWatcher(input_folder, batch_settings, listener=print)
+        watcher.run(interval=5.0)        # stop_event가 설정될 때까지
+        watcher.run_once()               # 한 번만 확인
+
+    상태(이미지별 크기/수정 시각/해시, 결과 조각)는 입력 폴더의 .scenario_watch에 저장하므로
+    감시를 다시 시작해도 바뀐 이미지만 처리합니다.
+    """
+
+    def __init__(self, input_folder: str, settings: dict, include_subfolders: bool = True,
+                 max_workers: int = DEFAULT_BATCH_WORKERS, settle_seconds: float = DEFAULT_SETTLE_SECONDS,
+                 api_key: Optional[str] = None, listener: Optional[Callable[[dict], None]] = None,
+                 stop_event: Optional[threading.Event] = None):
+        self.input_folder = input_folder
+        self.settings = settings
+        self.include_subfolders = include_subfolders
+        self.max_workers = max(1, min(max_workers, MAX_BATCH_WORKERS))
+        self.settle_seconds = settle_seconds
+        self.api_key = api_key
+        self.listener = listener
+        self.stop_event = stop_event or threading.Event()
+
+        self.state_dir = os.path.join(input_folder, WATCH_STATE_DIRNAME)
+        self.state_path = os.path.join(self.state_dir, WATCH_STATE_FILENAME)
+        self.results = ShardSpool(os.path.join(self.state_dir, WATCH_RESULTS_DIRNAME), BATCH_SPLIT_RULES)
+        self.state = self._load_state()
+
+    # ---------- 상태 ----------
+
+    @property
+    def images(self) -> Dict[str, dict]:
+        """이미지 상대 경로 -> size, mtime_ns, sha256, order(조각 번호), rows, error"""
+        return self.state["images"]
+
+    def _load_state(self) -> dict:
+        state = {"settings": self.settings, "next_order": 0, "images": {}, "consolidated_dirty": False}
+        if os.path.exists(self.state_path):
+            try:
+                with open(self.state_path, "r", encoding="utf-8") as f:
+                    state.update(json.load(f))
+            except (OSError, ValueError):
+                self._log(MSG_WARNING, f"⚠️ 감시 상태 파일을 읽을 수 없어 처음부터 시작합니다: {self.state_path}")
+        for entry in state["images"].values():
+            if entry.get("error"):
+                entry["size"] = -1  # 실패한 이미지는 다시 시작할 때 재시도
+        if state["settings"] != self.settings:
+            if state["images"]:
+                self._log(MSG_WARNING, "⚠️ 생성 설정이 지난 실행과 달라 모든 이미지를 다시 생성합니다")
+            for entry in state["images"].values():
+                entry["size"] = -1
+                entry["sha256"] = None
+            state["settings"] = self.settings
+        return state
+
+    def _save_state(self):
+        """상태 파일 저장 (임시 파일에 쓴 뒤 교체)"""
+        os.makedirs(self.state_dir, exist_ok=True)
+        temp_path = self.state_path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(self.state, f, ensure_ascii=False)
+        os.replace(temp_path, self.state_path)
+
+    def _notify(self, event: dict):
+        if self.listener is not None:
+            self.listener(event)
+
+    def _log(self, kind: str, text: str):
+        self._notify({"event": "message", "kind": kind, "text": text})
+
+    # ---------- 변경 감지 ----------
+
+    def scan(self) -> dict:
+        """
+        폴더를 확인해 처리할 이미지를 찾음 (해시는 크기/수정 시각이 바뀐 파일만 계산)
+
+        Returns:
+            dict: changed(새 이미지 + 내용이 바뀐 이미지, 경로 순), deleted(사라진 이미지),
+                touched(수정 시각만 바뀐 이미지 수), settling(복사 중일 수 있어 미룬 이미지 수)
+        """
+        now = time.time()
+        current = {}
+        for image_file in list_batch_images(self.input_folder, self.include_subfolders):
+            try:
+                current[image_file] = os.stat(os.path.join(self.input_folder, image_file))
+            except FileNotFoundError:
+                continue  # 목록을 만든 뒤 삭제됨
+        deleted = sorted(image_file for image_file in self.images if image_file not in current)
+
+        changed, touched, settling = [], 0, 0
+        for image_file in sorted(current):
+            stat = current[image_file]
+            entry = self.images.get(image_file)
+            if entry is not None and entry["size"] == stat.st_size and entry["mtime_ns"] == stat.st_mtime_ns:
+                continue
+            if now - stat.st_mtime < self.settle_seconds:
+                settling += 1
+                continue
+            if entry is not None and entry.get("sha256") and entry["size"] == stat.st_size:
+                try:
+                    same_content = file_sha256(os.path.join(self.input_folder, image_file)) == entry["sha256"]
+                except OSError:
+                    continue
+                if same_content:
+                    entry["mtime_ns"] = stat.st_mtime_ns
+                    touched += 1
+                    continue
+            changed.append(image_file)
+        return {"changed": changed, "deleted": deleted, "touched": touched, "settling": settling}
+
+    # ---------- 이미지 처리 ----------
+
+    def _adopt_existing(self, image_file: str, image_mtime: float) -> Optional[pd.DataFrame]:
+        """처음 보는 이미지 옆에 이미지보다 새로운 _최종.xlsx가 있으면 그 결과를 사용 (API 호출 없음)"""
+        if image_file in self.images or not self.settings["worker"]["save_individual"]:
+            return None
+        output_file = individual_output_path(self.input_folder, image_file)
+        if not os.path.exists(output_file) or os.path.getmtime(output_file) < image_mtime:
+            return None
+        try:
+            return pd.read_excel(output_file, dtype=str)
+        except Exception:
+            return None  # 읽을 수 없는 파일은 다시 생성
+
+    def _process_image(self, image_file: str) -> dict:
+        """이미지 1장 처리 (워커 스레드, 처리한 내용의 크기/수정 시각/해시를 함께 반환)"""
+        image_path = os.path.join(self.input_folder, image_file)
+        stat = os.stat(image_path)  # 읽기 전 상태 (읽는 도중 바뀌면 다음 확인에서 다시 처리)
+        with open(image_path, "rb") as f:
+            image_data = f.read()
+        processed = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "sha256": hashlib.sha256(image_data).hexdigest()}
+
+        adopted_df = self._adopt_existing(image_file, stat.st_mtime)
+        if adopted_df is not None:
+            return dict(processed, merged_df=adopted_df, adopted=True, output_file=individual_output_path(self.input_folder, image_file))
+
+        worker_settings = self.settings["worker"]
+        result = process_batch_image(
+            self.input_folder, image_file, worker_settings["model_name"], worker_settings["phase1_types"],
+            worker_settings["run_integration"], worker_settings["condition_text"], worker_settings["sample_guide_text"],
+            save_individual=worker_settings["save_individual"], max_retries=BATCH_MAX_RETRIES,
+            use_cache=worker_settings["use_cache"], structured=worker_settings["structured"],
+            image_options=worker_settings["image_options"], tile_images=worker_settings["tile_images"],
+            similarity_threshold=worker_settings["similarity_threshold"], api_key=self.api_key,
+            cancel_event=self.stop_event, image_data=image_data,
+        )
+        history_store.append_entry(worker_settings["model_name"], f"[배치] {image_file}", result["merged_df"].to_dict('records'), "Final", "")
+        return dict(processed, merged_df=result["merged_df"], adopted=False, output_file=result["output_file"],
+                    api_calls=result["call_stats"].api_calls, cache_hits=result["call_stats"].cache_hits)
+
+    def process(self, image_files: List[str]) -> dict:
+        """
+        이미지들을 병렬 처리하고 끝나는 대로 결과 조각/상태를 기록
+
+        Returns:
+            dict: ok / adopted / failed / cancelled 이미지 수
+        """
+        counts = {"ok": 0, "adopted": 0, "failed": 0, "cancelled": 0}
+        if not image_files:
+            return counts
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="watch") as executor:
+            futures = {executor.submit(self._process_image, image_file): image_file for image_file in image_files}
+            for done, future in enumerate(as_completed(futures), start=1):
+                image_file = futures[future]
+                progress = {"event": "image", "image": image_file, "done": done, "total": len(image_files)}
+                try:
+                    result = future.result()
+                except BatchCancelled:
+                    counts["cancelled"] += 1
+                    self._notify(dict(progress, outcome="cancelled"))
+                    continue
+                except Exception as e:
+                    # 실패한 내용의 상태를 기록해 같은 파일을 주기마다 다시 호출하지 않음
+                    counts["failed"] += 1
+                    # 내용이 바뀐 이미지였다면 이전 내용의 결과 조각이 통합 파일에 남지 않도록 삭제
+                    entry = self._entry(image_file)
+                    if entry.pop("rows", None) is not None:
+                        self.results.remove(entry["order"])
+                        self.state["consolidated_dirty"] = True
+                    entry.update(self._current_stat(image_file), error=str(e))
+                    self._save_state()
+                    self._log(MSG_ERROR, f"❌ {image_file}: 단계별 {BATCH_MAX_RETRIES}회 시도 후 실패 - {e}")
+                    self._notify(dict(progress, outcome="failed", error=str(e)))
+                    continue
+
+                merged_df = result.pop("merged_df")
+                entry = self._entry(image_file)
+                entry.update(size=result["size"], mtime_ns=result["mtime_ns"], sha256=result["sha256"],
+                             rows=len(merged_df), error="")
+                if self.settings["save_consolidated"]:
+                    self.results.add(entry["order"], merged_df)
+                    self.state["consolidated_dirty"] = True
+                self._save_state()
+                outcome = "adopted" if result["adopted"] else "ok"
+                counts[outcome] += 1
+                self._notify(dict(progress, outcome=outcome, rows=len(merged_df), output_file=result["output_file"],
+                                  api_calls=result.get("api_calls", 0), cache_hits=result.get("cache_hits", 0)))
+        return counts
+
+    def _entry(self, image_file: str) -> dict:
+        """이미지의 상태 항목 (처음 보는 이미지는 새 조각 번호 할당)"""
+        if image_file not in self.images:
+            self.images[image_file] = {"order": self.state["next_order"]}
+            self.state["next_order"] += 1
+        return self.images[image_file]
+
+    def _current_stat(self, image_file: str) -> dict:
+        """실패 기록용 현재 크기/수정 시각/해시 (읽을 수 없으면 다음 확인에서 다시 시도)"""
+        image_path = os.path.join(self.input_folder, image_file)
+        try:
+            stat = os.stat(image_path)
+            return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "sha256": file_sha256(image_path)}
+        except OSError:
+            return {"size": -1, "mtime_ns": 0, "sha256": None}
+
+    def remove(self, image_files: List[str]):
+        """삭제된 이미지의 상태/결과 조각 제거 (개별 _최종.xlsx는 남겨 둠)"""
+        for image_file in image_files:
+            entry = self.images.pop(image_file)
+            self.results.remove(entry["order"])
+            self.state["consolidated_dirty"] = True
+        if image_files:
+            self._save_state()
+
+    # ---------- 통합 파일 ----------
+
+    def consolidate(self) -> list:
+        """
+        보관된 이미지별 결과로 통합 파일 재작성 (화면 간 중복은 이미지 경로 순으로 다시 계산)
+
+        Returns:
+            List[Tuple[str, str, int]]: (분리 이름, 파일 경로, 행 수)
+        """
+        # 보관된 결과는 조각 1개씩만 읽고, 통합 파일은 조각을 병합하며 한 행씩 기록 (이미지 수와 무관한 메모리)
+        temp_dir = None
+        cross_dedup_mode = self.settings["cross_dedup_mode"]
+        if cross_dedup_mode is None:
+            # 건수/너비는 삭제/교체된 조각을 빼고 다시 누적해야 하므로 새 스풀로 다시 등록
+            output_spool = ShardSpool(self.results.directory, BATCH_SPLIT_RULES)
+            output_spool.reload()
+        else:
+            temp_dir = os.path.join(self.state_dir, "consolidate")
+            shutil.rmtree(temp_dir, ignore_errors=True)
+            output_spool = ShardSpool(temp_dir, BATCH_SPLIT_RULES)
+            cross_dedup_index = DedupIndex(DEDUP_COLUMNS)
+            for position, image_file in enumerate(sorted(self.images)):
+                merged_df = self.results.read(self.images[image_file]["order"])
+                if merged_df is None:
+                    continue
+                consolidated_df, _ = cross_dedup_index.apply(merged_df, image_file, cross_dedup_mode)
+                output_spool.add(position, consolidated_df)
+
+        outputs = {
+            name: os.path.join(self.input_folder, file_name.format(timestamp=WATCH_OUTPUT_LABEL))
+            for name, file_name in CONSOLIDATED_FILE_NAMES.items()
+        }
+        try:
+            written = output_spool.write_workbooks({name: path + ".tmp" for name, path in outputs.items()})
+        finally:
+            if temp_dir is not None:
+                shutil.rmtree(temp_dir, ignore_errors=True)
+        saved_files = []
+        for name, path in outputs.items():
+            if name in written:
+                os.replace(path + ".tmp", path)
+                saved_files.append((name, path, written[name]))
+            elif os.path.exists(path):
+                os.remove(path)  # 해당 분리의 이미지가 모두 삭제됨
+        self.state["consolidated_dirty"] = False
+        self._save_state()
+        return saved_files
+
+    # ---------- 실행 ----------
+
+    def run_once(self) -> dict:
+        """
+        폴더를 한 번 확인하고 바뀐 이미지만 처리 (통합 파일은 바뀐 것이 있을 때만 다시 기록)
+
+        Returns:
+            dict: scan 결과 수치와 process() 결과
+        """
+        scan = self.scan()
+        if scan["changed"] or scan["deleted"] or scan["touched"] or scan["settling"]:  # 바뀐 것이 없으면 조용히 대기
+            self._notify({"event": "scan", "changed": len(scan["changed"]), "deleted": len(scan["deleted"]),
+                          "touched": scan["touched"], "settling": scan["settling"], "tracked": len(self.images)})
+        self.remove(scan["deleted"])
+        if scan["touched"]:
+            self._save_state()
+        counts = self.process(scan["changed"])
+        if self.settings["save_consolidated"] and self.state["consolidated_dirty"]:
+            try:
+                saved_files = self.consolidate()
+                self._notify({"event": "consolidated", "rows": sum(count for name, _, count in saved_files if name == "all"),
+                              "files": [{"split": split_name, "path": path, "rows": count}
+                                        for split_name, path, count in saved_files]})
+            except OSError as e:
+                self._log(MSG_ERROR, f"❌ 통합 파일 저장 실패 (다음 확인에서 다시 시도): {e}")
+        return dict(counts, changed=len(scan["changed"]), deleted=len(scan["deleted"]))
+
+    def run(self, interval: float = DEFAULT_WATCH_INTERVAL) -> dict:
+        """
+        stop_event가 설정될 때까지 interval초마다 run_once() 반복
+
+        Returns:
+            dict: 전체 처리 수 (ok / adopted / failed / cancelled)
+        """
+        totals = {"ok": 0, "adopted": 0, "failed": 0, "cancelled": 0}
+        self._log(MSG_INFO, f"👀 폴더 감시 시작: {self.input_folder} ({interval:g}초마다 확인)")
+        while not self.stop_event.is_set():
+            cycle = self.run_once()
+            for key in totals:
+                totals[key] += cycle[key]
+            self.stop_event.wait(interval)
+        self._log(MSG_CAPTION, "⏹️ 폴더 감시 중지 (처리 중이던 이미지는 다음 실행에서 다시 처리)")
+        return totals
+
+
+# ---------- 명령행 ----------
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        description="입력 폴더를 감시해 새로 추가/변경된 화면 이미지만 테스트 시나리오를 생성합니다.",
+        epilog="종료 코드: 0 정상, 1 일부 이미지 실패(--once), 2 인자/설정 오류, 130 중단",
+    )
+    parser.add_argument("input_folder", help="감시할 이미지 폴더 (결과 Excel도 이 폴더에 저장)")
+    add_batch_options(parser)
+    parser.add_argument("--top-level-only", dest="recursive", action="store_false", help="하위 폴더는 감시하지 않음")
+    parser.set_defaults(recursive=True)  # 감시는 기본으로 하위 폴더 포함
+    parser.add_argument("--workers", type=int, default=DEFAULT_BATCH_WORKERS,
+                        help=f"동시 처리 이미지 수 (1~{MAX_BATCH_WORKERS}, 기본: {DEFAULT_BATCH_WORKERS})")
+    parser.add_argument("--interval", type=float, default=DEFAULT_WATCH_INTERVAL,
+                        help=f"폴더 확인 주기 초 (기본: {DEFAULT_WATCH_INTERVAL:g})")
+    parser.add_argument("--settle", type=float, default=DEFAULT_SETTLE_SECONDS,
+                        help=f"수정 후 이 시간(초)이 지난 파일만 처리 (복사 중인 파일 제외, 기본: {DEFAULT_SETTLE_SECONDS:g})")
+    parser.add_argument("--once", action="store_true", help="한 번만 확인하고 종료")
+    add_runtime_options(parser)
+    parser.add_argument("--progress", choices=["jsonl", "text"], default="jsonl", help="진행 상황 출력 형식 (기본: jsonl)")
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    printer = ProgressPrinter(args.progress)
+    try:
+        if not os.path.isdir(args.input_folder):
+            raise UsageError(f"폴더를 찾을 수 없습니다: {args.input_folder}")
+        if not 1 <= args.workers <= MAX_BATCH_WORKERS:
+            raise UsageError(f"--workers는 1~{MAX_BATCH_WORKERS} 사이여야 합니다")
+        if args.persist_dedup_index:
+            raise UsageError("--persist-dedup-index는 폴더 감시에서 사용할 수 없습니다 (통합 파일마다 화면 간 중복을 다시 계산)")
+        settings = build_batch_settings(args)
+        settings["persist_dedup_index"] = False
+        api_key = configure_runtime(args)
+    except UsageError as e:
+        print(f"오류: {e}", file=sys.stderr)
+        return EXIT_USAGE
+
+    stop_event = threading.Event()
+
+    def request_stop(*_):
+        if not stop_event.is_set():
+            stop_event.set()
+            printer({"event": "cancel"})
+
+    signal.signal(signal.SIGTERM, request_stop)
+    signal.signal(signal.SIGINT, request_stop)  # 진행 중인 API 호출까지만 마치고 중지
+    watcher = FolderWatcher(args.input_folder, settings, args.recursive, args.workers, args.settle,
+                            api_key, listener=printer, stop_event=stop_event)
+    worker_settings = settings["worker"]
+    printer({
+        "event": "start",
+        "input_folder": os.path.abspath(args.input_folder),
+        "tracked": len(watcher.images),
+        "model": worker_settings["model_name"],
+        "types": worker_settings["phase1_types"] + (["현업용 통합테스트"] if worker_settings["run_integration"] else []),
+        "workers": watcher.max_workers,
+        "interval": args.interval,
+    })
+    totals = watcher.run_once() if args.once else watcher.run(args.interval)
+    printer(dict({"event": "done"}, **totals))
+    if stop_event.is_set():
+        return EXIT_CANCELLED
+    return EXIT_IMAGES_FAILED if totals["failed"] else EXIT_OK
+
+
+if __name__ == "__main__":
+    sys.exit(main())